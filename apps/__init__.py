@@ -45,15 +45,18 @@ def create_app(config):
     CHECK_FOLDER = str(os.path.abspath(os.path.join(__file__, '..', 'checkversionplatform')))
     REPORT_FOLDER = str(os.path.abspath(os.path.join(__file__, '..', '..', 'reports')))
     POCSUITE3_FOLDER = str(os.path.abspath(os.path.join(__file__, '..', '..', 'pocsuite3')))
+    TRANSCRIPT_FOLDER = str(os.path.abspath(os.path.join(__file__, '..', '..', 'transcripts')))
 
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
     app.config['CHECK_FOLDER'] = CHECK_FOLDER # folder rỗng để check thôi
     app.config['REPORT_FOLDER'] = REPORT_FOLDER
     app.config['POCSUITE3_FOLDER'] = POCSUITE3_FOLDER
+    app.config['TRANSCRIPT_FOLDER'] = TRANSCRIPT_FOLDER # transcript output của shell
     print(' > UPLOAD_FOLDER: ' + UPLOAD_FOLDER)
     print(' > CHECK_FOLDER:    ' + CHECK_FOLDER)
     print(' > REPORT_FOLDER: ' + REPORT_FOLDER)
     print(' > POCSUITE3_FOLDER:    ' + POCSUITE3_FOLDER)
+    print(' > TRANSCRIPT_FOLDER: ' + TRANSCRIPT_FOLDER)
     
     app.config.from_object(config)
     register_extensions(app)
@@ -93,6 +96,14 @@ def create_app(config):
     from apps.managershell.socketio_events import register_terminal_events
     register_terminal_events(socketio)
 
+    # Đăng ký các event cho weevely batch (stream kết quả từng command)
+    from apps.weevely.socketio_events import register_batch_events
+    register_batch_events(socketio)
+
+    # Đăng ký các event cho PoC job (kết quả verify/attack/shell chạy nền) và PoC campaign
+    from apps.home.socketio_events import register_poc_job_events
+    register_poc_job_events(socketio)
+
     return app
 
 __all__ = ['db', 'login_manager', 'create_app', 'socketio', 'shell_manager']
\ No newline at end of file
@@ -0,0 +1,589 @@
+#Chạy hàng loạt PoC trên hàng loạt target (campaign)
+"""
+PoC campaign
+
+Một campaign verify ma trận PoC x target (target lấy từ bảng Targets theo
+filter) trong nền:
+    - task được sinh dần theo từng trang target, hàng đợi có giới hạn, không
+      load cả bảng Targets hay cả ma trận vào bộ nhớ
+    - mỗi target chỉ nhận các PoC khớp fingerprint đã lưu trong Reports
+      (wappalyzer / nmap / wpscan, xem PocMatcher); option ``full_matrix``
+      để chạy mọi PoC trên mọi target
+    - task chạy trên TaskScheduler của pocsuite3 (giới hạn rate / số request
+      đồng thời theo host, backoff khi host timeout hoặc trả 429/503), mỗi task
+      là một PocContext cô lập như PoC job
+    - kết quả ghi theo lô (ResultWriter): mỗi ``batch_size`` dòng là một lệnh
+      insert nhiều dòng và một commit; Reports.pocs và Targets.exploitation_level
+      được cập nhật một lần cho mỗi target khi target chạy xong mọi PoC
+
+API:
+    submit(app, pocs, target_filter, options, owner) -> campaign_id
+    status(campaign_id)                              -> dict tiến độ
+    cancel(campaign_id)                              -> (ok, msg)
+    list_campaigns(owner)
+
+``on_progress(dict)`` được gọi mỗi ``progress_interval`` giây khi campaign chạy,
+``on_finish(dict)`` khi campaign kết thúc (route dùng để emit Socket.IO).
+"""
+import datetime as dt
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from queue import Empty, Full, Queue
+
+from sqlalchemy import or_
+
+from pocsuite3.lib.core.data import paths
+from pocsuite3.lib.core.poc_matcher import Fingerprint, PocMatcher
+from pocsuite3.lib.core.scheduler import TaskScheduler
+from pocsuite3.lib.core.settings import TASK_QUEUE_SIZE_PER_THREAD
+
+from apps import db
+from apps.home.poc_jobs import PocContext, load_poc, resolve_poc_path
+from apps.models import Targets, Reports, VerificationResults
+from apps.jobs import Job, JobManager, QUEUED, DONE, FAILED, CANCELLED, FINISHED_STATES
+
+# số target đọc từ DB mỗi lần
+TARGET_PAGE_SIZE = 500
+
+
+def count_poc_files():
+    """Tổng số file PoC, mẫu số của Targets.exploitation_level (giống /api/save_report)"""
+    return len([
+        f for f in os.listdir(paths.POCSUITE_POCS_PATH)
+        if f.endswith('.py') and not f.startswith('__')
+    ])
+
+
+def target_query(target_filter):
+    """Query Targets theo filter {ids, status, server_type, keyword}"""
+    query = Targets.query
+    target_filter = target_filter or {}
+    if target_filter.get('ids'):
+        query = query.filter(Targets.server_id.in_([int(i) for i in target_filter['ids']]))
+    if target_filter.get('status'):
+        query = query.filter(Targets.status == target_filter['status'])
+    if target_filter.get('server_type'):
+        query = query.filter(Targets.server_type == target_filter['server_type'])
+    if target_filter.get('keyword'):
+        keyword = f"%{target_filter['keyword']}%"
+        query = query.filter(or_(Targets.hostname.ilike(keyword), Targets.ip_address.ilike(keyword)))
+    return query
+
+
+def iter_targets(app, target_filter, page_size=TARGET_PAGE_SIZE):
+    """(server_id, target, ip, fingerprint) của các target khớp filter, đọc theo trang server_id"""
+    last_id = 0
+    while True:
+        with app.app_context():
+            rows = (target_query(target_filter)
+                    .outerjoin(Reports, Reports.server_id == Targets.server_id)
+                    .filter(Targets.server_id > last_id)
+                    .order_by(Targets.server_id)
+                    .with_entities(Targets.server_id, Targets.hostname, Targets.ip_address,
+                                   Reports.wappalyzer, Reports.nmap, Reports.wpscan)
+                    .limit(page_size)
+                    .all())
+        if not rows:
+            return
+        for server_id, hostname, ip_address, wappalyzer, nmap, wpscan in rows:
+            yield server_id, hostname or ip_address, ip_address, Fingerprint.from_scans(wappalyzer, nmap, wpscan)
+        last_id = rows[-1][0]
+
+
+def preview_campaign(app, pocs, target_filter=None):
+    """Số task của campaign có / không có preselect, không chạy gì.
+    pocs: danh sách (path, appName, appVersion, name)"""
+    matcher = PocMatcher(pocs)
+    per_poc = OrderedDict((poc[0], 0) for poc in pocs)
+    targets = selected = unfingerprinted = 0
+    for _, _, _, fingerprint in iter_targets(app, target_filter):
+        targets += 1
+        if not fingerprint.known:
+            unfingerprinted += 1
+        for poc_path in matcher.select(fingerprint):
+            per_poc[poc_path] += 1
+            selected += 1
+    return {
+        'targets': targets,
+        'unfingerprinted': unfingerprinted,
+        'matrix': targets * len(pocs),
+        'selected': selected,
+        'skipped': targets * len(pocs) - selected,
+        'per_poc': per_poc
+    }
+
+
+def merge_poc_entries(current, entries):
+    """Gộp kết quả mới vào Reports.pocs, kết quả cũ của cùng PoC bị thay thế"""
+    try:
+        merged = json.loads(current) if current else []
+    except ValueError:
+        merged = []
+    if not isinstance(merged, list):
+        merged = []
+    return replace_poc_entries(merged, entries)
+
+
+def replace_poc_entries(current, entries):
+    """current + entries, entry của cùng PoC (poc.path) trong current bị thay bằng entry mới"""
+    paths_done = {entry['poc']['path'] for entry in entries}
+    kept = [
+        entry for entry in current
+        if not (isinstance(entry, dict) and isinstance(entry.get('poc'), dict)
+                and entry['poc'].get('path') in paths_done)
+    ]
+    return kept + entries
+
+
+class ResultWriter:
+    """Ghi kết quả campaign theo lô, một commit cho mỗi lần flush
+
+    Lô ghi lỗi được giữ lại và ghi cùng lần flush sau (không flush tự động
+    trong ``retry_delay`` giây sau lỗi), bị bỏ sau ``max_retries`` lần lỗi liên tiếp.
+    """
+
+    def __init__(self, app, batch_size=200, max_retries=3, retry_delay=5.0):
+        self.app = app
+        self.batch_size = max(1, int(batch_size))
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.total_poc = count_poc_files()
+        self.written = 0
+        self.targets_written = 0
+        self.commits = 0
+        self.errors = 0
+        self.dropped = 0
+        self._rows = []
+        # server_id -> các entry {poc, result} của target đã chạy xong
+        self._reports = {}
+        self._failures = 0
+        self._retry_at = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def _full_locked(self):
+        if time.time() < self._retry_at:
+            return False
+        return len(self._rows) >= self.batch_size or len(self._reports) >= self.batch_size
+
+    def add(self, row):
+        with self._lock:
+            self._rows.append(row)
+            full = self._full_locked()
+        if full:
+            self.flush()
+
+    def target_done(self, server_id, entries):
+        with self._lock:
+            if server_id in self._reports:
+                entries = replace_poc_entries(self._reports[server_id], entries)
+            self._reports[server_id] = entries
+            full = self._full_locked()
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Ghi buffer trong một commit, trả về False nếu lỗi (lô được giữ lại để ghi lại)"""
+        # một flush một lúc, các worker khác tiếp tục đổ vào buffer mới
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+                reports, self._reports = self._reports, {}
+            if not rows and not reports:
+                return True
+            with self.app.app_context():
+                try:
+                    VerificationResults.bulk_create(rows, commit=False)
+                    self._update_targets(reports)
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    self._flush_failed(rows, reports, e)
+                    return False
+            self.written += len(rows)
+            self.targets_written += len(reports)
+            self.commits += 1
+            self._failures = 0
+            return True
+
+    def close(self, wait=None):
+        """Flush cuối khi campaign kết thúc, thử lại tới khi hết lượt retry"""
+        wait = self.retry_delay if wait is None else wait
+        while not self.flush():
+            if not self.pending():
+                return False
+            time.sleep(wait)
+        return True
+
+    def pending(self):
+        with self._lock:
+            return len(self._rows) + len(self._reports)
+
+    def _flush_failed(self, rows, reports, error):
+        self.errors += len(rows)
+        self._failures += 1
+        print(f"[-] Campaign result flush error ({len(rows)} rows, {len(reports)} targets): {error}")
+        if self._failures > self.max_retries:
+            # lỗi lặp lại với cùng dữ liệu, bỏ lô để các lô sau vẫn được ghi
+            self.dropped += len(rows)
+            self._failures = 0
+            print(f"[-] Campaign result dropped after {self.max_retries} retries: "
+                  f"{len(rows)} rows, {len(reports)} targets")
+            return
+        with self._lock:
+            # kết quả mới hơn của cùng target thay thế entry cũ của cùng PoC
+            self._rows[:0] = rows
+            for server_id, entries in reports.items():
+                newer = self._reports.get(server_id)
+                self._reports[server_id] = replace_poc_entries(entries, newer) if newer else entries
+            self._retry_at = time.time() + self.retry_delay
+
+    def _update_targets(self, reports):
+        """Reports.pocs + Targets.exploitation_level cho các target trong lô, không commit"""
+        if not reports:
+            return
+        ids = list(reports)
+        now_time = dt.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        current = {r.server_id: r for r in Reports.query.filter(Reports.server_id.in_(ids))}
+        targets = {t.server_id: t for t in Targets.query.filter(Targets.server_id.in_(ids))}
+        for server_id, entries in reports.items():
+            target = targets.get(server_id)
+            if target is None:
+                # target bị xóa trong lúc chạy
+                continue
+            report = current.get(server_id)
+            if report is None:
+                report = Reports(server_id=server_id)
+                db.session.add(report)
+            pocs = merge_poc_entries(report.pocs, entries)
+            report.pocs = json.dumps(pocs)
+            report.update_pocs = now_time
+            target.exploitation_level = f"{len(pocs)}/{self.total_poc}"
+            target.updated_at = dt.datetime.utcnow()
+
+    def stats(self):
+        return {
+            'written': self.written,
+            'targets_written': self.targets_written,
+            'commits': self.commits,
+            'errors': self.errors,
+            'dropped': self.dropped,
+            'pending': self.pending()
+        }
+
+
+class Campaign(Job):
+    """Trạng thái và tiến độ của một campaign"""
+
+    def __init__(self, app, pocs, target_filter=None, options=None, owner=None):
+        super().__init__(owner)
+        self.app = app
+        self.pocs = list(pocs)
+        self.target_filter = target_filter or {}
+        self.options = options or {}
+        self.targets_total = 0
+        # PoC x target, và số task bị bỏ qua vì không khớp fingerprint
+        self.matrix = 0
+        self.skipped = 0
+        self.completed = 0
+        self.vulnerable = 0
+        self.failed = 0
+        self.targets_done = 0
+        self.findings = deque(maxlen=50)
+        self.stop = threading.Event()
+        self.writer = None
+        self.scheduler = None
+        self._lock = threading.Lock()
+
+    @property
+    def campaign_id(self):
+        return self.job_id
+
+    @property
+    def total(self):
+        return self.matrix - self.skipped
+
+    def to_dict(self):
+        elapsed = self.elapsed()
+        data = {
+            'campaign_id': self.campaign_id,
+            'pocs': len(self.pocs),
+            'target_filter': self.target_filter,
+            'status': self.state,
+            'done': self.state in FINISHED_STATES,
+            'error': self.error,
+            'targets_total': self.targets_total,
+            'targets_done': self.targets_done,
+            'matrix': self.matrix,
+            'skipped': self.skipped,
+            'total': self.total,
+            'completed': self.completed,
+            'vulnerable': self.vulnerable,
+            'failed': self.failed,
+            'progress': round(100.0 * self.completed / self.total, 1) if self.total else 0,
+            'findings': list(self.findings),
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed_time': elapsed,
+            'rate': round(self.completed / elapsed, 2) if elapsed else 0
+        }
+        if self.writer:
+            data['persisted'] = self.writer.stats()
+        if self.scheduler:
+            stats = self.scheduler.stats()
+            data['queue_depth'] = stats['queue_depth']
+            data['running'] = stats['running']
+            data['throttled'] = stats['throttled']
+        return data
+
+
+class CampaignRun:
+    """Chạy ma trận PoC x target của một campaign"""
+
+    def __init__(self, campaign, threads, batch_size, on_progress=None, progress_interval=1.0):
+        self.campaign = campaign
+        self.threads = max(1, int(campaign.options.get('threads') or threads))
+        self.params = dict(campaign.options.get('params') or {})
+        self.on_progress = on_progress
+        self.progress_interval = progress_interval
+        self.task_queue = Queue(maxsize=self.threads * TASK_QUEUE_SIZE_PER_THREAD)
+        self.feeding = threading.Event()
+        campaign.scheduler = TaskScheduler(self.threads, campaign.options.get('host_rate') or 0,
+                                           campaign.options.get('host_concurrency') or 0,
+                                           task_queue=self.task_queue, feeding=self.feeding)
+        campaign.writer = ResultWriter(campaign.app, batch_size)
+        self.pocs = OrderedDict()
+        self.matcher = None
+        # server_id -> [số PoC chưa chạy, entries]
+        self._open_targets = {}
+        self._lock = threading.Lock()
+
+    def run(self):
+        campaign = self.campaign
+        for poc_path in campaign.pocs:
+            self.pocs[poc_path] = load_poc(poc_path)
+        with campaign.app.app_context():
+            campaign.targets_total = target_query(campaign.target_filter).count()
+        campaign.matrix = campaign.targets_total * len(self.pocs)
+        if not campaign.options.get('full_matrix'):
+            self.matcher = PocMatcher((path, poc.appName, poc.appVersion, poc.name) for path, poc in self.pocs.items())
+        print(f"[+] PoC campaign {campaign.campaign_id}: {len(self.pocs)} PoCs x "
+              f"{campaign.targets_total} targets, {self.threads} threads")
+
+        self.feeding.set()
+        feeder = threading.Thread(target=self._feed, daemon=True, name=f"campaign-feed-{campaign.campaign_id[:8]}")
+        feeder.start()
+        workers = [threading.Thread(target=self._work, daemon=True,
+                                    name=f"campaign-{campaign.campaign_id[:8]}-{i}") for i in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            while worker.is_alive():
+                worker.join(self.progress_interval)
+                self._progress()
+        feeder.join()
+
+        # target dở dang khi bị hủy vẫn lưu những gì đã chạy
+        with self._lock:
+            open_targets, self._open_targets = self._open_targets, {}
+        for server_id, (_, entries) in open_targets.items():
+            if entries:
+                campaign.writer.target_done(server_id, entries)
+        campaign.writer.close()
+
+    def _progress(self):
+        if self.on_progress:
+            try:
+                self.on_progress(self.campaign.to_dict())
+            except Exception as e:
+                print(f"[-] PoC campaign progress error: {e}")
+
+    def _feed(self):
+        """Sinh task (server_id, ip, target, poc_path) theo từng target, chờ khi hàng đợi đầy"""
+        try:
+            for server_id, target, ip_address, fingerprint in iter_targets(self.campaign.app,
+                                                                           self.campaign.target_filter):
+                selected = self.matcher.select(fingerprint) if self.matcher else list(self.pocs)
+                with self.campaign._lock:
+                    self.campaign.skipped += len(self.pocs) - len(selected)
+                    if not selected:
+                        self.campaign.targets_done += 1
+                if not selected:
+                    continue
+                with self._lock:
+                    self._open_targets[server_id] = [len(selected), []]
+                for poc_path in selected:
+                    # TaskScheduler đọc target ở item[-2], giống task (seq, target, poc) của pocsuite3
+                    item = (server_id, ip_address, target, poc_path)
+                    while not self.campaign.stop.is_set():
+                        try:
+                            self.task_queue.put(item, timeout=0.5)
+                            break
+                        except Full:
+                            continue
+                    if self.campaign.stop.is_set():
+                        return
+        except Exception as e:
+            self.campaign.error = f"Target generation failed: {e}"
+            self.campaign.stop.set()
+        finally:
+            self.feeding.clear()
+
+    def _work(self):
+        scheduler = self.campaign.scheduler
+        while True:
+            try:
+                item, host = scheduler.get()
+            except Empty:
+                return
+            started = time.time()
+            try:
+                if self.campaign.stop.is_set():
+                    continue
+                self._run_task(*item, scheduler)
+            finally:
+                scheduler.release(host, started)
+
+    def _run_task(self, server_id, ip_address, target, poc_path, scheduler):
+        poc = self.pocs[poc_path]
+        params = dict(self.params)
+        params['target-value'] = target
+        # PoC không phải HTTP lấy target từ rhost
+        params['rhost-value'] = target
+        error = None
+        report = None
+        try:
+            context = PocContext(poc, params)
+            output, result = context.run('verify', scheduler)
+            report = context.report(output)
+        except Exception as e:
+            error = str(e)
+            result = {'Result': error}
+        vulnerable = bool(report and report['status'] == 'success')
+
+        result = dict(result)
+        result['Target'] = target
+        result['Mode'] = 'Verified'
+        result['report'] = report or {'status': 'Fail'}
+        poc_info = {
+            'name': poc.name,
+            'path': poc_path,
+            'appname': poc.appName,
+            'appversion': poc.appVersion,
+            'vulID': poc.vulID
+        }
+        self.campaign.writer.add({
+            'target_hostname': target,
+            'poc_id': poc.vulID or poc.name,
+            'poc_path': poc_path,
+            'target_ip': ip_address,
+            'result_data': json.dumps(result, indent=2, default=str),
+            'status': 'failed' if error else 'completed',
+            'notes': f'Campaign {self.campaign.campaign_id}'
+        })
+
+        campaign = self.campaign
+        with campaign._lock:
+            campaign.completed += 1
+            if error:
+                campaign.failed += 1
+            if vulnerable:
+                campaign.vulnerable += 1
+                campaign.findings.append({'target': target, 'poc': poc.name, 'poc_path': poc_path})
+
+        entries = None
+        with self._lock:
+            pending = self._open_targets.get(server_id)
+            if pending is not None:
+                pending[0] -= 1
+                pending[1].append({'poc': poc_info, 'result': result})
+                if pending[0] <= 0:
+                    entries = self._open_targets.pop(server_id)[1]
+        if entries is not None:
+            with campaign._lock:
+                campaign.targets_done += 1
+            campaign.writer.target_done(server_id, entries)
+
+
+class PocCampaignManager(JobManager):
+    """Hàng đợi campaign, tối đa ``max_campaigns`` campaign chạy cùng lúc"""
+
+    kind = 'PoC campaign'
+
+    def __init__(self, max_campaigns=1, threads=20, batch_size=200, result_ttl=86400, max_campaigns_kept=100):
+        super().__init__(max_campaigns, result_ttl, max_campaigns_kept)
+        self.threads = threads
+        self.batch_size = batch_size
+        self.on_progress = None
+
+    # ------------------------------------------------------------------ API
+
+    def submit(self, app, pocs, target_filter=None, options=None, owner=None):
+        """Tạo campaign, trả về campaign_id. pocs: danh sách đường dẫn PoC"""
+        if not pocs:
+            raise ValueError("No PoC selected")
+        for poc_path in pocs:
+            resolve_poc_path(poc_path)
+        with app.app_context():
+            if not target_query(target_filter).first():
+                raise ValueError("No target matches the filter")
+
+        campaign = Campaign(app, pocs, target_filter, options, owner)
+        print(f"[+] PoC campaign {campaign.campaign_id} queued: {len(pocs)} PoCs")
+        return self._enqueue(campaign)
+
+    def cancel(self, campaign_id):
+        """Hủy campaign: đang chờ thì bỏ luôn, đang chạy thì dừng sinh task và lưu kết quả đã có"""
+        campaign = self.get(campaign_id)
+        if not campaign:
+            return False, 'Campaign not found'
+        with self._lock:
+            if campaign.state in FINISHED_STATES:
+                return False, 'Campaign already finished'
+            campaign.stop.set()
+            if campaign.state != QUEUED:
+                return True, 'Campaign is stopping'
+            self._cancel_queued_locked(campaign)
+        self._notify(campaign)
+        return True, 'Campaign cancelled'
+
+    def list_campaigns(self, owner=None):
+        return self.list_jobs(owner)
+
+    # ------------------------------------------------------------ internals
+
+    def _thread_name(self, campaign):
+        return f"poc-campaign-{campaign.campaign_id[:8]}"
+
+    def _execute(self, campaign):
+        CampaignRun(campaign, self.threads, self.batch_size, self.on_progress).run()
+        if campaign.error:
+            return FAILED
+        if campaign.stop.is_set():
+            return CANCELLED
+        return DONE
+
+    def _finished_message(self, campaign):
+        return (f"[+] PoC campaign {campaign.campaign_id} {campaign.state}: {campaign.completed}/{campaign.total} "
+                f"tasks, {campaign.vulnerable} vulnerable")
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_poc_campaign_manager():
+    """Singleton manager, cấu hình qua POC_CAMPAIGN_MAX / POC_CAMPAIGN_THREADS / POC_CAMPAIGN_BATCH"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = PocCampaignManager(
+                max_campaigns=int(os.getenv('POC_CAMPAIGN_MAX', 1)),
+                threads=int(os.getenv('POC_CAMPAIGN_THREADS', 20)),
+                batch_size=int(os.getenv('POC_CAMPAIGN_BATCH', 200))
+            )
+    return _manager
@@ -0,0 +1,243 @@
+#Chạy PoC từ web API trong các context cô lập
+"""
+PoC job manager
+
+Mỗi lần verify / attack / shell một PoC từ web API là một job có job_id riêng.
+Job chạy trong một context cô lập:
+    - instance PoC riêng (POCBase.new_task() của PoC đã load), nên options và
+      target của người này không ghi đè lên người khác
+    - headers / proxy / timeout riêng (request_context), không sửa conf toàn cục
+    - kết quả riêng, giữ trong ``result_ttl`` giây sau khi job kết thúc
+
+Tối đa ``max_workers`` job chạy cùng lúc trong thread nền, job vượt quá được
+xếp hàng chờ; request thread của Flask trả về ngay với job_id.
+
+API:
+    submit(poc_path, mode, params, owner) -> job_id
+    status(job_id)                        -> dict trạng thái + kết quả
+    cancel(job_id)                        -> (ok, msg), chỉ hủy được job đang chờ
+    wait(job_id, timeout)                 -> dict trạng thái khi job kết thúc
+    list_jobs(owner)
+
+``on_finish(job_dict)`` được gọi khi job kết thúc (route dùng để emit Socket.IO).
+"""
+import os
+import threading
+
+from pocsuite3.lib.core.common import get_filename, ltrim, rtrim
+from pocsuite3.lib.core.data import conf, kb, paths
+from pocsuite3.lib.core.enums import POC_CATEGORY
+from pocsuite3.lib.core.register import load_file_to_module
+from pocsuite3.lib.request.patch.hook_request import request_context
+
+from apps.jobs import Job, JobManager, QUEUED, FINISHED_STATES
+
+MODES = ('verify', 'attack', 'shell')
+
+# load_file_to_module ghi vào kb.registered_pocs / kb.current_poc
+_load_lock = threading.Lock()
+# poc file -> (mtime, PoC đã load)
+_loaded_pocs = {}
+# get_listener_ip() / get_listener_port() đọc conf toàn cục, các job shell chạy lần lượt
+_shell_lock = threading.Lock()
+
+
+def resolve_poc_path(poc_path):
+    """Đường dẫn file PoC, giống PocsuiteInterpreter.command_use"""
+    if not poc_path.endswith('.py'):
+        poc_path = poc_path + '.py'
+    if not os.path.exists(poc_path):
+        poc_path = os.path.join(paths.POCSUITE_ROOT_PATH, poc_path)
+    if not os.path.exists(poc_path):
+        raise ValueError(f"No such file: '{poc_path}'")
+    return os.path.abspath(poc_path)
+
+
+def load_poc(poc_path):
+    """PoC đã load (dùng chung, chỉ đọc), load lại khi file thay đổi"""
+    file_path = resolve_poc_path(poc_path)
+    mtime = os.path.getmtime(file_path)
+    with _load_lock:
+        cached = _loaded_pocs.get(file_path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        # register_poc giữ instance cũ nếu module đã đăng ký
+        kb.registered_pocs.pop('pocs_{0}'.format(get_filename(file_path, with_ext=False)), None)
+        poc = load_file_to_module(file_path)
+        if poc is None:
+            raise ValueError(f"No poc is available by that poc-path: '{poc_path}'")
+        poc.pocsuite3_module_path = ltrim(rtrim(file_path, '.py'), os.path.join(paths.POCSUITE_ROOT_PATH, ''))
+        _loaded_pocs[file_path] = (mtime, poc)
+        return poc
+
+
+class PocContext:
+    """Context cô lập của một lần chạy PoC: instance, options, http settings, kết quả"""
+
+    def __init__(self, poc, params=None):
+        self.poc = poc.new_task()
+        for key, value in (params or {}).items():
+            self.set(key.replace('-value', ''), value)
+
+    def set(self, key, value):
+        """Giống PocsuiteInterpreter.command_set nhưng chỉ trên instance của context"""
+        if key in self.poc.options:
+            self.poc.set_option(key, value)
+        elif key in self.poc.global_options:
+            self.poc.setg_option(key, value)
+        elif key in self.poc.payload_options:
+            self.poc.setp_option(key, value)
+
+    def _global(self, name):
+        option = self.poc.global_options.get(name)
+        return option.value if option is not None and option.value != '' else None
+
+    def target(self):
+        """Target giống PocsuiteInterpreter._attack_mode"""
+        if self.poc.current_protocol == POC_CATEGORY.PROTOCOL.HTTP:
+            return self.poc.getg_option('target')
+        scheme = 'https' if self.poc.getg_option('ssl') else 'http'
+        return f"{scheme}://{self.poc.getg_option('rhost')}:{self.poc.getg_option('rport')}"
+
+    def http_settings(self):
+        """headers / proxies / timeout từ global options, thay cho _set_global_conf"""
+        headers = dict(conf.http_headers or {})
+        proxies = dict(conf.proxies or {})
+        timeout = conf.timeout
+        if self.poc.current_protocol == POC_CATEGORY.PROTOCOL.HTTP:
+            if self._global('referer'):
+                headers['Referer'] = self._global('referer')
+            if self._global('agent'):
+                headers['User-Agent'] = self._global('agent')
+            if self._global('proxy'):
+                proxies = {'http': self._global('proxy'), 'https': self._global('proxy')}
+            if self._global('timeout'):
+                timeout = max(float(self._global('timeout')), 3.0)
+        return headers, proxies, timeout
+
+    def run(self, mode, scheduler=None):
+        """Chạy PoC, trả về (output, result dict). scheduler: TaskScheduler nhận tín hiệu timeout / 429 của host"""
+        if mode == 'shell':
+            self.poc.check_requirement(self.poc.payload_options, self.poc.global_options)
+        else:
+            self.poc.check_requirement(self.poc.global_options, self.poc.options)
+        target = self.target()
+        headers, proxies, timeout = self.http_settings()
+
+        with request_context(headers, proxies, timeout, scheduler):
+            if mode == 'shell':
+                with _shell_lock:
+                    conf.connect_back_host = self.poc.getp_option('lhost')
+                    conf.connect_back_port = self.poc.getp_option('lport')
+                    output = self.poc.execute(target, headers=headers, mode=mode, verbose=False)
+            else:
+                output = self.poc.execute(target, headers=headers, mode=mode, verbose=False)
+        return output, self.collect_result(output)
+
+    def collect_result(self, output):
+        # PoC của project gán self.result, PoC gốc của pocsuite3 trả về Output
+        tmp = getattr(self.poc, 'result', None)
+        if tmp is None and output is not None:
+            tmp = output.result if output.is_success() else None
+        if isinstance(tmp, dict):
+            return dict(tmp)
+        return {'Result': str(tmp) if tmp is not None else 'No result'}
+
+    def report(self, output):
+        return {
+            'status': 'success' if output is not None and output.is_success() else 'Fail',
+            'poc_name': getattr(self.poc, 'pocsuite3_module_path', self.poc.name),
+            'vul_id': self.poc.vulID,
+            'app_name': self.poc.appName,
+            'app_version': self.poc.appVersion
+        }
+
+
+class PocJob(Job):
+    """Trạng thái và kết quả của một lần chạy PoC"""
+
+    def __init__(self, poc_path, mode, params=None, owner=None):
+        super().__init__(owner)
+        self.poc_path = poc_path
+        self.mode = mode
+        self.params = params or {}
+        self.result = None
+        self.report = None
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'poc_path': self.poc_path,
+            'mode': self.mode,
+            'target': self.params.get('target-value', self.params.get('target')),
+            'status': self.state,
+            'done': self.state in FINISHED_STATES,
+            'result': self.result,
+            'report': self.report,
+            'error': self.error,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'elapsed_time': self.elapsed()
+        }
+
+
+class PocJobManager(JobManager):
+    """Chạy nhiều PoC cùng lúc, mỗi job một context cô lập"""
+
+    kind = 'PoC job'
+
+    def __init__(self, max_workers=8, result_ttl=3600, max_jobs=1000):
+        super().__init__(max_workers, result_ttl, max_jobs)
+
+    # ------------------------------------------------------------------ API
+
+    def submit(self, poc_path, mode='verify', params=None, owner=None):
+        """Tạo job mới, trả về job_id. Job chạy ngay nếu còn worker rảnh"""
+        if mode not in MODES:
+            raise ValueError(f"Unknown mode: {mode}")
+        if not poc_path:
+            raise ValueError("poc-path is required")
+        # lỗi đường dẫn báo ngay cho client thay vì trong job
+        resolve_poc_path(poc_path)
+
+        job = PocJob(poc_path, mode, params, owner)
+        print(f"[+] PoC job {job.job_id} queued: {mode} {poc_path}")
+        return self._enqueue(job)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if not job:
+            return False, 'Job not found'
+        with self._lock:
+            if job.state != QUEUED:
+                return False, 'Only queued jobs can be cancelled'
+            self._cancel_queued_locked(job)
+        self._notify(job)
+        return True, 'Job cancelled'
+
+    # ------------------------------------------------------------ internals
+
+    def _thread_name(self, job):
+        return f"poc-{job.mode}-{job.job_id[:8]}"
+
+    def _execute(self, job):
+        context = PocContext(load_poc(job.poc_path), job.params)
+        output, job.result = context.run(job.mode)
+        job.report = context.report(output)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_poc_job_manager():
+    """Singleton manager cho cả server, số worker lấy từ POC_MAX_WORKERS / POC_RESULT_TTL"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = PocJobManager(
+                max_workers=int(os.getenv('POC_MAX_WORKERS', 8)),
+                result_ttl=int(os.getenv('POC_RESULT_TTL', 3600))
+            )
+    return _manager
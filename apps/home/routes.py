@@ -7,14 +7,17 @@ from turtle import delay
 import wtforms
 import datetime as dt
 from apps.home import blueprint
-from apps import db 
-from apps.models import Targets, ShellConnection, ShellStatus, ShellType
+from apps import db, socketio
+from apps.home.poc_jobs import get_poc_job_manager
+from apps.home.poc_campaigns import get_poc_campaign_manager, preview_campaign
+from apps.home.socketio_events import poc_job_room, poc_campaign_room
+from apps.models import Targets, ShellConnection, ShellStatus, ShellType, VerificationResults
 from apps.authentication.models import Users
 from apps.managershell.routes import close_shell, get_shell_manager, start_shell_function
 from jinja2 import TemplateNotFound
 from flask_wtf import FlaskForm
 from flask_login import login_required, current_user
-from flask import render_template, request, redirect, url_for, jsonify, session
+from flask import render_template, request, redirect, url_for, jsonify, session, current_app
 
 import requests
 
@@ -28,6 +31,7 @@ import subprocess
 import re
 import sys,types
 import random
+import uuid
 
 
 ##IMPORTING POCSUITE3
@@ -51,6 +55,32 @@ check_environment()
 set_paths(module_path())
 init_options()
 poc_core = PocsuiteInterpreter()
+# verify/attack/shell chạy trong context cô lập của poc_jobs, poc_core chỉ dùng để xem thông tin PoC
+poc_jobs = get_poc_job_manager()
+
+
+def _emit_poc_job_done(job):
+    socketio.emit('poc_job_done', job, room=poc_job_room(job['job_id']))
+
+
+poc_jobs.on_finish = _emit_poc_job_done
+# API đồng bộ (verify/attack/shell) đợi job tối đa POC_WAIT_TIMEOUT giây, quá thì
+# trả job_id với 202 để client poll /api/poc-jobs/<job_id> hoặc đợi Socket.IO
+POC_WAIT_TIMEOUT = float(os.getenv('POC_WAIT_TIMEOUT', 60))
+# verify hàng loạt PoC x target chạy nền, kết quả ghi DB theo lô
+poc_campaigns = get_poc_campaign_manager()
+
+
+def _emit_poc_campaign_progress(campaign):
+    socketio.emit('poc_campaign_progress', campaign, room=poc_campaign_room(campaign['campaign_id']))
+
+
+def _emit_poc_campaign_done(campaign):
+    socketio.emit('poc_campaign_done', campaign, room=poc_campaign_room(campaign['campaign_id']))
+
+
+poc_campaigns.on_progress = _emit_poc_campaign_progress
+poc_campaigns.on_finish = _emit_poc_campaign_done
 ## Ending IMPORTING POCSUITE#
 server = Server()
 lib_db = database.Database()  # Rename to avoid conflict
@@ -205,6 +235,8 @@ def get_poc_info():
         return jsonify({'status': -1, 'msg': 'No poc is available by that poc-path'})
     if not poc_core.current_module:
         return jsonify({'status': -1, 'msg': 'No poc is available by that poc-path'})
+    # PoC đang chọn của từng người dùng, verify/attack/shell sau đó chạy đúng PoC này
+    session['poc_path'] = poc_path
     modeString = ''
 
     #Xác định các chế độ hỗ trợ (mode)
@@ -260,87 +292,148 @@ def get_detail_options(options):
             
     return ret
 
+def _session_owner():
+    if 'poc_owner' not in session:
+        session['poc_owner'] = uuid.uuid4().hex
+    return session['poc_owner']
+
+def _current_poc_path():
+    """PoC của request: poc_path gửi lên, PoC đã chọn qua /get-poc-info, hoặc PoC đang load trong poc_core"""
+    poc_path = request.form.get('poc_path') or session.get('poc_path')
+    if not poc_path and poc_core.current_module is not None:
+        poc_path = poc_core.current_module.pocsuite3_module_path
+    return poc_path
+
+def _poc_params():
+    return {key: val for key, val in request.form.items() if key not in ('poc_path', 'async')}
+
+def _run_poc_job(mode):
+    """Submit job, trả về job_id ngay nếu async=1, nếu không thì đợi kết quả như API cũ
+    (tối đa POC_WAIT_TIMEOUT giây, job chưa xong thì trạng thái trả về có done=False)"""
+    job_id = poc_jobs.submit(_current_poc_path(), mode, _poc_params(), owner=_session_owner())
+    if request.values.get('async') == '1':
+        return job_id, None
+    return job_id, poc_jobs.wait(job_id, POC_WAIT_TIMEOUT)
+
+def _job_pending(job):
+    """Job vẫn chạy sau POC_WAIT_TIMEOUT: 202 kèm job_id để client poll"""
+    return jsonify({'status': 0, 'job_id': job['job_id'], 'data': job,
+                    'msg': f"Job still {job['status']}, poll /api/poc-jobs/{job['job_id']}"}), 202
+
+def _job_result(job, mode_label):
+    result = dict(job['result'] or {'Result': job['error'] or 'No result'})
+    result['Target'] = job['target']
+    result['Mode'] = mode_label
+    result['job_id'] = job['job_id']
+    return result
+
 @blueprint.route('/api/verify-mode', methods = ['POST'])
 def VerifyMode():
-    params = {}
-    for key in request.form:
-        params[key] = request.form[key]
-    #Set params to pocsuite3
-    for key,val in params.items():
-        key = key.replace('-value','')
-        command = key + ' ' + val
-        print(command)
-        poc_core.command_set(command)
-        
-    #kiểm tra và hiển thị cấu hình cuối cùng trước khi thực hiện chức năng verify, 
-    # giúp đảm bảo tất cả tham số đã được thiết lập đúng và có thể debug nếu có vấn đề.
-    poc_core.command_show('options')
-    result = {}
-    report = {}
     try:
-        # _cleanup_options()
-        poc_core.command_verify()
-        tmp = poc_core.current_module.result
-        if(isinstance(tmp,dict)):
-            for key,val in tmp.items():
-                result[key] = val
-        else:
-            result['Result'] = str(tmp)
-        report['status'] = 'success'
-    except:
-        report['status'] = 'Fail'
-        result['Result'] = 'No result'   
-    
-    # newwww = html_report.HtmlReport()
-    # newwww.start()
+        job_id, job = _run_poc_job('verify')
+    except ValueError as e:
+        return jsonify({'status': -1, 'msg': str(e)})
+    if job is None:
+        return jsonify({'status': 0, 'job_id': job_id})
+    if not job['done']:
+        return _job_pending(job)
 
-    result['Target'] = params['target-value']
-    # x = kb.plugins
-    result['Mode'] = 'Verified'
-    # result['target'] = params['target-value']
-    
-    
-    report['poc_name'] = poc_core.current_module.pocsuite3_module_path
-    report['vul_id'] = poc_core.current_module.vulID
-    report['app_name'] = poc_core.current_module.appName
-    report['app_version'] = poc_core.current_module.appVersion
-    
-    result['report'] = report
+    result = _job_result(job, 'Verified')
+    result['report'] = job['report'] or {'status': 'Fail'}
     return jsonify({'status': 0, 'data': result})
 
 @blueprint.route('/api/attack-mode', methods = ['POST'])
 def AttackMode():
-    params = {}
-    for key in request.form:
-        params[key] = request.form[key]
-    #Set params to pocsuite3
-    for key,val in params.items():
-        key = key.replace('-value','')
-        command = key + ' ' + val
-        print(command)
-        poc_core.command_set(command)
-        
-    #Realise MODE command --> VERIFY
-    poc_core.command_show('options')
-    result = {}
     try:
-        poc_core.command_attack()
-        tmp = poc_core.current_module.result
-        if(isinstance(tmp,dict)):
-            for key,val in tmp.items():
-                result[key] = val
-        else:
-            result['Result'] = str(tmp)
-    except:
-        result['Result'] = 'No result'   
-    
-    # newwww = html_report.HtmlReport()
-    # newwww.start()
-
-    result['Target'] = params['target-value']
-    # x = kb.plugins
-    result['Mode'] = 'Attacked'
-    return jsonify({'status': 0, 'data': result})
+        job_id, job = _run_poc_job('attack')
+    except ValueError as e:
+        return jsonify({'status': -1, 'msg': str(e)})
+    if job is None:
+        return jsonify({'status': 0, 'job_id': job_id})
+    if not job['done']:
+        return _job_pending(job)
+    return jsonify({'status': 0, 'data': _job_result(job, 'Attacked')})
+
+@blueprint.route('/api/poc-jobs', methods=['POST'])
+def submit_poc_job():
+    """Tạo job PoC: {poc_path, mode, params: {target-value: ..., ...}}, trả về job_id ngay"""
+    data = request.get_json(silent=True) or {}
+    try:
+        job_id = poc_jobs.submit(data.get('poc_path') or session.get('poc_path'), data.get('mode', 'verify'),
+                                 data.get('params') or {}, owner=_session_owner())
+    except ValueError as e:
+        return jsonify({'status': -1, 'msg': str(e)}), 400
+    return jsonify({'status': 0, 'job_id': job_id, 'data': poc_jobs.status(job_id)})
+
+@blueprint.route('/api/poc-jobs', methods=['GET'])
+def list_poc_jobs():
+    """Danh sách job PoC của user hiện tại (all=1 để xem mọi job)"""
+    owner = None if request.args.get('all') == '1' else _session_owner()
+    return jsonify({'status': 0, 'data': poc_jobs.list_jobs(owner=owner), 'stats': poc_jobs.stats()})
+
+@blueprint.route('/api/poc-jobs/<job_id>', methods=['GET'])
+def poc_job_status(job_id):
+    status = poc_jobs.status(job_id)
+    if status is None:
+        return jsonify({'status': -1, 'msg': 'Job not found'}), 404
+    return jsonify({'status': 0, 'data': status})
+
+@blueprint.route('/api/poc-jobs/<job_id>/cancel', methods=['POST'])
+def cancel_poc_job(job_id):
+    ok, msg = poc_jobs.cancel(job_id)
+    return jsonify({'status': 0 if ok else -1, 'msg': msg})
+
+def _campaign_pocs(data):
+    pocs = data.get('pocs')
+    if pocs == 'all':
+        return [module['path'] for module in poc_core.get_all_modules()]
+    return pocs or []
+
+@blueprint.route('/api/poc-campaigns/preview', methods=['POST'])
+def preview_poc_campaign():
+    """Số task trước / sau khi lọc PoC theo fingerprint của target, cùng body với POST /api/poc-campaigns"""
+    data = request.get_json(silent=True) or {}
+    modules = {module['path']: module for module in poc_core.get_all_modules()}
+    pocs = []
+    for path in _campaign_pocs(data):
+        module = modules.get(path, {})
+        pocs.append((path, module.get('appname') or '', module.get('appversion') or '', module.get('name') or ''))
+    if not pocs:
+        return jsonify({'status': -1, 'msg': 'No PoC selected'}), 400
+    return jsonify({'status': 0, 'data': preview_campaign(current_app._get_current_object(), pocs,
+                                                          data.get('targets') or {})})
+
+@blueprint.route('/api/poc-campaigns', methods=['POST'])
+def submit_poc_campaign():
+    """Tạo campaign verify: {pocs: [poc path] | 'all', targets: {ids, status, server_type, keyword},
+    threads, host_rate, host_concurrency, params: {...}, full_matrix}, trả về campaign_id ngay.
+    Mặc định mỗi target chỉ chạy các PoC khớp fingerprint, full_matrix=true để chạy tất cả"""
+    data = request.get_json(silent=True) or {}
+    pocs = _campaign_pocs(data)
+    options = {key: data.get(key) for key in ('threads', 'host_rate', 'host_concurrency', 'params', 'full_matrix')}
+    try:
+        campaign_id = poc_campaigns.submit(current_app._get_current_object(), pocs,
+                                           data.get('targets') or {}, options, owner=_session_owner())
+    except ValueError as e:
+        return jsonify({'status': -1, 'msg': str(e)}), 400
+    return jsonify({'status': 0, 'campaign_id': campaign_id, 'data': poc_campaigns.status(campaign_id)})
+
+@blueprint.route('/api/poc-campaigns', methods=['GET'])
+def list_poc_campaigns():
+    owner = None if request.args.get('all') == '1' else _session_owner()
+    return jsonify({'status': 0, 'data': poc_campaigns.list_campaigns(owner=owner)})
+
+@blueprint.route('/api/poc-campaigns/<campaign_id>', methods=['GET'])
+def poc_campaign_status(campaign_id):
+    status = poc_campaigns.status(campaign_id)
+    if status is None:
+        return jsonify({'status': -1, 'msg': 'Campaign not found'}), 404
+    return jsonify({'status': 0, 'data': status})
+
+@blueprint.route('/api/poc-campaigns/<campaign_id>/cancel', methods=['POST'])
+def cancel_poc_campaign(campaign_id):
+    ok, msg = poc_campaigns.cancel(campaign_id)
+    return jsonify({'status': 0 if ok else -1, 'msg': msg})
 
 #2 hàm dười này để test xem có ổn ko khi lưu => chưa đưa và thực nghiệm
 @blueprint.route('/api/save-verification-results', methods=['POST'])
@@ -356,7 +449,7 @@ def save_verification_results():
         poc_path = data.get('poc_path')
         results = data.get('results', [])
         
-        saved_count = 0
+        rows = []
         for result_item in results:
             target = result_item.get('target', 'Unknown')
             result_data = result_item.get('result', {})
@@ -373,17 +466,18 @@ def save_verification_results():
                 if ':' in target_info:
                     target_ip = target_info.split(':')[0]
             
-            # Create verification result
-            VerificationResults.create_result(
-                target_hostname=target,
-                poc_id=poc_id,
-                poc_path=poc_path,
-                target_ip=target_ip,
-                result_data=result_json,
-                status='completed',
-                notes=f'Verification completed at {dt.datetime.utcnow().isoformat()}'
-            )
-            saved_count += 1
+            rows.append({
+                'target_hostname': target,
+                'poc_id': poc_id,
+                'poc_path': poc_path,
+                'target_ip': target_ip,
+                'result_data': result_json,
+                'status': 'completed',
+                'notes': f'Verification completed at {dt.datetime.utcnow().isoformat()}'
+            })
+
+        # một lệnh insert và một commit cho cả danh sách
+        saved_count = VerificationResults.bulk_create(rows)
         
         return jsonify({
             'status': 0, 
@@ -451,12 +545,6 @@ def ShellMode():
             'msg': 'Missing required parameters: lhost and lport'
         }), 400
 
-    # Set params to pocsuite3
-    for key, val in params.items():
-        key = key.replace('-value','')
-        command = key + ' ' + val
-        poc_core.command_set(command)
-
     try:
         lhost = params['lhost-value']
         lport = params['lport-value']
@@ -501,11 +589,9 @@ def ShellMode():
         # BƯỚC 4: Thực hiện kết nối thông qua POC
         print(f"[STEP 4] Executing POC to create reverse shell connection to {shell.local_ip}:{shell.local_port}")
         
-        # Hiển thị options để debug
-        poc_core.command_show('options')
-        
-        # Thực thi POC để tạo reverse shell kết nối đến pwncat listener
-        poc_core.command_shell()
+        # Thực thi POC (context cô lập, options lấy từ params) để tạo reverse shell kết nối đến pwncat listener
+        job = poc_jobs.wait(poc_jobs.submit(_current_poc_path(), 'shell', _poc_params(), owner=_session_owner()),
+                            POC_WAIT_TIMEOUT)
         time.sleep(1)
         print(f"[+] POC executed, reverse shell should connect to pwncat listener at {shell.local_ip}:{shell.local_port}")
 
@@ -533,11 +619,15 @@ def ShellMode():
         print(f"[DEBUG] Returning result with shell_id: {shell.connection_id}")
 
         # Add POC results if any
-        tmp = poc_core.current_module.result
-        if isinstance(tmp, dict):
-            result.update(tmp)
+        result['job_id'] = job['job_id']
+        if not job['done']:
+            # PoC vẫn chạy, listener đã bật: client poll job_id để lấy kết quả
+            result['job_status'] = job['status']
+            return jsonify({'status': 0, 'job_id': job['job_id'], 'data': result}), 202
+        if job['result']:
+            result.update(job['result'])
         else:
-            result['result'] = str(tmp)
+            result['result'] = job['error'] or 'No result'
 
         return jsonify({'status': 0, 'data': result})
 
@@ -644,9 +734,8 @@ def upload_poc():
     except Exception as e:
         return jsonify({'status':-1, 'msg':f"{str(e)}"})
 
-    # reload Pocsuite3 // Reload core
-    global poc_core
-    poc_core = PocsuiteInterpreter()
+    # reload Pocsuite3 // cập nhật PoC index, chỉ parse file mới
+    poc_core.refresh_modules()
     LogLastStatus(1)
     
     return jsonify({'status': 0, 'msg': 'File uploaded and POC core reloaded successfully'}), 200
@@ -667,9 +756,11 @@ def delete_poc():
         os.remove(file_path)
         print(f"[+] Delete file POC : {poc_path}")
         
-        #reload Pocsuite3
-        global poc_core
-        poc_core = PocsuiteInterpreter()
+        #reload Pocsuite3 // xóa PoC khỏi index
+        if poc_core.current_module is not None and \
+                getattr(poc_core.current_module, 'pocsuite3_module_path', None) == poc_path[:-3]:
+            poc_core.current_module = None
+        poc_core.refresh_modules()
         LogLastStatus(1)
     except Exception as e:
         return jsonify({'status':-1, 'msg':f"{str(e)}"})
@@ -0,0 +1,68 @@
+"""
+Socket.IO events cho PoC job và PoC campaign
+"""
+from flask_socketio import emit, join_room, leave_room
+from flask import request
+import logging
+
+from apps.home.poc_jobs import get_poc_job_manager
+from apps.home.poc_campaigns import get_poc_campaign_manager
+
+logger = logging.getLogger(__name__)
+
+
+def poc_job_room(job_id):
+    """Tên room nhận kết quả của một PoC job"""
+    return f"poc_job_{job_id}"
+
+
+def poc_campaign_room(campaign_id):
+    """Tên room nhận tiến độ của một campaign"""
+    return f"poc_campaign_{campaign_id}"
+
+
+def register_poc_job_events(socketio):
+    """Đăng ký các event Socket.IO cho PoC job"""
+
+    @socketio.on('join_poc_job')
+    def handle_join_poc_job(data):
+        """Tham gia room của job, 'poc_job_done' được emit khi job kết thúc"""
+        job_id = (data or {}).get('job_id')
+        if not job_id:
+            emit('error', {'message': 'Missing job_id'})
+            return
+        join_room(poc_job_room(job_id))
+        logger.info(f"Client {request.sid} joined poc job room: {job_id}")
+
+        # Client join sau khi job đã xong vẫn nhận được kết quả
+        status = get_poc_job_manager().status(job_id)
+        emit('joined_poc_job', status or {'job_id': job_id, 'status': 'unknown'})
+
+    @socketio.on('leave_poc_job')
+    def handle_leave_poc_job(data):
+        """Rời khỏi room của job"""
+        job_id = (data or {}).get('job_id')
+        if job_id:
+            leave_room(poc_job_room(job_id))
+            emit('left_poc_job', {'job_id': job_id, 'status': 'left'})
+
+    @socketio.on('join_poc_campaign')
+    def handle_join_poc_campaign(data):
+        """Tham gia room của campaign: 'poc_campaign_progress' mỗi giây, 'poc_campaign_done' khi kết thúc"""
+        campaign_id = (data or {}).get('campaign_id')
+        if not campaign_id:
+            emit('error', {'message': 'Missing campaign_id'})
+            return
+        join_room(poc_campaign_room(campaign_id))
+        logger.info(f"Client {request.sid} joined poc campaign room: {campaign_id}")
+
+        status = get_poc_campaign_manager().status(campaign_id)
+        emit('joined_poc_campaign', status or {'campaign_id': campaign_id, 'status': 'unknown'})
+
+    @socketio.on('leave_poc_campaign')
+    def handle_leave_poc_campaign(data):
+        """Rời khỏi room của campaign"""
+        campaign_id = (data or {}).get('campaign_id')
+        if campaign_id:
+            leave_room(poc_campaign_room(campaign_id))
+            emit('left_poc_campaign', {'campaign_id': campaign_id, 'status': 'left'})
@@ -0,0 +1,178 @@
+#Hàng đợi job chạy nền dùng chung cho recon, PoC job và PoC campaign
+"""
+Job manager
+
+Trạng thái job và phần hàng đợi chung của các manager chạy job trong thread
+nền (ReconJobManager, PocJobManager, PocCampaignManager):
+    - tối đa ``max_workers`` job chạy cùng lúc, job vượt quá được xếp hàng chờ
+    - job đã kết thúc được giữ ``result_ttl`` giây, tối đa ``max_jobs`` job
+
+Lớp con cài ``_execute(job)`` (chạy job, trả về state cuối) và các API riêng
+(submit, cancel...). ``on_finish(job_dict)`` được gọi khi job kết thúc.
+"""
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class Job:
+    """Trạng thái chung của một job"""
+
+    def __init__(self, owner=None):
+        self.job_id = uuid.uuid4().hex
+        self.owner = owner
+        self.state = QUEUED
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.finished = threading.Event()
+
+    def elapsed(self):
+        return round((self.finished_at or time.time()) - self.started_at, 2) if self.started_at else 0
+
+    def to_dict(self):
+        raise NotImplementedError
+
+
+class JobManager:
+    """Chạy các job trong thread nền, tối đa ``max_workers`` job cùng lúc"""
+
+    # tên dùng trong log và tên thread
+    kind = 'Job'
+
+    def __init__(self, max_workers=4, result_ttl=3600, max_jobs=500):
+        self.max_workers = max(1, int(max_workers))
+        self.result_ttl = result_ttl
+        self.max_jobs = max_jobs
+        self.on_finish = None
+        self._jobs = OrderedDict()
+        self._pending = deque()
+        self._running = 0
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ API
+
+    def get(self, job_id):
+        with self._lock:
+            self._purge_locked()
+            return self._jobs.get(job_id)
+
+    def status(self, job_id):
+        job = self.get(job_id)
+        if not job:
+            return None
+        data = job.to_dict()
+        if job.state == QUEUED:
+            with self._lock:
+                data['queue_position'] = next(
+                    (i for i, pending in enumerate(self._pending) if pending is job), None)
+        return data
+
+    def wait(self, job_id, timeout=None):
+        """Đợi job kết thúc tối đa ``timeout`` giây, trả về trạng thái lúc đó"""
+        job = self.get(job_id)
+        if not job:
+            return None
+        job.finished.wait(timeout)
+        return self.status(job_id)
+
+    def list_jobs(self, owner=None):
+        with self._lock:
+            self._purge_locked()
+            jobs = list(self._jobs.values())
+        return [job.to_dict() for job in jobs if owner is None or job.owner == owner]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'running': self._running,
+                'queued': len(self._pending),
+                'jobs': len(self._jobs)
+            }
+
+    # ------------------------------------------------------------ internals
+
+    def _execute(self, job):
+        """Chạy job trong thread nền, trả về state cuối (mặc định DONE)"""
+        raise NotImplementedError
+
+    def _enqueue(self, job):
+        with self._lock:
+            self._purge_locked()
+            self._jobs[job.job_id] = job
+            self._pending.append(job)
+        self._dispatch()
+        return job.job_id
+
+    def _dispatch(self):
+        """Start các job đang chờ trong giới hạn max_workers"""
+        to_start = []
+        with self._lock:
+            while self._pending and self._running < self.max_workers:
+                job = self._pending.popleft()
+                job.state = RUNNING
+                job.started_at = time.time()
+                self._running += 1
+                to_start.append(job)
+        for job in to_start:
+            threading.Thread(target=self._run_job, args=(job,), daemon=True,
+                             name=self._thread_name(job)).start()
+
+    def _thread_name(self, job):
+        return f"{self.kind.lower().replace(' ', '-')}-{job.job_id[:8]}"
+
+    def _run_job(self, job):
+        try:
+            state = self._execute(job) or DONE
+        except Exception as e:
+            job.error = str(e)
+            state = FAILED
+        with self._lock:
+            self._running -= 1
+            self._finish_locked(job, state)
+        print(self._finished_message(job))
+        self._notify(job)
+        self._dispatch()
+
+    def _finished_message(self, job):
+        return f"[+] {self.kind} {job.job_id} {job.state}"
+
+    def _cancel_queued_locked(self, job):
+        """Bỏ job đang chờ khỏi hàng đợi, gọi khi đang giữ _lock"""
+        self._pending.remove(job)
+        self._finish_locked(job, CANCELLED)
+
+    def _notify(self, job):
+        if self.on_finish:
+            try:
+                self.on_finish(job.to_dict())
+            except Exception as e:
+                print(f"[-] {self.kind} notify error: {e}")
+
+    def _finish_locked(self, job, state):
+        job.state = state
+        job.finished_at = time.time()
+        job.finished.set()
+
+    def _purge_locked(self):
+        """Xóa job đã kết thúc quá TTL, và job cũ nhất khi vượt max_jobs"""
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job.state in FINISHED_STATES and now - job.finished_at > self.result_ttl:
+                del self._jobs[job_id]
+        while len(self._jobs) > self.max_jobs:
+            oldest = next((jid for jid, j in self._jobs.items() if j.state in FINISHED_STATES), None)
+            if oldest is None:
+                break
+            del self._jobs[oldest]
@@ -0,0 +1,215 @@
+#Một I/O loop cho mọi PTY của PwncatManager
+"""
+PTY multiplexer
+
+Thay cho một thread / shell chạy select(0.1) + os.read(1024): một thread duy
+nhất giữ mọi PTY master fd trong một selector (epoll trên Linux) và ngủ cho
+tới khi có dữ liệu, không polling theo chu kỳ.
+
+    - fd được đặt non-blocking, mỗi lần fd sẵn sàng đọc liên tục tới khi hết
+      dữ liệu (tối đa ``max_chunk`` byte) rồi gọi handler một lần
+    - shell chết được phát hiện qua EOF / EIO / HUP trên master fd, handler
+      ``on_close`` được gọi, fd được đóng bởi chính loop
+    - register / unregister từ thread khác được xếp hàng và đánh thức loop
+      qua một pipe, selector chỉ bị sửa trong thread của loop nên số fd không
+      bị dùng lại khi loop còn giữ fd cũ
+
+Handler là object có ``on_data(bytes)`` và ``on_close()``, chạy trong thread
+của loop nên phải nhanh; việc chậm (DB, ...) đẩy sang thread khác.
+"""
+import errno
+import os
+import selectors
+import threading
+from collections import deque
+
+# đọc mỗi lần os.read, PTY Linux trả về tối đa vài KB mỗi lần
+READ_SIZE = 65536
+# tối đa dữ liệu gom lại cho một lần gọi on_data
+MAX_CHUNK = 256 * 1024
+
+
+class PtyMultiplexer:
+    """Một thread đọc mọi PTY master fd và chuyển dữ liệu tới handler của từng shell"""
+
+    def __init__(self, read_size=READ_SIZE, max_chunk=MAX_CHUNK):
+        self.read_size = read_size
+        self.max_chunk = max_chunk
+        self._selector = selectors.DefaultSelector()
+        self._ops = deque()
+        # fd đang được loop giữ, chỉ thread của loop sửa
+        self._fds = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._running = False
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        # thống kê
+        self.wakeups = 0
+        self.reads = 0
+        self.bytes_read = 0
+        self.dispatches = 0
+
+    # ------------------------------------------------------------------ API
+
+    def register(self, fd, handler):
+        """Theo dõi một PTY master fd, handler.on_data / on_close được gọi trong thread của loop"""
+        os.set_blocking(fd, False)
+        self._submit(('add', fd, handler))
+
+    def unregister(self, fd, close=True):
+        """Bỏ theo dõi fd (không gọi on_close), đóng fd sau khi đã gỡ khỏi selector"""
+        self._submit(('remove', fd, close))
+
+    def count(self):
+        with self._lock:
+            # trừ pipe đánh thức
+            return len(self._fds)
+
+    def stats(self):
+        return {
+            'fds': self.count(),
+            'wakeups': self.wakeups,
+            'reads': self.reads,
+            'bytes_read': self.bytes_read,
+            'dispatches': self.dispatches
+        }
+
+    def stop(self):
+        with self._lock:
+            self._running = False
+        self._wake()
+        if self._thread:
+            self._thread.join(timeout=5)
+
+    # ------------------------------------------------------------ internals
+
+    def _submit(self, op):
+        with self._lock:
+            self._ops.append(op)
+            if not self._running:
+                self._running = True
+                self._thread = threading.Thread(target=self._run, daemon=True, name='pty-mux')
+                self._thread.start()
+        self._wake()
+
+    def _wake(self):
+        try:
+            os.write(self._wake_w, b'\0')
+        except BlockingIOError:
+            # pipe đầy: loop đã có việc phải làm
+            pass
+
+    def _apply_ops(self):
+        try:
+            while os.read(self._wake_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        while True:
+            with self._lock:
+                if not self._ops:
+                    return
+                op = self._ops.popleft()
+            if op[0] == 'add':
+                _, fd, handler = op
+                try:
+                    self._selector.register(fd, selectors.EVENT_READ, handler)
+                    self._fds.add(fd)
+                except (KeyError, ValueError, OSError) as e:
+                    print(f"[!] PTY mux: cannot register fd {fd}: {e}")
+            else:
+                _, fd, close = op
+                self._remove(fd, close)
+
+    def _remove(self, fd, close):
+        # fd đã được loop bỏ (EOF) thì không đóng lại lần nữa, số fd có thể đã thuộc về shell khác
+        if fd not in self._fds:
+            return
+        self._fds.discard(fd)
+        try:
+            self._selector.unregister(fd)
+        except (KeyError, ValueError):
+            pass
+        if close:
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _release(self, fd, handler):
+        """fd hết dữ liệu: bỏ khỏi selector, báo handler rồi mới đóng để số fd không bị dùng lại sớm"""
+        self._remove(fd, close=False)
+        self._call(handler.on_close)
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+    def _read(self, fd):
+        """Đọc hết dữ liệu đang có, trả về (data, eof)"""
+        chunks = []
+        size = 0
+        while size < self.max_chunk:
+            try:
+                data = os.read(fd, self.read_size)
+            except BlockingIOError:
+                return b''.join(chunks), False
+            except OSError as e:
+                # EIO: phía slave đã đóng hết (process chết)
+                if e.errno in (errno.EIO, errno.EBADF):
+                    return b''.join(chunks), True
+                raise
+            self.reads += 1
+            if not data:
+                return b''.join(chunks), True
+            chunks.append(data)
+            size += len(data)
+        return b''.join(chunks), False
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._running:
+                    break
+            # không timeout: chỉ thức dậy khi có dữ liệu, EOF hoặc register / unregister
+            events = self._selector.select()
+            self.wakeups += 1
+            for key, _ in events:
+                if key.fd == self._wake_r:
+                    self._apply_ops()
+                    continue
+                handler = key.data
+                try:
+                    data, eof = self._read(key.fd)
+                except OSError as e:
+                    print(f"[!] PTY mux: read error on fd {key.fd}: {e}")
+                    data, eof = b'', True
+                if data:
+                    self.bytes_read += len(data)
+                    self.dispatches += 1
+                    self._call(handler.on_data, data)
+                if eof:
+                    self._release(key.fd, handler)
+
+    @staticmethod
+    def _call(func, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            print(f"[!] PTY mux handler error: {e}")
+
+
+_mux = None
+_mux_lock = threading.Lock()
+
+
+def get_pty_mux():
+    """Multiplexer dùng chung cho cả process"""
+    global _mux
+    with _mux_lock:
+        if _mux is None:
+            _mux = PtyMultiplexer()
+    return _mux
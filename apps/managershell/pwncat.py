@@ -3,7 +3,6 @@ import threading
 import time
 import os
 import pty
-import select
 import socket
 import termios
 import sys
@@ -12,12 +11,17 @@ import datetime as dt
 from urllib.parse import urlparse
 from flask_socketio import SocketIO 
 
+from apps.managershell.pty_mux import get_pty_mux
+from apps.managershell.terminal_stream import TerminalStreamer
+from apps.managershell.scrollback import ShellHistory
+from apps.managershell.supervisor import ShellSupervisor
+from apps.managershell.state_writer import ShellStateWriter
+
 # Thêm import cho lưu DB
 try:
-    from apps.models import Targets, db, ShellConnection, ShellType, ShellStatus
+    from apps.models import Targets, ShellType, ShellStatus
 except ImportError:
     Targets = None
-    db = None
 
 class PwncatManager:
     def __init__(self, app=None):
@@ -27,9 +31,32 @@ class PwncatManager:
         self.socketio = None  # SocketIO instance
         self.counter = 0
         self.reconnect_interval = 10  # giây
+        # Scrollback (replay khi join_shell) + transcript nén của từng shell
+        self.history = ShellHistory(
+            folder=app.config.get('TRANSCRIPT_FOLDER') if app else None,
+            ring_size=int(os.environ.get('TERMINAL_SCROLLBACK_SIZE', 1024 * 1024))
+        )
+        # Output terminal: gom frame, gửi riêng từng client với giới hạn backlog
+        self.output = TerminalStreamer(
+            self._send_to_client,
+            window=float(os.environ.get('TERMINAL_STREAM_WINDOW_MS', 20)) / 1000,
+            high_water=int(os.environ.get('TERMINAL_STREAM_HIGH_WATER', 256 * 1024)),
+            history=self.history
+        )
+        # Trạng thái / hoạt động của ShellConnection được ghi DB theo lô (write-behind)
+        self.db_writer = ShellStateWriter(
+            app,
+            interval=float(os.environ.get('SHELL_DB_FLUSH_MS', 500)) / 1000,
+            max_pending=int(os.environ.get('SHELL_DB_FLUSH_MAX', 200))
+        )
         # Không sử dụng Redis message queue, sử dụng memory queue
-        self._auto_reconnect_thread = threading.Thread(target=self.auto_reconnect_shells, daemon=True)
-        self._auto_reconnect_thread.start()
+        # Supervisor: reconnect shell chết với backoff, không giữ self.lock khi I/O
+        self.supervisor = ShellSupervisor(
+            self,
+            max_workers=int(os.environ.get('SHELL_RECONNECT_WORKERS', 4)),
+            max_delay=int(os.environ.get('SHELL_RECONNECT_MAX_DELAY', 300)),
+            sweep_interval=self.reconnect_interval
+        )
 
     def _generate_shell_id(self, prefix="shell"):
         with self.lock:
@@ -75,85 +102,78 @@ class PwncatManager:
             import traceback
             print(f"[DEBUG] Traceback: {traceback.format_exc()}")
 
+    def _send_to_client(self, event, payload, sid, callback):
+        """Gửi event tới một client, callback được gọi khi client ack"""
+        self.socketio.emit(event, payload, to=sid, namespace='/', callback=callback)
+
     def _emit_terminal_output(self, shell_id, data):
-        """Emit terminal output qua Socket.IO"""
-        try:
-            from flask_socketio import emit
-            
-            print(f"[DEBUG] Emitting terminal output: {shell_id} -> {repr(data[:100])}")
-            
-            # Sử dụng app context
-            with self.app.app_context():
-                emit('terminal_output', {
-                    'shell_id': shell_id,
-                    'output': data
-                }, room=shell_id, namespace='/')
-                
-        except Exception as e:
-            print(f"[!] Error emitting terminal output: {e}")
-            import traceback
-            print(f"[DEBUG] Traceback: {traceback.format_exc()}")
+        """Đưa output (bytes) của shell vào stream, frame được gửi qua Socket.IO"""
+        self.output.feed(shell_id, data)
+
+    def _on_connection_detected(self, shell_id):
+        """Victim đã kết nối: cập nhật trạng thái (chạy ngoài thread của PTY multiplexer)"""
+        print(f"[DEBUG] Connection detected for shell {shell_id}, updating status to CONNECTED")
+        with self.lock:
+            if shell_id in self.shells:
+                self.shells[shell_id]["status"] = "connected"
+        self.update_shell_status(shell_id, "CONNECTED")
+        self._emit_shell_status(shell_id, "CONNECTED")
+
+    def _on_pty_closed(self, shell_id, master_fd):
+        """PTY đã đóng phía process: bỏ master_fd khỏi shell, multiplexer sẽ đóng fd"""
+        print(f"[DEBUG] PTY closed for shell {shell_id}")
+        with self.lock:
+            info = self.shells.get(shell_id)
+            current = bool(info) and info.get("master_fd") == master_fd
+            if current:
+                info["master_fd"] = None
+        # Process của shell đã thoát: supervisor lên lịch reconnect
+        if current:
+            self.supervisor.notify_exit(shell_id)
+
+    def _register_shell(self, shell_id, info, generation=None):
+        """
+        Đưa shell vào self.shells, đọc PTY qua multiplexer và giám sát shell
+
+        Reconnect (generation khác None): shell bị đóng trong lúc reconnect thì
+        process mới bị dừng thay vì đưa shell trở lại, trả về False
+        """
+        with self.lock:
+            # cùng lock với close_shell: đóng sau bước này sẽ thấy và dừng process mới
+            watched = self.supervisor.watch(shell_id, generation)
+            if watched:
+                self.shells[shell_id] = info
+        if not watched:
+            print(f"[!] Shell {shell_id} was closed while reconnecting, dropping new process")
+            self._stop_process(info["proc"])
+            try:
+                os.close(info["master_fd"])
+            except OSError:
+                pass
+            return False
+        self._watch_pty(shell_id, info["master_fd"])
+        return True
 
-    def _pty_reader_thread(self, shell_id, master_fd):
-        """Thread đọc dữ liệu từ PTY và gửi về client"""
-        print(f"[DEBUG] Starting PTY reader thread for shell {shell_id}")
-        connection_detected = False
+    def _stop_process(self, proc):
         try:
-            while True:
-                # Đọc dữ liệu từ PTY
-                ready, _, _ = select.select([master_fd], [], [], 0.1)
-                if ready:
-                    try:
-                        data = os.read(master_fd, 1024)
-                        if data:
-                            print(f"[DEBUG] Read data from PTY for shell {shell_id}: {repr(data)}")
-                            
-                            # Detect khi victim kết nối (có output từ pwncat)
-                            decoded_data = data.decode('utf-8', errors='ignore')
-                            if not connection_detected and ('registered new host' in decoded_data or 'pwncat$' in decoded_data):
-                                connection_detected = True
-                                print(f"[DEBUG] Connection detected for shell {shell_id}, updating status to CONNECTED")
-                                
-                                # Cập nhật trạng thái trong memory
-                                with self.lock:
-                                    if shell_id in self.shells:
-                                        self.shells[shell_id]["status"] = "connected"
-                                
-                                # Cập nhật trạng thái trong database
-                                self.update_shell_status(shell_id, "CONNECTED")
-                                
-                                # Emit socket event để cập nhật frontend
-                                self._emit_shell_status(shell_id, "CONNECTED")
-                                
-                                print(f"[DEBUG] Shell {shell_id} status updated to CONNECTED")
-                            
-                            # Gửi dữ liệu về client qua Socket.IO
-                            self._emit_terminal_output(shell_id, data.decode('utf-8', errors='ignore'))
-                        else:
-                            print(f"[DEBUG] No data from PTY for shell {shell_id}, breaking")
-                            # Không có dữ liệu, có thể shell đã đóng
-                            break
-                    except (OSError, IOError) as e:
-                        print(f"[DEBUG] Error reading from PTY for shell {shell_id}: {e}")
-                        break
-                else:
-                    # Kiểm tra xem shell còn tồn tại không
-                    with self.lock:
-                        if shell_id not in self.shells:
-                            print(f"[DEBUG] Shell {shell_id} no longer exists, breaking")
-                            break
-        except Exception as e:
-            print(f"[!] Error in PTY reader thread for shell {shell_id}: {e}")
-        finally:
-            print(f"[DEBUG] PTY reader thread ending for shell {shell_id}")
-            # Đóng master_fd khi thread kết thúc
+            proc.terminate()
+            proc.wait(timeout=5)
+        except:
             try:
-                os.close(master_fd)
+                proc.kill()
             except:
                 pass
 
-    def start_listener(self, port, name=None, url=None, listen_ip='0.0.0.0'):
-        """Khởi động listener với PTY (reverse shell: python -m pwncat -lp <port>)"""
+    def _watch_pty(self, shell_id, master_fd):
+        """Đăng ký master_fd vào PTY multiplexer dùng chung thay cho một thread đọc / shell"""
+        get_pty_mux().register(master_fd, _ShellPtyHandler(self, shell_id, master_fd))
+
+    def start_listener(self, port, name=None, url=None, listen_ip='0.0.0.0', generation=None):
+        """
+        Khởi động listener với PTY (reverse shell: python -m pwncat -lp <port>)
+
+        generation: lần reconnect của supervisor (xem _restart_shell)
+        """
         try:
             # Tạo PTY
             master_fd, slave_fd = pty.openpty()
@@ -195,17 +215,9 @@ class PwncatManager:
                 "last_status": "active"
             }
             
-            with self.lock:
-                self.shells[shell_id] = info
-            
-            # Tạo thread đọc dữ liệu từ PTY
-            reader_thread = threading.Thread(
-                target=self._pty_reader_thread,
-                args=(shell_id, master_fd),
-                daemon=True
-            )
-            reader_thread.start()
-            
+            if not self._register_shell(shell_id, info, generation):
+                return None
+
             print(f"[+] Started pwncat listener on port {port} as '{shell_id}' with PTY")
             print(f"[DEBUG] Process ID: {proc.pid}")
             print(f"[DEBUG] Waiting for connection on port {port}...")
@@ -225,8 +237,12 @@ class PwncatManager:
                 pass
             return None
 
-    def connect_shell(self, target, target_port, name=None, url=None):
-        """Kết nối bind shell với PTY (bind shell: python -m pwncat <ip> <port>)"""
+    def connect_shell(self, target, target_port, name=None, url=None, generation=None):
+        """
+        Kết nối bind shell với PTY (bind shell: python -m pwncat <ip> <port>)
+
+        generation: lần reconnect của supervisor (xem _restart_shell)
+        """
         try:
             ip = self.normalize_ip(target)
             if not ip:
@@ -272,17 +288,9 @@ class PwncatManager:
                 "last_status": "active"
             }
             
-            with self.lock:
-                self.shells[shell_id] = info
-            
-            # Tạo thread đọc dữ liệu từ PTY
-            reader_thread = threading.Thread(
-                target=self._pty_reader_thread,
-                args=(shell_id, master_fd),
-                daemon=True
-            )
-            reader_thread.start()
-            
+            if not self._register_shell(shell_id, info, generation):
+                return None
+
             print(f"[+] Connected to shell at {ip}:{target_port} as '{shell_id}' with PTY")
             self._update_shell_info(shell_id)
             
@@ -318,8 +326,11 @@ class PwncatManager:
             try:
                 # Ghi dữ liệu vào PTY
                 print(f"[DEBUG] Writing {len(data)} bytes to PTY for shell {shell_id}")
-                os.write(master_fd, data.encode('utf-8'))
+                payload = data.encode('utf-8')
+                os.write(master_fd, payload)
                 info["last_active"] = dt.datetime.utcnow().isoformat()
+                # mỗi dòng gửi đi tính là một lệnh
+                self.db_writer.activity(shell_id, commands=data.count('\n'), bytes_count=len(payload))
                 print(f"[DEBUG] Successfully sent input to shell {shell_id}")
                 return True
             except (OSError, IOError) as e:
@@ -341,40 +352,32 @@ class PwncatManager:
 
     def close_shell(self, shell_id):
         """Đóng shell và cleanup"""
+        self.supervisor.unwatch(shell_id)
         with self.lock:
-            info = self.shells.get(shell_id)
+            info = self.shells.pop(shell_id, None)
+            master_fd = info.get("master_fd") if info else None
             if info:
-                proc = info["proc"]
-                master_fd = info.get("master_fd")
-                
-                # Terminate process
-                try:
-                    proc.terminate()
-                    proc.wait(timeout=5)
-                except:
-                    try:
-                        proc.kill()
-                    except:
-                        pass
-                
-                # Đóng master_fd
-                if master_fd:
-                    try:
-                        os.close(master_fd)
-                    except:
-                        pass
-                
-                info["disconnect_time"] = dt.datetime.utcnow().isoformat()
-                info["last_status"] = "closed"
-                info["status"] = "closed"
-                self.update_shell_status(shell_id, "CLOSED")
-                self._emit_shell_status(shell_id, "CLOSED")
-                del self.shells[shell_id]
-                print(f"[-] Closed shell '{shell_id}'")
-                return True
-            else:
-                print(f"[!] Shell '{shell_id}' not found.")
-                return False
+                info["master_fd"] = None
+        if not info:
+            print(f"[!] Shell '{shell_id}' not found.")
+            return False
+
+        # Terminate process (ngoài lock: không chặn input của các shell khác)
+        self._stop_process(info["proc"])
+
+        # Đóng master_fd (multiplexer gỡ fd khỏi selector rồi mới đóng)
+        if master_fd:
+            get_pty_mux().unregister(master_fd, close=True)
+        # gửi nốt output còn lại rồi bỏ stream của shell
+        self.output.close(shell_id)
+
+        info["disconnect_time"] = dt.datetime.utcnow().isoformat()
+        info["last_status"] = "closed"
+        info["status"] = "closed"
+        self.update_shell_status(shell_id, "CLOSED")
+        self._emit_shell_status(shell_id, "CLOSED")
+        print(f"[-] Closed shell '{shell_id}'")
+        return True
 
     def check_shell_alive(self, shell_id):
         """Kiểm tra shell còn hoạt động không"""
@@ -392,86 +395,91 @@ class PwncatManager:
             self._emit_shell_status(shell_id, "DISCONNECTED")
         return alive
 
-    def auto_reconnect_shells(self):
-        """Tự động reconnect shells bị mất kết nối"""
-        while True:
-            time.sleep(self.reconnect_interval)
-            with self.lock:
-                for shell_id, info in list(self.shells.items()):
-                    if not self.check_shell_alive(shell_id):
-                        print(f"[!] Shell {shell_id} lost. Attempting to reconnect...")
-                        if info.get("shell_type") == "bind" and info.get("ip") and info.get("port"):
-                            info["reconnect_count"] += 1
-                            info["last_status"] = "reconnecting"
-                            self.update_shell_status(shell_id, "DISCONNECTED")
-                            self._emit_shell_status(shell_id, "RECONNECTING")
-                            try:
-                                new_shell_id = self.connect_shell(info["ip"], info["port"], name=shell_id, url=info.get("url"))
-                                print(f"[+] Reconnected shell {shell_id} as {new_shell_id}")
-                                self._emit_shell_status(shell_id, "CONNECTED")
-                            except Exception as e:
-                                print(f"[!] Failed to reconnect shell {shell_id}: {e}")
-                                self._emit_shell_status(shell_id, "DISCONNECTED")
-                        elif info.get("shell_type") == "reverse" and info.get("port"):
-                            info["reconnect_count"] += 1
-                            info["last_status"] = "re-listening"
-                            self.update_shell_status(shell_id, "DISCONNECTED")
-                            self._emit_shell_status(shell_id, "RE-LISTENING")
-                            try:
-                                new_shell_id = self.start_listener(info["port"], name=shell_id, url=info.get("url"))
-                                print(f"[+] Restarted listener for shell {shell_id} as {new_shell_id}")
-                                self._emit_shell_status(shell_id, "LISTENING")
-                            except Exception as e:
-                                print(f"[!] Failed to restart listener for shell {shell_id}: {e}")
-                                self._emit_shell_status(shell_id, "DISCONNECTED")
-    
+    def _exited_shells(self):
+        """Các shell có process đã thoát (lượt quét của supervisor)"""
+        with self.lock:
+            procs = [(shell_id, info["proc"]) for shell_id, info in self.shells.items()]
+        return [shell_id for shell_id, proc in procs if proc.poll() is not None]
+
+    def _mark_disconnected(self, shell_id, delay):
+        """Shell mất kết nối: cập nhật memory, DB và frontend (chạy trên executor của supervisor)"""
+        with self.lock:
+            info = self.shells.get(shell_id)
+            if not info:
+                return
+            info["last_status"] = "disconnected"
+            info["status"] = "disconnected"
+            info["disconnect_time"] = dt.datetime.utcnow().isoformat()
+        print(f"[!] Shell {shell_id} lost. Reconnecting in {delay:.1f}s")
+        self.update_shell_status(shell_id, "DISCONNECTED")
+        self._emit_shell_status(shell_id, "DISCONNECTED")
+
+    def _restart_shell(self, shell_id, generation=None):
+        """
+        Khởi động lại shell đã chết (bind: connect lại, reverse: listen lại), True nếu thành công
+
+        generation: lần reconnect của supervisor, shell bị đóng giữa chừng thì không khởi động lại
+        """
+        with self.lock:
+            info = self.shells.get(shell_id)
+            if not info:
+                return False
+            old_fd = info.get("master_fd")
+            info["master_fd"] = None
+            info = dict(info)
+        # process đã thoát nhưng PTY còn mở (process con giữ PTY): bỏ fd cũ
+        if old_fd:
+            get_pty_mux().unregister(old_fd, close=True)
+        # reap process cũ
+        info["proc"].poll()
+        reconnect_count = info.get("reconnect_count", 0) + 1
+        if info.get("shell_type") == "bind" and info.get("ip") and info.get("port"):
+            self._emit_shell_status(shell_id, "RECONNECTING")
+            new_shell_id = self.connect_shell(info["ip"], info["port"], name=shell_id, url=info.get("url"),
+                                              generation=generation)
+        elif info.get("shell_type") == "reverse" and info.get("port"):
+            self._emit_shell_status(shell_id, "RE-LISTENING")
+            new_shell_id = self.start_listener(info["port"], name=shell_id, url=info.get("url"),
+                                               listen_ip=info.get("ip") or '0.0.0.0', generation=generation)
+        else:
+            return False
+        if not new_shell_id:
+            return False
+        with self.lock:
+            if shell_id in self.shells:
+                self.shells[shell_id]["reconnect_count"] = reconnect_count
+        return True
+
     def save_shell_to_db(self, info):
-        """Lưu thông tin shell vào database"""
+        """Lưu thông tin shell vào database (qua write-behind queue)"""
         try:
-            from apps.models import ShellConnection, ShellStatus, db
-            from datetime import datetime
+            from apps.models import ShellStatus
             
             shell_id = info.get('id')
             if not shell_id:
                 print(f"[DEBUG] No shell_id in info: {info}")
                 return
             
-            # Tìm shell trong database
-            shell = ShellConnection.get_by_id(shell_id)
-            if not shell:
-                print(f"[DEBUG] Shell {shell_id} not found in database")
-                return
-            
             # Cập nhật trạng thái
             status = info.get('status', 'unknown')
-            if status == 'listening':
-                shell.status = ShellStatus.LISTENING
-            elif status == 'connected':
-                shell.status = ShellStatus.CONNECTED
-            elif status == 'closed':
-                shell.status = ShellStatus.CLOSED
-            elif status == 'disconnected':
-                shell.status = ShellStatus.DISCONNECTED
-            elif status == 'error':
-                shell.status = ShellStatus.ERROR
-            else:
+            status_mapping = {
+                'listening': ShellStatus.LISTENING,
+                'connected': ShellStatus.CONNECTED,
+                'closed': ShellStatus.CLOSED,
+                'disconnected': ShellStatus.DISCONNECTED,
+                'error': ShellStatus.ERROR
+            }
+            if status not in status_mapping:
                 print(f"[DEBUG] Unknown status: {status}")
                 return
-            
-            # Cập nhật thông tin khác
-            shell.updated_at = dt.datetime.utcnow()
+            fields = {'status': status_mapping[status]}
             
             # Cập nhật thông tin user và privilege nếu có
-            if info.get('user'):
-                shell.user = info.get('user')
-            if info.get('privilege_level'):
-                shell.privilege_level = info.get('privilege_level')
-            if info.get('hostname'):
-                shell.hostname = info.get('hostname')
+            for key in ('user', 'privilege_level', 'hostname'):
+                if info.get(key):
+                    fields[key] = info.get(key)
             
-            # Commit vào database
-            db.session.commit()
-            print(f"[DEBUG] Updated shell {shell_id} status to {status} in database")
+            self.db_writer.update(shell_id, **fields)
             
         except Exception as e:
             print(f"[!] Error saving shell info to DB: {e}")
@@ -479,14 +487,9 @@ class PwncatManager:
             print(f"[DEBUG] Traceback: {traceback.format_exc()}")
 
     def update_shell_status(self, shell_id, status):
-        """Cập nhật trạng thái shell trong database"""
+        """Cập nhật trạng thái shell trong database (ghi theo lô, không chờ DB)"""
         try:
-            from apps.models import ShellConnection, ShellStatus, db
-            
-            shell = ShellConnection.get_by_id(shell_id)
-            if not shell:
-                print(f"[DEBUG] Shell {shell_id} not found in database")
-                return False
+            from apps.models import ShellStatus
             
             # Map status string to enum
             status_mapping = {
@@ -498,10 +501,7 @@ class PwncatManager:
             }
             
             if status.upper() in status_mapping:
-                shell.status = status_mapping[status.upper()]
-                shell.updated_at = dt.datetime.utcnow()
-                db.session.commit()
-                print(f"[DEBUG] Updated shell {shell_id} status to {status} in database")
+                self.db_writer.update(shell_id, status=status_mapping[status.upper()])
                 return True
             else:
                 print(f"[DEBUG] Unknown status: {status}")
@@ -562,6 +562,33 @@ class PwncatManager:
             print(f"[!] Error escalating privilege: {e}")
             return False
 
+class _ShellPtyHandler:
+    """Nhận dữ liệu PTY của một shell từ multiplexer"""
+
+    def __init__(self, manager, shell_id, master_fd):
+        self.manager = manager
+        self.shell_id = shell_id
+        self.master_fd = master_fd
+        self.connection_detected = False
+
+    def on_data(self, data):
+        # shell đã bị close_shell: multiplexer có thể còn dispatch vài lần đọc trước khi gỡ fd
+        if self.shell_id not in self.manager.shells:
+            return
+        decoded_data = data.decode('utf-8', errors='ignore')
+        # Detect khi victim kết nối (có output từ pwncat)
+        if not self.connection_detected and ('registered new host' in decoded_data or 'pwncat$' in decoded_data):
+            self.connection_detected = True
+            # Ghi DB không chạy trong thread của multiplexer để không chặn các shell khác
+            threading.Thread(target=self.manager._on_connection_detected, args=(self.shell_id,), daemon=True).start()
+        # Gửi dữ liệu về client qua Socket.IO
+        self.manager._emit_terminal_output(self.shell_id, data)
+        self.manager.db_writer.activity(self.shell_id, bytes_count=len(data))
+
+    def on_close(self):
+        self.manager.output.end(self.shell_id)
+        self.manager._on_pty_closed(self.shell_id, self.master_fd)
+
 # Tạo instance global (sẽ được khởi tạo với app instance sau)
 shell_manager = None
 
@@ -429,10 +429,35 @@ def send_command(shell_id):
         return jsonify({'status': 'fail', 'msg': str(e)}), 500
 
 @blueprint.route('/api/shells/<shell_id>/history', methods=['GET'])
-# API: Lấy lịch sử lệnh đã gửi tới shell
+# API: Lấy lịch sử lệnh đã gửi tới shell, hoặc một trang output từ transcript (?source=output)
 def shell_history(shell_id):
-    """Lấy lịch sử lệnh"""
+    """Lấy lịch sử lệnh / output"""
     try:
+        if request.args.get('source') == 'output' or 'offset' in request.args:
+            manager = get_shell_manager()
+            # shell đang mở hoặc đã lưu trong DB, id lạ không tạo transcript
+            if shell_id not in manager.shells and not ShellConnection.get_by_id(shell_id):
+                return jsonify({'status': 'fail', 'msg': 'Shell not found'}), 404
+            # offset: byte offset trong output (âm: tính từ cuối), limit: số byte tối đa của trang
+            page = manager.history.read(
+                shell_id,
+                offset=int(request.args.get('offset', 0)),
+                limit=int(request.args.get('limit', 65536))
+            )
+            if page is None:
+                return jsonify({'status': 'fail', 'msg': 'Transcript is disabled'}), 404
+            output, offset, next_offset, total = page
+            return jsonify({
+                'status': 'success',
+                'data': {
+                    'output': output,
+                    'offset': offset,
+                    'next_offset': next_offset,
+                    'total': total,
+                    'has_more': next_offset < total
+                }
+            })
+
         limit = min(int(request.args.get('limit', 50)), 100)  # Max 100 commands
         cmds = ShellCommand.get_by_connection(shell_id, limit=limit)
         return jsonify({
@@ -840,6 +865,16 @@ def shell_statistics():
         logger.error(f"Error getting shell statistics: {e}")
         return jsonify({'status': 'fail', 'msg': str(e)}), 500
 
+@blueprint.route('/api/shells/stream-metrics', methods=['GET'])
+# API: Thống kê stream output terminal (events/s, bytes/event, frame bị bỏ)
+def shell_stream_metrics():
+    """Metrics của terminal output stream"""
+    try:
+        return jsonify({'status': 'success', 'data': get_shell_manager().output.metrics()})
+    except Exception as e:
+        logger.error(f"Error getting stream metrics: {e}")
+        return jsonify({'status': 'fail', 'msg': str(e)}), 500
+
 @blueprint.route('/api/shells/<shell_id>/note', methods=['POST'])
 # API: Cập nhật ghi chú cho shell
 def update_shell_note(shell_id):
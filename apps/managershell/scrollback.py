@@ -0,0 +1,301 @@
+#Scrollback và transcript của output shell
+"""
+Shell scrollback
+
+    - ScrollbackRing: ring buffer cố định (mặc định 1 MB) các byte output gần
+      nhất của shell, được replay cho client khi join_shell
+    - Transcript: file append-only cho mỗi ShellConnection, output được nén
+      thành từng block gzip độc lập (nối liên tiếp trong ``<id>.log.gz``) và
+      file index ``<id>.idx`` gồm các record cố định
+      (raw_offset, file_offset, member_len, raw_len). Đọc một trang chỉ cần
+      tìm nhị phân trong index và giải nén vài block, không nạp cả phiên
+    - ShellHistory: giữ ring + transcript của các shell đang mở, được
+      TerminalStreamer gọi cho mỗi frame đã gom; ``close()`` ghi nốt transcript
+      và bỏ cả hai khi shell bị đóng
+
+Offset trong transcript là offset byte của output (UTF-8).
+"""
+import gzip
+import os
+import re
+import struct
+import threading
+import time
+
+# dung lượng ring buffer / shell
+RING_SIZE = 1024 * 1024
+# kích thước block trước khi nén và ghi ra file
+BLOCK_SIZE = 64 * 1024
+# block chưa đầy được ghi sau thời gian này
+FLUSH_INTERVAL = 2
+# trang tối đa khi đọc transcript
+MAX_PAGE = 1024 * 1024
+
+INDEX_RECORD = struct.Struct('<QQII')
+
+
+def _char_start(data, pos):
+    """Vị trí đầu ký tự UTF-8 gần nhất từ pos trở đi"""
+    while pos < len(data) and (data[pos] & 0xC0) == 0x80:
+        pos += 1
+    return pos
+
+
+def _char_end(data):
+    """Độ dài phần đầu của data không kết thúc giữa một ký tự UTF-8"""
+    end = len(data)
+    for back in range(1, min(4, end) + 1):
+        byte = data[end - back]
+        if (byte & 0xC0) == 0x80:
+            continue
+        # byte đầu ký tự: đủ byte chưa?
+        need = 1 if byte < 0x80 else 4 if byte >= 0xF0 else 3 if byte >= 0xE0 else 2
+        return end if back >= need else end - back
+    return end
+
+
+class ScrollbackRing:
+    """Ring buffer các byte output gần nhất, buffer lớn dần tới ``capacity``"""
+
+    def __init__(self, capacity=RING_SIZE):
+        self.capacity = capacity
+        self.buffer = bytearray()
+        self.pos = 0
+        self.size = 0
+
+    def append(self, data):
+        if self.size < self.capacity:
+            # chưa đầy: buffer chỉ chiếm đúng số byte đã nhận
+            self.buffer += data
+            if len(self.buffer) > self.capacity:
+                del self.buffer[:len(self.buffer) - self.capacity]
+            self.size = len(self.buffer)
+            self.pos = self.size % self.capacity
+            return
+        if len(data) >= self.capacity:
+            self.buffer[:] = data[-self.capacity:]
+            self.pos = 0
+            self.size = self.capacity
+            return
+        end = self.pos + len(data)
+        if end <= self.capacity:
+            self.buffer[self.pos:end] = data
+        else:
+            first = self.capacity - self.pos
+            self.buffer[self.pos:] = data[:first]
+            self.buffer[:end - self.capacity] = data[first:]
+        self.pos = end % self.capacity
+        self.size = min(self.size + len(data), self.capacity)
+
+    def snapshot(self):
+        if self.size < self.capacity:
+            data = bytes(self.buffer)
+        else:
+            data = bytes(self.buffer[self.pos:] + self.buffer[:self.pos])
+        # ring có thể bắt đầu giữa một ký tự
+        return data[_char_start(data, 0):]
+
+    def text(self):
+        return self.snapshot().decode('utf-8', errors='replace')
+
+
+class Transcript:
+    """Transcript nén của một shell với index offset"""
+
+    def __init__(self, folder, shell_id, block_size=BLOCK_SIZE):
+        name = re.sub(r'[^A-Za-z0-9_.-]', '_', shell_id)
+        self.data_path = os.path.join(folder, name + '.log.gz')
+        self.index_path = os.path.join(folder, name + '.idx')
+        self.block_size = block_size
+        self.pending = bytearray()
+        self.last_flush = time.time()
+        self.lock = threading.Lock()
+        self.total, self.file_size = self._recover()
+
+    def _recover(self):
+        """Đọc record cuối của index, bỏ phần ghi dở (process chết giữa lúc ghi)"""
+        if not os.path.exists(self.index_path):
+            return 0, 0
+        index_size = os.path.getsize(self.index_path)
+        records = index_size // INDEX_RECORD.size
+        if index_size % INDEX_RECORD.size:
+            with open(self.index_path, 'r+b') as f:
+                f.truncate(records * INDEX_RECORD.size)
+        if not records:
+            return 0, 0
+        raw_offset, file_offset, member_len, raw_len = self._record(records - 1)
+        file_size = file_offset + member_len
+        if os.path.exists(self.data_path) and os.path.getsize(self.data_path) > file_size:
+            with open(self.data_path, 'r+b') as f:
+                f.truncate(file_size)
+        return raw_offset + raw_len, file_size
+
+    def _record(self, i, f=None):
+        if f is None:
+            with open(self.index_path, 'rb') as f:
+                return self._record(i, f)
+        f.seek(i * INDEX_RECORD.size)
+        return INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))
+
+    def size(self):
+        with self.lock:
+            return self.total + len(self.pending)
+
+    def append(self, data):
+        with self.lock:
+            self.pending += data
+            if len(self.pending) >= self.block_size:
+                self._flush()
+
+    def flush(self, idle=None):
+        """Ghi block đang chờ, idle: chỉ ghi khi đã quá ``idle`` giây từ lần ghi trước"""
+        with self.lock:
+            if self.pending and (idle is None or time.time() - self.last_flush >= idle):
+                self._flush()
+
+    def _flush(self):
+        raw = bytes(self.pending)
+        member = gzip.compress(raw, compresslevel=6)
+        os.makedirs(os.path.dirname(self.data_path), exist_ok=True)
+        with open(self.data_path, 'ab') as f:
+            f.write(member)
+        # index ghi sau data: record trong index luôn trỏ tới block đã ghi đủ
+        with open(self.index_path, 'ab') as f:
+            f.write(INDEX_RECORD.pack(self.total, self.file_size, len(member), len(raw)))
+        self.total += len(raw)
+        self.file_size += len(member)
+        self.pending = bytearray()
+        self.last_flush = time.time()
+
+    def read(self, offset=0, limit=65536):
+        """
+        Đọc một trang output
+
+        offset âm: tính từ cuối transcript. Trang không bắt đầu / kết thúc giữa
+        một ký tự UTF-8, next_offset dùng cho trang tiếp theo.
+        Trả về (text, offset, next_offset, total)
+        """
+        self.flush()
+        # ít nhất một ký tự UTF-8 (4 byte) để trang luôn tiến
+        limit = max(4, min(int(limit), MAX_PAGE))
+        with self.lock:
+            total = self.total
+        offset = int(offset)
+        if offset < 0:
+            offset = max(0, total + offset)
+        offset = min(offset, total)
+        end = min(offset + limit, total)
+        data = self._read_range(offset, end)
+        start = _char_start(data, 0)
+        data = data[start:]
+        if offset + start + len(data) < total:
+            data = data[:_char_end(data)]
+        offset += start
+        return data.decode('utf-8', errors='replace'), offset, offset + len(data), total
+
+    def _read_range(self, start, end):
+        if start >= end or not os.path.exists(self.index_path):
+            return b''
+        chunks = []
+        with open(self.index_path, 'rb') as index, open(self.data_path, 'rb') as data:
+            records = os.path.getsize(self.index_path) // INDEX_RECORD.size
+            # block cuối cùng có raw_offset <= start
+            lo, hi = 0, records - 1
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if self._record(mid, index)[0] <= start:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            i = lo
+            while i < records:
+                raw_offset, file_offset, member_len, raw_len = self._record(i, index)
+                if raw_offset >= end:
+                    break
+                data.seek(file_offset)
+                raw = gzip.decompress(data.read(member_len))
+                chunks.append(raw[max(0, start - raw_offset):end - raw_offset])
+                i += 1
+        return b''.join(chunks)
+
+
+class ShellHistory:
+    """Ring buffer + transcript của mọi shell"""
+
+    def __init__(self, folder=None, ring_size=RING_SIZE, block_size=BLOCK_SIZE):
+        """
+        folder: thư mục chứa transcript, None: chỉ giữ ring buffer trong bộ nhớ
+        """
+        self.folder = folder
+        self.ring_size = ring_size
+        self.block_size = block_size
+        self.rings = {}
+        self.transcripts = {}
+        self.lock = threading.Lock()
+
+    def transcript(self, shell_id, create=True):
+        """create=False: transcript đang mở, hoặc một Transcript tạm không được giữ lại"""
+        if not self.folder:
+            return None
+        with self.lock:
+            transcript = self.transcripts.get(shell_id)
+            if transcript is None:
+                transcript = Transcript(self.folder, shell_id, self.block_size)
+                if create:
+                    self.transcripts[shell_id] = transcript
+            return transcript
+
+    def _ring(self, shell_id):
+        with self.lock:
+            ring = self.rings.get(shell_id)
+            if ring is not None:
+                return ring
+            ring = self.rings[shell_id] = ScrollbackRing(self.ring_size)
+        # sau khi restart server: ring được nạp lại từ cuối transcript
+        transcript = self.transcript(shell_id)
+        if transcript and transcript.size():
+            ring.append(transcript.read(-self.ring_size, self.ring_size)[0].encode('utf-8'))
+        return ring
+
+    def append(self, shell_id, text):
+        data = text.encode('utf-8')
+        self._ring(shell_id).append(data)
+        transcript = self.transcript(shell_id)
+        if transcript:
+            transcript.append(data)
+
+    def replay(self, shell_id):
+        """Output gần nhất của shell (tối đa ring_size byte)"""
+        return self._ring(shell_id).text()
+
+    def flush(self, shell_id=None, idle=None):
+        with self.lock:
+            transcripts = [self.transcripts[shell_id]] if shell_id in self.transcripts else \
+                list(self.transcripts.values()) if shell_id is None else []
+        for transcript in transcripts:
+            try:
+                transcript.flush(idle)
+            except OSError as e:
+                print(f"[!] Error writing transcript {transcript.data_path}: {e}")
+
+    def flush_idle(self):
+        """Ghi các block chưa đầy đã chờ quá FLUSH_INTERVAL giây"""
+        self.flush(idle=FLUSH_INTERVAL)
+
+    def close(self, shell_id):
+        """Shell đã đóng: ghi nốt transcript, bỏ ring và transcript khỏi bộ nhớ"""
+        with self.lock:
+            self.rings.pop(shell_id, None)
+            transcript = self.transcripts.pop(shell_id, None)
+        if transcript:
+            try:
+                transcript.flush()
+            except OSError as e:
+                print(f"[!] Error writing transcript {transcript.data_path}: {e}")
+
+    def read(self, shell_id, offset=0, limit=65536):
+        # đọc transcript của shell đã đóng không giữ nó lại trong bộ nhớ
+        transcript = self.transcript(shell_id, create=False)
+        if transcript is None:
+            return None
+        return transcript.read(offset, limit)
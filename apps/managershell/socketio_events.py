@@ -33,6 +33,7 @@ def register_terminal_events(socketio):
     def handle_disconnect():
         """Khi client ngắt kết nối"""
         logger.info(f"Client disconnected: {request.sid}")
+        get_shell_manager().output.remove_client(request.sid)
         
         # Kiểm tra xem client có đang trong shell nào không
         rooms = socketio.server.rooms(request.sid)
@@ -53,7 +54,12 @@ def register_terminal_events(socketio):
         """Tham gia room của shell cụ thể"""
         shell_id = data.get('shell_id')
         if shell_id:
+            # chỉ shell đang mở: scrollback / stream được giữ theo shell_id
+            if shell_id not in get_shell_manager().shells:
+                emit('error', {'message': f'Shell {shell_id} not found'})
+                return
             join_room(shell_id)
+            get_shell_manager().output.subscribe(shell_id, request.sid)
             logger.info(f"Client {request.sid} joined shell room: {shell_id}")
             emit('joined_shell', {'shell_id': shell_id, 'status': 'joined'})
 
@@ -63,6 +69,7 @@ def register_terminal_events(socketio):
         shell_id = data.get('shell_id')
         if shell_id:
             leave_room(shell_id)
+            get_shell_manager().output.unsubscribe(shell_id, request.sid)
             logger.info(f"Client {request.sid} left shell room: {shell_id}")
             emit('left_shell', {'shell_id': shell_id, 'status': 'left'})
 
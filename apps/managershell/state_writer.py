@@ -0,0 +1,195 @@
+#Ghi trạng thái / hoạt động của ShellConnection xuống DB theo lô
+"""
+Write-behind cho ShellConnection
+
+update_shell_status / save_shell_to_db từng gọi get_by_id + commit ngay trong
+thread đọc PTY và vòng reconnect; với nhiều shell, khóa ghi của SQLite trở
+thành nút cổ chai và output terminal phải chờ DB.
+
+ShellStateWriter nhận cập nhật từ mọi thread mà không chạm DB:
+
+    - ``update(connection_id, **fields)``: gán field (status, user, hostname, ...),
+      giá trị mới nhất thắng
+    - ``activity(connection_id, commands, bytes_count)``: cộng dồn command_count,
+      data_transferred và last_active
+
+Các cập nhật được gom theo connection và ghi bằng một transaction (UPDATE
+trực tiếp, không load object) mỗi ``interval`` giây hoặc khi có ``max_pending``
+cập nhật; ``flush()`` ghi đồng bộ, được gọi khi process thoát.
+"""
+import atexit
+import datetime as dt
+import threading
+import time
+
+from sqlalchemy import func
+from sqlalchemy.exc import SQLAlchemyError
+
+# chu kỳ ghi (giây)
+FLUSH_INTERVAL = 0.5
+# số cập nhật đang chờ thì ghi ngay
+MAX_PENDING = 200
+
+
+class PendingUpdate:
+    """Các thay đổi chưa ghi của một connection"""
+
+    def __init__(self):
+        self.fields = {}
+        self.commands = 0
+        self.bytes = 0
+        self.last_active = None
+
+    def merge(self, other):
+        # other là cập nhật cũ hơn (ghi thất bại), self thắng với field trùng
+        for key, value in other.fields.items():
+            self.fields.setdefault(key, value)
+        self.commands += other.commands
+        self.bytes += other.bytes
+        if self.last_active is None:
+            self.last_active = other.last_active
+
+
+class ShellStateWriter:
+    """Hàng đợi write-behind cho ShellConnection"""
+
+    def __init__(self, app, interval=FLUSH_INTERVAL, max_pending=MAX_PENDING, db=None, model=None):
+        """
+        db / model: mặc định apps.models.db / ShellConnection
+        """
+        self.app = app
+        self.interval = interval
+        self.max_pending = max_pending
+        self._db = db
+        self._model = model
+        self._pending = {}
+        self._count = 0
+        self._cond = threading.Condition()
+        # chỉ một flush tại một thời điểm
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+        # thống kê
+        self.updates = 0
+        self.flushes = 0
+        self.rows = 0
+        self.errors = 0
+        atexit.register(self.stop)
+
+    # ------------------------------------------------------------------ API
+
+    def update(self, connection_id, **fields):
+        """Gán field của connection (status, user, hostname, ...)"""
+        with self._cond:
+            self._entry(connection_id).fields.update(fields)
+            self._added()
+
+    def activity(self, connection_id, commands=0, bytes_count=0):
+        """Cộng dồn số lệnh / số byte và cập nhật last_active"""
+        with self._cond:
+            entry = self._entry(connection_id)
+            entry.commands += commands
+            entry.bytes += bytes_count
+            entry.last_active = dt.datetime.utcnow()
+            self._added()
+
+    def flush(self):
+        """Ghi đồng bộ mọi cập nhật đang chờ, trả về số connection đã ghi"""
+        with self._flush_lock:
+            with self._cond:
+                pending, self._pending = self._pending, {}
+                self._count = 0
+            if not pending:
+                return 0
+            try:
+                self._write(pending)
+            except Exception as e:
+                self.errors += 1
+                print(f"[!] Error writing shell state to DB: {e}")
+                self._requeue(pending)
+                return 0
+            self.flushes += 1
+            self.rows += len(pending)
+            return len(pending)
+
+    def stop(self):
+        """Dừng thread và ghi nốt (khi process thoát)"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self.flush()
+
+    def stats(self):
+        with self._cond:
+            pending = len(self._pending)
+        return {
+            'updates': self.updates,
+            'flushes': self.flushes,
+            'rows': self.rows,
+            'errors': self.errors,
+            'pending': pending
+        }
+
+    # ------------------------------------------------------------ internals
+
+    def _entry(self, connection_id):
+        entry = self._pending.get(connection_id)
+        if entry is None:
+            entry = self._pending[connection_id] = PendingUpdate()
+        return entry
+
+    def _added(self):
+        self.updates += 1
+        self._count += 1
+        if self._thread is None and not self._stopped:
+            self._thread = threading.Thread(target=self._run, daemon=True, name='shell-state-writer')
+            self._thread.start()
+        if self._count >= self.max_pending:
+            self._cond.notify()
+
+    def _requeue(self, pending):
+        with self._cond:
+            for connection_id, old in pending.items():
+                entry = self._entry(connection_id)
+                entry.merge(old)
+            self._count += len(pending)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.interval
+                while not self._stopped and self._count < self.max_pending:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._stopped:
+                    return
+            self.flush()
+
+    def _write(self, pending):
+        if self._db is None or self._model is None:
+            from apps.models import ShellConnection, db
+            self._db, self._model = db, ShellConnection
+        db, model = self._db, self._model
+        now = dt.datetime.utcnow()
+        with self.app.app_context():
+            try:
+                for connection_id, entry in pending.items():
+                    values = {key: value for key, value in entry.fields.items() if key in model.__table__.c}
+                    values['updated_at'] = now
+                    if entry.last_active:
+                        values['last_active'] = entry.last_active
+                    if entry.commands:
+                        values['command_count'] = func.coalesce(model.command_count, 0) + entry.commands
+                    if entry.bytes:
+                        values['data_transferred'] = func.coalesce(model.data_transferred, 0) + entry.bytes
+                    db.session.execute(
+                        model.__table__.update()
+                        .where(model.__table__.c.connection_id == connection_id)
+                        .values(**values)
+                    )
+                db.session.commit()
+            except SQLAlchemyError:
+                db.session.rollback()
+                raise
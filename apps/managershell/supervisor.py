@@ -0,0 +1,189 @@
+#Giám sát và reconnect shell với backoff
+"""
+Shell supervisor
+
+Thay cho vòng auto_reconnect_shells (giữ PwncatManager.lock trong cả lượt quét
+10s, ghi DB / emit / reconnect / sleep ngay trong lock):
+
+    - mỗi shell có một state machine: running -> backoff -> reconnecting -> running,
+      stopped khi người dùng đóng shell
+    - shell chết được báo bởi EOF của PTY multiplexer (process thoát thì phía
+      slave của PTY đóng); một lượt quét thưa (``sweep_interval``) kiểm tra
+      proc.poll() cho process thoát mà PTY vẫn mở (process con còn giữ PTY)
+    - thời gian chờ trước mỗi lần thử tăng theo cấp số nhân có jitter
+      (``base_delay`` * 2^n, tối đa ``max_delay``, ngẫu nhiên trong [delay/2, delay]),
+      shell chạy ổn định quá ``stable_after`` giây thì đếm lại từ đầu
+    - reconnect chạy trên ThreadPoolExecutor giới hạn số worker; timer và state
+      dùng lock riêng, không giữ lock nào khi làm I/O, ghi DB hay sleep
+    - shell bị đóng trong lúc reconnect: ``watch(shell_id, generation)`` từ chối
+      process mới, manager dừng process đó thay vì đưa shell trở lại
+"""
+import heapq
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+RUNNING = 'running'
+BACKOFF = 'backoff'
+RECONNECTING = 'reconnecting'
+STOPPED = 'stopped'
+
+
+class SupervisedShell:
+    """Trạng thái giám sát của một shell"""
+
+    def __init__(self, shell_id):
+        self.shell_id = shell_id
+        self.state = RUNNING
+        self.attempts = 0
+        self.started_at = time.time()
+        self.next_attempt = None
+        # tăng mỗi lần đổi lịch, timer cũ của shell bị bỏ qua
+        self.generation = 0
+
+    def to_dict(self):
+        return {
+            'shell_id': self.shell_id,
+            'state': self.state,
+            'attempts': self.attempts,
+            'next_attempt': self.next_attempt
+        }
+
+
+class ShellSupervisor:
+    """Phát hiện shell chết và reconnect với exponential backoff"""
+
+    def __init__(self, manager, max_workers=4, base_delay=2, max_delay=300, stable_after=60,
+                 sweep_interval=10):
+        self.manager = manager
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stable_after = stable_after
+        self.sweep_interval = sweep_interval
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='shell-reconnect')
+        self.shells = {}
+        self._cond = threading.Condition()
+        # (thời điểm, shell_id, generation)
+        self._timers = []
+        self._thread = threading.Thread(target=self._run, daemon=True, name='shell-supervisor')
+        self._thread.start()
+
+    # ------------------------------------------------------------------ API
+
+    def watch(self, shell_id, generation=None):
+        """
+        Shell vừa được khởi động (lần đầu hoặc reconnect thành công)
+
+        generation: generation của lần reconnect; trả về False nếu shell đã bị
+        đóng trong lúc reconnect, khi đó process mới không được đăng ký
+        """
+        with self._cond:
+            shell = self.shells.get(shell_id)
+            if generation is not None and (shell is None or shell.generation != generation):
+                return False
+            if shell is None:
+                shell = self.shells[shell_id] = SupervisedShell(shell_id)
+            elif shell.state == RECONNECTING:
+                # reconnect xong: giữ số lần thử cho tới khi shell chạy ổn định
+                pass
+            else:
+                shell.attempts = 0
+            shell.generation += 1
+            shell.state = RUNNING
+            shell.started_at = time.time()
+            shell.next_attempt = None
+            return True
+
+    def unwatch(self, shell_id):
+        """Người dùng đóng shell: không reconnect nữa"""
+        with self._cond:
+            shell = self.shells.pop(shell_id, None)
+            if shell:
+                shell.state = STOPPED
+                shell.generation += 1
+
+    def notify_exit(self, shell_id):
+        """Process của shell đã thoát (EOF của PTY hoặc lượt quét), lên lịch reconnect"""
+        with self._cond:
+            shell = self.shells.get(shell_id)
+            if shell is None or shell.state != RUNNING:
+                return
+            if time.time() - shell.started_at >= self.stable_after:
+                shell.attempts = 0
+            delay = self._delay(shell.attempts)
+            shell.state = BACKOFF
+            shell.generation += 1
+            shell.next_attempt = time.time() + delay
+            heapq.heappush(self._timers, (time.monotonic() + delay, shell_id, shell.generation))
+            self._cond.notify()
+        # ghi DB / emit ngoài lock, trên executor
+        self.executor.submit(self.manager._mark_disconnected, shell_id, delay)
+
+    def status(self, shell_id=None):
+        with self._cond:
+            if shell_id is not None:
+                shell = self.shells.get(shell_id)
+                return shell.to_dict() if shell else None
+            return [shell.to_dict() for shell in self.shells.values()]
+
+    # ------------------------------------------------------------ internals
+
+    def _delay(self, attempts):
+        delay = min(self.max_delay, self.base_delay * (2 ** attempts))
+        return random.uniform(delay / 2, delay)
+
+    def _run(self):
+        next_sweep = time.monotonic() + self.sweep_interval
+        while True:
+            due = []
+            with self._cond:
+                now = time.monotonic()
+                while self._timers and self._timers[0][0] <= now:
+                    _, shell_id, generation = heapq.heappop(self._timers)
+                    shell = self.shells.get(shell_id)
+                    if shell is None or shell.generation != generation or shell.state != BACKOFF:
+                        continue
+                    shell.state = RECONNECTING
+                    shell.attempts += 1
+                    due.append((shell_id, generation))
+                if not due and now < next_sweep:
+                    wait = next_sweep - now
+                    if self._timers:
+                        wait = min(wait, self._timers[0][0] - now)
+                    self._cond.wait(wait)
+                    continue
+            for shell_id, generation in due:
+                self.executor.submit(self._attempt, shell_id, generation)
+            if time.monotonic() >= next_sweep:
+                next_sweep = time.monotonic() + self.sweep_interval
+                self._sweep()
+
+    def _sweep(self):
+        """Process đã thoát nhưng PTY chưa báo EOF"""
+        for shell_id in self.manager._exited_shells():
+            self.notify_exit(shell_id)
+
+    def _attempt(self, shell_id, generation):
+        with self._cond:
+            shell = self.shells.get(shell_id)
+            if shell is None or shell.generation != generation:
+                return
+            attempts = shell.attempts
+        print(f"[!] Shell {shell_id} lost. Reconnect attempt {attempts}...")
+        try:
+            ok = self.manager._restart_shell(shell_id, generation)
+        except Exception as e:
+            print(f"[!] Failed to reconnect shell {shell_id}: {e}")
+            ok = False
+        if ok:
+            print(f"[+] Reconnected shell {shell_id}")
+            return
+        with self._cond:
+            shell = self.shells.get(shell_id)
+            if shell is None or shell.generation != generation:
+                return
+            shell.state = RUNNING
+            shell.started_at = time.time()
+        # thất bại: lên lịch lần sau như một lần thoát mới
+        self.notify_exit(shell_id)
@@ -0,0 +1,315 @@
+#Gom output PTY thành frame và gửi tới từng client với giới hạn backlog
+"""
+Terminal output streaming
+
+Thay cho một event 'terminal_output' cho mỗi lần os.read:
+
+    - dữ liệu của mỗi shell được decode bằng incremental UTF-8 decoder (ký tự
+      nhiều byte bị cắt giữa hai lần đọc vẫn nguyên vẹn) và gom trong một
+      cửa sổ ngắn (``window`` giây hoặc ``max_frame`` ký tự) thành một frame
+    - frame được gửi riêng cho từng client đã join shell, kèm ack callback;
+      client có quá ``high_water`` byte chưa ack sẽ bị bỏ frame, khi client
+      theo kịp thì nhận một dòng tóm tắt số byte đã bỏ
+    - việc gửi chạy trong một thread riêng, thread đọc PTY chỉ append dữ liệu
+    - mỗi frame được ghi vào ShellHistory (scrollback ring + transcript), client
+      mới join nhận replay của ring trước mọi frame live, không mất / lặp dữ liệu
+    - ``end()`` khi process của shell thoát (PTY EOF, shell có thể được
+      reconnect), ``close()`` khi shell bị đóng: stream của shell bị bỏ sau khi
+      gửi nốt dữ liệu
+
+Payload của frame giữ nguyên dạng cũ ``{'shell_id', 'output'}``, frame replay
+có thêm ``'replay': True``.
+"""
+import codecs
+import heapq
+import threading
+import time
+from collections import deque
+
+# cửa sổ gom dữ liệu
+WINDOW = 0.02
+# kích thước tối đa của một frame (ký tự)
+MAX_FRAME = 32 * 1024
+# backlog tối đa chưa được ack của một client
+HIGH_WATER = 256 * 1024
+# frame không được ack sau thời gian này coi như đã tới (client cũ không gửi ack)
+ACK_TIMEOUT = 10
+# số giây dùng để tính events/s
+RATE_WINDOW = 10
+
+
+class ClientChannel:
+    """Backlog của một client (sid) trên một shell"""
+
+    def __init__(self, sid):
+        self.sid = sid
+        self.seq = 0
+        # (seq, thời điểm gửi, số byte)
+        self.inflight = deque()
+        self.inflight_bytes = 0
+        self.dropped_bytes = 0
+        self.lock = threading.Lock()
+
+    def sent(self, size):
+        with self.lock:
+            self.seq += 1
+            self.inflight.append((self.seq, time.time(), size))
+            self.inflight_bytes += size
+            return self.seq
+
+    def ack(self, seq):
+        # ack tới theo thứ tự gửi
+        with self.lock:
+            while self.inflight and self.inflight[0][0] <= seq:
+                self.inflight_bytes -= self.inflight.popleft()[2]
+
+    def backlog(self, now, ack_timeout):
+        with self.lock:
+            while self.inflight and now - self.inflight[0][1] > ack_timeout:
+                self.inflight_bytes -= self.inflight.popleft()[2]
+            return self.inflight_bytes
+
+
+class ShellStream:
+    """Dữ liệu đang chờ gửi của một shell"""
+
+    def __init__(self, shell_id):
+        self.shell_id = shell_id
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.pending = []
+        self.pending_size = 0
+        self.deadline = None
+        # sid -> ClientChannel
+        self.clients = {}
+        # shell đã đóng: bỏ stream khi gửi xong dữ liệu còn lại
+        self.closing = False
+        # giữ thứ tự giữa ghi history + gửi frame và replay cho client mới
+        self.lock = threading.Lock()
+
+
+class TerminalStreamer:
+    """Gom output của mọi shell và gửi tới các client đã join"""
+
+    def __init__(self, send, window=WINDOW, max_frame=MAX_FRAME, high_water=HIGH_WATER,
+                 ack_timeout=ACK_TIMEOUT, history=None):
+        """
+        send(event, payload, sid, callback): gửi một event tới một client
+        history: ShellHistory lưu scrollback / transcript, None: không lưu
+        """
+        self.send = send
+        self.history = history
+        self.window = window
+        self.max_frame = max_frame
+        self.high_water = high_water
+        self.ack_timeout = ack_timeout
+        self.streams = {}
+        self._cond = threading.Condition()
+        # (deadline, shell_id)
+        self._due = []
+        self._thread = None
+        # metrics
+        self.events = 0
+        self.bytes_sent = 0
+        self.frames_dropped = 0
+        self.bytes_dropped = 0
+        self._rate = deque()
+
+    # ---------------------------------------------------------- subscribers
+
+    def _stream(self, shell_id):
+        stream = self.streams.get(shell_id)
+        if stream is None:
+            stream = self.streams[shell_id] = ShellStream(shell_id)
+        return stream
+
+    def subscribe(self, shell_id, sid):
+        """Client join shell: replay scrollback rồi mới nhận frame live"""
+        with self._cond:
+            stream = self._stream(shell_id)
+        with stream.lock:
+            if sid in stream.clients:
+                return
+            channel = ClientChannel(sid)
+            if self.history:
+                text = self.history.replay(shell_id)
+                if text:
+                    self._send_frame(shell_id, channel, text, replay=True)
+            stream.clients[sid] = channel
+
+    def unsubscribe(self, shell_id, sid):
+        with self._cond:
+            stream = self.streams.get(shell_id)
+        if stream:
+            with stream.lock:
+                stream.clients.pop(sid, None)
+
+    def remove_client(self, sid):
+        """Client ngắt kết nối: bỏ khỏi mọi shell"""
+        with self._cond:
+            streams = list(self.streams.values())
+        for stream in streams:
+            with stream.lock:
+                stream.clients.pop(sid, None)
+
+    # --------------------------------------------------------------- output
+
+    def feed(self, shell_id, data):
+        """Thêm output (bytes) của shell, frame được gửi sau tối đa ``window`` giây"""
+        with self._cond:
+            stream = self._stream(shell_id)
+            text = stream.decoder.decode(data)
+            self._append(stream, text)
+
+    def end(self, shell_id):
+        """Process của shell đã thoát: gửi nốt dữ liệu còn lại, giữ client cho lần reconnect"""
+        with self._cond:
+            stream = self.streams.get(shell_id)
+            if stream:
+                self._append(stream, stream.decoder.decode(b'', final=True), now=True)
+                stream.decoder.reset()
+
+    def close(self, shell_id):
+        """Shell đã đóng: gửi nốt dữ liệu còn lại rồi bỏ stream của shell"""
+        with self._cond:
+            stream = self.streams.get(shell_id)
+            if not stream:
+                return
+            stream.closing = True
+            self._append(stream, stream.decoder.decode(b'', final=True), now=True)
+            if stream.pending:
+                return
+            del self.streams[shell_id]
+        if self.history:
+            self.history.close(shell_id)
+
+    def _drop_closed(self, stream):
+        with self._cond:
+            # dữ liệu mới tới sau close: bỏ ở lượt gửi sau
+            if not stream.closing or stream.pending or self.streams.get(stream.shell_id) is not stream:
+                return
+            del self.streams[stream.shell_id]
+        if self.history:
+            self.history.close(stream.shell_id)
+
+    def _append(self, stream, text, now=False):
+        if text:
+            stream.pending.append(text)
+            stream.pending_size += len(text)
+        if not stream.pending:
+            return
+        deadline = time.monotonic() + (0 if now or stream.pending_size >= self.max_frame else self.window)
+        if stream.deadline is None or deadline < stream.deadline:
+            stream.deadline = deadline
+            heapq.heappush(self._due, (deadline, stream.shell_id))
+            self._start()
+            self._cond.notify()
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name='terminal-stream')
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                batch = []
+                while not batch:
+                    now = time.monotonic()
+                    while self._due and self._due[0][0] <= now:
+                        deadline, shell_id = heapq.heappop(self._due)
+                        stream = self.streams.get(shell_id)
+                        # mục cũ trong heap (deadline đã được dời sớm hơn) bị bỏ qua
+                        if stream is None or stream.deadline != deadline:
+                            continue
+                        text = ''.join(stream.pending)
+                        stream.pending = []
+                        stream.pending_size = 0
+                        stream.deadline = None
+                        batch.append((stream, text))
+                    if not batch:
+                        timeout = self._due[0][0] - now if self._due else None
+                        if self.history:
+                            # thức dậy định kỳ để ghi block transcript chưa đầy
+                            timeout = min(timeout, 1.0) if timeout is not None else 1.0
+                        if not self._cond.wait(timeout) and self.history:
+                            break
+            if not batch:
+                self.history.flush_idle()
+                continue
+            for stream, text in batch:
+                with stream.lock:
+                    if self.history:
+                        try:
+                            self.history.append(stream.shell_id, text)
+                        except OSError as e:
+                            print(f"[!] Error saving shell output: {e}")
+                    clients = list(stream.clients.values())
+                    for start in range(0, len(text), self.max_frame):
+                        self._deliver(stream.shell_id, text[start:start + self.max_frame], clients)
+                if stream.closing:
+                    self._drop_closed(stream)
+
+    def _deliver(self, shell_id, text, clients):
+        now = time.time()
+        size = len(text.encode('utf-8'))
+        for channel in clients:
+            if channel.backlog(now, self.ack_timeout) + size > self.high_water:
+                channel.dropped_bytes += size
+                self.frames_dropped += 1
+                self.bytes_dropped += size
+                continue
+            output = text
+            if channel.dropped_bytes:
+                output = f"\r\n[... {channel.dropped_bytes} bytes dropped, client too slow ...]\r\n" + text
+                channel.dropped_bytes = 0
+            self._send_frame(shell_id, channel, output, size=size)
+
+    def _send_frame(self, shell_id, channel, text, size=None, replay=False):
+        size = len(text.encode('utf-8')) if size is None else size
+        payload = {'shell_id': shell_id, 'output': text}
+        if replay:
+            payload['replay'] = True
+        seq = channel.sent(size)
+        try:
+            self.send('terminal_output', payload, channel.sid,
+                      lambda *args, channel=channel, seq=seq: channel.ack(seq))
+        except Exception as e:
+            print(f"[!] Error emitting terminal output: {e}")
+            channel.ack(seq)
+            return
+        self._count(size)
+
+    # -------------------------------------------------------------- metrics
+
+    def _count(self, size):
+        self.events += 1
+        self.bytes_sent += size
+        second = int(time.time())
+        if self._rate and self._rate[-1][0] == second:
+            self._rate[-1][1] += 1
+            self._rate[-1][2] += size
+        else:
+            self._rate.append([second, 1, size])
+        while self._rate and self._rate[0][0] <= second - RATE_WINDOW:
+            self._rate.popleft()
+
+    def metrics(self):
+        now = int(time.time())
+        recent = [bucket for bucket in list(self._rate) if bucket[0] > now - RATE_WINDOW]
+        events = sum(bucket[1] for bucket in recent)
+        sent = sum(bucket[2] for bucket in recent)
+        with self._cond:
+            clients = sum(len(stream.clients) for stream in self.streams.values())
+            backlog = sum(channel.inflight_bytes for stream in self.streams.values()
+                          for channel in list(stream.clients.values()))
+        return {
+            'events': self.events,
+            'bytes': self.bytes_sent,
+            'events_per_sec': round(events / RATE_WINDOW, 2),
+            'bytes_per_event': round(sent / events, 1) if events else 0,
+            'avg_bytes_per_event': round(self.bytes_sent / self.events, 1) if self.events else 0,
+            'frames_dropped': self.frames_dropped,
+            'bytes_dropped': self.bytes_dropped,
+            'clients': clients,
+            'backlog_bytes': backlog
+        }
@@ -490,7 +490,22 @@ class VerificationResults(db.Model):
         except SQLAlchemyError as e:
             db.session.rollback()
             raise InvalidUsage(f"Error creating verification result: {str(e)}")
-    
+
+    @classmethod
+    def bulk_create(cls, rows, commit=True):
+        """Insert many results (dicts with the create_result fields) in one statement"""
+        if not rows:
+            return 0
+        try:
+            # executemany, không tạo object ORM cho từng dòng
+            db.session.execute(cls.__table__.insert(), rows)
+            if commit:
+                db.session.commit()
+            return len(rows)
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            raise InvalidUsage(f"Error creating verification results: {str(e)}")
+
     @classmethod
     def get_by_id(cls, result_id):
         """Get verification result by ID"""
@@ -1,18 +1,18 @@
 import requests
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import requests.adapters
 from colorama import Fore, Style, init
 import os
 import time
 from datetime import datetime
 import threading
-from queue import Queue
+from queue import Queue, Full
+from collections import Counter
 import signal
 import sys
 import re
 from urllib.parse import urlparse, urljoin
 import json
 from typing import Dict, List, Optional, Callable
-from multiprocessing import Process, Queue as MPQueue
 
 # Khởi tạo colorama để hiển thị màu sắc trên tất cả các hệ điều hành
 init(autoreset=True)
@@ -23,9 +23,18 @@ class Recon_Directory:
     Hỗ trợ quét đa luồng, callback real-time, và lưu kết quả
     """
     
+    # Server trả về các mã này cho HEAD thì dùng GET
+    REJECTED_HEAD = (405, 501)
+    # Body GET nhỏ hơn ngưỡng này được đọc bỏ để giữ kết nối keep-alive
+    MAX_DRAIN_BYTES = 64 * 1024
+    # Số path chờ trong work queue cho mỗi thread
+    QUEUE_PER_THREAD = 4
+    
     def __init__(self, base_url: str, wordlist_file: Optional[str] = None, 
                  threads: int = 50, timeout: int = 10, 
-                 callback: Optional[Callable] = None):
+                 callback: Optional[Callable] = None,
+                 use_head: bool = True, backend: str = 'threads',
+                 pipeline_depth: int = 8, spill_file: Optional[str] = None):
         """
         Khởi tạo Directory Scanner API
         
@@ -35,6 +44,12 @@ class Recon_Directory:
             threads (int): Số lượng thread đồng thời (mặc định: 50)
             timeout (int): Thời gian timeout cho mỗi request (giây)
             callback (callable, optional): Hàm callback để cập nhật real-time
+            use_head (bool): Gửi HEAD trước, chỉ dùng GET khi server từ chối HEAD (405/501)
+            backend (str): 'threads' (requests Session dùng chung) hoặc
+                           'pipeline' (asyncio, HTTP/1.1 pipelining, `threads` kết nối)
+            pipeline_depth (int): Số request gửi trước trên mỗi kết nối với backend 'pipeline'
+            spill_file (str, optional): File JSON lines để ghi các path không tìm thấy.
+                                        Nếu không có, chỉ giữ bộ đếm theo status code
         """
         # Chuẩn hóa và xác thực URL đầu vào
         self.base_url = self._normalize_url(base_url)
@@ -42,10 +57,19 @@ class Recon_Directory:
         self.threads = threads
         self.timeout = timeout
         self.callback = callback
+        self.use_head = use_head
+        self.backend = backend
+        self.pipeline_depth = pipeline_depth
+        self.spill_file = spill_file
+        
+        # Session dùng chung, connection pool đủ cho `threads` kết nối keep-alive
+        self.session = self._build_session()
         
-        # Lưu trữ kết quả quét
-        self.results = []  # Tất cả kết quả (cả thành công và thất bại)
+        # Lưu trữ kết quả quét: chỉ giữ URL tìm thấy, path không tìm thấy
+        # được đếm theo status code (và ghi ra spill_file nếu có)
         self.found_urls = []  # Chỉ các URL được tìm thấy
+        self.status_counts = Counter()  # Số path theo status code ('error' nếu lỗi)
+        self._spill = None  # File handle của spill_file khi đang quét
         self.scanned_count = 0  # Số lượng path đã quét
         self.total_paths = 0  # Tổng số path cần quét
         self.start_time = None  # Thời điểm bắt đầu quét
@@ -71,6 +95,59 @@ class Recon_Directory:
         # Thiết lập signal handlers để dừng an toàn
         self._setup_signal_handlers()
     
+    def _build_session(self) -> requests.Session:
+        """
+        Tạo requests Session với connection pool kích thước bằng số thread
+        
+        Returns:
+            requests.Session: Session dùng chung cho tất cả các thread
+        """
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=max(1, self.threads),
+            max_retries=0
+        )
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+    
+    def _probe(self, url: str) -> requests.Response:
+        """
+        Gửi request kiểm tra một URL mà không tải body
+        
+        HEAD được dùng mặc định. Nếu server từ chối HEAD (405/501) thì
+        chuyển sang GET (stream=True) cho phần còn lại của lần quét.
+        
+        Args:
+            url (str): URL cần kiểm tra
+            
+        Returns:
+            requests.Response: Response (body chưa được đọc)
+        """
+        if self.use_head:
+            response = self.session.head(url, timeout=self.timeout, allow_redirects=False)
+            if response.status_code not in self.REJECTED_HEAD:
+                return response
+            response.close()
+            self.use_head = False
+        
+        response = self.session.get(url, timeout=self.timeout, allow_redirects=False, stream=True)
+        self._discard_body(response)
+        return response
+    
+    def _discard_body(self, response: requests.Response):
+        """
+        Bỏ body của response GET
+        
+        Body nhỏ được đọc hết để trả kết nối về pool, body lớn thì đóng kết nối
+        """
+        length = response.headers.get('Content-Length')
+        if length is not None and length.isdigit() and int(length) <= self.MAX_DRAIN_BYTES:
+            for _ in response.iter_content(chunk_size=self.MAX_DRAIN_BYTES):
+                pass
+        response.close()
+    
     def _normalize_url(self, url_input: str) -> str:
         """
         Chuẩn hóa và xác thực URL đầu vào
@@ -126,7 +203,7 @@ class Recon_Directory:
         """
         try:
             # Thực hiện request GET để kiểm tra kết nối
-            response = requests.get(self.base_url, timeout=self.timeout, allow_redirects=False)
+            response = self._probe(self.base_url)
             
             # Nếu nhận được status code hợp lệ thì coi như thành công
             if response.status_code in [200, 301, 302, 403, 401]:
@@ -158,12 +235,12 @@ class Recon_Directory:
         signal.signal(signal.SIGINT, signal_handler)   # Ctrl+C
         signal.signal(signal.SIGTERM, signal_handler)  # Signal kết thúc
     
-    def _load_wordlist(self) -> List[str]:
+    def _iter_wordlist(self):
         """
-        Tải danh sách các path từ file wordlist
+        Đọc lần lượt các path từ file wordlist, không tải cả file vào bộ nhớ
         
-        Returns:
-            list: Danh sách các path cần quét
+        Yields:
+            str: Path cần quét
             
         Raises:
             ValueError: Nếu không có file wordlist
@@ -178,13 +255,24 @@ class Recon_Directory:
         
         try:
             # Đọc file wordlist và loại bỏ các dòng trống
-            with open(self.wordlist_file, "r", encoding='utf-8') as f:
-                paths = [line.strip() for line in f if line.strip()]
-            return paths
+            with open(self.wordlist_file, "r", encoding='utf-8', errors='replace') as f:
+                for line in f:
+                    path = line.strip()
+                    if path:
+                        yield path
             
         except Exception as e:
             raise Exception(f"Error reading wordlist file: {e}")
     
+    def _count_wordlist(self) -> int:
+        """
+        Đếm số path trong wordlist (đọc stream) để tính tiến độ
+        
+        Returns:
+            int: Số path cần quét
+        """
+        return sum(1 for _ in self._iter_wordlist())
+    
     def _check_url(self, path: str) -> Optional[Dict]:
         """
         Kiểm tra xem một path cụ thể có tồn tại trên đích không
@@ -216,24 +304,41 @@ class Recon_Directory:
         try:
             # Đo thời gian response
             start_time = time.time()
-            response = requests.get(url, timeout=self.timeout, allow_redirects=False)
+            response = self._probe(url)
             response_time = time.time() - start_time
             
             # Cập nhật thông tin kết quả
             result['status_code'] = response.status_code
             result['response_time'] = round(response_time, 3)
             
-            # Kiểm tra nếu status code cho thấy thành công
-            if str(response.status_code)[0] in self.success_codes:
-                result['found'] = True
-            
         except requests.RequestException as e:
             # Ghi lại lỗi nếu có
             result['error'] = str(e)
         
-        # Cập nhật bộ đếm
+        return self._record_result(result)
+    
+    def _record_result(self, result: Dict) -> Dict:
+        """
+        Đánh dấu found, cập nhật bộ đếm và gọi callback cho một kết quả
+        
+        Args:
+            result (dict): Kết quả của một path
+            
+        Returns:
+            dict: Kết quả đã cập nhật
+        """
+        # Kiểm tra nếu status code cho thấy thành công
+        if result['status_code'] and str(result['status_code'])[0] in self.success_codes:
+            result['found'] = True
+        
+        # Cập nhật bộ đếm, chỉ giữ lại URL tìm thấy
         with self.lock:
             self.scanned_count += 1
+            self.status_counts[result['status_code'] or 'error'] += 1
+            if result['found']:
+                self.found_urls.append(result)
+            elif self._spill is not None:
+                self._spill.write(json.dumps(result) + '\n')
         
         # Gọi callback nếu có
         if self.callback:
@@ -244,6 +349,75 @@ class Recon_Directory:
         
         return result
     
+    def _scan_threaded(self, paths):
+        """
+        Quét bằng `threads` worker đọc từ một work queue có giới hạn
+        
+        Wordlist được đọc dần vào queue, nên bộ nhớ không phụ thuộc kích thước
+        wordlist. Khi stop(), không đưa thêm path vào queue và các worker bỏ qua
+        phần còn lại, nên scan dừng sau tối đa một request timeout.
+        
+        Args:
+            paths (iterable): Các path cần quét
+        """
+        work = Queue(maxsize=self.threads * self.QUEUE_PER_THREAD)
+        
+        def worker():
+            while True:
+                path = work.get()
+                if path is None:
+                    return
+                self._check_url(path)  # Trả về None ngay nếu đã dừng
+        
+        workers = [threading.Thread(target=worker, daemon=True) for _ in range(self.threads)]
+        for thread in workers:
+            thread.start()
+        
+        try:
+            for path in paths:
+                while not self.is_stopped():
+                    try:
+                        work.put(path, timeout=0.5)
+                        break
+                    except Full:
+                        continue
+                if self.is_stopped():
+                    break
+        finally:
+            # Một sentinel cho mỗi worker
+            for _ in workers:
+                work.put(None)
+            for thread in workers:
+                thread.join()
+    
+    def _scan_pipelined(self, paths):
+        """
+        Quét bằng backend asyncio/HTTP pipelining (xem _Pipeline_.py)
+        
+        Args:
+            paths (iterable): Các path cần quét
+        """
+        from ._Pipeline_ import PipelinedProber
+        
+        prober = PipelinedProber(self.base_url, connections=self.threads,
+                                 depth=self.pipeline_depth, timeout=self.timeout)
+        if not self.use_head:
+            prober.method = 'GET'
+        
+        def on_result(path, status_code, response_time, error):
+            result = {
+                'url': f"{self.base_url}/{path}",
+                'path': path,
+                'status_code': status_code,
+                'response_time': response_time,
+                'error': error,
+                'found': False,
+                'timestamp': datetime.now().isoformat()
+            }
+            self._record_result(result)
+        
+        prober.run(paths, on_result, self.is_stopped)
+    
     def _scan_worker(self):
         """
         Worker method để quét trong thread riêng biệt
@@ -254,34 +428,26 @@ class Recon_Directory:
             if not self._test_connection():
                 return
             
-            # Tải wordlist
-            paths = self._load_wordlist()
-            self.total_paths = len(paths)
+            # Wordlist được đọc dần trong lúc quét
+            self.total_paths = self._count_wordlist()
             self.start_time = time.time()
+            if self.spill_file:
+                self._spill = open(self.spill_file, 'w', encoding='utf-8')
             
-            # Bắt đầu quét với ThreadPoolExecutor
-            with ThreadPoolExecutor(max_workers=self.threads) as executor:
-                # Gửi tất cả các task
-                future_to_path = {executor.submit(self._check_url, path): path for path in paths}
-                
-                # Xử lý các task hoàn thành theo thời gian thực
-                for future in as_completed(future_to_path):
-                    # Kiểm tra nếu có yêu cầu dừng
-                    if self.is_stopped():
-                        break
-                    
-                    # Lấy kết quả
-                    result = future.result()
-                    if result is not None:
-                        # Phân loại kết quả
-                        if result['found']:
-                            self.found_urls.append(result)
-                        self.results.append(result)
+            if self.backend == 'pipeline':
+                self._scan_pipelined(self._iter_wordlist())
+            else:
+                self._scan_threaded(self._iter_wordlist())
             
         except Exception as e:
             print(f"Scan error: {e}")
         finally:
-            # Đánh dấu kết thúc quét
+            # Đánh dấu kết thúc quét, trả các kết nối trong pool
+            self.session.close()
+            with self.lock:
+                if self._spill is not None:
+                    self._spill.close()
+                    self._spill = None
             self.is_scanning = False
     
     def start_scan(self) -> bool:
@@ -299,8 +465,8 @@ class Recon_Directory:
         self.stop_requested = False
         self.stop_event.clear()
         self.scanned_count = 0
-        self.results = []
         self.found_urls = []
+        self.status_counts = Counter()
         
         # Tạo và bắt đầu thread quét
         self.scan_thread = threading.Thread(target=self._scan_worker, daemon=True)
@@ -335,6 +501,7 @@ class Recon_Directory:
                 - total_paths: Tổng số path cần quét
                 - found_urls_count: Số URL tìm thấy
                 - results_count: Tổng số kết quả
+                - status_counts: Số path theo status code
                 - elapsed_time: Thời gian đã trôi qua
                 - rate: Tốc độ quét (path/giây)
                 - progress_percent: Phần trăm hoàn thành
@@ -345,7 +512,8 @@ class Recon_Directory:
             'scanned_count': self.scanned_count,
             'total_paths': self.total_paths,
             'found_urls_count': len(self.found_urls),
-            'results_count': len(self.results)
+            'results_count': self.scanned_count,
+            'status_counts': self._status_counts()
         }
         
         # Tính toán thời gian và tốc độ
@@ -361,19 +529,30 @@ class Recon_Directory:
         
         return status
     
+    def _status_counts(self) -> Dict:
+        """Bộ đếm theo status code, key dạng string để serialize JSON"""
+        with self.lock:
+            return {str(code): count for code, count in self.status_counts.items()}
+    
     def get_results(self, found_only: bool = False) -> List[Dict]:
         """
         Lấy kết quả quét
         
+        Chỉ các URL tìm thấy được giữ trong bộ nhớ; các path không tìm thấy
+        được đọc lại từ spill_file nếu có
+        
         Args:
             found_only (bool): Chỉ trả về các URL tìm thấy nếu True
             
         Returns:
             list: Danh sách kết quả
         """
-        if found_only:
-            return self.found_urls.copy()
-        return self.results.copy()
+        results = self.found_urls.copy()
+        if found_only or not self.spill_file or not os.path.exists(self.spill_file):
+            return results
+        with open(self.spill_file, 'r', encoding='utf-8') as f:
+            results.extend(json.loads(line) for line in f if line.strip())
+        return results
     
     def get_found_urls(self) -> List[Dict]:
         """
@@ -436,7 +615,7 @@ class Recon_Directory:
                 f.write("-" * 50 + "\n\n")
                 
                 # Ghi từng kết quả
-                results_to_save = self.found_urls if found_only else self.results
+                results_to_save = self.get_results(found_only=found_only)
                 for result in results_to_save:
                     f.write(f"{result['url']} (Status: {result['status_code']})\n")
             
@@ -455,6 +634,7 @@ class Recon_Directory:
                 - total_scanned: Tổng số đã quét
                 - found_urls: Số URL tìm thấy
                 - total_results: Tổng số kết quả
+                - status_counts: Số path theo status code
                 - is_completed: Đã hoàn thành chưa
                 - was_interrupted: Có bị gián đoạn không
                 - elapsed_time: Thời gian thực hiện
@@ -464,7 +644,8 @@ class Recon_Directory:
             'target': self.base_url,
             'total_scanned': self.scanned_count,
             'found_urls': len(self.found_urls),
-            'total_results': len(self.results),
+            'total_results': self.scanned_count,
+            'status_counts': self._status_counts(),
             'is_completed': not self.is_scanning,
             'was_interrupted': self.stop_requested
         }
@@ -498,10 +679,6 @@ def print_result_callback(result: Dict):
 
 
 class DirsearchManager:
-    _process = None
-    _queue = None
-    _result = []
-    _is_running = False
     _wordlist_map = {
         'normal': os.path.join(os.path.dirname(__file__), 'Dictionary', 'normal.txt'),
         'deep': os.path.join(os.path.dirname(__file__), 'Dictionary', 'deep.txt'),
@@ -510,49 +687,21 @@ class DirsearchManager:
     }
 
     @staticmethod
-    def _scan_worker(url, wordlist_file, queue):
-        def callback(result):
-            queue.put(result)
-        scanner = Recon_Directory(url, wordlist_file=wordlist_file, callback=callback)
-        scanner.start_scan()
-        scanner.wait_for_completion()
-        queue.put('DONE')
-
-    @staticmethod
-    def start_scan(url, mode):
-        if DirsearchManager._process is not None and DirsearchManager._process.is_alive():
-            return False, 'A scan is already running'
-        wordlist_file = DirsearchManager._wordlist_map.get(mode, DirsearchManager._wordlist_map['default'])
-        print(f"[DirsearchManager] Start scan: url={url}, mode={mode}, wordlist={wordlist_file}")
-        DirsearchManager._queue = MPQueue()
-        DirsearchManager._result = []
-        DirsearchManager._process = Process(target=DirsearchManager._scan_worker, args=(url, wordlist_file, DirsearchManager._queue))
-        DirsearchManager._process.start()
-        DirsearchManager._is_running = True
-        return True, 'Dirsearch is scanning..'
+    def wordlist_for(mode):
+        return DirsearchManager._wordlist_map.get(mode, DirsearchManager._wordlist_map['default'])
 
     @staticmethod
-    def get_scan_result():
-        results = []
-        if DirsearchManager._queue is not None:
-            while not DirsearchManager._queue.empty():
-                item = DirsearchManager._queue.get()
-                if item == 'DONE':
-                    DirsearchManager._is_running = False
-                    break
-                results.append(item)
-        DirsearchManager._result.extend(results)
-        return DirsearchManager._result
-
-    @staticmethod
-    def stop_scan():
-        if DirsearchManager._process is not None and DirsearchManager._process.is_alive():
-            DirsearchManager._process.terminate()
-            DirsearchManager._process = None
-            DirsearchManager._is_running = False
-            return True, 'Scan stopped'
-        else:
-            return False, 'No scan is running'
-
-
-
+    def scan_job(url, params, emit):
+        """Job cho ReconJobManager, mỗi URL tìm thấy là một item"""
+        wordlist_file = DirsearchManager.wordlist_for(params.get('mode'))
+        print(f"[DirsearchManager] Start scan: url={url}, mode={params.get('mode')}, wordlist={wordlist_file}")
+        # Chỉ gửi URL tìm thấy, path không tìm thấy nằm trong status_counts của summary
+        def on_result(result):
+            if result['found']:
+                emit('item', result)
+        scanner = Recon_Directory(url, wordlist_file=wordlist_file, callback=on_result,
+                                  threads=int(params.get('threads', 50)),
+                                  backend=params.get('backend', 'threads'))
+        scanner.start_scan()
+        scanner.wait_for_completion()
+        emit('result', scanner.get_summary())
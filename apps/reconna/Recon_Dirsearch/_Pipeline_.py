@@ -0,0 +1,218 @@
+import asyncio
+import ssl
+import time
+from collections import deque
+from typing import Callable, Iterable, Optional
+from urllib.parse import urlparse
+
+
+class PipelinedProber:
+    """
+    Backend asyncio cho Recon_Directory, dùng HTTP/1.1 pipelining
+
+    Mở `connections` kết nối keep-alive tới target, trên mỗi kết nối gửi liền
+    `depth` request HEAD rồi mới đọc lần lượt các response. Không cần thư viện
+    ngoài (chỉ asyncio). Nếu server từ chối HEAD (405/501) thì chuyển sang GET
+    và đọc bỏ body theo Content-Length hoặc chunked.
+    """
+
+    REJECTED_HEAD = (405, 501)
+    # Số path chờ trong queue cho mỗi kết nối
+    QUEUE_PER_CONNECTION = 4
+
+    def __init__(self, base_url: str, connections: int = 50, depth: int = 8,
+                 timeout: int = 10, user_agent: Optional[str] = None):
+        """
+        Args:
+            base_url (str): URL đã chuẩn hóa (không có / cuối)
+            connections (int): Số kết nối song song
+            depth (int): Số request gửi trước trên mỗi kết nối
+            timeout (int): Timeout đọc mỗi response (giây)
+        """
+        parsed = urlparse(base_url)
+        self.base_url = base_url
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        self.ssl = parsed.scheme == 'https'
+        self.base_path = parsed.path.rstrip('/')
+        self.host_header = parsed.netloc
+        self.connections = max(1, connections)
+        self.depth = max(1, depth)
+        self.timeout = timeout
+        self.user_agent = user_agent or 'Mozilla/5.0'
+        self.method = 'HEAD'
+
+    def _ssl_context(self):
+        if not self.ssl:
+            return None
+        ctx = ssl.create_default_context()
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+        return ctx
+
+    def _build_request(self, path: str, method: str) -> bytes:
+        return (
+            f"{method} {self.base_path}/{path} HTTP/1.1\r\n"
+            f"Host: {self.host_header}\r\n"
+            f"User-Agent: {self.user_agent}\r\n"
+            f"Accept: */*\r\n"
+            f"Connection: keep-alive\r\n\r\n"
+        ).encode('latin-1', 'replace')
+
+    async def _read_response(self, reader, method: str):
+        """Đọc một response, trả về (status_code, keep_alive)"""
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError('Connection closed by server')
+        parts = status_line.split(None, 2)
+        status = int(parts[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get('connection', '').lower() != 'close'
+
+        # HEAD, 1xx, 204, 304 không có body
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            return status, keep_alive
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # Bỏ trailer
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                await reader.readexactly(size + 2)
+        elif 'content-length' in headers:
+            await reader.readexactly(int(headers['content-length']))
+        else:
+            # Body kết thúc khi đóng kết nối
+            await reader.read()
+            keep_alive = False
+
+        return status, keep_alive
+
+    async def _next_batch(self, queue: asyncio.Queue, requeued: deque, exhausted: bool):
+        """Lấy tối đa `depth` path, ưu tiên path cần gửi lại. Trả về (batch, exhausted)"""
+        batch = []
+        while requeued and len(batch) < self.depth:
+            batch.append(requeued.popleft())
+        while len(batch) < self.depth and not exhausted:
+            if batch:
+                try:
+                    path = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+            else:
+                path = await queue.get()
+            if path is None:
+                # Hết wordlist cho worker này
+                exhausted = True
+            else:
+                batch.append(path)
+        return batch, exhausted
+
+    async def _connection_worker(self, queue: asyncio.Queue, requeued: deque, retried: set,
+                                 on_result: Callable, should_stop: Callable):
+        reader = writer = None
+        ssl_context = self._ssl_context()
+        exhausted = False
+
+        try:
+            while not should_stop():
+                batch, exhausted = await self._next_batch(queue, requeued, exhausted)
+                if not batch:
+                    if exhausted:
+                        return
+                    continue
+
+                if writer is None:
+                    try:
+                        reader, writer = await asyncio.wait_for(
+                            asyncio.open_connection(self.host, self.port, ssl=ssl_context), self.timeout)
+                    except (OSError, asyncio.TimeoutError) as e:
+                        for path in batch:
+                            on_result(path, None, None, f"Connection error: {e}")
+                        continue
+
+                method = self.method
+                sent_at = time.time()
+                writer.write(b''.join(self._build_request(path, method) for path in batch))
+
+                answered = 0
+                try:
+                    await writer.drain()
+                    for path in batch:
+                        if should_stop():
+                            break
+                        status, keep_alive = await asyncio.wait_for(self._read_response(reader, method), self.timeout)
+                        answered += 1
+                        if method == 'HEAD' and status in self.REJECTED_HEAD:
+                            # Server không hỗ trợ HEAD: chuyển sang GET cho toàn bộ scan
+                            self.method = 'GET'
+                            requeued.append(path)
+                        else:
+                            on_result(path, status, round(time.time() - sent_at, 3), None)
+                        if not keep_alive:
+                            break
+                except (OSError, ValueError, IndexError, asyncio.IncompleteReadError, asyncio.TimeoutError) as e:
+                    keep_alive = False
+                    error = str(e) or e.__class__.__name__
+                else:
+                    error = None
+
+                # Path chưa có response: gửi lại trên kết nối mới (tối đa 1 lần)
+                for path in batch[answered:]:
+                    if should_stop():
+                        break
+                    if path not in retried:
+                        retried.add(path)
+                        requeued.append(path)
+                    else:
+                        on_result(path, None, None, error or 'No response')
+
+                if not keep_alive:
+                    writer.close()
+                    reader = writer = None
+        finally:
+            if writer is not None:
+                writer.close()
+
+    async def _feed(self, queue: asyncio.Queue, paths: Iterable[str], should_stop: Callable):
+        """Đưa path vào queue có giới hạn, đọc dần từ `paths`"""
+        for path in paths:
+            if should_stop():
+                break
+            await queue.put(path)
+        for _ in range(self.connections):
+            await queue.put(None)
+
+    async def _run(self, paths: Iterable[str], on_result: Callable, should_stop: Callable):
+        queue = asyncio.Queue(maxsize=self.connections * self.QUEUE_PER_CONNECTION)
+        requeued = deque()
+        retried = set()
+        feeder = asyncio.ensure_future(self._feed(queue, paths, should_stop))
+        try:
+            await asyncio.gather(*[
+                self._connection_worker(queue, requeued, retried, on_result, should_stop)
+                for _ in range(self.connections)
+            ])
+        finally:
+            # Worker đã dừng (stop) trong khi feeder còn chờ queue
+            feeder.cancel()
+
+    def run(self, paths: Iterable[str], on_result: Callable, should_stop: Callable = lambda: False):
+        """
+        Quét tất cả path, gọi on_result(path, status_code, response_time, error) cho từng path
+
+        `paths` được đọc dần nên có thể là generator trên một wordlist lớn.
+        Chạy event loop riêng nên có thể gọi từ bất kỳ thread nào.
+        """
+        asyncio.run(self._run(paths, on_result, should_stop))
@@ -4,16 +4,11 @@ import shutil
 import nmap
 import re
 from urllib.parse import urlparse
-import multiprocessing
 
-# Quản lý process scan toàn cục (hoặc dùng dict nếu muốn đa user)
-scan_process = None
-result_queue = None
-
-def scan_worker(target, arguments, result_queue):
+def nmap_scan_job(target, params, emit):
+    """Job cho ReconJobManager, chạy trong process riêng"""
     scanner = Recon_Nmap(target)
-    result = scanner._scan_and_return(arguments)
-    result_queue.put(result)
+    emit('result', scanner._scan_and_return(params.get('arguments', '-T4 -F -Pn')))
 
 class Recon_Nmap:
     def __init__(self, target):
@@ -101,32 +96,6 @@ class Recon_Nmap:
         except Exception:
             return target
 
-    @staticmethod
-    def start_scan(target, arguments):
-        global scan_process, result_queue
-        if scan_process and scan_process.is_alive():
-            return False, "A scan is already running"
-        result_queue = multiprocessing.Queue()
-        scan_process = multiprocessing.Process(target=scan_worker, args=(target, arguments, result_queue))
-        scan_process.start()
-        return True, "Nmap is scanning"
-
-    @staticmethod
-    def stop_scan():
-        global scan_process
-        if scan_process and scan_process.is_alive():
-            scan_process.terminate()
-            scan_process.join()
-            return True, "Scan stopped"
-        return False, "No scan running"
-
-    @staticmethod
-    def get_scan_result():
-        global result_queue
-        if result_queue and not result_queue.empty():
-            return result_queue.get()
-        return None
-    
 
 # scanner = Recon_Nmap("127.0.0.1")
     
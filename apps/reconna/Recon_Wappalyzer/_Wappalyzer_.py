@@ -1,54 +1,20 @@
 #from python_wappalyzer import Wappalyzer, WebPage
 from Wappalyzer import Wappalyzer, WebPage
 #from Wappalyzer import Wappalyzer,WebPage
-from multiprocessing import Process, Queue
 import re
 from urllib.parse import urlparse
 
 
-class Recon_Wappalyzer:
-    _process = None
-    _queue = None
-    _result = None
-
-    @staticmethod
-    def _scan_worker(url, queue):
-        try:
-            scanner = Recon_Wappalyzer(url)
-            result = scanner.get_results()
-            queue.put(result)
-        except Exception as e:
-            queue.put({'error': str(e)})
-
-
+def wappalyzer_scan_job(target, params, emit):
+    """Job cho ReconJobManager, chạy trong process riêng"""
+    try:
+        emit('result', Recon_Wappalyzer(target).get_results())
+    except Exception as e:
+        # Giữ format cũ: lỗi được trả về như kết quả
+        emit('result', {'error': str(e)})
 
-    @staticmethod
-    def start_scan(url):
-        if Recon_Wappalyzer._process is not None and Recon_Wappalyzer._process.is_alive():
-            return False, 'A scan is already running'
-        Recon_Wappalyzer._queue = Queue()
-        Recon_Wappalyzer._process = Process(target=Recon_Wappalyzer._scan_worker, args=(url, Recon_Wappalyzer._queue))
-        Recon_Wappalyzer._process.start()
-        Recon_Wappalyzer._result = None
-        return True, 'Wappalyzer is scanning...'
-
-    @staticmethod
-    def get_scan_result():
-        if Recon_Wappalyzer._result is not None:
-            return Recon_Wappalyzer._result
-        if Recon_Wappalyzer._queue is not None and not Recon_Wappalyzer._queue.empty():
-            Recon_Wappalyzer._result = Recon_Wappalyzer._queue.get()
-            return Recon_Wappalyzer._result
-        return None
 
-    @staticmethod
-    def stop_scan():
-        if Recon_Wappalyzer._process is not None and Recon_Wappalyzer._process.is_alive():
-            Recon_Wappalyzer._process.terminate()
-            Recon_Wappalyzer._process = None
-            return True, 'Scan stopped'
-        else:
-            return False, 'No scan is running'
+class Recon_Wappalyzer:
 
     @staticmethod
     def normalize_target(target):
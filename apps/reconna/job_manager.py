@@ -0,0 +1,279 @@
+#Quản lý các job recon chạy song song
+"""
+Recon job manager
+
+Mỗi lần scan (nmap, wappalyzer, dirsearch, wpscan) là một job có job_id riêng,
+chạy trong process riêng. Nhiều job chạy cùng lúc nhưng không vượt quá
+``max_processes``; job vượt quá budget được xếp hàng chờ. Kết quả được giữ
+theo từng job trong ``result_ttl`` giây sau khi job kết thúc.
+
+API chung cho mọi tool:
+    submit(tool, target, params)  -> job_id
+    status(job_id)                -> dict trạng thái
+    results(job_id, since)        -> các item mới từ vị trí `since` (kết quả từng phần)
+    cancel(job_id)                -> (ok, msg)
+
+Tool được đăng ký bằng ``register(name, tool)``:
+    ProcessTool(func)   - func(target, params, emit) chạy trong multiprocessing.Process,
+                          emit('item', x) cho kết quả từng phần, emit('result', x) cho kết quả cuối
+    CommandTool(build)  - build(target, params) trả về command line, mỗi dòng stdout là một item
+"""
+import os
+import queue
+import subprocess
+import threading
+from multiprocessing import Process, Queue as MPQueue
+
+from apps.jobs import Job, JobManager, QUEUED, RUNNING, DONE, FAILED, CANCELLED, FINISHED_STATES
+
+
+def _process_entry(func, target, params, out_queue):
+    """Chạy trong process con, chuyển emit() thành message trên queue"""
+    def emit(kind, payload=None):
+        out_queue.put((kind, payload))
+    try:
+        func(target, params, emit)
+    except Exception as e:
+        out_queue.put(('error', str(e)))
+
+
+class ProcessTool:
+    """Tool chạy một hàm Python trong process riêng"""
+
+    def __init__(self, func):
+        self.func = func
+
+    def start(self, job):
+        out_queue = MPQueue()
+        process = Process(target=_process_entry, args=(self.func, job.target, job.params, out_queue), daemon=True)
+        process.start()
+        job._handle = process
+        # cancel() đến trước khi có _handle thì dừng ngay tại đây
+        if job._cancel_requested:
+            self.stop(job)
+        try:
+            while True:
+                try:
+                    kind, payload = out_queue.get(timeout=0.5)
+                except queue.Empty:
+                    if not process.is_alive():
+                        break
+                    continue
+                job._emit(kind, payload)
+            # Lấy nốt các message còn lại sau khi process kết thúc
+            while True:
+                try:
+                    kind, payload = out_queue.get_nowait()
+                except queue.Empty:
+                    break
+                job._emit(kind, payload)
+        finally:
+            process.join(timeout=1)
+            if process.exitcode not in (0, None) and not job.error and not job._cancel_requested:
+                job._emit('error', f"Scan process exited with code {process.exitcode}")
+
+    @staticmethod
+    def stop(job):
+        process = job._handle
+        if process is not None and process.is_alive():
+            process.terminate()
+
+
+class CommandTool:
+    """Tool chạy một command ngoài, mỗi dòng output là một item"""
+
+    def __init__(self, build_command, line_filter=None):
+        self.build_command = build_command
+        self.line_filter = line_filter
+
+    def start(self, job):
+        process = subprocess.Popen(
+            self.build_command(job.target, job.params),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=1,
+            universal_newlines=True
+        )
+        job._handle = process
+        if job._cancel_requested:
+            self.stop(job)
+        try:
+            for line in process.stdout:
+                line = line.strip()
+                if self.line_filter:
+                    line = self.line_filter(line)
+                if line:
+                    job._emit('item', line)
+        finally:
+            process.stdout.close()
+            process.wait()
+        # Kết quả cuối là toàn bộ output
+        job._emit('result', list(job.items))
+
+    @staticmethod
+    def stop(job):
+        process = job._handle
+        if process is not None and process.poll() is None:
+            process.terminate()
+
+
+class ReconJob(Job):
+    """Trạng thái và kết quả của một lần scan"""
+
+    def __init__(self, tool_name, tool, target, params=None, owner=None):
+        super().__init__(owner)
+        self.tool_name = tool_name
+        self.tool = tool
+        self.target = target
+        self.params = params or {}
+        self.items = []
+        self.result = None
+        self._handle = None
+        self._cancel_requested = False
+        self._lock = threading.Lock()
+
+    def _emit(self, kind, payload):
+        with self._lock:
+            if kind == 'item':
+                self.items.append(payload)
+            elif kind == 'result':
+                self.result = payload
+            elif kind == 'error':
+                self.error = payload
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'job_id': self.job_id,
+                'tool': self.tool_name,
+                'target': self.target,
+                'params': self.params,
+                'status': self.state,
+                'done': self.state in FINISHED_STATES,
+                'items_count': len(self.items),
+                'has_result': self.result is not None,
+                'error': self.error,
+                'created_at': self.created_at,
+                'started_at': self.started_at,
+                'finished_at': self.finished_at,
+                'elapsed_time': self.elapsed()
+            }
+
+
+class ReconJobManager(JobManager):
+    """Chạy nhiều recon job cùng lúc trong giới hạn số process"""
+
+    kind = 'Recon job'
+
+    def __init__(self, max_processes=4, result_ttl=3600, max_jobs=500):
+        super().__init__(max_processes, result_ttl, max_jobs)
+        self._tools = {}
+
+    @property
+    def max_processes(self):
+        return self.max_workers
+
+    def register(self, name, tool):
+        self._tools[name] = tool
+
+    def tools(self):
+        return list(self._tools)
+
+    def configure(self, max_processes=None, result_ttl=None):
+        with self._lock:
+            if max_processes:
+                self.max_workers = max(1, int(max_processes))
+            if result_ttl:
+                self.result_ttl = result_ttl
+        self._dispatch()
+
+    # ------------------------------------------------------------------ API
+
+    def submit(self, tool_name, target, params=None, owner=None):
+        """Tạo job mới, trả về job_id. Job chạy ngay nếu còn budget"""
+        tool = self._tools.get(tool_name)
+        if tool is None:
+            raise ValueError(f"Unknown recon tool: {tool_name}")
+        if not target:
+            raise ValueError("Missing target")
+
+        job = ReconJob(tool_name, tool, target, params, owner)
+        print(f"[+] Recon job {job.job_id} queued: {tool_name} {target}")
+        return self._enqueue(job)
+
+    def results(self, job_id, since=0):
+        """Các item từ vị trí `since`, kèm cursor cho lần poll tiếp theo"""
+        job = self.get(job_id)
+        if not job:
+            return None
+        since = max(0, int(since or 0))
+        with job._lock:
+            items = job.items[since:]
+            return {
+                'job_id': job.job_id,
+                'status': job.state,
+                'done': job.state in FINISHED_STATES,
+                'items': items,
+                'cursor': since + len(items),
+                'result': job.result,
+                'error': job.error
+            }
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if not job:
+            return False, 'Job not found'
+        with self._lock:
+            if job.state in FINISHED_STATES:
+                return False, 'No scan running'
+            job._cancel_requested = True
+            if job.state == QUEUED:
+                self._cancel_queued_locked(job)
+                return True, 'Scan cancelled'
+        job.tool.stop(job)
+        return True, 'Scan stopped'
+
+    def list_jobs(self, owner=None, tool_name=None):
+        return [
+            job for job in super().list_jobs(owner)
+            if tool_name is None or job['tool'] == tool_name
+        ]
+
+    def stats(self):
+        stats = super().stats()
+        stats['max_processes'] = stats.pop('max_workers')
+        return stats
+
+    # ------------------------------------------------------------ internals
+
+    def _thread_name(self, job):
+        return f"recon-{job.tool_name}-{job.job_id[:8]}"
+
+    def _execute(self, job):
+        try:
+            job.tool.start(job)
+        except Exception as e:
+            job._emit('error', str(e))
+        if job._cancel_requested:
+            return CANCELLED
+        return FAILED if job.error else DONE
+
+    def _finish_locked(self, job, state):
+        super()._finish_locked(job, state)
+        job._handle = None
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_recon_job_manager():
+    """Singleton manager cho cả server, budget lấy từ RECON_MAX_PROCESSES / RECON_RESULT_TTL"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ReconJobManager(
+                max_processes=int(os.getenv('RECON_MAX_PROCESSES', 4)),
+                result_ttl=int(os.getenv('RECON_RESULT_TTL', 3600))
+            )
+    return _manager
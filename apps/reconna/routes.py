@@ -11,36 +11,80 @@ import random
 from flask import Blueprint, request, jsonify
 from sqlalchemy.exc import OperationalError, SQLAlchemyError
 from apps.models import Targets, Reports, db
-from apps.reconna.Recon_Nmap._Nmap_ import Recon_Nmap
-from apps.reconna.Recon_Wappalyzer._Wappalyzer_ import Recon_Wappalyzer
-from apps.reconna.Recon_Dirsearch._Dirseach_ import Recon_Directory, DirsearchManager
+import uuid
+from apps.reconna.Recon_Nmap._Nmap_ import nmap_scan_job
+from apps.reconna.Recon_Wappalyzer._Wappalyzer_ import wappalyzer_scan_job
+from apps.reconna.Recon_Dirsearch._Dirseach_ import DirsearchManager
 from apps.reconna.Recon_Wpcan._WP_Scan_ import Recon_Wpscan
+from apps.reconna.job_manager import get_recon_job_manager, ProcessTool, CommandTool
 
 #import các model để luwu dữ liệu
 from apps.models import Reports, Targets
 from apps import db  # Đảm bảo đã import db
 
-#=================================NMAP======================================================
-@blueprint.route('/recon/nmap/scan',methods=['GET','POST'])
-def recon_nmap_scan():    
+#================================= Recon job manager ======================================================
+# Mỗi lần scan là một job riêng (nhiều user / nhiều scan cùng lúc), các route /recon/<tool>/*
+# bên dưới chỉ là wrapper. Job_id gần nhất của mỗi tool được nhớ trong session để frontend cũ
+# không cần gửi job_id.
+recon_jobs = get_recon_job_manager()
+recon_jobs.register('nmap', ProcessTool(nmap_scan_job))
+recon_jobs.register('wappalyzer', ProcessTool(wappalyzer_scan_job))
+recon_jobs.register('dirsearch', ProcessTool(DirsearchManager.scan_job))
+recon_jobs.register('wpscan', CommandTool(Recon_Wpscan.build_command, Recon_Wpscan.clean_line))
+
+def _nmap_arguments(mode_scan):
+    # Host Discovery: chỉ xem host nào đang online   nmap -sn 192.168.1.5   
+    # Fast Scan: Quét nhanh ~100 cổng phổ biến.     nmap -T4 -F -Pn 10.10.10.10
+    # Service Detection: Quét TCP stealth, dò dịch vụ + phiên bản.    nmap -sS -sV -Pn -T4 10.10.10.10
+    # Vulnerability Scan: Dùng các script NSE để phát hiện lỗi như Heartbleed, SMB vuln, HTTP vuln...      nmap --script=vuln -Pn 10.10.10.10
+    # Aggressive Scan: Tổng hợp: OS, dịch vụ, script, traceroute.      nmap -A -Pn 10.10.10.10
+    return "-sn" if mode_scan == 1 else \
+            "-T4 -F -Pn" if mode_scan == 2 else \
+            "-sS -sV -Pn -T4" if mode_scan == 3 else \
+            "--script=vuln -Pn" if mode_scan == 4 else \
+            "-A -Pn"
+
+def _dirsearch_mode(mode_scan):
+    return "fast" if mode_scan == 1 else \
+            "normal" if mode_scan == 2 else \
+            "deep"
+
+def _job_params(tool, data):
+    if tool == 'nmap':
+        return {'arguments': _nmap_arguments(data.get('mode'))}
+    if tool == 'dirsearch':
+        params = {'mode': _dirsearch_mode(data.get('mode'))}
+        if data.get('backend') in ('threads', 'pipeline'):
+            params['backend'] = data['backend']
+        return params
+    return {}
+
+def _session_owner():
+    if 'recon_owner' not in session:
+        session['recon_owner'] = uuid.uuid4().hex
+    return session['recon_owner']
+
+def _submit_job(tool, data):
+    job_id = recon_jobs.submit(tool, data.get('hostname'), _job_params(tool, data), owner=_session_owner())
+    jobs = dict(session.get('recon_jobs', {}))
+    jobs[tool] = job_id
+    session['recon_jobs'] = jobs
+    return job_id
+
+def _current_job_id(tool):
+    data = request.get_json(silent=True) or {}
+    return request.args.get('job_id') or data.get('job_id') or session.get('recon_jobs', {}).get(tool)
+
+def _legacy_scan(tool):
     try:
         data = request.get_json()
-        url_target = data.get('hostname')
-        mode_scan = data.get('mode')
-        print(f"[+] Data scan nmap: {data}")
-        # Host Discovery: chỉ xem host nào đang online   nmap -sn 192.168.1.5   
-        # Fast Scan: Quét nhanh ~100 cổng phổ biến.     nmap -T4 -F -Pn 10.10.10.10
-        # Service Detection: Quét TCP stealth, dò dịch vụ + phiên bản.    nmap -sS -sV -Pn -T4 10.10.10.10
-        # Vulnerability Scan: Dùng các script NSE để phát hiện lỗi như Heartbleed, SMB vuln, HTTP vuln...      nmap --script=vuln -Pn 10.10.10.10
-        # Aggressive Scan: Tổng hợp: OS, dịch vụ, script, traceroute.      nmap -A -Pn 10.10.10.10
-        arguments = "-sn" if mode_scan == 1 else \
-                "-T4 -F -Pn" if mode_scan == 2 else \
-                "-sS -sV -Pn -T4" if mode_scan == 3 else \
-                "--script=vuln -Pn" if mode_scan == 4 else \
-                "-A -Pn"
-        ok, msg = Recon_Nmap.start_scan(url_target, arguments)
-
-        return jsonify({'status': 0 if ok else -1, 'msg': msg})
+        print(f"[+] Data scan {tool}: {data}")
+        if not data.get('hostname'):
+            return jsonify({"status": -1, "msg": "Thiếu URL target", "error": "Thiếu URL"}), 400
+        job_id = _submit_job(tool, data)
+        status = recon_jobs.status(job_id)
+        msg = f"{tool} is scanning" if status['status'] == 'running' else f"{tool} is queued"
+        return jsonify({'status': 0, 'msg': msg, 'job_id': job_id})
     except Exception as e:
         return jsonify({
             'status': -1,
@@ -48,18 +92,81 @@ def recon_nmap_scan():
             'error': str(e)
         })
 
+def _legacy_final_result(tool):
+    """nmap / wappalyzer / wpscan: trả kết quả khi job đã xong"""
+    job_id = _current_job_id(tool)
+    data = recon_jobs.results(job_id, since=0) if job_id else None
+    if data is None or not data['done']:
+        return jsonify({'status': -1, 'msg': 'No result available', 'job_id': job_id})
+    result = data['result'] if data['result'] is not None else data['items']
+    return jsonify({'status': 0, 'data': result, 'error': data['error'], 'job_id': job_id})
+
+def _legacy_stop(tool):
+    job_id = _current_job_id(tool)
+    if not job_id:
+        return jsonify({'status': -1, 'msg': 'No scan running'})
+    ok, msg = recon_jobs.cancel(job_id)
+    return jsonify({'status': 0 if ok else -1, 'msg': msg, 'job_id': job_id})
+
+
+@blueprint.route('/recon/jobs', methods=['POST'])
+def recon_submit_job():
+    """Tạo job recon: {tool, hostname, mode}"""
+    try:
+        data = request.get_json() or {}
+        tool = data.get('tool')
+        if tool not in recon_jobs.tools():
+            return jsonify({'status': -1, 'msg': f'Unknown tool: {tool}'}), 400
+        if not data.get('hostname'):
+            return jsonify({'status': -1, 'msg': 'Thiếu URL target'}), 400
+        job_id = _submit_job(tool, data)
+        return jsonify({'status': 0, 'job_id': job_id, 'data': recon_jobs.status(job_id)})
+    except Exception as e:
+        return jsonify({'status': -1, 'msg': str(e), 'error': str(e)})
+
+@blueprint.route('/recon/jobs', methods=['GET'])
+def recon_list_jobs():
+    """Danh sách job của user hiện tại (all=1 để xem mọi job)"""
+    owner = None if request.args.get('all') == '1' else _session_owner()
+    return jsonify({
+        'status': 0,
+        'data': recon_jobs.list_jobs(owner=owner, tool_name=request.args.get('tool')),
+        'stats': recon_jobs.stats()
+    })
+
+@blueprint.route('/recon/jobs/<job_id>', methods=['GET'])
+def recon_job_status(job_id):
+    status = recon_jobs.status(job_id)
+    if status is None:
+        return jsonify({'status': -1, 'msg': 'Job not found'}), 404
+    return jsonify({'status': 0, 'data': status})
+
+@blueprint.route('/recon/jobs/<job_id>/results', methods=['GET'])
+def recon_job_results(job_id):
+    """Kết quả từng phần: ?since=<cursor> trả về các item mới"""
+    data = recon_jobs.results(job_id, since=request.args.get('since', 0, type=int))
+    if data is None:
+        return jsonify({'status': -1, 'msg': 'Job not found'}), 404
+    return jsonify({'status': 0, 'data': data})
+
+@blueprint.route('/recon/jobs/<job_id>/cancel', methods=['POST'])
+def recon_cancel_job(job_id):
+    ok, msg = recon_jobs.cancel(job_id)
+    return jsonify({'status': 0 if ok else -1, 'msg': msg})
+
+
+#=================================NMAP======================================================
+@blueprint.route('/recon/nmap/scan',methods=['GET','POST'])
+def recon_nmap_scan():    
+    return _legacy_scan('nmap')
+
 @blueprint.route('/recon/nmap/result', methods=['GET'])
 def get_nmap_result():
-    result = Recon_Nmap.get_scan_result()
-    if result is not None:
-        return jsonify({'status': 0, 'data': result})
-    else:
-        return jsonify({'status': -1, 'msg': 'No result available'})
+    return _legacy_final_result('nmap')
 
 @blueprint.route('/recon/nmap/stop', methods=['POST'])
 def stop_nmap_scan():
-    ok, msg = Recon_Nmap.stop_scan()
-    return jsonify({'status': 0 if ok else -1, 'msg': msg})
+    return _legacy_stop('nmap')
 
 
 
@@ -67,92 +174,48 @@ def stop_nmap_scan():
 #=================================Wappalyzer======================================================
 @blueprint.route('/recon/wappalyzer/scan', methods=['POST'])
 def recon_wappalyzer_scan():
-    try:
-        data = request.get_json()
-        url_target = data.get('hostname')
-        print(f"Data scan Wappalyzer: {data}")
-        ok, msg = Recon_Wappalyzer.start_scan(url_target)
-        return jsonify({'status': 0 if ok else -1, 'msg': msg})
-    except Exception as e:
-        return jsonify({
-            'status': -1,
-            'msg': str(e),
-            'error': str(e)
-        })
+    return _legacy_scan('wappalyzer')
 
 @blueprint.route('/recon/wappalyzer/result', methods=['GET'])
 def get_wappalyzer_result():
-    result = Recon_Wappalyzer.get_scan_result()
-    if result is not None:
-        return jsonify({'status': 0, 'data': result})
-    else:
-        return jsonify({'status': -1, 'msg': 'No result available'})
+    return _legacy_final_result('wappalyzer')
 
 @blueprint.route('/recon/wappalyzer/stop', methods=['POST'])
 def stop_wappalyzer_scan():
-    ok, msg = Recon_Wappalyzer.stop_scan()
-    return jsonify({'status': 0 if ok else -1, 'msg': msg})
+    return _legacy_stop('wappalyzer')
 
 
 #=================================Dirsearch======================================================
 @blueprint.route('/recon/Dirsearch/scan', methods=['POST'])
 def recon_Dirsearch_scan():
-    try:
-        data = request.get_json()
-        url_target = data.get('hostname')
-        mode_scan = data.get('mode')
-        mode = "fast" if mode_scan == 1 else \
-                "normal" if mode_scan == 2 else \
-                "deep" 
-
-        print(f"Data scan Dirsearch: {data}")
-        ok, msg = DirsearchManager.start_scan(url_target, mode)
-        return jsonify({'status': 0 if ok else -1, 'msg': msg})
-    except Exception as e:
-        return jsonify({
-            'status': -1,
-            'msg': str(e),
-            'error': str(e)
-        })
+    return _legacy_scan('dirsearch')
 
 @blueprint.route('/recon/Dirsearch/result', methods=['GET'])
 def get_Dirsearch_result():
-    result = DirsearchManager.get_scan_result()
-    done = not DirsearchManager._is_running
-    if result is not None:
-        return jsonify({'status': 0, 'data': result, 'done': done})
-    else:
-        return jsonify({'status': -1, 'msg': 'No result available', 'done': done})
+    job_id = _current_job_id('dirsearch')
+    data = recon_jobs.results(job_id, since=0) if job_id else None
+    if data is None:
+        return jsonify({'status': -1, 'msg': 'No result available', 'done': True})
+    return jsonify({'status': 0, 'data': data['items'], 'done': data['done'], 'job_id': job_id})
 
 @blueprint.route('/recon/Dirsearch/stop', methods=['POST'])
 def stop_Dirsearch_scan():
-    ok, msg = DirsearchManager.stop_scan()
-    return jsonify({'status': 0 if ok else -1, 'msg': msg})
+    return _legacy_stop('dirsearch')
 
 
 #================================= Wpscan ======================================================
 @blueprint.route('/recon/wpscan/scan',methods=['POST'])
 def recon_wpscan_scan():
-    try:
-        data = request.get_json()
-        url_target = data.get('hostname')
-        if not url_target:
-            return jsonify({"status":-1,"msg":"Thiếu URL target","error": "Thiếu URL"}), 400
-
-        print(f"Data scan Wpscan: {data}")
-        ok, msg = Recon_Wpscan.start_scan(url_target)
-        return jsonify({'status':0,'msg':msg})
-    except Exception as e:
-        return jsonify({'status':-1,"error":str(e),"msg":str(e)})
+    return _legacy_scan('wpscan')
 
 
 @blueprint.route('/recon/wpscan/result', methods=['GET'])
 def get_wpscan_result():
-    result = Recon_Wpscan.get_scan_result()
-    if result is not None:
-        return jsonify({'status': 0, 'data': result})
-    else:
-        return jsonify({'status': -1, 'msg': 'No result available'})
+    return _legacy_final_result('wpscan')
+
+@blueprint.route('/recon/wpscan/stop', methods=['POST'])
+def stop_wpscan_scan():
+    return _legacy_stop('wpscan')
 
 
 #================================= Lưu dữ liệu report ==========================================================   
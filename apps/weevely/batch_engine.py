@@ -0,0 +1,316 @@
+# apps/weevely/batch_engine.py
+"""
+Concurrent batch engine cho weevely module commands
+
+Chạy một danh sách command (trên một hoặc nhiều webshell) bằng một worker
+pool giới hạn thay vì tuần tự + sleep:
+
+- ``max_workers``: tổng số command chạy song song (global cap)
+- ``per_target_limit``: số command song song tối đa trên cùng một webshell
+  (url, password), khớp với số worker của session pool cho mỗi target
+- ``depends_on``: command chỉ chạy sau khi các command nó phụ thuộc đã
+  thành công; nếu dependency lỗi thì command bị skip
+- ``on_result``: callback gọi ngay khi từng command xong (dùng để stream
+  kết quả qua Socket.IO)
+"""
+
+import logging
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BatchTask:
+    """Một command trong batch"""
+    task_id: str
+    url: str
+    password: str
+    command: str
+    depends_on: List[str] = field(default_factory=list)
+    target: Optional[str] = None  # nhãn hiển thị, ví dụ connection_id
+    timeout: int = 60
+
+    @property
+    def target_key(self):
+        return (self.url, self.password)
+
+
+class BatchEngine:
+    """Chạy các BatchTask với worker pool, giới hạn theo target và dependency"""
+
+    def __init__(self,
+                 executor,
+                 max_workers: int = 16,
+                 per_target_limit: int = 2,
+                 delay: float = 0.0,
+                 on_result: Optional[Callable[[Dict], None]] = None):
+        """
+        Args:
+            executor: WeevelyModuleExecutor dùng để chạy từng command
+            max_workers: Số command chạy song song tối đa
+            per_target_limit: Số command song song tối đa trên một webshell
+            delay: Khoảng cách tối thiểu (giây) từ lúc command trước bắt đầu hoặc
+                   kết thúc tới lúc command sau bắt đầu trên cùng một webshell,
+                   0 để không giới hạn
+            on_result: Callback nhận từng result entry ngay khi xong
+        """
+        self.executor = executor
+        self.max_workers = max(1, int(max_workers))
+        self.per_target_limit = max(1, int(per_target_limit))
+        self.delay = max(0.0, float(delay or 0))
+        self.on_result = on_result
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        """Không start thêm command mới, các command đang chạy vẫn chạy xong"""
+        self.cancelled.set()
+
+    def _notify(self, entry: Dict):
+        if not self.on_result:
+            return
+        try:
+            self.on_result(entry)
+        except Exception as e:
+            logger.warning(f"Batch result callback failed: {e}")
+
+    def _execute(self, task: BatchTask) -> Dict:
+        try:
+            return self.executor.execute_module(task.url, task.password, task.command, task.timeout)
+        except Exception as e:
+            return {'success': False, 'error': f"Execution error: {str(e)}", 'module_command': task.command}
+
+    def run(self, tasks: List[BatchTask]) -> Dict:
+        """Chạy toàn bộ batch, trả về dict tổng hợp khi tất cả đã xong"""
+        start_time = time.time()
+        index_of = {task.task_id: i for i, task in enumerate(tasks)}
+        by_id = OrderedDict((task.task_id, task) for task in tasks)
+        results = {}
+
+        # Dependency graph
+        waiting_on = {}
+        dependents = {task_id: [] for task_id in by_id}
+        for task in tasks:
+            deps = [d for d in dict.fromkeys(task.depends_on) if d != task.task_id]
+            waiting_on[task.task_id] = set(deps)
+            for dep in deps:
+                if dep in dependents:
+                    dependents[dep].append(task.task_id)
+
+        def record(task: BatchTask, result: Dict, status: str):
+            entry = {
+                'command_index': index_of[task.task_id],
+                'task_id': task.task_id,
+                'target': task.target,
+                'command': task.command,
+                'status': status,
+                'result': result
+            }
+            results[task.task_id] = entry
+            self._notify(entry)
+
+        def skip(task_id: str, reason: str):
+            # Skip task và toàn bộ các task phụ thuộc vào nó
+            stack = [(task_id, reason)]
+            while stack:
+                current, why = stack.pop()
+                if current in results:
+                    continue
+                waiting_on.pop(current, None)
+                record(by_id[current], {'success': False, 'error': why, 'module_command': by_id[current].command}, 'skipped')
+                for child in dependents[current]:
+                    stack.append((child, f"Skipped: dependency {current} did not succeed"))
+
+        ready = deque()
+        for task_id, deps in list(waiting_on.items()):
+            unknown = [d for d in deps if d not in by_id]
+            if unknown:
+                skip(task_id, f"Unknown dependency: {', '.join(unknown)}")
+            elif not deps:
+                ready.append(task_id)
+
+        running = {}
+        inflight = {}
+        last_start = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='weevely-batch') as pool:
+            while ready or running:
+                now = time.time()
+                next_wakeup = None
+
+                # Submit các task sẵn sàng, giữ thứ tự ban đầu
+                if not self.cancelled.is_set():
+                    for task_id in list(ready):
+                        if len(running) >= self.max_workers:
+                            break
+                        task = by_id[task_id]
+                        key = task.target_key
+                        if inflight.get(key, 0) >= self.per_target_limit:
+                            continue
+                        if self.delay and key in last_start:
+                            wait_for = last_start[key] + self.delay - now
+                            if wait_for > 0:
+                                next_wakeup = wait_for if next_wakeup is None else min(next_wakeup, wait_for)
+                                continue
+                        ready.remove(task_id)
+                        inflight[key] = inflight.get(key, 0) + 1
+                        last_start[key] = now
+                        running[pool.submit(self._execute, task)] = task
+                else:
+                    while ready:
+                        skip(ready.popleft(), 'Batch cancelled')
+
+                if not running:
+                    if ready and next_wakeup:
+                        time.sleep(next_wakeup)
+                    continue
+
+                done, _ = wait(list(running), timeout=next_wakeup, return_when=FIRST_COMPLETED)
+                for future in done:
+                    task = running.pop(future)
+                    inflight[task.target_key] -= 1
+                    last_start[task.target_key] = time.time()
+                    result = future.result()
+                    success = bool(result.get('success'))
+                    record(task, result, 'success' if success else 'failed')
+
+                    for child in dependents[task.task_id]:
+                        if child in results:
+                            continue
+                        if not success:
+                            skip(child, f"Skipped: dependency {task.task_id} did not succeed")
+                            continue
+                        pending = waiting_on.get(child)
+                        if pending is not None:
+                            pending.discard(task.task_id)
+                            if not pending:
+                                ready.append(child)
+
+        # Task còn lại là do dependency vòng
+        for task_id, task in by_id.items():
+            if task_id not in results:
+                record(task, {'success': False, 'error': 'Skipped: dependency cycle', 'module_command': task.command}, 'skipped')
+
+        ordered = sorted(results.values(), key=lambda r: r['command_index'])
+        successful = sum(1 for r in ordered if r['status'] == 'success')
+        skipped = sum(1 for r in ordered if r['status'] == 'skipped')
+
+        return {
+            'success': True,
+            'total_commands': len(tasks),
+            'successful_commands': successful,
+            'failed_commands': len(tasks) - successful,
+            'skipped_commands': skipped,
+            'total_execution_time': time.time() - start_time,
+            'results': ordered,
+            'executed_at': time.time()
+        }
+
+
+def build_tasks(targets: List[Dict], commands: List, timeout: int = 60) -> List[BatchTask]:
+    """Tạo BatchTask cho mỗi (target, command)
+
+    Args:
+        targets: List dict {'url', 'password', 'target'(optional)}
+        commands: List command string, hoặc dict {'id', 'command', 'depends_on'}.
+                  Dependency được resolve trong phạm vi cùng một target.
+        timeout: Timeout mỗi command
+    """
+    tasks = []
+    multi = len(targets) > 1
+    for t_index, target in enumerate(targets):
+        label = target.get('target') or str(t_index)
+        prefix = f"{label}:" if multi else ''
+        for c_index, cmd in enumerate(commands):
+            if isinstance(cmd, dict):
+                local_id = str(cmd.get('id', c_index))
+                command = cmd.get('command', '')
+                depends_on = cmd.get('depends_on') or []
+                if not isinstance(depends_on, list):
+                    depends_on = [depends_on]
+            else:
+                local_id = str(c_index)
+                command = cmd
+                depends_on = []
+            tasks.append(BatchTask(
+                task_id=prefix + local_id,
+                url=target['url'],
+                password=target['password'],
+                command=command,
+                depends_on=[prefix + str(d) for d in depends_on],
+                target=target.get('target'),
+                timeout=timeout
+            ))
+    return tasks
+
+
+class BatchIdConflict(ValueError):
+    """batch_id do client gửi lên không hợp lệ hoặc đang được một batch khác dùng"""
+
+
+class BatchRegistry:
+    """Lưu trạng thái các batch chạy nền để client poll hoặc join room Socket.IO
+
+    Client có thể tự đặt batch_id (để join room trước khi gửi request), id đó
+    phải hợp lệ và không trùng với một batch đang chạy.
+    """
+
+    BATCH_ID_RE = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+    def __init__(self, max_batches: int = 100):
+        self.max_batches = max_batches
+        self._batches = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self, batch_id: Optional[str] = None, total: int = 0) -> str:
+        """Đăng ký batch mới, raise BatchIdConflict nếu batch_id sai hoặc đang chạy"""
+        if batch_id and not self.BATCH_ID_RE.match(str(batch_id)):
+            raise BatchIdConflict('Invalid batch_id: 8-64 characters of [A-Za-z0-9_-]')
+        batch_id = batch_id or uuid.uuid4().hex
+        with self._lock:
+            current = self._batches.get(batch_id)
+            if current is not None and current['status'] == 'running':
+                raise BatchIdConflict(f'Batch {batch_id} is already running')
+            # batch cũ đã xong được thay bằng batch mới, xếp lại cuối hàng
+            self._batches.pop(batch_id, None)
+            self._batches[batch_id] = {
+                'batch_id': batch_id,
+                'status': 'running',
+                'total_commands': total,
+                'completed': 0,
+                'results': [],
+                'summary': None,
+                'started_at': time.time()
+            }
+            while len(self._batches) > self.max_batches:
+                self._batches.popitem(last=False)
+        return batch_id
+
+    def add_result(self, batch_id: str, entry: Dict):
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is not None:
+                batch['results'].append(entry)
+                batch['completed'] += 1
+
+    def finish(self, batch_id: str, summary: Dict):
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is not None:
+                batch['status'] = 'completed'
+                batch['summary'] = {k: v for k, v in summary.items() if k != 'results'}
+
+    def get(self, batch_id: str) -> Optional[Dict]:
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            return dict(batch, results=list(batch['results'])) if batch else None
+
+
+batch_registry = BatchRegistry()
@@ -7,9 +7,12 @@ Tự động chạy các cron jobs theo thời gian đã hẹn
 import os
 import sys
 import time
+import heapq
 import threading
 import schedule
 import datetime as dt
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from croniter import croniter
 from typing import Dict, List, Optional
 import logging
@@ -49,15 +52,38 @@ def setup_logging():
 logger = setup_logging()
 
 class WeevelyCronScheduler:
-    """Scheduler để tự động chạy các cron jobs"""
+    """Scheduler để tự động chạy các cron jobs
+
+    Giữ một min-heap (next_run, job_id) trong bộ nhớ và ngủ tới deadline
+    sớm nhất thay vì poll DB mỗi 60 giây. Khi một job đến hạn chỉ job đó
+    được đọc lại từ DB và tính next_run mới. Các route create/update/
+    toggle/delete gọi `reschedule()`/`unschedule()` để cập nhật heap.
+
+    Job chạy trên một ThreadPoolExecutor giới hạn, các job cùng một
+    weevely connection chạy tuần tự. `next_run` được lưu vào DB nên khi
+    restart không cần tính lại cho mọi job.
+
+    `clock` trả về thời điểm hiện tại (UTC naive), mặc định
+    `datetime.utcnow`, test truyền clock giả để điều khiển thời gian.
+    """
     
-    def __init__(self):
+    def __init__(self, max_workers: int = 8, clock=None):
         self.running = False
         self.scheduler_thread = None
-        self.jobs = {}
         self.last_check = None
-        self.check_interval = 60  # Kiểm tra mỗi 60 giây
+        self.max_workers = max_workers
         self.app = None  # Store Flask app instance for context
+        self._now = clock or dt.datetime.utcnow
+
+        # Heap (next_run, job_id). Entry cũ bị bỏ qua khi không khớp _scheduled
+        self._heap = []
+        self._scheduled = {}
+        self._cond = threading.Condition()
+
+        # Bounded executor + hàng đợi tuần tự theo connection
+        self._executor = None
+        self._queues = {}
+        self._queues_lock = threading.Lock()
         
     def set_app(self, app):
         """Set Flask app instance for context management"""
@@ -75,99 +101,200 @@ class WeevelyCronScheduler:
             return
             
         self.running = True
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='weevely-cron')
         self.scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
         self.scheduler_thread.start()
         logger.info("Cron scheduler started with Flask app context")
         
     def stop(self):
         """Dừng scheduler"""
-        self.running = False
+        with self._cond:
+            self.running = False
+            self._cond.notify_all()
         if self.scheduler_thread:
             self.scheduler_thread.join(timeout=5)
+        if self._executor:
+            # Job đang chạy vẫn chạy xong, job đang chờ bị bỏ
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        with self._queues_lock:
+            self._queues.clear()
         logger.info("Cron scheduler stopped")
+
+    @staticmethod
+    def _compute_next_run(job, base: dt.datetime) -> Optional[dt.datetime]:
+        """Thời điểm chạy tiếp theo sau `base`, None nếu cron expression lỗi"""
+        try:
+            return croniter(job.cron_expression, base).get_next(dt.datetime)
+        except Exception as e:
+            logger.error(f"Error parsing cron expression for job {job.name}: {str(e)}")
+            return None
+
+    def _push(self, job_id: int, next_run: Optional[dt.datetime]):
+        """Đưa job vào heap (hoặc xóa nếu next_run là None) và đánh thức loop"""
+        with self._cond:
+            if next_run is None:
+                self._scheduled.pop(job_id, None)
+            else:
+                self._scheduled[job_id] = next_run
+                heapq.heappush(self._heap, (next_run, job_id))
+            self._cond.notify_all()
+
+    def reschedule(self, job):
+        """Tính lại next_run của job sau khi tạo/sửa/bật/tắt (cần app context)"""
+        if not job.is_active:
+            self.unschedule(job.id)
+            return
+        now = self._now()
+        # Job chưa chạy lần nào thì chạy ngay, như khi nạp lúc start
+        next_run = now if not job.last_run else self._compute_next_run(job, now)
+        if job.next_run != next_run:
+            job.next_run = next_run
+            job.save()
+        self._push(job.id, next_run)
+
+    def unschedule(self, job_id: int):
+        """Bỏ job khỏi heap (job bị xóa hoặc tắt)
+
+        Lần chạy đang chờ trong hàng đợi của connection cũng bị bỏ, lần
+        đang chạy vẫn chạy xong nhưng không được xếp lịch lại.
+        """
+        self._push(job_id, None)
+        with self._queues_lock:
+            for queue in self._queues.values():
+                if job_id in queue:
+                    queue.remove(job_id)
+
+    def _load_jobs(self):
+        """Nạp heap từ DB một lần khi start, dùng next_run đã lưu nếu có"""
+        from apps.models import CronJob, db
+
+        now = self._now()
+        changed = False
+        with self._cond:
+            self._heap = []
+            self._scheduled = {}
+
+        for job in CronJob.get_active_jobs():
+            next_run = job.next_run
+            if next_run is None:
+                # Job chưa chạy lần nào thì chạy ngay như trước
+                next_run = now if not job.last_run else self._compute_next_run(job, job.last_run)
+                if next_run is None:
+                    continue
+                job.next_run = next_run
+                changed = True
+            self._push(job.id, next_run)
+
+        if changed:
+            db.session.commit()
+        logger.info(f"Loaded {len(self._scheduled)} cron jobs into scheduler")
         
     def _run_scheduler(self):
-        """Main scheduler loop"""
+        """Main scheduler loop: ngủ tới deadline sớm nhất trong heap"""
         logger.info("Starting cron scheduler loop...")
+
+        try:
+            with self.app.app_context():
+                self._load_jobs()
+        except Exception as e:
+            logger.error(f"Error loading cron jobs: {str(e)}")
         
         while self.running:
             try:
-                # Sử dụng app instance đã được set để tạo context
-                if self.app:
+                due = []
+                with self._cond:
+                    while self.running:
+                        # Bỏ các entry đã bị thay thế hoặc xóa
+                        while self._heap and self._scheduled.get(self._heap[0][1]) != self._heap[0][0]:
+                            heapq.heappop(self._heap)
+                        if not self._heap:
+                            self._cond.wait()
+                            continue
+                        delay = (self._heap[0][0] - self._now()).total_seconds()
+                        if delay > 0:
+                            self._cond.wait(timeout=delay)
+                            continue
+                        break
+                    if not self.running:
+                        break
+                    due = self._pop_due(self._now())
+
+                if due:
                     with self.app.app_context():
-                        self._check_and_run_jobs()
-                else:
-                    logger.warning("No Flask app instance available")
-                    
-                time.sleep(self.check_interval)
+                        self._fire_jobs(due)
             except Exception as e:
                 logger.error(f"Error in scheduler loop: {str(e)}")
                 time.sleep(10)  # Wait a bit before retrying
+
+    def _pop_due(self, now: dt.datetime) -> List[int]:
+        """Lấy các job đến hạn tại `now` theo thứ tự next_run"""
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                next_run, job_id = heapq.heappop(self._heap)
+                # Entry cũ (job đã được xếp lịch lại hoặc bỏ) bị bỏ qua
+                if self._scheduled.get(job_id) == next_run:
+                    del self._scheduled[job_id]
+                    due.append(job_id)
+        return due
                 
-    def _check_and_run_jobs(self):
-        """Kiểm tra và chạy các cron jobs cần thiết"""
-        try:
-            current_time = dt.datetime.utcnow()
-            
-            # Import models trong app context
-            from apps.models import CronJob
-            
-            # Lấy tất cả cron jobs đang active
-            active_jobs = CronJob.get_active_jobs()
-            
-            for job in active_jobs:
-                try:
-                    # Kiểm tra xem job có cần chạy không
-                    if self._should_run_job(job, current_time):
-                        logger.info(f"Executing cron job: {job.name} (ID: {job.id})")
-                        
-                        # Chạy job trong thread riêng để không block scheduler
-                        job_thread = threading.Thread(
-                            target=self._execute_job_safe,
-                            args=(job.id,),
-                            daemon=True
-                        )
-                        job_thread.start()
-                        
-                        # Update job statistics
-                        job.last_run = current_time
-                        job.run_count += 1
-                        job.save()
-                        
-                        logger.info(f"Cron job {job.name} executed successfully")
-                        
-                except Exception as e:
-                    logger.error(f"Error processing cron job {job.name}: {str(e)}")
-                    # Update failure count
-                    job.failure_count += 1
-                    job.save()
-                    
-            self.last_check = current_time
-            
-        except Exception as e:
-            logger.error(f"Error checking cron jobs: {str(e)}")
-            
-    def _should_run_job(self, job, current_time: dt.datetime) -> bool:
-        """Kiểm tra xem job có cần chạy không dựa trên cron expression"""
+    def _fire_jobs(self, job_ids: List[int]):
+        """Cập nhật thống kê, tính next_run và đưa các job đến hạn vào executor"""
+        from apps.models import CronJob, db
+
+        current_time = self._now()
+        fired = []
+
+        for job_id in job_ids:
+            job = CronJob.find_by_id(job_id)
+            if not job or not job.is_active:
+                continue
+            # Tính từ thời điểm hiện tại để không chạy bù nhiều lần sau downtime
+            job.next_run = self._compute_next_run(job, current_time)
+            job.last_run = current_time
+            job.run_count = (job.run_count or 0) + 1
+            fired.append(job)
+
+        if not fired:
+            return
         try:
-            # Parse cron expression
-            cron = croniter(job.cron_expression, job.last_run or current_time)
-            next_run = cron.get_next(dt.datetime)
-            
-            # Job cần chạy nếu:
-            # 1. Chưa chạy lần nào (last_run = None)
-            # 2. Hoặc đã đến thời gian chạy tiếp theo
-            if not job.last_run:
-                return True
-            
-            if current_time >= next_run:
-                return True
-                    
-            return False
-            
+            db.session.commit()
         except Exception as e:
-            logger.error(f"Error parsing cron expression for job {job.name}: {str(e)}")
-            return False
+            db.session.rollback()
+            logger.error(f"Error saving cron job schedule: {str(e)}")
+
+        for job in fired:
+            logger.info(f"Executing cron job: {job.name} (ID: {job.id})")
+            self._push(job.id, job.next_run)
+            self._enqueue(job.id, job.weevely_connection_id)
+
+        self.last_check = current_time
+
+    def _enqueue(self, job_id: int, connection_id: Optional[str]):
+        """Xếp job vào hàng đợi của connection, chỉ một job chạy mỗi connection"""
+        key = connection_id or f"job-{job_id}"
+        with self._queues_lock:
+            queue = self._queues.get(key)
+            if queue is not None:
+                # Connection đang bận, job đã chờ sẵn thì không xếp thêm lần nữa
+                if job_id not in queue:
+                    queue.append(job_id)
+                return
+            self._queues[key] = deque([job_id])
+        if self._executor:
+            self._executor.submit(self._drain_queue, key)
+
+    def _drain_queue(self, key: str):
+        """Chạy lần lượt các job của một connection cho tới khi hàng đợi rỗng"""
+        while True:
+            with self._queues_lock:
+                queue = self._queues.get(key)
+                if not queue:
+                    self._queues.pop(key, None)
+                    return
+                job_id = queue.popleft()
+            self._execute_job_safe(job_id)
             
     def _execute_job_safe(self, job_id: int):
         """Chạy job một cách an toàn với error handling"""
@@ -196,29 +323,38 @@ class WeevelyCronScheduler:
             
     def get_scheduler_status(self) -> Dict:
         """Lấy trạng thái của scheduler"""
+        with self._cond:
+            scheduled = dict(self._scheduled)
+        with self._queues_lock:
+            busy = len(self._queues)
+            queued = sum(len(q) for q in self._queues.values())
+        next_wakeup = min(scheduled.values()) if scheduled else None
+
+        status = {
+            'running': self.running,
+            'last_check': self.last_check.isoformat() if self.last_check else None,
+            'scheduled_jobs_count': len(scheduled),
+            'next_run': next_wakeup.isoformat() if next_wakeup else None,
+            'busy_connections': busy,
+            'queued_jobs': queued,
+            'max_workers': self.max_workers
+        }
         try:
             if self.app:
                 with self.app.app_context():
                     from apps.models import CronJob
-                    active_jobs = CronJob.get_active_jobs()
-                    
-                    return {
-                        'running': self.running,
-                        'last_check': self.last_check.isoformat() if self.last_check else None,
-                        'active_jobs_count': len(active_jobs),
+                    status.update({
+                        'active_jobs_count': CronJob.query.filter_by(is_active=True).count(),
                         'total_jobs_count': CronJob.query.count(),
-                        'check_interval_seconds': self.check_interval,
                         'app_context': 'Available'
-                    }
+                    })
             else:
-                return {
-                    'running': self.running,
-                    'last_check': self.last_check.isoformat() if self.last_check else None,
+                status.update({
                     'active_jobs_count': 0,
                     'total_jobs_count': 0,
-                    'check_interval_seconds': self.check_interval,
                     'app_context': 'Not Available'
-                }
+                })
+            return status
         except Exception as e:
             logger.error(f"Error getting scheduler status: {str(e)}")
             return {
@@ -250,7 +386,7 @@ class WeevelyCronScheduler:
                 
                 # Update statistics
                 job.run_count += 1
-                job.last_run = dt.datetime.utcnow()
+                job.last_run = self._now()
                 if result.get('success'):
                     job.success_count += 1
                 else:
@@ -316,6 +452,17 @@ def force_run_job(job_id: int):
     """Force run a specific cron job"""
     return cron_scheduler.force_run_job(job_id)
 
+def reschedule_job(job):
+    """Cập nhật lịch của job sau khi tạo/sửa/bật/tắt (gọi trong app context)"""
+    try:
+        cron_scheduler.reschedule(job)
+    except Exception as e:
+        logger.error(f"Failed to reschedule cron job {job.id}: {str(e)}")
+
+def unschedule_job(job_id: int):
+    """Bỏ job khỏi lịch sau khi xóa"""
+    cron_scheduler.unschedule(job_id)
+
 if __name__ == "__main__":
     # Test scheduler
     print("Starting Weevely Cron Scheduler...")
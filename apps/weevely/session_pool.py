@@ -0,0 +1,353 @@
+# apps/weevely/session_pool.py
+"""
+Persistent Weevely session pool
+
+Giữ các tiến trình `weevely.py worker <url> <password>` sống lâu, mỗi tiến
+trình sở hữu một Session/Channel và các module đã load sẵn. Nhờ vậy mỗi
+lệnh module chỉ tốn một round-trip HTTP thay vì khởi động interpreter,
+load toàn bộ module, đọc session YAML và probe shell lại từ đầu.
+
+Weevely giữ registry module và cấu hình ở mức global của process, nên mỗi
+(url, password) chạy trong một worker riêng thay vì chung một interpreter.
+
+Mỗi (url, password) chỉ có một worker: session trong bộ nhớ của worker (cwd
+của :file_cd, kết quả probe shell) là trạng thái của webshell, hai worker sẽ
+lệch nhau. Worker ghi session ra file sau mỗi lệnh nên worker bị kill vẫn
+giữ được trạng thái cho worker sau.
+"""
+
+import atexit
+import itertools
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+
+class WorkerError(Exception):
+    """Worker process died or replied with an unreadable frame"""
+
+
+class WeevelyWorker:
+    """One long-lived weevely worker process bound to a single agent"""
+
+    def __init__(self, weevely_path: str, url: str, password: str, start_timeout: float = 30):
+        self.url = url
+        self.password = password
+        self.created_at = time.time()
+        self.last_used = self.created_at
+        self.calls = 0
+
+        self._ids = itertools.count(1)
+        self._replies: queue.Queue = queue.Queue()
+        self._process = subprocess.Popen(
+            [sys.executable, weevely_path, 'worker', url, password],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1,
+            cwd=os.path.dirname(weevely_path),
+            env=os.environ.copy()
+        )
+        self._reader = threading.Thread(target=self._read_replies, daemon=True)
+        self._reader.start()
+
+        ready = self._next_reply(start_timeout)
+        if not ready.get('ready'):
+            self.close()
+            raise WorkerError('Weevely worker failed to start')
+
+    def _read_replies(self):
+        for line in self._process.stdout:
+            try:
+                self._replies.put(json.loads(line))
+            except ValueError:
+                continue
+        # EOF: wake up any waiting caller
+        self._replies.put(None)
+
+    def _next_reply(self, timeout: float) -> Dict:
+        try:
+            reply = self._replies.get(timeout=timeout)
+        except queue.Empty:
+            # The worker is stuck inside the command, it cannot be reused
+            self.kill()
+            raise subprocess.TimeoutExpired(self._process.args, timeout)
+        if reply is None:
+            self.close()
+            raise WorkerError('Weevely worker exited unexpectedly')
+        return reply
+
+    def _request(self, timeout: float, **request) -> Dict:
+        request_id = next(self._ids)
+        request['id'] = request_id
+        try:
+            self._process.stdin.write(json.dumps(request) + '\n')
+            self._process.stdin.flush()
+        except (BrokenPipeError, OSError, ValueError) as e:
+            self.close()
+            raise WorkerError(f'Weevely worker pipe closed: {e}')
+
+        # Replies are strictly ordered, skip anything left over from an
+        # earlier call that was abandoned
+        while True:
+            reply = self._next_reply(timeout)
+            if reply.get('id') == request_id:
+                return reply
+
+    def run(self, module_command: str, timeout: float) -> subprocess.CompletedProcess:
+        """Run a command, returning the same shape as `subprocess.run`"""
+        reply = self._request(timeout, op='run', cmd=module_command)
+        self.last_used = time.time()
+        self.calls += 1
+        return subprocess.CompletedProcess(
+            args=self._process.args + [module_command],
+            returncode=reply.get('returncode', 1),
+            stdout=reply.get('stdout', ''),
+            stderr=reply.get('stderr', '')
+        )
+
+    def ping(self, timeout: float = 5) -> bool:
+        try:
+            return bool(self._request(timeout, op='ping').get('ok'))
+        except (WorkerError, subprocess.TimeoutExpired):
+            return False
+
+    def is_alive(self) -> bool:
+        return self._process.poll() is None
+
+    def kill(self):
+        if self._process.poll() is None:
+            self._process.kill()
+            try:
+                self._process.wait(timeout=2)
+            except Exception:
+                pass
+
+    def close(self):
+        if self._process.poll() is not None:
+            return
+        try:
+            self._process.stdin.write(json.dumps({'op': 'exit'}) + '\n')
+            self._process.stdin.flush()
+            self._process.wait(timeout=2)
+        except Exception:
+            self.kill()
+
+
+class _PoolSlot:
+    """Workers belonging to one (url, password) key"""
+
+    def __init__(self):
+        self.idle: List[WeevelyWorker] = []
+        self.total = 0
+
+
+class WeevelySessionPool:
+    """
+    Pool các weevely worker theo (url, password)
+
+    - Một worker cho mỗi webshell, các lệnh cùng webshell chạy lần lượt
+    - Worker rảnh quá `idle_timeout` giây sẽ bị đóng
+    - Worker rảnh quá `health_check_interval` giây được ping trước khi dùng lại
+    """
+
+    def __init__(self,
+                 weevely_path: str,
+                 idle_timeout: float = 300,
+                 health_check_interval: float = 60,
+                 start_timeout: float = 30):
+        self.weevely_path = weevely_path
+        # session của webshell nằm trong bộ nhớ worker, không chia ra nhiều worker
+        self.max_workers_per_key = 1
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.start_timeout = start_timeout
+        self.logger = logging.getLogger(__name__)
+
+        self._slots: Dict[Tuple[str, str], _PoolSlot] = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stats = {'spawned': 0, 'reused': 0, 'evicted': 0, 'health_failures': 0}
+
+        self._reaper = threading.Thread(target=self._reap_idle, daemon=True)
+        self._reaper.start()
+
+    def _count(self, name: str):
+        with self._cond:
+            self._stats[name] += 1
+
+    def _acquire(self, key: Tuple[str, str], deadline: float, timeout: float) -> WeevelyWorker:
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise WorkerError('Session pool is closed')
+                slot = self._slots.setdefault(key, _PoolSlot())
+                if slot.idle:
+                    worker = slot.idle.pop()
+                    break
+                if slot.total < self.max_workers_per_key:
+                    slot.total += 1
+                    worker = None
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(key[0], timeout)
+                self._cond.wait(remaining)
+
+        if worker is not None:
+            if self._is_healthy(worker):
+                self._count('reused')
+                return worker
+            self._count('health_failures')
+            worker.close()
+
+        # Spawn outside the lock, the slot count is already reserved
+        try:
+            start_timeout = min(self.start_timeout, max(deadline - time.time(), 0))
+            worker = WeevelyWorker(self.weevely_path, key[0], key[1], start_timeout)
+        except Exception:
+            self._forget(key)
+            raise
+        self._count('spawned')
+        return worker
+
+    def _is_healthy(self, worker: WeevelyWorker) -> bool:
+        if not worker.is_alive():
+            return False
+        if time.time() - worker.last_used < self.health_check_interval:
+            return True
+        return worker.ping()
+
+    def _release(self, key: Tuple[str, str], worker: WeevelyWorker):
+        if not worker.is_alive():
+            self._forget(key)
+            return
+        with self._cond:
+            slot = self._slots.get(key)
+            if slot is not None and not self._closed:
+                slot.idle.append(worker)
+                self._cond.notify()
+                return
+        worker.close()
+
+    def _forget(self, key: Tuple[str, str]):
+        """Give back the slot of a worker that is gone"""
+        with self._cond:
+            slot = self._slots.get(key)
+            if slot:
+                slot.total -= 1
+                if not slot.total and not slot.idle:
+                    del self._slots[key]
+            self._cond.notify()
+
+    def execute(self, url: str, password: str, module_command: str, timeout: float = 60) -> subprocess.CompletedProcess:
+        """
+        Thực thi module command qua worker của webshell
+
+        Raises:
+            subprocess.TimeoutExpired: khi lệnh vượt quá timeout (worker bị kill)
+            WorkerError: khi worker không khởi động được hoặc chết giữa chừng
+        """
+        key = (url, password)
+        # Chờ worker, spawn và chạy lệnh dùng chung một deadline
+        deadline = time.time() + timeout
+        worker = self._acquire(key, deadline, timeout)
+        try:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(module_command, timeout)
+            return worker.run(module_command, remaining)
+        finally:
+            self._release(key, worker)
+
+    def health_check(self, url: str, password: str) -> bool:
+        """Ping mọi worker rảnh của một webshell, đóng worker không phản hồi"""
+        key = (url, password)
+        with self._cond:
+            slot = self._slots.get(key)
+            workers = list(slot.idle) if slot else []
+            if slot:
+                slot.idle.clear()
+
+        healthy = True
+        for worker in workers:
+            if worker.ping():
+                self._release(key, worker)
+            else:
+                healthy = False
+                self._count('health_failures')
+                worker.close()
+                self._forget(key)
+        return healthy
+
+    def evict(self, url: str, password: str):
+        """Đóng các worker rảnh của một webshell (vd: khi xoá connection)"""
+        key = (url, password)
+        with self._cond:
+            slot = self._slots.get(key)
+            workers = list(slot.idle) if slot else []
+            if slot:
+                slot.idle.clear()
+        for worker in workers:
+            worker.close()
+            self._forget(key)
+            self._count('evicted')
+
+    def _reap_idle(self):
+        while not self._closed:
+            time.sleep(min(self.idle_timeout, 30))
+            now = time.time()
+            expired = []
+            with self._cond:
+                for key, slot in self._slots.items():
+                    for worker in list(slot.idle):
+                        if now - worker.last_used > self.idle_timeout or not worker.is_alive():
+                            slot.idle.remove(worker)
+                            expired.append((key, worker))
+            for key, worker in expired:
+                worker.close()
+                self._forget(key)
+                self._count('evicted')
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {
+                **self._stats,
+                'keys': len(self._slots),
+                'workers': sum(slot.total for slot in self._slots.values()),
+                'idle_workers': sum(len(slot.idle) for slot in self._slots.values()),
+            }
+
+    def close_all(self):
+        with self._cond:
+            self._closed = True
+            workers = [w for slot in self._slots.values() for w in slot.idle]
+            self._slots.clear()
+            self._cond.notify_all()
+        for worker in workers:
+            worker.close()
+
+
+_pool: Optional[WeevelySessionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_session_pool(weevely_path: Optional[str] = None) -> WeevelySessionPool:
+    """Trả về session pool dùng chung trong process"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if not weevely_path:
+                weevely_path = os.path.join(
+                    os.path.dirname(os.path.abspath(__file__)), 'weevely3', 'weevely.py'
+                )
+            _pool = WeevelySessionPool(weevely_path)
+            atexit.register(_pool.close_all)
+        return _pool
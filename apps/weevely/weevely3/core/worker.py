@@ -0,0 +1,113 @@
+"""
+The module `core.worker` serves terminal commands over a pipe.
+
+A worker keeps one session, its channel and the loaded modules alive
+between commands, so that a caller pays the interpreter startup, module
+loading and shell probing only once per agent instead of once per command.
+The session file is saved after every command, like the one-shot CLI did
+at exit, so that a worker killed later does not lose the session state.
+
+Requests and replies are JSON objects, one per line:
+
+* `{"id": 1, "op": "run", "cmd": ":system_info"}` is answered with
+  `{"id": 1, "stdout": "...", "stderr": "...", "returncode": 0}`.
+* `{"id": 2, "op": "ping"}` is answered with `{"id": 2, "ok": true, ...}`
+  together with the connection counters of the channel transports.
+* `{"op": "exit"}` or EOF on the input stream terminates the worker.
+"""
+
+import contextlib
+import io
+import json
+import traceback
+
+from core.channels import transport
+from core.loggers import log, stream_handler
+from core.weexceptions import FatalException
+
+
+class Worker:
+
+    def __init__(self, terminal, instream, outstream):
+
+        self.terminal = terminal
+        self.instream = instream
+        self.outstream = outstream
+
+    def _reply(self, **data):
+
+        self.outstream.write(json.dumps(data) + '\n')
+        self.outstream.flush()
+
+    def run_command(self, line):
+        """Run a terminal line capturing what the one-shot CLI would print.
+
+        Module output printed with `print()` is collected as stdout, while
+        the log stream (normally stderr) is collected as stderr.
+        """
+
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        returncode = 0
+
+        previous_stream = stream_handler.setStream(stderr)
+        try:
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                try:
+                    self.terminal.precmd(line)
+                    self.terminal.onecmd(line)
+                except FatalException as e:
+                    log.critical('Exiting: %s' % e)
+                except Exception:
+                    traceback.print_exc()
+                    returncode = 1
+        finally:
+            stream_handler.setStream(previous_stream)
+
+        self.save_session()
+
+        return stdout.getvalue(), stderr.getvalue(), returncode
+
+    def save_session(self):
+
+        session = self.terminal.session
+        if not session.get('path'):
+            return
+
+        try:
+            session._session_save_atexit()
+        except Exception as e:
+            log.warning('Error saving session %s: %s' % (session.get('path'), e))
+
+    def serve(self):
+
+        self._reply(ready = True)
+
+        for raw in self.instream:
+
+            try:
+                request = json.loads(raw)
+            except ValueError:
+                continue
+
+            op = request.get('op')
+            request_id = request.get('id')
+
+            if op == 'exit':
+                break
+
+            if op == 'ping':
+                self._reply(
+                    id = request_id,
+                    ok = True,
+                    transports = transport.transports_stats()
+                )
+
+            elif op == 'run':
+                stdout, stderr, returncode = self.run_command(request.get('cmd', ''))
+                self._reply(
+                    id = request_id,
+                    stdout = stdout,
+                    stderr = stderr,
+                    returncode = returncode
+                )
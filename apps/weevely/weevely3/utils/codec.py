@@ -0,0 +1,126 @@
+"""
+Wire codec of the obfuscated channel.
+
+Requests are `base64(xor(zlib(payload), key))` and responses are decoded
+the other way round. The repeating-key XOR runs as one bulk operation on
+the whole buffer (numpy when available, big int arithmetic otherwise)
+instead of a byte-at-a-time generator, and compression and base64 are
+done in chunks so large transfers do not keep every intermediate copy
+alive at once. The output is byte-identical to the one-shot pipeline.
+"""
+
+import base64
+import binascii
+import string
+import zlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Must be a multiple of 3 so that base64 chunks concatenate cleanly
+CHUNK_SIZE = 3 * 256 * 1024
+
+_b64_alphabet = (string.ascii_letters + string.digits + '+/=').encode('ascii')
+
+
+def _keystream(key, length, offset = 0):
+
+    if isinstance(key, str):
+        key = key.encode('utf-8')
+
+    if not key:
+        return b''
+
+    offset %= len(key)
+    rotated = key[offset:] + key[:offset]
+
+    return (rotated * (length // len(rotated) + 1))[:length]
+
+
+def xor(data, key, offset = 0):
+    """XOR `data` with the repeating `key`, starting at key position `offset`."""
+
+    length = len(data)
+    # like zip() with itertools.cycle(), an empty key gives an empty result
+    if not length or not key:
+        return bytearray()
+
+    stream = _keystream(key, length, offset)
+
+    if numpy is not None:
+        return bytearray(numpy.bitwise_xor(
+            numpy.frombuffer(data, dtype = numpy.uint8),
+            numpy.frombuffer(stream, dtype = numpy.uint8)
+        ).tobytes())
+
+    return bytearray((
+        int.from_bytes(data, 'little') ^ int.from_bytes(stream, 'little')
+    ).to_bytes(length, 'little'))
+
+
+def encode(payload, key, chunk_size = CHUNK_SIZE):
+    """Return `base64(xor(zlib.compress(payload), key))`."""
+
+    compressor = zlib.compressobj()
+    view = memoryview(payload)
+    encoded = []
+    pending = bytearray()
+    offset = 0
+
+    def push(compressed):
+        nonlocal offset
+
+        if not compressed:
+            return
+
+        pending.extend(xor(compressed, key, offset))
+        offset += len(compressed)
+
+        # Encode only whole 3-byte groups, keep the rest for the next chunk
+        cut = len(pending) - len(pending) % 3
+        if cut:
+            encoded.append(base64.b64encode(pending[:cut]))
+            del pending[:cut]
+
+    for start in range(0, len(view), chunk_size):
+        push(compressor.compress(view[start:start + chunk_size]))
+    push(compressor.flush())
+
+    encoded.append(base64.b64encode(pending))
+
+    return b''.join(encoded)
+
+
+def _b64_chunks(data, chunk_size):
+
+    # Chunked decoding is only safe on clean, padded base64. Anything
+    # else is left to the lenient one-shot decoder.
+    if len(data) % 4 or data.translate(None, _b64_alphabet):
+        yield base64.b64decode(data)
+        return
+
+    step = chunk_size // 3 * 4
+    view = memoryview(data)
+    for start in range(0, len(view), step):
+        yield binascii.a2b_base64(view[start:start + step])
+
+
+def decode(data, key, chunk_size = CHUNK_SIZE):
+    """Return `zlib.decompress(xor(base64decode(data), key))`."""
+
+    decompressor = zlib.decompressobj()
+    decoded = []
+    offset = 0
+
+    for chunk in _b64_chunks(bytes(data), chunk_size):
+        decoded.append(decompressor.decompress(xor(chunk, key, offset)))
+        offset += len(chunk)
+
+    decoded.append(decompressor.flush())
+
+    if not decompressor.eof:
+        raise zlib.error('Error -5 while decompressing data: incomplete or truncated stream')
+
+    return b''.join(decoded)
@@ -2,6 +2,8 @@ import random
 import string
 import itertools
 
+from . import codec
+
 str2hex = lambda x: "\\x" + "\\x".join([hex(ord(c))[2:].zfill(2) for c in x])
 
 def randstr(n=4, fixed=True, charset=None):
@@ -29,10 +31,7 @@ def divide(data, min_size, max_size, split_size):
     yield bytearray(it)
 
 def sxor(s1, s2):
-    return bytearray(
-        a ^ b
-        for a, b in zip(s1, itertools.cycle(s2))
-    )
+    return codec.xor(s1, s2)
 
 def pollute(data, charset, frequency=0.3):
 
@@ -12,6 +12,7 @@ from core.config import agent_templates_folder_path, obfuscators_templates_folde
 from core.loggers import log, dlog
 from core.sessions import SessionURL, SessionFile
 from core.terminal import Terminal
+from core.worker import Worker
 from core.weexceptions import FatalException, ArgparseError
 
 if sys.stdout.encoding is None:
@@ -50,6 +51,21 @@ def main(arguments):
     elif arguments.command == 'session':
         session = SessionFile(arguments.path)
 
+    elif arguments.command == 'worker':
+        # Keep the real stdout for the reply stream, anything else
+        # printed outside a command goes to stderr.
+        replies = sys.stdout
+        sys.stdout = sys.stderr
+
+        session = SessionURL(
+            url = arguments.url,
+            password = arguments.password
+        )
+        modules.load_modules(session)
+
+        Worker(Terminal(session), sys.stdin, replies).serve()
+        return
+
     dlog.debug(
         pprint.pformat(session)
     )
@@ -77,6 +93,10 @@ if __name__ == '__main__':
     sessionparser.add_argument('path', help = 'Session file path')
     sessionparser.add_argument('cmd', help = 'Command', nargs='?')
 
+    workerparser = subparsers.add_parser('worker', help='Serve commands on stdin for a persistent caller')
+    workerparser.add_argument('url', help = 'The agent URL')
+    workerparser.add_argument('password', help = 'The agent password')
+
     agents_available = [
         os.path.split(agent)[1].split('.')[0] for agent in
         glob.glob('%s/*.tpl' % agent_templates_folder_path)
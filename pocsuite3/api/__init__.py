@@ -59,6 +59,10 @@ def get_results():
     return kb.results
 
 
+def get_scheduler_stats():
+    return kb.scheduler.stats() if kb.scheduler else None
+
+
 def init_pocsuite(options):
     init_options(options)
     init()
@@ -1,5 +1,6 @@
-import copy
+import threading
 import time
+from queue import Empty
 
 from pocsuite3.lib.core.common import data_to_stdout, desensitization
 from pocsuite3.lib.core.data import conf, cmd_line_options
@@ -8,13 +9,20 @@ from pocsuite3.lib.core.data import logger
 from pocsuite3.lib.core.datatype import AttribDict
 from pocsuite3.lib.core.exception import PocsuiteValidationException, PocsuiteSystemException
 from pocsuite3.lib.core.poc import Output
-from pocsuite3.lib.core.settings import CMD_PARSE_WHITELIST
+from pocsuite3.lib.core.scheduler import TaskScheduler
+from pocsuite3.lib.core.settings import CMD_PARSE_WHITELIST, SCHEDULER_STATS_INTERVAL
+from pocsuite3.lib.core.task_source import TaskFeeder, count_targets
 from pocsuite3.lib.core.threads import run_threads
+from pocsuite3.lib.request.patch.session_pool import session_pool
 from pocsuite3.modules.listener import handle_listener_connection
 from pocsuite3.modules.listener.reverse_tcp import handle_listener_connection_for_console
 from pocsuite3.thirdparty.prettytable.prettytable import PrettyTable
 
 
+# guards kb.prepared_pocs, task threads prepare the same PoC concurrently
+_prepared_lock = threading.Lock()
+
+
 def runtime_check():
     if not kb.registered_pocs:
         error_msg = "no PoC loaded, please check your PoC file"
@@ -24,15 +32,40 @@ def runtime_check():
 
 def start():
     runtime_check()
-    tasks_count = kb.task_queue.qsize()
+    # options are applied again for every run, the PoC or cmd_line_options may have changed
+    kb.prepared_pocs = set()
+    feeder = None
+    if kb.lazy_tasks:
+        targets_count = count_targets()
+        tasks_count = targets_count * len(kb.registered_pocs) if targets_count is not None else "unknown"
+        feeder = TaskFeeder(kb.task_cursor.load() if kb.task_cursor else 0)
+        feeder.start()
+    else:
+        tasks_count = kb.task_queue.qsize()
     info_msg = "pocsusite got a total of {0} tasks".format(tasks_count)
     logger.info(info_msg)
     logger.debug("pocsuite will open {} threads".format(conf.threads))
 
+    # kept in kb after the scan, stats() stays readable for api callers
+    kb.scheduler = TaskScheduler(conf.threads, conf.host_rate, conf.host_concurrency)
+    kb.session_pool_stats = session_pool.stats()
+    if conf.threads > 1 and not conf.quiet:
+        kb.scheduler.start_reporter(SCHEDULER_STATS_INTERVAL)
     try:
         run_threads(conf.threads, task_run)
         logger.info("Scan completed,ready to print")
     finally:
+        kb.scheduler.stop_reporter()
+        if feeder is not None:
+            feeder.stop()
+            if kb.task_cursor:
+                if feeder.exhausted and kb.task_cursor.position >= feeder.generated:
+                    kb.task_cursor.clear()
+                else:
+                    kb.task_cursor.flush()
+                    logger.info("scan interrupted, resume file '{0}' saved at task {1}".format(
+                        kb.task_cursor.filename, kb.task_cursor.position))
+            kb.lazy_tasks = False
         task_done()
 
     if conf.mode == "shell" and not conf.api:
@@ -87,94 +120,154 @@ def show_task_result():
     data_to_stdout('\n{0}'.format(results_table.get_string(sortby="status", reversesort=True)))
     data_to_stdout("\nsuccess : {} / {}\n".format(success_num, total_num))
 
+    usage = connection_usage()
+    if usage["requests"]:
+        data_to_stdout("connections : {connections} opened ({tls_handshakes} TLS handshakes) for {requests} requests, "
+                       "{reused} reused\n".format(**usage))
 
-def task_run():
-    while not kb.task_queue.empty() and kb.thread_continue:
-        target, poc_module = kb.task_queue.get()
-        if not conf.console_mode:
-            poc_module = copy.deepcopy(kb.registered_pocs[poc_module])
-        poc_name = poc_module.name
-
-        # for hide some infomations
-        if conf.ppt:
-            info_msg = "running poc:'{0}' target '{1}'".format(poc_name, desensitization(target))
-        else:
-            info_msg = "running poc:'{0}' target '{1}'".format(poc_name, target)
 
-        logger.info(info_msg)
+def connection_usage():
+    """
+    sockets opened and reused by the pooled requests calls during the last scan
+    :return:
+    """
+    before = kb.session_pool_stats or {}
+    now = session_pool.stats()
+    return {key: now[key] - before.get(key, 0) for key in ("connections", "tls_handshakes", "requests", "reused")}
 
-        # hand user define parameters
-        if hasattr(poc_module, "_options"):
-            for item in kb.cmd_line:
-                value = cmd_line_options.get(item, "")
-                if item in poc_module.options:
-                    poc_module.set_option(item, value)
-                    info_msg = "Parameter {0} => {1}".format(item, value)
-                    logger.info(info_msg)
-            # check must be option
-            for opt, v in poc_module.options.items():
-                # check conflict in whitelist
-                if opt in CMD_PARSE_WHITELIST:
-                    info_msg = "Poc:'{0}' You can't customize this variable '{1}' because it is already taken up by the pocsuite.".format(
-                        poc_name, opt)
-                    logger.error(info_msg)
-                    raise SystemExit
-
-                if v.require and v.value == "":
-                    info_msg = "Poc:'{poc}' Option '{key}' must be set,please add parameters '--{key}'".format(
-                        poc=poc_name, key=opt)
-                    logger.error(info_msg)
-                    raise SystemExit
 
-        try:
-            result = poc_module.execute(target, headers=conf.http_headers, mode=conf.mode, verbose=False)
-        except PocsuiteValidationException as ex:
-            info_msg = "Poc:'{}' PocsuiteValidationException:{}".format(poc_name, ex)
-            logger.error(info_msg)
-            result = None
-
-        if not isinstance(result, Output) and not None:
-            _result = Output(poc_module)
-            if result:
-                if isinstance(result, bool):
-                    _result.success({})
-                elif isinstance(result, str):
-                    _result.success({"Info": result})
-                elif isinstance(result, dict):
-                    _result.success(result)
-                else:
-                    _result.success({"Info": repr(result)})
-            else:
-                _result.fail('target is not vulnerable')
+def prepare_poc(poc_module):
+    """
+    apply user defined parameters to a registered poc, once per poc
+    :return:
+    """
+    with _prepared_lock:
+        # kb.registered_pocs keeps the instances alive during the run, so ids are not reused
+        if id(poc_module) in kb.prepared_pocs:
+            return
+        apply_cmd_line_options(poc_module)
+        kb.prepared_pocs.add(id(poc_module))
 
-            result = _result
 
-        if not result:
-            continue
+def apply_cmd_line_options(poc_module):
+    """
+    hand user define parameters and check must be option
+    :return:
+    """
+    poc_name = poc_module.name
+    if hasattr(poc_module, "_options"):
+        for item in kb.cmd_line:
+            value = cmd_line_options.get(item, "")
+            if item in poc_module.options:
+                poc_module.set_option(item, value)
+                info_msg = "Parameter {0} => {1}".format(item, value)
+                logger.info(info_msg)
+        # check must be option
+        for opt, v in poc_module.options.items():
+            # check conflict in whitelist
+            if opt in CMD_PARSE_WHITELIST:
+                info_msg = "Poc:'{0}' You can't customize this variable '{1}' because it is already taken up by the pocsuite.".format(
+                    poc_name, opt)
+                logger.error(info_msg)
+                raise SystemExit
+
+            if v.require and v.value == "":
+                info_msg = "Poc:'{poc}' Option '{key}' must be set,please add parameters '--{key}'".format(
+                    poc=poc_name, key=opt)
+                logger.error(info_msg)
+                raise SystemExit
 
-        if not conf.quiet:
-            result.show_result()
 
-        result_status = "success" if result.is_success() else "failed"
-        if result_status == "success" and kb.comparison:
-            kb.comparison.change_success(target, True)
+def task_run():
+    scheduler = kb.scheduler
+    while kb.thread_continue:
+        try:
+            # blocks while the feeder is still producing tasks or every host is throttled
+            item, host = scheduler.get()
+        except Empty:
+            break
 
-        output = AttribDict(result.to_dict())
-        if conf.ppt:
-            # hide some information
-            target = desensitization(target)
+        if len(item) > 2:
+            seq, target, poc_module = item
+        else:
+            seq = None
+            target, poc_module = item
+        started = time.time()
+        try:
+            run_task(target, poc_module)
+        finally:
+            scheduler.release(host, started)
+            if seq is not None and kb.task_cursor:
+                kb.task_cursor.done(seq)
+
+
+def run_task(target, poc_module):
+    if not conf.console_mode:
+        poc_module = kb.registered_pocs[poc_module]
+        prepare_poc(poc_module)
+        # small per-task context instead of a deepcopy of the whole poc
+        poc_module = poc_module.new_task()
+    else:
+        apply_cmd_line_options(poc_module)
+    poc_name = poc_module.name
+
+    # for hide some infomations
+    if conf.ppt:
+        info_msg = "running poc:'{0}' target '{1}'".format(poc_name, desensitization(target))
+    else:
+        info_msg = "running poc:'{0}' target '{1}'".format(poc_name, target)
 
-        output.update({
-            'target': target,
-            'poc_name': poc_name,
-            'created': time.strftime("%Y-%m-%d %X", time.localtime()),
-            'status': result_status
-        })
-        result_plugins_handle(output)
-        kb.results.append(output)
+    logger.info(info_msg)
+
+    try:
+        result = poc_module.execute(target, headers=conf.http_headers, mode=conf.mode, verbose=False)
+    except PocsuiteValidationException as ex:
+        info_msg = "Poc:'{}' PocsuiteValidationException:{}".format(poc_name, ex)
+        logger.error(info_msg)
+        result = None
+
+    if not isinstance(result, Output) and not None:
+        _result = Output(poc_module)
+        if result:
+            if isinstance(result, bool):
+                _result.success({})
+            elif isinstance(result, str):
+                _result.success({"Info": result})
+            elif isinstance(result, dict):
+                _result.success(result)
+            else:
+                _result.success({"Info": repr(result)})
+        else:
+            _result.fail('target is not vulnerable')
+
+        result = _result
+
+    if not result:
+        return
 
-        # TODO
-        # set task delay
+    if not conf.quiet:
+        result.show_result()
+
+    result_status = "success" if result.is_success() else "failed"
+    if result_status == "success" and kb.comparison:
+        kb.comparison.change_success(target, True)
+
+    output = AttribDict(result.to_dict())
+    if conf.ppt:
+        # hide some information
+        target = desensitization(target)
+
+    output.update({
+        'target': target,
+        'poc_name': poc_name,
+        'created': time.strftime("%Y-%m-%d %X", time.localtime()),
+        'status': result_status
+    })
+    result_plugins_handle(output)
+    kb.results.append(output)
+
+    # TODO
+    # set task delay
 
 
 def result_plugins_start():
@@ -103,6 +103,8 @@ def set_paths(root_path):
     paths.POCSUITE_CONSOLE_HISTORY = os.path.join(_, "console.hst")
 
     paths.POCSUITE_TMP_PATH = os.path.join(_, "tmp")
+    paths.POCSUITE_POC_INDEX = os.path.join(_, "poc_index.db")
+    paths.POCSUITE_BYTECODE_PATH = os.path.join(_, "bytecode")
     paths.POCSUITE_RC_PATH = os.path.join(paths.POCSUITE_HOME_PATH, ".pocsuiterc")
     paths.POCSUITE_OUTPUT_PATH = paths.get("POCSUITE_OUTPUT_PATH", os.path.join(_, "output"))
     paths.SHELLCODES_DEV_PATH = os.path.join(paths.POCSUITE_ROOT_PATH, "shellcodes", "tools")
@@ -373,6 +375,26 @@ def get_file_items(filename, comment_prefix='#', unicode_=True, lowercase=False,
     return ret if not unique else ret.keys()
 
 
+def iter_file_items(filename, comment_prefix='#'):
+    """ Like get_file_items, but reads the file lazily (no unique/lowercase support) """
+    check_file(filename)
+
+    try:
+        with open(filename, 'r') as f:
+            for line in f:
+                if comment_prefix and line.find(comment_prefix) != -1:
+                    line = line[:line.find(comment_prefix)]
+
+                line = line.strip()
+                if line:
+                    yield line
+
+    except (IOError, OSError) as ex:
+        err_msg = "something went wrong while trying "
+        err_msg += "to read the content of file '{0}' ('{1}')".format(filename, ex)
+        raise PocsuiteSystemException(err_msg)
+
+
 def parse_target(address):
     target = None
     if is_domain_format(address) \
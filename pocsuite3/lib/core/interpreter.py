@@ -13,6 +13,7 @@ from pocsuite3.lib.core.common import banner, index_modules, data_to_stdout, hum
 from pocsuite3.lib.core.data import logger, paths, kb, conf
 from pocsuite3.lib.core.enums import POC_CATEGORY, AUTOCOMPLETE_TYPE
 from pocsuite3.lib.core.exception import PocsuiteBaseException, PocsuiteShellQuitException
+from pocsuite3.lib.core.poc_index import PocIndex
 from pocsuite3.lib.core.option import _set_listener, _set_http_referer, _set_http_user_agent, _set_network_proxy, \
     _set_network_timeout
 from pocsuite3.lib.core.register import load_file_to_module
@@ -164,6 +165,9 @@ class PocsuiteInterpreter(BaseInterpreter):
     attack                              Attack target and return target vulnerable infomation
     exploit                             Get a shell from remote target"""
 
+    # seconds between stat checks of the PoC files behind the metadata index
+    POC_INDEX_REFRESH_INTERVAL = 30
+
     def __init__(self):
         super(PocsuiteInterpreter, self).__init__()
 
@@ -179,15 +183,21 @@ class PocsuiteInterpreter(BaseInterpreter):
         self.module_commands.extend(self.global_commands)
         self.module_commands.sort()
 
-        self.modules = index_modules()
-        self.modules_count = len(self.modules)
+        self.last_search = []
+        self.last_ip = []
+        self.poc_index = PocIndex(paths.POCSUITE_POC_INDEX)
+        self.refresh_modules()
         # init
         conf.console_mode = True
         banner()
         logger.info("Load Pocs :{}".format(self.modules_count))
 
-        self.last_search = []
-        self.last_ip = []
+        self.__parse_prompt()
+
+    def refresh_modules(self):
+        """ Re-list the PoC files and update the metadata index for changed ones """
+        self.modules = index_modules()
+        self.modules_count = len(self.modules)
         self.main_modules_dirs = []
         for module in self.modules:
             temp_module = module
@@ -196,8 +206,7 @@ class PocsuiteInterpreter(BaseInterpreter):
                 temp_module = temp_module.replace(paths.POCSUITE_ROOT_PATH, "").lstrip("\\")
             temp_module = temp_module.replace(paths.POCSUITE_ROOT_PATH, "").lstrip("/")
             self.main_modules_dirs.append(temp_module)
-
-        self.__parse_prompt()
+        self.poc_index.sync(paths.POCSUITE_ROOT_PATH, self.main_modules_dirs, self.parse_poc_metadata)
     
     def __parse_prompt(self):
         raw_prompt_default_template = "\001\033[4m\002{host}\001\033[0m\002 > "
@@ -494,29 +503,27 @@ class PocsuiteInterpreter(BaseInterpreter):
                 return m2.group(1)
         return vultype
 
+    def parse_poc_metadata(self, code):
+        name = get_poc_name(code)
+        appname=get_poc_appname(code)
+        appversion=get_poc_appversion(code)
+        #Mlemkem đã fix ở đây
+        author=get_poc_author(code)
+        references=get_poc_references(code)
+        vulType=self.fast_vultype_from_code(code)
+        #vulType = get_poc_vulType(code)
+        return {"appname":appname,"name":name,"appversion":appversion,
+                "author":author, "references":references, "vulType":vulType}
+
     def get_all_modules(self):
          # 展现所有可用的poc
-        search_result = []
-        #tmp_module: Path to module
-        #Name: Name of module 
-        for tmp_module in self.main_modules_dirs:
-            found = os.path.join(paths.POCSUITE_ROOT_PATH, tmp_module + ".py")
-            with open(found, encoding='utf-8') as f:
-                code = f.read()
-            name = get_poc_name(code)
-            appname=get_poc_appname(code)
-            appversion=get_poc_appversion(code)
-            #Mlemkem đã fix ở đây
-            author=get_poc_author(code)
-            references=get_poc_references(code)
-            vulType=self.fast_vultype_from_code(code)
-            #vulType = get_poc_vulType(code)
-            item={"appname":appname,"name":name,"appversion":appversion,"path":tmp_module,
-                  "author":author, "references":references, "vulType":vulType}
-            search_result.append(item)
+        # Metadata lấy từ PocIndex, chỉ parse lại các file PoC đã thay đổi
+        if self.poc_index.is_stale(self.POC_INDEX_REFRESH_INTERVAL):
+            self.refresh_modules()
         #self.last_search lưu dữ liệu để tìm kiếm POC theo Index
         self.last_search.clear()
-        return search_result
+        return self.poc_index.all()
+
     def get_info_module(self):
         fields = ["name", "VulID", "version", "author", "vulDate", "createDate", "updateDate", "references",
                   "appPowerLink", "appName", "appVersion", "vulType", "desc"]
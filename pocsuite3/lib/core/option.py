@@ -8,7 +8,7 @@ from queue import Queue
 from urllib.parse import urlsplit
 
 from pocsuite3.lib.core.clear import remove_extra_log_message
-from pocsuite3.lib.core.common import boldify_message, check_file, get_file_items, parse_target, \
+from pocsuite3.lib.core.common import boldify_message, check_file, parse_target, \
     get_public_type_members, data_to_stdout
 from pocsuite3.lib.core.common import check_path, extract_cookies
 from pocsuite3.lib.core.common import get_local_ip, desensitization
@@ -24,8 +24,10 @@ from pocsuite3.lib.core.enums import HTTP_HEADER, CUSTOM_LOGGING, PROXY_TYPE
 from pocsuite3.lib.core.exception import PocsuiteSyntaxException, PocsuiteSystemException, PocsuiteHeaderTypeException
 from pocsuite3.lib.core.log import FORMATTER
 from pocsuite3.lib.core.register import load_file_to_module
-from pocsuite3.lib.core.settings import DEFAULT_USER_AGENT, DEFAULT_LISTENER_PORT, CMD_PARSE_WHITELIST
+from pocsuite3.lib.core.settings import DEFAULT_USER_AGENT, DEFAULT_LISTENER_PORT, CMD_PARSE_WHITELIST, \
+    TASK_QUEUE_SIZE_PER_THREAD
 from pocsuite3.lib.core.statistics_comparison import StatisticsComparison
+from pocsuite3.lib.core.task_source import TaskCursor, file_target_source, tasks_fingerprint
 from pocsuite3.lib.core.update import update
 from pocsuite3.lib.parse.cmd import DIY_OPTIONS
 from pocsuite3.lib.parse.configfile import config_file_parser
@@ -219,8 +221,8 @@ def _set_multiple_targets():
             kb.targets.add(target)
 
     if conf.url_file:
-        for line in get_file_items(conf.url_file, lowercase=False, unique=True):
-            kb.targets.add(line)
+        # read lazily while the tasks are queued
+        file_target_source(conf.url_file)
 
     if conf.dork:
         # enable plugin 'target_from_zoomeye' by default
@@ -241,10 +243,11 @@ def _set_multiple_targets():
 
 
 def _set_task_queue():
-    if kb.registered_pocs and kb.targets:
-        for poc_module in kb.registered_pocs:
-            for target in kb.targets:
-                kb.task_queue.put((target, poc_module))
+    # tasks are generated by a TaskFeeder into a bounded queue when the scan starts
+    kb.task_queue = Queue(maxsize=max(conf.threads, 1) * TASK_QUEUE_SIZE_PER_THREAD)
+    kb.lazy_tasks = bool(kb.registered_pocs and (kb.targets or kb.target_sources))
+    if kb.lazy_tasks and conf.resume:
+        kb.task_cursor = TaskCursor(conf.resume, tasks_fingerprint())
 
 
 def _check_account_login():
@@ -274,6 +277,10 @@ def _check_zoomeye():
 def _set_threads():
     if not isinstance(conf.threads, int) or conf.threads <= 0:
         conf.threads = 1
+    if not isinstance(conf.host_rate, (int, float)) or conf.host_rate < 0:
+        conf.host_rate = 0
+    if not isinstance(conf.host_concurrency, int) or conf.host_concurrency < 0:
+        conf.host_concurrency = 0
 
 
 def _set_connect_back():
@@ -519,6 +526,9 @@ def _set_conf_attributes():
     conf.ssvid = None
     conf.plugins = []
     conf.threads = 1
+    conf.host_rate = 0
+    conf.host_concurrency = 0
+    conf.resume = None
     conf.batch = False
     conf.check_requires = False
     conf.quiet = False
@@ -572,6 +582,12 @@ def _set_kb_attributes(flush_all=True):
     kb.data.connect_back_port = DEFAULT_LISTENER_PORT
     kb.data.clients = []
     kb.targets = OrderedSet()
+    kb.target_sources = []
+    kb.lazy_tasks = False
+    kb.task_feeding = False
+    kb.task_cursor = None
+    kb.scheduler = None
+    kb.session_pool_stats = None
     kb.plugins = AttribDict()
     kb.plugins.targets = AttribDict()
     kb.plugins.pocs = AttribDict()
@@ -579,6 +595,7 @@ def _set_kb_attributes(flush_all=True):
     kb.results = []
     kb.current_poc = None
     kb.registered_pocs = AttribDict()
+    kb.prepared_pocs = set()
     kb.task_queue = Queue()
     kb.cmd_line = DIY_OPTIONS or []
 
@@ -43,6 +43,9 @@ optDict = {
         'plugins': 'string',
         'pocs_path': 'string',
         'threads': 'integer',
+        'host_rate': 'float',
+        'host_concurrency': 'integer',
+        'resume': 'string',
         'batch': 'string',
         'check_requires': 'boolean',
         'quiet': 'boolean'
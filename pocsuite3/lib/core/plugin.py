@@ -28,6 +28,12 @@ class PluginBase(object):
 
         return ret
 
+    def add_target_source(self, description, factory, count=None):
+        """ Register targets produced lazily by factory(), see task_source.add_target_source """
+        from pocsuite3.lib.core.task_source import add_target_source
+        add_target_source(description, factory, count)
+        return True
+
     def add_poc(self, poc, fullname=None):
         ret = False
         poc = self.format_poc(poc)
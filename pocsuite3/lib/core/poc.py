@@ -1,3 +1,4 @@
+import copy
 import re
 import traceback
 from collections import OrderedDict
@@ -58,6 +59,38 @@ class POCBase(object):
         if hasattr(self, "_options"):
             self.options.update(self._options())
 
+        # set on per-task contexts created by new_task()
+        self._owned_options = None
+
+    def new_task(self):
+        """ Per-task context for this PoC, used instead of copy.deepcopy
+
+        The context is an instance of the PoC class sharing this (registered)
+        instance's attributes through a shallow copy of __dict__, so execute()
+        only writes target, url, headers, params, mode and result state on the
+        context. Option dicts and Option objects stay shared until the task
+        sets one (e.g. build_url() setting rhost/rport), then that dict and
+        option are copied for the task only.
+        """
+        task = object.__new__(self.__class__)
+        task.__dict__.update(self.__dict__)
+        task._owned_options = set()
+        return task
+
+    def _writable_option(self, attr, key):
+        options = getattr(self, attr)
+        if key not in options:
+            raise PocsuiteValidationException("No key " + key)
+        owned = getattr(self, "_owned_options", None)
+        if owned is not None:
+            # copy-on-write on a task context
+            if attr not in owned:
+                options = OrderedDict(options)
+                setattr(self, attr, options)
+                owned.add(attr)
+            options[key] = copy.copy(options[key])
+        return options[key]
+
     def get_options(self):
         tmp = OrderedDict()
         for k, v in self.options.items():
@@ -119,19 +152,13 @@ class POCBase(object):
     def set_option(self, key, value):
         # if not hasattr(self, 'options'):
         #     self.options = {}
-        if key not in self.options:
-            raise PocsuiteValidationException("No key " + key)
-        self.options[key].__set__("", value)
+        self._writable_option("options", key).__set__("", value)
 
     def setg_option(self, key, value):
-        if key not in self.global_options:
-            raise PocsuiteValidationException("No key " + key)
-        self.global_options[key].__set__("", value)
+        self._writable_option("global_options", key).__set__("", value)
 
     def setp_option(self, key, value):
-        if key not in self.payload_options:
-            raise PocsuiteValidationException("No key " + key)
-        self.payload_options[key].__set__("", value)
+        self._writable_option("payload_options", key).__set__("", value)
 
     def check_requirement(self, *args):
         for option in args:
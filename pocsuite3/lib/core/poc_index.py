@@ -0,0 +1,143 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from pocsuite3.lib.core.data import logger
+
+
+class PocIndex(object):
+    """ Persistent PoC metadata index (SQLite sidecar)
+
+    Every PoC is stored with the mtime, size and sha1 of its source, so a sync
+    only stats the files and re-parses the ones whose content changed. Each
+    change bumps a generation counter stored in the database; listing returns
+    an in-memory copy until the generation changes, so interpreters sharing
+    the same database see each other's updates.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._generation = None
+        self._synced_at = 0
+        self._cache = None
+        self._cache_generation = None
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir and not os.path.isdir(db_dir):
+            os.makedirs(db_dir)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS poc_meta ("
+                "path TEXT PRIMARY KEY, mtime REAL, size INTEGER, sha1 TEXT, "
+                "name TEXT, appname TEXT, appversion TEXT, author TEXT, "
+                "refs TEXT, vultype TEXT)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS poc_index_state (key TEXT PRIMARY KEY, value INTEGER)")
+            conn.execute("INSERT OR IGNORE INTO poc_index_state VALUES ('generation', 0)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _read_generation(conn):
+        return conn.execute("SELECT value FROM poc_index_state WHERE key = 'generation'").fetchone()[0]
+
+    def _upsert(self, conn, module, st, sha1, meta):
+        conn.execute(
+            "INSERT OR REPLACE INTO poc_meta VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (module, st.st_mtime, st.st_size, sha1,
+             meta.get("name"), meta.get("appname"), meta.get("appversion"),
+             meta.get("author"), meta.get("references"), meta.get("vulType")))
+
+    def sync(self, root_path, modules, parser):
+        """ Bring the index in line with the PoC files on disk
+
+        :param root_path: directory the module paths are relative to
+        :param modules: module paths without the .py suffix
+        :param parser: callable(code) -> dict with name, appname, appversion, author, references and vulType
+        :return: number of PoCs (re)parsed
+        """
+        parsed = 0
+        with self._lock, self._connect() as conn:
+            known = {row[0]: row[1:] for row in conn.execute("SELECT path, mtime, size, sha1 FROM poc_meta")}
+            changed = False
+
+            for module in modules:
+                filename = os.path.join(root_path, module + ".py")
+                try:
+                    st = os.stat(filename)
+                except OSError:
+                    continue
+                row = known.get(module)
+                if row and row[0] == st.st_mtime and row[1] == st.st_size:
+                    continue
+
+                try:
+                    with open(filename, "rb") as f:
+                        raw = f.read()
+                except OSError as ex:
+                    logger.warning("Unable to read poc '{}': {}".format(filename, ex))
+                    continue
+                sha1 = hashlib.sha1(raw).hexdigest()
+                if row and row[2] == sha1:
+                    # touched but not modified
+                    conn.execute("UPDATE poc_meta SET mtime = ?, size = ? WHERE path = ?",
+                                 (st.st_mtime, st.st_size, module))
+                    continue
+
+                try:
+                    meta = parser(raw.decode("utf-8", errors="replace"))
+                except Exception as ex:
+                    # still listed, without metadata, instead of breaking the whole sync
+                    logger.warning("Unable to parse poc '{}': {}".format(filename, ex))
+                    meta = {}
+                self._upsert(conn, module, st, sha1, meta)
+                parsed += 1
+                changed = True
+
+            removed = set(known) - set(modules)
+            if removed:
+                conn.executemany("DELETE FROM poc_meta WHERE path = ?", [(m,) for m in removed])
+                changed = True
+
+            if changed:
+                conn.execute("UPDATE poc_index_state SET value = value + 1 WHERE key = 'generation'")
+            self._generation = self._read_generation(conn)
+            self._synced_at = time.time()
+
+        if parsed or removed:
+            logger.debug("PoC index: {} parsed, {} removed".format(parsed, len(removed)))
+        return parsed
+
+    def is_stale(self, max_age):
+        """ True when another process changed the index, or the last sync is older than max_age seconds """
+        if self._generation is None or time.time() - self._synced_at > max_age:
+            return True
+        with self._connect() as conn:
+            return self._read_generation(conn) != self._generation
+
+    def all(self):
+        """ All indexed PoCs ordered by path, as the dicts returned by get_all_modules """
+        with self._lock:
+            if self._cache is None or self._cache_generation != self._generation:
+                with self._connect() as conn:
+                    rows = conn.execute(
+                        "SELECT path, name, appname, appversion, author, refs, vultype "
+                        "FROM poc_meta ORDER BY path").fetchall()
+                self._cache = [
+                    {"appname": appname, "name": name, "appversion": appversion, "path": path,
+                     "author": author, "references": refs, "vulType": vultype or ""}
+                    for path, name, appname, appversion, author, refs, vultype in rows
+                ]
+                self._cache_generation = self._generation
+            return [dict(item) for item in self._cache]
@@ -0,0 +1,328 @@
+import json
+import re
+from collections import OrderedDict
+
+# product key -> how to recognise it
+#   name:     matches the appName of a PoC and the name of a detected technology, versions
+#             found next to such a name are versions of the product
+#   evidence: other technologies the product runs on, the host may run it (version unknown)
+#   ports:    open ports typical of the product
+# PoCs whose appName matches no product are not pruned, add the product here to make them prunable
+PRODUCTS = OrderedDict([
+    ("wordpress", {
+        "name": r"word\s*press",
+        "evidence": r"wp-content|wp-includes|wp-json",
+        "ports": (),
+    }),
+    ("weblogic", {
+        "name": r"web\s*logic",
+        "evidence": r"\bt3s?\b",
+        "ports": (7001, 7002),
+    }),
+    ("confluence", {
+        "name": r"confluence",
+        "evidence": r"atlassian",
+        "ports": (8090,),
+    }),
+    ("struts2", {
+        "name": r"struts",
+        "evidence": r"\.action\b|tomcat|jetty|jboss|wildfly|glassfish|websphere|\bjava\b|\bjsp\b|servlet",
+        "ports": (),
+    }),
+])
+
+# products with plugins, the rest of the appName of their PoCs names the plugin
+COMPONENT_PRODUCTS = ("wordpress",)
+COMPONENT_NOISE = r"\b(plugin|theme|extension|addon|add-on)\b"
+
+VERSION_RE = re.compile(r"\d+(?:\.\d+)+|\d+(?=\.x)|\d+")
+RANGE_RE = re.compile(r"(\d+(?:\.\d+)*)(?:\.[x*])?\s*(?:-|~|to)\s*[^\d]*?(\d+(?:\.\d+)*)")
+BOUND_RE = re.compile(r"(<=|>=|<|>|=)\s*(\d+(?:\.\d+)*)")
+
+_compiled = {}
+
+
+def _pattern(product, kind):
+    key = (product, kind)
+    if key not in _compiled:
+        _compiled[key] = re.compile(PRODUCTS[product][kind], re.I) if PRODUCTS[product][kind] else None
+    return _compiled[key]
+
+
+def version_tuple(version):
+    return tuple(int(part) for part in re.findall(r"\d+", str(version)))
+
+
+def _cmp(a, b):
+    """ Compare two version tuples on their common prefix, '2.3' is equal to '2.3.16' """
+    n = min(len(a), len(b))
+    return (a[:n] > b[:n]) - (a[:n] < b[:n])
+
+
+def parse_version_ranges(text):
+    """ Ranges of an appVersion string ('2.0.0-2.0.8', '<= 2.6.7', '12.2.1.3.0, 12.2.1.4.0', ...)
+
+    :return: list of (low, high, low_inclusive, high_inclusive) with version tuples (None for open ends),
+             None when nothing could be parsed, the PoC then matches any version
+    """
+    if not text:
+        return None
+    ranges = []
+    text = re.sub(r"\(?\bexcept\b[^)]*\)?", " ", str(text), flags=re.I)
+    for part in re.split(r",|;|\n|\band\b|\bor\b", text):
+        part = part.strip()
+        if not part:
+            continue
+        match = RANGE_RE.search(part)
+        if match:
+            ranges.append((version_tuple(match.group(1)), version_tuple(match.group(2)), True, True))
+            continue
+        match = BOUND_RE.search(part)
+        if match:
+            op, version = match.group(1), version_tuple(match.group(2))
+            if op in ("<", "<="):
+                ranges.append((None, version, True, op == "<="))
+            elif op in (">", ">="):
+                ranges.append((version, None, op == ">=", True))
+            else:
+                ranges.append((version, version, True, True))
+            continue
+        match = VERSION_RE.search(part)
+        if match:
+            version = version_tuple(match.group(0))
+            ranges.append((version, version, True, True))
+    return ranges or None
+
+
+def _above(version, bound, inclusive):
+    c = _cmp(version, bound)
+    # '10.3' may still be above '10.3.6' when only the prefix is known, '5.0.1' is above '5.0'
+    return c > 0 or (c == 0 and (inclusive or len(version) < len(bound) or any(version[len(bound):])))
+
+
+def _below(version, bound, inclusive):
+    c = _cmp(version, bound)
+    return c < 0 or (c == 0 and (inclusive or len(version) < len(bound)))
+
+
+def version_in_ranges(version, ranges):
+    version = version_tuple(version)
+    if not version or not ranges:
+        return True
+    for low, high, low_inclusive, high_inclusive in ranges:
+        if low is not None and not _above(version, low, low_inclusive):
+            continue
+        if high is not None and not _below(version, high, high_inclusive):
+            continue
+        return True
+    return False
+
+
+def _slug(text):
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")
+
+
+def _versions(text, dotted=True):
+    """ Version numbers in text, only dotted ones in free text where a lone number is rarely a version """
+    return {v for v in VERSION_RE.findall(str(text)) if "." in v or not dotted}
+
+
+def _load(data):
+    """ Stored scan output, JSON or the text rendered by the web interface """
+    if data is None:
+        return None
+    if isinstance(data, (list, dict)):
+        return data
+    data = str(data).strip()
+    if not data:
+        return None
+    if data[0] in "[{":
+        try:
+            return json.loads(data)
+        except ValueError:
+            pass
+    return data
+
+
+class Fingerprint(object):
+    """ Products, versions and open ports seen on a host by wappalyzer / nmap / wpscan """
+
+    def __init__(self):
+        # product -> versions seen (empty: present, version unknown)
+        self.products = {}
+        # plugin slug -> versions
+        self.components = {}
+        self.ports = set()
+        # False when no scan output was stored, nothing can be pruned then
+        self.known = False
+
+    def add(self, text, version=None):
+        """ A detected technology, with its version when the scanner gave one """
+        text = str(text or "")
+        if not text.strip():
+            return
+        self.known = True
+        for product in PRODUCTS:
+            if _pattern(product, "name").search(text):
+                versions = self.products.setdefault(product, set())
+                versions.update(_versions(version, dotted=False) if version else _versions(text))
+            elif _pattern(product, "evidence") and _pattern(product, "evidence").search(text):
+                self.products.setdefault(product, set())
+
+    def add_port(self, port, text=""):
+        self.known = True
+        self.ports.add(int(port))
+        for product in PRODUCTS:
+            if int(port) in PRODUCTS[product]["ports"]:
+                self.products.setdefault(product, set())
+        self.add(text)
+
+    def add_component(self, product, slug, version=None):
+        self.products.setdefault(product, set())
+        versions = self.components.setdefault(slug, set())
+        if version:
+            versions.update(_versions(version, dotted=False))
+
+    def add_wappalyzer(self, data):
+        data = _load(data)
+        if isinstance(data, list):
+            for item in data:
+                if isinstance(item, dict):
+                    version = item.get("version")
+                    self.add(item.get("technology"), None if version == "Unknown" else version)
+        elif isinstance(data, str):
+            # 'WordPress (v6.2)' / 'Nginx (Unknown)'
+            for line in data.splitlines():
+                match = re.match(r"^\s*(.*?)\s*\((?:v(.*)|Unknown)\)\s*$", line)
+                if match:
+                    self.add(match.group(1), match.group(2))
+                elif line.strip():
+                    self.add(line)
+
+    def add_nmap(self, data):
+        data = _load(data)
+        if isinstance(data, list):
+            for host in data:
+                if not isinstance(host, dict):
+                    continue
+                for ports in (host.get("protocols") or {}).values():
+                    for port in ports:
+                        if port.get("state") == "open":
+                            text = "{0} {1}".format(port.get("service") or "", port.get("product") or "")
+                            self.add_port(port.get("port"), text)
+                            self.add(port.get("product"), port.get("version"))
+        elif isinstance(data, str):
+            # '    Port 7001/tcp  open  afs3-callback  Oracle WebLogic Server  12.2.1.3'
+            for line in data.splitlines():
+                match = re.match(r"^\s*Port (\d+)/\w+\s+(\S+)\s*(.*)$", line)
+                if match and match.group(2) == "open":
+                    self.add_port(match.group(1), match.group(3))
+
+    def add_wpscan(self, data):
+        data = _load(data)
+        if isinstance(data, list):
+            data = "\n".join(str(line) for line in data)
+        if not isinstance(data, str):
+            return
+        in_plugins = False
+        plugin = None
+        for line in data.splitlines():
+            match = re.search(r"WordPress version ([\d.]+) identified", line)
+            if match:
+                self.add("WordPress", match.group(1))
+                continue
+            if re.search(r"WordPress theme in use|wp-content", line):
+                self.known = True
+                self.products.setdefault("wordpress", set())
+            if line.startswith("[i] "):
+                # 'Plugin(s) Identified:' starts the plugin list, any other section ends it
+                in_plugins = "Plugin(s) Identified" in line
+                plugin = None
+                continue
+            if not in_plugins:
+                continue
+            match = re.match(r"^\[\+\] ([a-z0-9_-]+)\s*$", line)
+            if match:
+                plugin = match.group(1)
+                self.known = True
+                self.add_component("wordpress", plugin)
+                continue
+            match = re.match(r"^\s*\|\s*Version: ([\d.]+)", line)
+            if match and plugin:
+                self.add_component("wordpress", plugin, match.group(1))
+
+    @classmethod
+    def from_scans(cls, wappalyzer=None, nmap=None, wpscan=None):
+        fingerprint = cls()
+        fingerprint.add_wappalyzer(wappalyzer)
+        fingerprint.add_nmap(nmap)
+        fingerprint.add_wpscan(wpscan)
+        return fingerprint
+
+
+class PocSignature(object):
+    """ Product, plugin and version ranges a PoC applies to, from its appName / appVersion """
+
+    def __init__(self, path, app_name="", app_version="", name=""):
+        self.path = path
+        self.product = None
+        self.component = None
+        self.ranges = parse_version_ranges(app_version)
+        label = app_name or name or ""
+        for product in PRODUCTS:
+            match = _pattern(product, "name").search(label)
+            if match:
+                self.product = product
+                if product in COMPONENT_PRODUCTS:
+                    rest = re.sub(COMPONENT_NOISE, " ", label[:match.start()] + label[match.end():], flags=re.I)
+                    self.component = _slug(rest) or None
+                break
+
+    def matches(self, fingerprint):
+        if self.product is None:
+            return True
+        if self.product not in fingerprint.products:
+            return False
+        if self.component:
+            versions = fingerprint.components.get(self.component)
+            if versions is None:
+                # the plugin was not listed, scanners miss plugins so it may still be there
+                return True
+        else:
+            versions = fingerprint.products[self.product]
+        return not versions or any(version_in_ranges(version, self.ranges) for version in versions)
+
+
+class PocMatcher(object):
+    """ Picks the PoCs worth running against a host from its stored fingerprint
+
+    PoCs are indexed by product; a host is only sent the PoCs of the products
+    seen on it (and in the PoC's version ranges when the version is known),
+    plus the PoCs that name no known product. Hosts without any stored scan
+    get every PoC.
+    """
+
+    def __init__(self, pocs):
+        """
+        :param pocs: iterable of (path, appName, appVersion, name)
+        """
+        self.signatures = [PocSignature(*poc) for poc in pocs]
+        self.order = {signature.path: i for i, signature in enumerate(self.signatures)}
+        self.by_product = {}
+        self.generic = []
+        for signature in self.signatures:
+            if signature.product is None:
+                self.generic.append(signature)
+            else:
+                self.by_product.setdefault(signature.product, []).append(signature)
+
+    def select(self, fingerprint):
+        """ Paths of the PoCs to run against a host, in the order they were given """
+        if fingerprint is None or not fingerprint.known:
+            return [signature.path for signature in self.signatures]
+        selected = [signature.path for signature in self.generic]
+        for product in fingerprint.products:
+            for signature in self.by_product.get(product, ()):
+                if signature.matches(fingerprint):
+                    selected.append(signature.path)
+        return sorted(selected, key=self.order.get)
@@ -1,5 +1,10 @@
+import hashlib
 import importlib.machinery
 import importlib.util
+import marshal
+import os
+import sys
+import tempfile
 from importlib.abc import Loader
 
 from pocsuite3.lib.core.common import (
@@ -7,8 +12,46 @@ from pocsuite3.lib.core.common import (
     is_pocsuite3_poc, get_poc_requires, get_poc_name)
 from pocsuite3.lib.core.data import kb
 from pocsuite3.lib.core.data import logger
+from pocsuite3.lib.core.data import paths
 from pocsuite3.lib.core.settings import POC_IMPORTDICT
 
+# source hashes whose requirements were already imported in this process
+_checked_requires = set()
+
+
+def _bytecode_cache_file(key):
+    return os.path.join(paths.POCSUITE_BYTECODE_PATH, '{0}.{1}.pyc'.format(key, sys.implementation.cache_tag))
+
+
+def load_cached_code(key):
+    """ Returns (requires, poc_name, code object) cached for key, or None """
+    try:
+        with open(_bytecode_cache_file(key), 'rb') as f:
+            data = f.read()
+    except (OSError, TypeError):
+        return None
+    magic = importlib.util.MAGIC_NUMBER
+    if data[:len(magic)] != magic:
+        return None
+    try:
+        return marshal.loads(data[len(magic):])
+    except (EOFError, ValueError, TypeError):
+        return None
+
+
+def store_cached_code(key, requires, poc_name, code):
+    cache_file = _bytecode_cache_file(key)
+    try:
+        cache_dir = os.path.dirname(cache_file)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(importlib.util.MAGIC_NUMBER + marshal.dumps((requires, poc_name, code)))
+        os.replace(tmp_file, cache_file)
+    except (OSError, TypeError, ValueError) as ex:
+        logger.debug('unable to write bytecode cache for {0}: {1}'.format(key, ex))
+
 
 class PocLoader(Loader):
     def __init__(self, fullname, path):
@@ -22,27 +65,30 @@ class PocLoader(Loader):
     def get_filename(self, fullname):
         return self.path
 
-    def get_data(self, filename):
+    def get_source(self, filename):
         if filename.startswith('pocsuite://') and self.data:
-            if not is_pocsuite3_poc(self.data):
-                data = multiple_replace(self.data, POC_IMPORTDICT)
-            else:
-                data = self.data
-        else:
-            with open(filename, encoding='utf-8') as f:
-                code = f.read()
-            if not is_pocsuite3_poc(code):
-                data = multiple_replace(code, POC_IMPORTDICT)
-            else:
-                data = code
-        return data
+            return self.data
+        with open(filename, encoding='utf-8') as f:
+            return f.read()
+
+    @staticmethod
+    def transform_source(code):
+        if not is_pocsuite3_poc(code):
+            return multiple_replace(code, POC_IMPORTDICT)
+        return code
+
+    def get_data(self, filename):
+        return self.transform_source(self.get_source(filename))
 
     @staticmethod
     def check_requires(data):
         requires = get_poc_requires(data)
+        PocLoader.import_requires(requires, get_poc_name(data) if requires else None)
+
+    @staticmethod
+    def import_requires(requires, poc_name):
         requires = [i.strip().strip('"').strip("'") for i in requires.split(',')] if requires else ['']
         if requires[0]:
-            poc_name = get_poc_name(data)
             info_msg = 'PoC script "{0}" requires "{1}" to be installed'.format(poc_name, ','.join(requires))
             logger.info(info_msg)
             try:
@@ -64,9 +110,24 @@ class PocLoader(Loader):
 
     def exec_module(self, module):
         filename = self.get_filename(self.fullname)
-        poc_code = self.get_data(filename)
-        self.check_requires(poc_code)
-        obj = compile(poc_code, filename, 'exec', dont_inherit=True, optimize=-1)
+        source = self.get_source(filename)
+
+        # compiled code is cached by source hash and file name, the
+        # interpreter version is part of the cache file name and header
+        key = hashlib.sha1('{0}\0{1}'.format(filename, source).encode('utf-8', 'surrogatepass')).hexdigest()
+        cached = load_cached_code(key)
+        if cached is not None:
+            requires, poc_name, obj = cached
+        else:
+            poc_code = self.transform_source(source)
+            requires = get_poc_requires(poc_code)
+            poc_name = get_poc_name(poc_code) if requires else None
+            obj = compile(poc_code, filename, 'exec', dont_inherit=True, optimize=-1)
+            store_cached_code(key, requires, poc_name, obj)
+
+        if key not in _checked_requires:
+            self.import_requires(requires, poc_name)
+            _checked_requires.add(key)
         exec(obj, module.__dict__)
 
 
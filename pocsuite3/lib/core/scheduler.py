@@ -0,0 +1,286 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from queue import Empty
+from urllib.parse import urlparse
+
+from pocsuite3.lib.core.data import kb
+from pocsuite3.lib.core.data import logger
+from pocsuite3.lib.core.settings import HOST_BACKOFF_BASE, HOST_BACKOFF_MAX, TASK_QUEUE_SIZE_PER_THREAD, \
+    THROTTLE_STATUS_CODES
+
+# weight of the newest sample in the per-host latency averages
+LATENCY_EWMA_ALPHA = 0.2
+
+# idle hosts whose state (and stats) is kept, least recently used ones are dropped first
+MAX_TRACKED_HOSTS = 4096
+
+
+def target_host(target):
+    """ Host part of a target ('http://a.b:8080/x', 'a.b:8080' and 'a.b' all give 'a.b') """
+    target = str(target).strip()
+    netloc = urlparse(target if "://" in target else "//" + target).netloc or target
+    host = netloc.rpartition("@")[2]
+    if host.startswith("["):
+        return host[1:].partition("]")[0].lower()
+    if host.count(":") == 1:
+        host = host.partition(":")[0]
+    return host.lower()
+
+
+def _ewma(current, sample):
+    return sample if current is None else current + LATENCY_EWMA_ALPHA * (sample - current)
+
+
+class HostState(object):
+    """ Token bucket, in-flight counter, backoff and latency stats of one host """
+
+    def __init__(self, rate, burst):
+        self.tokens = float(burst)
+        self.refilled_at = time.time()
+        self.inflight = 0
+        # 1.0 normally, halved on every throttling signal and slowly restored
+        self.factor = 1.0
+        self.strikes = 0
+        self.backoff_until = 0
+        self.deferred = deque()
+        self.completed = 0
+        self.throttled = 0
+        self.task_latency = None
+        self.request_latency = None
+
+    def refill(self, rate, burst, now):
+        if rate:
+            self.tokens = min(float(burst), self.tokens + (now - self.refilled_at) * rate * self.factor)
+        self.refilled_at = now
+
+
+class TaskScheduler(object):
+    """ Hands out kb.task_queue items to the worker threads
+
+    The number of workers is the global concurrency limit. On top of it every
+    host gets a token bucket (rate tasks per second, 0 for no limit) and a max
+    number of tasks in flight (0 for no limit). Tasks of a host that is not
+    ready are parked and the worker takes the next task of another host, so a
+    slow or throttled host does not stall the scan.
+
+    Timeouts and 429/503 responses (reported by the request hook through
+    throttled()) put the host in backoff for an exponentially growing time and
+    halve its rate and concurrency; every clean task restores them a bit.
+
+    task_queue and feeding (an Event set while tasks are still being added)
+    default to kb.task_queue and kb.task_feeding, pass them to schedule
+    another queue.
+    """
+
+    def __init__(self, threads, rate=0, max_inflight=0, burst=None, task_queue=None, feeding=None):
+        self.rate = float(rate or 0)
+        self.burst = burst or max(1.0, self.rate)
+        self.max_inflight = int(max_inflight or 0)
+        self.max_deferred = max(threads, 1) * TASK_QUEUE_SIZE_PER_THREAD
+        self.task_queue = task_queue if task_queue is not None else kb.task_queue
+        self.feeding = feeding
+        self.hosts = OrderedDict()
+        # hosts with parked tasks
+        self.waiting = {}
+        self.deferred = 0
+        self.throttled_total = 0
+        self.running = 0
+        self.completed = 0
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self._stop_reporter = threading.Event()
+
+    def _host(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(self.rate, self.burst)
+        return state
+
+    def _host_limit(self, state):
+        if not self.max_inflight:
+            # no configured limit, but a host in backoff gets one task at a time
+            return None if state.factor >= 1 else 1
+        return max(1, int(self.max_inflight * state.factor))
+
+    def _ready(self, state, now):
+        if now < state.backoff_until:
+            return False
+        limit = self._host_limit(state)
+        if limit is not None and state.inflight >= limit:
+            return False
+        state.refill(self.rate, self.burst, now)
+        return not self.rate or state.tokens >= 1
+
+    def _acquire(self, state):
+        if self.rate:
+            state.tokens -= 1
+        state.inflight += 1
+        self.running += 1
+
+    def _wake_time(self, state, now):
+        if now < state.backoff_until:
+            return state.backoff_until
+        if self.rate and state.tokens < 1:
+            return now + (1 - state.tokens) / (self.rate * state.factor)
+        # waiting for a running task of the host to finish
+        return now + 0.05
+
+    def _next_locked(self, now):
+        """ A runnable task as (item, host, 0), or (None, None, seconds to wait) """
+        wake = now + 0.5
+        for host, state in self.waiting.items():
+            if self._ready(state, now):
+                self._acquire(state)
+                self.deferred -= 1
+                item = state.deferred.popleft()
+                if not state.deferred:
+                    del self.waiting[host]
+                return item, host, 0
+            wake = min(wake, self._wake_time(state, now))
+
+        while self.deferred < self.max_deferred:
+            try:
+                item = self.task_queue.get_nowait()
+            except Empty:
+                break
+            host = target_host(item[-2])
+            state = self._host(host)
+            if not state.deferred and self._ready(state, now):
+                self._acquire(state)
+                return item, host, 0
+            state.deferred.append(item)
+            self.waiting[host] = state
+            self.deferred += 1
+            wake = min(wake, self._wake_time(state, now))
+
+        return None, None, max(0.01, wake - now)
+
+    def _idle(self, state, now):
+        """ Nothing to remember about the host, its state can be dropped """
+        if state.inflight or state.deferred or state.factor < 1 or state.backoff_until > now:
+            return False
+        state.refill(self.rate, self.burst, now)
+        return not self.rate or state.tokens >= self.burst
+
+    def _evict(self, now):
+        """ Keep the per-host states of a scan over millions of hosts bounded """
+        for host in list(self.hosts):
+            if len(self.hosts) <= MAX_TRACKED_HOSTS:
+                break
+            if self._idle(self.hosts[host], now):
+                del self.hosts[host]
+
+    def _feeding(self):
+        return kb.task_feeding if self.feeding is None else self.feeding.is_set()
+
+    def get(self):
+        """ Next task for a worker, as (item, host)
+
+        :raise Empty: no task is left
+        """
+        while kb.thread_continue:
+            with self._lock:
+                item, host, wait = self._next_locked(time.time())
+                if item is not None:
+                    return item, host
+                if not self.deferred and self.task_queue.empty() and not self._feeding():
+                    raise Empty
+            time.sleep(wait)
+        raise Empty
+
+    def release(self, host, started):
+        """ Called by the worker when the task of host finished """
+        now = time.time()
+        elapsed = now - started
+        with self._lock:
+            state = self._host(host)
+            state.inflight -= 1
+            state.completed += 1
+            state.task_latency = _ewma(state.task_latency, elapsed)
+            self.running -= 1
+            self.completed += 1
+            if state.backoff_until < started:
+                # no throttling signal during the task
+                state.strikes = 0
+                state.factor = min(1.0, state.factor * 1.25)
+            self.hosts.move_to_end(host)
+            if len(self.hosts) > MAX_TRACKED_HOSTS:
+                self._evict(now)
+
+    def throttled(self, url, retry_after=None):
+        """ The host of url answered 429/503 or timed out, back off """
+        host = target_host(url)
+        now = time.time()
+        with self._lock:
+            state = self._host(host)
+            state.throttled += 1
+            self.throttled_total += 1
+            if now < state.backoff_until:
+                # answer to a request sent before the backoff started
+                return
+            state.strikes += 1
+            state.factor = max(1.0 / 16, state.factor / 2)
+            delay = min(HOST_BACKOFF_MAX, HOST_BACKOFF_BASE * 2 ** (state.strikes - 1))
+            if retry_after:
+                delay = min(HOST_BACKOFF_MAX, max(delay, retry_after))
+            state.backoff_until = now + delay
+            # a full bucket would let a burst through right after the backoff
+            state.tokens = min(state.tokens, 1.0)
+        logger.debug("host {0} throttled, backing off {1:.1f}s".format(host, delay))
+
+    def observe(self, url, response=None):
+        """ Called by the request hook for every request, response is None when it timed out """
+        if response is None:
+            self.throttled(url)
+            return
+        with self._lock:
+            state = self._host(target_host(url))
+            state.request_latency = _ewma(state.request_latency, response.elapsed.total_seconds())
+        if response.status_code in THROTTLE_STATUS_CODES:
+            retry_after = response.headers.get("Retry-After", "")
+            self.throttled(url, float(retry_after) if retry_after.isdigit() else None)
+
+    def stats(self):
+        """ Live scheduler stats
+
+        :return: dict with throughput (tasks/s), queue depth and the latency (seconds) of the hosts being scanned
+        """
+        now = time.time()
+        with self._lock:
+            elapsed = now - self.started_at
+            hosts = {}
+            for host, state in self.hosts.items():
+                hosts[host] = {
+                    "completed": state.completed,
+                    "inflight": state.inflight,
+                    "queued": len(state.deferred),
+                    "throttled": state.throttled,
+                    "backoff": max(0.0, state.backoff_until - now),
+                    "task_latency": state.task_latency,
+                    "request_latency": state.request_latency,
+                }
+            return {
+                "elapsed": elapsed,
+                "completed": self.completed,
+                "running": self.running,
+                "throughput": self.completed / elapsed if elapsed else 0.0,
+                "queue_depth": self.task_queue.qsize() + self.deferred,
+                "throttled": self.throttled_total,
+                "hosts": hosts,
+            }
+
+    def _report(self, interval):
+        while not self._stop_reporter.wait(interval):
+            stats = self.stats()
+            backoff = sum(1 for host in stats["hosts"].values() if host["backoff"])
+            logger.info("{0} tasks done, {1:.1f} tasks/s, {2} running, {3} queued, {4} hosts in backoff".format(
+                stats["completed"], stats["throughput"], stats["running"], stats["queue_depth"], backoff))
+
+    def start_reporter(self, interval):
+        thread = threading.Thread(target=self._report, args=(interval,), name="scheduler-stats")
+        thread.daemon = True
+        thread.start()
+
+    def stop_reporter(self):
+        self._stop_reporter.set()
@@ -80,6 +80,26 @@ POC_APPVERSION_REGEX = r'''(?sm)POCBase\):.*?appVersion\s*=\s*['"](?P<result>.*?
 
 MAX_NUMBER_OF_THREADS = 20
 
+# queued tasks per thread, tasks are generated lazily into this bounded queue
+TASK_QUEUE_SIZE_PER_THREAD = 16
+
+# per-host backoff after a timeout or a throttling response, doubled on every strike
+HOST_BACKOFF_BASE = 1.0
+HOST_BACKOFF_MAX = 60.0
+THROTTLE_STATUS_CODES = (429, 503)
+
+# seconds between two scheduler progress lines
+SCHEDULER_STATS_INTERVAL = 10
+
+# shared sessions of the module-level requests calls: hosts kept, idle seconds before closing, sockets per host
+SESSION_POOL_MAX_HOSTS = 256
+SESSION_POOL_IDLE_TIMEOUT = 60
+SESSION_POOL_MAX_CONNECTIONS = 100
+
+# bytes of a body looked at to find its charset, (host, content-type) pairs whose charset is remembered
+CHARSET_SNIFF_BYTES = 4096
+CHARSET_CACHE_SIZE = 1024
+
 DEFAULT_LISTENER_PORT = 6666
 
 # Maximum number of lines to save in history file
@@ -97,4 +117,5 @@ CMD_PARSE_WHITELIST = ['version', 'update', 'url', 'file', 'verify', 'attack', '
                        'login-user', 'login-pass', 'dork', 'dork-shodan', 'dork-censys', 'dork-zoomeye', 'dork-fofa',
                        'max-page', 'search-type', 'shodan-token', 'fofa-user', 'fofa-token', 'vul-keyword', 'ssv-id',
                        'lhost', 'lport', 'plugins', 'pocs-path', 'threads', 'batch', 'requires', 'quiet', 'poc',
-                       'verbose', 'mode', 'api', 'connect_back_host', 'connect_back_port', 'ppt']
+                       'verbose', 'mode', 'api', 'connect_back_host', 'connect_back_port', 'ppt', 'resume',
+                       'host-rate', 'host-concurrency']
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from ipaddress import ip_network
+from queue import Full
+
+from pocsuite3.lib.core.common import iter_file_items
+from pocsuite3.lib.core.data import kb
+from pocsuite3.lib.core.data import logger
+
+
+def add_target_source(description, factory, count=None):
+    """ Register a lazy target source
+
+    :param description: stable text identifying the source, part of the resume fingerprint
+    :param factory: callable returning a new iterator over the targets, called once per PoC
+    :param count: number of targets if known up front
+    """
+    kb.target_sources.append((description, factory, count))
+
+
+def file_target_source(filename):
+    st = os.stat(filename)
+    description = "file:{0}:{1}:{2}".format(os.path.abspath(filename), st.st_size, int(st.st_mtime))
+    add_target_source(description, lambda: iter_file_items(filename))
+
+
+def cidr_target_source(cidr):
+    network = ip_network(cidr, strict=False)
+    count = network.num_addresses
+    # hosts() skips the network/broadcast addresses (IPv6: the subnet-router anycast)
+    if network.version == 4 and network.prefixlen < 31:
+        count -= 2
+    elif network.version == 6 and network.prefixlen < 127:
+        count -= 1
+    add_target_source("cidr:{0}".format(network), lambda: (host.exploded for host in network.hosts()), count)
+    return count
+
+
+def iter_targets():
+    """ kb.targets (the eager ones) first, then every lazy source """
+    for target in list(kb.targets):
+        yield target
+    for _, factory, _ in kb.target_sources:
+        for target in factory():
+            yield target
+
+
+def count_targets():
+    """ Number of targets, None when a source does not know its size """
+    total = len(kb.targets)
+    for _, _, count in kb.target_sources:
+        if count is None:
+            return None
+        total += count
+    return total
+
+
+def iter_tasks(start=0):
+    """ Yields (seq, target, poc_module) for the poc x target product, skipping seq < start """
+    seq = 0
+    for poc_module in list(kb.registered_pocs):
+        for target in iter_targets():
+            if seq >= start:
+                yield seq, target, poc_module
+            seq += 1
+
+
+def tasks_fingerprint():
+    data = {
+        "pocs": list(kb.registered_pocs),
+        "targets": list(kb.targets),
+        "sources": [description for description, _, _ in kb.target_sources]
+    }
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+class TaskCursor(object):
+    """ Resume cursor: seq of the first unfinished task, persisted to a file
+
+    Tasks finish out of order, so finished seqs above the watermark are kept
+    in a set; its size is bounded by the queue size plus the thread count.
+    """
+
+    def __init__(self, filename, fingerprint, flush_every=100):
+        self.filename = filename
+        self.fingerprint = fingerprint
+        self.flush_every = flush_every
+        self.position = 0
+        self._finished = set()
+        self._since_flush = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.filename) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if data.get("fingerprint") != self.fingerprint:
+            logger.warning("resume file '{0}' belongs to another scan, starting over".format(self.filename))
+            return 0
+        self.position = int(data.get("position", 0))
+        if self.position:
+            logger.info("resuming scan from task {0}".format(self.position))
+        return self.position
+
+    def done(self, seq):
+        with self._lock:
+            if seq == self.position:
+                self.position += 1
+                while self.position in self._finished:
+                    self._finished.remove(self.position)
+                    self.position += 1
+            elif seq > self.position:
+                self._finished.add(seq)
+            self._since_flush += 1
+            if self._since_flush >= self.flush_every:
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self._since_flush = 0
+        try:
+            directory = os.path.dirname(os.path.abspath(self.filename))
+            fd, tmp_file = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump({"fingerprint": self.fingerprint, "position": self.position}, f)
+            os.replace(tmp_file, self.filename)
+        except OSError as ex:
+            logger.warning("unable to write resume file '{0}': {1}".format(self.filename, ex))
+
+    def clear(self):
+        with self._lock:
+            try:
+                os.remove(self.filename)
+            except OSError:
+                pass
+
+
+class TaskFeeder(object):
+    """ Feeds kb.task_queue (bounded) from iter_tasks() in a background thread """
+
+    def __init__(self, start=0):
+        self.start_seq = start
+        self.generated = start
+        self.exhausted = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        kb.task_feeding = True
+        self._thread = threading.Thread(target=self._feed, name="task-feeder")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _feed(self):
+        try:
+            for item in iter_tasks(self.start_seq):
+                while not self._stop.is_set():
+                    try:
+                        kb.task_queue.put(item, timeout=0.5)
+                        break
+                    except Full:
+                        continue
+                if self._stop.is_set():
+                    return
+                self.generated = item[0] + 1
+            self.exhausted = True
+        except Exception as ex:
+            logger.error("task generation failed: {0}".format(ex))
+        finally:
+            kb.task_feeding = False
@@ -1,4 +1,3 @@
-import time
 import threading
 import traceback
 
@@ -39,9 +38,11 @@ def run_threads(num_threads, thread_function, args: tuple = (), forward_exceptio
                 info_msg = "starting {0} threads".format(num_threads)
                 logger.info(info_msg)
 
-            if num_threads > MAX_NUMBER_OF_THREADS:
-                warn_msg = "starting {0} threads, more than MAX_NUMBER_OF_THREADS:{1}".format(num_threads, MAX_NUMBER_OF_THREADS)
-                logger.warn(warn_msg)
+            # with a per-host limit going wide only spreads the load over more hosts
+            if num_threads > MAX_NUMBER_OF_THREADS and not (conf.host_rate or conf.host_concurrency):
+                warn_msg = "starting {0} threads, more than MAX_NUMBER_OF_THREADS:{1}, consider --host-rate or " \
+                           "--host-concurrency".format(num_threads, MAX_NUMBER_OF_THREADS)
+                logger.warning(warn_msg)
 
         else:
             thread_function(*args)
@@ -61,14 +62,10 @@ def run_threads(num_threads, thread_function, args: tuple = (), forward_exceptio
 
             threads.append(thread)
 
-        # And wait for them to all finish
-        alive = True
-        while alive:
-            alive = False
-            for thread in threads:
-                if thread.isAlive():
-                    alive = True
-                    time.sleep(0.1)
+        # And wait for them to all finish, a join with timeout keeps Ctrl+C working
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
 
     except (KeyboardInterrupt, PocsuiteUserQuitException) as ex:
         kb.thread_continue = False
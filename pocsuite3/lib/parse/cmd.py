@@ -108,6 +108,12 @@ def cmd_line_parser(argv=None):
                                   help="User defined poc scripts path")
         optimization.add_argument("--threads", dest="threads", type=int, default=1,
                                   help="Max number of concurrent network requests (default 1)")
+        optimization.add_argument("--host-rate", dest="host_rate", type=float, default=0,
+                                  help="Max number of tasks started per second against one host (default 0, no limit)")
+        optimization.add_argument("--host-concurrency", dest="host_concurrency", type=int, default=0,
+                                  help="Max number of concurrent tasks against one host (default 0, no limit)")
+        optimization.add_argument("--resume", dest="resume", action="store", default=None,
+                                  help="Resume file: records scan progress, an interrupted scan restarts where it stopped")
         optimization.add_argument("--batch", dest="batch",
                                   help="Automatically choose defaut choice without asking.")
         optimization.add_argument("--requires", dest="check_requires", action="store_true", default=False,
@@ -3,6 +3,7 @@ from .remove_warnings import disable_warnings
 from .hook_request import patch_session
 from .add_httpraw import patch_addraw
 from .hook_request_redirect import patch_redirect
+from .session_pool import patch_session_pool
 
 
 def patch_all():
@@ -11,3 +12,4 @@ def patch_all():
     patch_session()
     patch_addraw()
     patch_redirect()
+    patch_session_pool()
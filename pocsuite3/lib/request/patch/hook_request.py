@@ -1,11 +1,43 @@
+import threading
+from contextlib import contextmanager
 from random import choice
 from pocsuite3.lib.core.data import conf
+from pocsuite3.lib.core.data import kb
 from pocsuite3.lib.core.enums import HTTP_HEADER
+from pocsuite3.lib.request.patch.lazy_encoding import defer_encoding
+from requests.exceptions import Timeout
 from requests.models import Request
 from requests.sessions import Session
 from requests.sessions import merge_setting, merge_cookies
 from requests.cookies import RequestsCookieJar
-from requests.utils import get_encodings_from_content
+
+# per-thread http settings of an isolated PoC run, used instead of the global conf
+_request_context = threading.local()
+
+
+@contextmanager
+def request_context(headers=None, proxies=None, timeout=None, scheduler=None):
+    """
+    http headers, proxies and timeout for the requests sent by the current thread
+    :param headers: dict replacing conf.http_headers
+    :param proxies: dict replacing conf.proxies
+    :param timeout: seconds, replacing conf.timeout
+    :param scheduler: TaskScheduler told about timeouts and throttling, replacing kb.scheduler
+    """
+    previous = getattr(_request_context, "value", None)
+    _request_context.value = {"headers": headers or {}, "proxies": proxies or {}, "timeout": timeout,
+                              "scheduler": scheduler}
+    try:
+        yield
+    finally:
+        _request_context.value = previous
+
+
+def current_proxies():
+    context = getattr(_request_context, "value", None)
+    if context is not None:
+        return context["proxies"]
+    return conf.proxies if 'proxies' in conf else {}
 
 
 def session_request(self, method, url,
@@ -17,11 +49,16 @@ def session_request(self, method, url,
                                    cookies or (conf.cookie if 'cookie' in conf else None))
     if conf.random_agent:
         conf.http_headers[HTTP_HEADER.USER_AGENT] = choice(conf.agents)
+    context = getattr(_request_context, "value", None)
+    if context is not None:
+        http_headers = context["headers"]
+    else:
+        http_headers = conf.http_headers if 'http_headers' in conf else {}
 
     req = Request(
         method=method.upper(),
         url=url,
-        headers=merge_setting(headers, conf.http_headers if 'http_headers' in conf else {}),
+        headers=merge_setting(headers, http_headers),
         files=files,
         data=data or {},
         json=json,
@@ -34,13 +71,13 @@ def session_request(self, method, url,
 
     # proxies = proxies or (conf.proxies if 'proxies' in conf else {})
     if proxies is None:
-       proxies = conf.proxies if 'proxies' in conf else {}
+        proxies = current_proxies()
 
     settings = self.merge_environment_settings(
         prep.url, proxies, stream, verify, cert
     )
 
-    timeout = timeout or conf.get("timeout", None)
+    timeout = timeout or (context["timeout"] if context is not None else None) or conf.get("timeout", None)
     if timeout:
         timeout = float(timeout)
 
@@ -50,16 +87,20 @@ def session_request(self, method, url,
         'allow_redirects': allow_redirects,
     }
     send_kwargs.update(settings)
-    resp = self.send(prep, **send_kwargs)
+    # the task scheduler backs off hosts that time out or throttle
+    scheduler = context["scheduler"] if context is not None else kb.get('scheduler')
+    try:
+        resp = self.send(prep, **send_kwargs)
+    except Timeout:
+        if scheduler:
+            scheduler.observe(prep.url)
+        raise
+    if scheduler:
+        scheduler.observe(prep.url, resp)
 
     if resp.encoding == 'ISO-8859-1':
-        encodings = get_encodings_from_content(resp.text)
-        if encodings:
-            encoding = encodings[0]
-        else:
-            encoding = resp.apparent_encoding
-
-        resp.encoding = encoding
+        # sniffed from the first bytes of the body when .text is read
+        defer_encoding(resp)
 
     return resp
 
@@ -0,0 +1,82 @@
+import codecs
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from requests.compat import chardet
+from requests.models import Response
+from requests.utils import get_encodings_from_content
+
+from pocsuite3.lib.core.settings import CHARSET_CACHE_SIZE, CHARSET_SNIFF_BYTES
+
+# utf-32 first, its little endian BOM starts with the utf-16 one
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# (host, content-type) -> BOM or declared encoding of an earlier response
+_encodings = OrderedDict()
+_encodings_lock = threading.Lock()
+
+
+def sniff_encoding(content):
+    """ Charset of a body from its first CHARSET_SNIFF_BYTES: BOM, then meta/xml declaration, then chardet
+
+    Returns (encoding, declared), declared is False for a chardet guess
+    """
+    prefix = content[:CHARSET_SNIFF_BYTES]
+    for bom, encoding in BOMS:
+        if prefix.startswith(bom):
+            return encoding, True
+    # the declarations are ascii, latin-1 maps every byte so decoding can not fail
+    encodings = get_encodings_from_content(prefix.decode("latin-1"))
+    if encodings:
+        return encodings[0], True
+    encoding = chardet.detect(prefix).get("encoding")
+    # an ascii prefix says nothing about the rest of the body, utf-8 decodes it the same
+    if encoding and encoding.lower() == "ascii":
+        encoding = "utf-8"
+    return encoding, False
+
+
+class LazyEncodingResponse(Response):
+    """ Response whose charset is sniffed the first time .encoding (so .text) is read """
+
+    @property
+    def encoding(self):
+        key = getattr(self, "_encoding_key", None)
+        if key is not None:
+            self._encoding_key = None
+            encoding, declared = sniff_encoding(self.content or b"")
+            if encoding:
+                self._encoding = encoding
+            # a guess only holds for this body, the next page of the host may differ
+            if encoding and declared:
+                with _encodings_lock:
+                    _encodings[key] = encoding
+                    if len(_encodings) > CHARSET_CACHE_SIZE:
+                        _encodings.popitem(last=False)
+        return self._encoding
+
+    @encoding.setter
+    def encoding(self, value):
+        # an explicit encoding wins over sniffing
+        self._encoding_key = None
+        self._encoding = value
+
+
+def defer_encoding(resp):
+    """ Resolve the charset of a response that only got the ISO-8859-1 default when it is needed """
+    key = (urlparse(resp.url).hostname, resp.headers.get("Content-Type"))
+    with _encodings_lock:
+        encoding = _encodings.get(key)
+    if encoding:
+        resp.encoding = encoding
+        return
+    resp.__dict__["_encoding"] = resp.__dict__.pop("encoding", None)
+    resp.__dict__["_encoding_key"] = key
+    resp.__class__ = LazyEncodingResponse
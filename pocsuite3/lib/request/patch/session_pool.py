@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.utils import select_proxy
+from requests_toolbelt.cookies.forgetful import ForgetfulCookieJar
+from urllib3.connectionpool import HTTPSConnectionPool
+
+from pocsuite3.lib.core.data import conf
+from pocsuite3.lib.core.settings import SESSION_POOL_IDLE_TIMEOUT, SESSION_POOL_MAX_HOSTS, SESSION_POOL_MAX_CONNECTIONS
+from pocsuite3.lib.request.patch.hook_request import current_proxies
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+class SessionPool(object):
+    """ Process-wide sessions for the module-level requests.get/post/... calls
+
+    requests.api builds and closes a Session per call, so no connection is
+    ever reused. Here every (scheme, host, port, proxy) gets a long-lived
+    Session shared by all threads, keep-alive connections are reused across
+    the requests of a PoC and across PoCs hitting the same host.
+
+    The sessions forget cookies, like a fresh Session per call would. At most
+    max_hosts sessions are kept (least recently used first out) and sessions
+    unused for idle_timeout seconds are closed.
+    """
+
+    def __init__(self, max_hosts=SESSION_POOL_MAX_HOSTS, idle_timeout=SESSION_POOL_IDLE_TIMEOUT):
+        self.max_hosts = max_hosts
+        self.idle_timeout = idle_timeout
+        # key -> [session, users, last used]
+        self._sessions = OrderedDict()
+        self._closed_stats = Counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def pool_key(url, proxies=None):
+        parsed = urlparse(url)
+        scheme = parsed.scheme.lower()
+        proxy = select_proxy(url, proxies if proxies is not None else current_proxies())
+        return scheme, (parsed.hostname or "").lower(), parsed.port or DEFAULT_PORTS.get(scheme), proxy
+
+    @staticmethod
+    def _new_session():
+        session = requests.Session()
+        session.cookies = ForgetfulCookieJar()
+        # a connection per worker thread that may hit the host at the same time
+        size = min(max(conf.get("threads") or 1, 10), SESSION_POOL_MAX_CONNECTIONS)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def acquire(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is None:
+                entry = self._sessions[key] = [self._new_session(), 0, now]
+            else:
+                self._sessions.move_to_end(key)
+            entry[1] += 1
+            entry[2] = now
+            self._evict(now)
+            return entry[0]
+
+    def release(self, key):
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is not None:
+                entry[1] -= 1
+                entry[2] = time.time()
+
+    def _evict(self, now):
+        """ Close idle sessions and the least recently used ones above max_hosts, never one in use """
+        excess = len(self._sessions) - self.max_hosts
+        for key, (session, users, last_used) in list(self._sessions.items()):
+            if users:
+                continue
+            if excess > 0 or now - last_used > self.idle_timeout:
+                self._close(key)
+                excess -= 1
+
+    def _close(self, key):
+        session = self._sessions.pop(key)[0]
+        self._closed_stats.update(self._session_stats(session))
+        session.close()
+
+    @staticmethod
+    def _session_stats(session):
+        stats = Counter()
+        for adapter in set(session.adapters.values()):
+            managers = [adapter.poolmanager] + list(adapter.proxy_manager.values())
+            for manager in managers:
+                for key in manager.pools.keys():
+                    pool = manager.pools.get(key)
+                    if pool is None:
+                        continue
+                    stats["connections"] += pool.num_connections
+                    stats["requests"] += pool.num_requests
+                    if isinstance(pool, HTTPSConnectionPool):
+                        stats["tls_handshakes"] += pool.num_connections
+        return stats
+
+    def stats(self):
+        """ Counters since the start of the process
+
+        :return: dict with sessions (open), connections (sockets opened), tls_handshakes, requests and reused
+        """
+        with self._lock:
+            stats = Counter(self._closed_stats)
+            for session, _, _ in self._sessions.values():
+                stats.update(self._session_stats(session))
+            sessions = len(self._sessions)
+        return {
+            "sessions": sessions,
+            "connections": stats["connections"],
+            "tls_handshakes": stats["tls_handshakes"],
+            "requests": stats["requests"],
+            "reused": max(0, stats["requests"] - stats["connections"]),
+        }
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._sessions):
+                self._close(key)
+
+
+session_pool = SessionPool()
+
+
+def pooled_request(method, url, **kwargs):
+    """ Drop-in for requests.api.request, going through the session pool """
+    key = session_pool.pool_key(url, kwargs.get("proxies"))
+    session = session_pool.acquire(key)
+    try:
+        return session.request(method=method, url=url, **kwargs)
+    finally:
+        session_pool.release(key)
+
+
+def patch_session_pool():
+    # requests.get/post/... look request up in the requests.api module
+    requests.api.request = pooled_request
+    requests.request = pooled_request
@@ -10,6 +10,7 @@ from pocsuite3.api import PLUGIN_TYPE
 from pocsuite3.api import PluginBase
 from pocsuite3.api import logger
 from pocsuite3.api import register_plugin, conf
+from pocsuite3.lib.core.task_source import cidr_target_source
 
 
 class TargetFromCIDR(PluginBase):
@@ -32,10 +33,9 @@ class TargetFromCIDR(PluginBase):
         count = 0
         for i in cidr_set:
             try:
+                # hosts are generated lazily while the tasks are queued
                 network = ip_network(i, strict=False)
-                for host in network.hosts():
-                    self.add_target(host.exploded)
-                    count += 1
+                count += cidr_target_source(str(network))
             except ValueError:
                 logger.error("[PLUGIN] error format from " + i)
         info_msg = "[PLUGIN] get {0} target(s) from CIDR".format(count)
@@ -0,0 +1,13 @@
+import importlib.util
+import os
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_module(*path):
+    """Load a module of apps/ from its file, importing the apps package would create the Flask app"""
+    name = os.path.splitext(path[-1])[0]
+    spec = importlib.util.spec_from_file_location(name, os.path.join(PROJECT_ROOT, *path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,153 @@
+import threading
+import time
+
+import pytest
+
+from apps.weevely.batch_engine import BatchEngine, BatchIdConflict, BatchRegistry, build_tasks
+
+
+class FakeExecutor:
+    """execute_module giả: command 'fail...' lỗi, 'sleep N' chờ N giây"""
+
+    def __init__(self):
+        self.calls = []
+        self.running = {}
+        self.peak = {}
+        self._lock = threading.Lock()
+
+    def execute_module(self, url, password, command, timeout):
+        with self._lock:
+            self.calls.append((url, command))
+            self.running[url] = self.running.get(url, 0) + 1
+            self.peak[url] = max(self.peak.get(url, 0), self.running[url])
+        try:
+            if command.startswith('sleep '):
+                time.sleep(float(command.split()[1]))
+            if command.startswith('fail'):
+                return {'success': False, 'error': 'failed', 'module_command': command}
+            return {'success': True, 'output': command, 'module_command': command}
+        finally:
+            with self._lock:
+                self.running[url] -= 1
+
+
+TARGET = {'url': 'http://a/agent.php', 'password': 'pw', 'target': 'a'}
+
+
+def run(commands, targets=(TARGET,), **kwargs):
+    executor = FakeExecutor()
+    streamed = []
+    engine = BatchEngine(executor, on_result=streamed.append, **kwargs)
+    summary = engine.run(build_tasks(list(targets), commands))
+    return executor, summary, streamed
+
+
+def test_dependencies_run_after_their_parents():
+    commands = [
+        {'id': 'child', 'command': 'child', 'depends_on': ['parent']},
+        {'id': 'parent', 'command': 'sleep 0.1'},
+        {'id': 'free', 'command': 'free'},
+    ]
+    executor, summary, streamed = run(commands, max_workers=4, per_target_limit=4)
+    order = [command for _, command in executor.calls]
+    assert order.index('child') > order.index('sleep 0.1')
+    assert summary['successful_commands'] == 3
+    # kết quả tổng hợp theo thứ tự command, stream theo thứ tự xong
+    assert [r['task_id'] for r in summary['results']] == ['child', 'parent', 'free']
+    assert streamed[-1]['task_id'] == 'child'
+
+
+def test_failure_skips_every_dependent():
+    commands = [
+        {'id': 'a', 'command': 'fail'},
+        {'id': 'b', 'command': 'b', 'depends_on': 'a'},
+        {'id': 'c', 'command': 'c', 'depends_on': ['b']},
+        {'id': 'd', 'command': 'd'},
+    ]
+    executor, summary, _ = run(commands)
+    status = {r['task_id']: r['status'] for r in summary['results']}
+    assert status == {'a': 'failed', 'b': 'skipped', 'c': 'skipped', 'd': 'success'}
+    assert [command for _, command in executor.calls if command in 'bc'] == []
+    assert (summary['failed_commands'], summary['skipped_commands']) == (3, 2)
+
+
+def test_unknown_dependency_and_cycle_are_skipped():
+    commands = [
+        {'id': 'a', 'command': 'a', 'depends_on': ['missing']},
+        {'id': 'b', 'command': 'b', 'depends_on': ['c']},
+        {'id': 'c', 'command': 'c', 'depends_on': ['b']},
+    ]
+    executor, summary, _ = run(commands)
+    assert executor.calls == []
+    errors = [r['result']['error'] for r in summary['results']]
+    assert errors == ['Unknown dependency: missing', 'Skipped: dependency cycle', 'Skipped: dependency cycle']
+
+
+def test_fanout_keeps_dependencies_per_target():
+    targets = [dict(TARGET, url=f"http://{name}/agent.php", target=name) for name in 'abc']
+    commands = [
+        {'id': 'first', 'command': 'sleep 0.05'},
+        {'id': 'second', 'command': 'second', 'depends_on': ['first']},
+    ]
+    executor, summary, _ = run(commands, targets, max_workers=8, per_target_limit=1)
+    assert summary['total_commands'] == 6
+    assert summary['successful_commands'] == 6
+    assert [r['task_id'] for r in summary['results']] == ['a:first', 'a:second', 'b:first', 'b:second',
+                                                         'c:first', 'c:second']
+    for name in 'abc':
+        url = f"http://{name}/agent.php"
+        assert [command for u, command in executor.calls if u == url] == ['sleep 0.05', 'second']
+        assert executor.peak[url] == 1
+
+
+def test_fanout_failure_stays_on_its_target():
+    targets = [dict(TARGET, url='http://a/agent.php', target='a'), dict(TARGET, url='http://b/agent.php', target='b')]
+    commands = [{'id': 'x', 'command': 'x'}, {'id': 'y', 'command': 'y', 'depends_on': ['x']}]
+
+    class FailOnA(FakeExecutor):
+        def execute_module(self, url, password, command, timeout):
+            if url == 'http://a/agent.php' and command == 'x':
+                command = 'fail'
+            return super().execute_module(url, password, command, timeout)
+
+    engine = BatchEngine(FailOnA())
+    summary = engine.run(build_tasks(targets, commands))
+    status = {r['task_id']: r['status'] for r in summary['results']}
+    assert status == {'a:x': 'failed', 'a:y': 'skipped', 'b:x': 'success', 'b:y': 'success'}
+
+
+def test_global_cap_and_cancel():
+    targets = [dict(TARGET, url=f"http://{i}/agent.php", target=str(i)) for i in range(6)]
+    executor = FakeExecutor()
+    engine = BatchEngine(executor, max_workers=2)
+    started = time.time()
+    summary = engine.run(build_tasks(targets, ['sleep 0.1']))
+    assert time.time() - started >= 0.3
+    assert summary['successful_commands'] == 6
+
+    engine = BatchEngine(executor, max_workers=1, on_result=lambda entry: engine.cancel())
+    summary = engine.run(build_tasks(targets, ['run']))
+    assert summary['successful_commands'] == 1
+    assert summary['skipped_commands'] == 5
+
+
+def test_registry_rejects_a_running_batch_id():
+    registry = BatchRegistry()
+    batch_id = registry.create('client-batch-1', 2)
+    with pytest.raises(BatchIdConflict):
+        registry.create('client-batch-1', 3)
+    registry.add_result(batch_id, {'task_id': '0'})
+    assert registry.get(batch_id)['completed'] == 1
+
+    registry.finish(batch_id, {'success': True, 'results': []})
+    assert registry.create('client-batch-1', 3) == 'client-batch-1'
+    assert registry.get(batch_id)['completed'] == 0
+    assert registry.get(batch_id)['status'] == 'running'
+
+
+def test_registry_rejects_malformed_ids():
+    registry = BatchRegistry()
+    for batch_id in ('short', 'x' * 65, '../../batch', 'batch id 1'):
+        with pytest.raises(BatchIdConflict):
+            registry.create(batch_id)
+    assert len(registry.create()) == 32
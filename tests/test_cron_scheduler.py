@@ -0,0 +1,169 @@
+import datetime as dt
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from apps.weevely.cron_scheduler import WeevelyCronScheduler
+
+START = dt.datetime(2026, 1, 1, 12, 0)
+
+
+class Clock:
+    def __init__(self, now=START):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, **kwargs):
+        self.now += dt.timedelta(**kwargs)
+
+
+class Job:
+    def __init__(self, job_id, cron_expression='*/5 * * * *', last_run=START, is_active=True):
+        self.id = job_id
+        self.name = f"job{job_id}"
+        self.cron_expression = cron_expression
+        self.last_run = last_run
+        self.next_run = None
+        self.is_active = is_active
+        self.saved = 0
+
+    def save(self):
+        self.saved += 1
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def scheduler(clock):
+    return WeevelyCronScheduler(clock=clock)
+
+
+def test_jobs_are_due_in_next_run_order(scheduler, clock):
+    scheduler._push(1, START + dt.timedelta(minutes=3))
+    scheduler._push(2, START + dt.timedelta(minutes=1))
+    scheduler._push(3, START + dt.timedelta(minutes=2))
+    scheduler._push(4, START + dt.timedelta(minutes=10))
+    assert scheduler._pop_due(clock()) == []
+    clock.advance(minutes=3)
+    assert scheduler._pop_due(clock()) == [2, 3, 1]
+    assert scheduler._pop_due(clock()) == []
+    assert scheduler.get_scheduler_status()['next_run'] == (START + dt.timedelta(minutes=10)).isoformat()
+
+
+def test_reschedule_uses_the_clock(scheduler, clock):
+    job = Job(1)
+    clock.advance(minutes=2)
+    scheduler.reschedule(job)
+    assert job.next_run == START + dt.timedelta(minutes=5)
+    assert job.saved == 1
+
+    # job chưa chạy lần nào thì đến hạn ngay
+    new_job = Job(2, last_run=None)
+    scheduler.reschedule(new_job)
+    assert new_job.next_run == clock()
+    assert scheduler._pop_due(clock()) == [2]
+
+
+def test_rescheduled_job_drops_its_old_run(scheduler, clock):
+    job = Job(1)
+    scheduler.reschedule(job)
+    assert job.next_run == START + dt.timedelta(minutes=5)
+
+    job.cron_expression = '0 * * * *'
+    scheduler.reschedule(job)
+    clock.advance(minutes=5)
+    assert scheduler._pop_due(clock()) == []
+    clock.advance(minutes=55)
+    assert scheduler._pop_due(clock()) == [1]
+
+
+def test_inactive_job_is_unscheduled(scheduler, clock):
+    job = Job(1)
+    scheduler.reschedule(job)
+    job.is_active = False
+    scheduler.reschedule(job)
+    clock.advance(days=1)
+    assert scheduler._pop_due(clock()) == []
+    assert scheduler.get_scheduler_status()['scheduled_jobs_count'] == 0
+
+
+class Runner:
+    """Thay _execute_job_safe: job chạy tới khi được release"""
+
+    def __init__(self):
+        self.started = []
+        self.release = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, job_id):
+        with self.lock:
+            self.started.append(job_id)
+            event = self.release.setdefault(job_id, threading.Event())
+        assert event.wait(5)
+
+    def finish(self, job_id):
+        with self.lock:
+            self.release.setdefault(job_id, threading.Event()).set()
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.time() + timeout
+    while not predicate():
+        assert time.time() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def runner(scheduler, monkeypatch):
+    runner = Runner()
+    monkeypatch.setattr(scheduler, '_execute_job_safe', runner)
+    scheduler._executor = ThreadPoolExecutor(max_workers=2)
+    yield runner
+    for job_id in list(runner.release):
+        runner.finish(job_id)
+    scheduler._executor.shutdown(wait=True)
+
+
+def test_jobs_of_one_connection_run_in_turn(scheduler, runner):
+    scheduler._enqueue(1, 'conn')
+    scheduler._enqueue(2, 'conn')
+    scheduler._enqueue(3, 'other')
+    wait_until(lambda: sorted(runner.started) == [1, 3])
+    # job 2 đã chờ sẵn thì không xếp thêm lần nữa
+    scheduler._enqueue(2, 'conn')
+    assert scheduler.get_scheduler_status()['queued_jobs'] == 1
+    runner.finish(1)
+    wait_until(lambda: runner.started[-1] == 2)
+    runner.finish(2)
+    runner.finish(3)
+    wait_until(lambda: scheduler.get_scheduler_status()['busy_connections'] == 0)
+    assert runner.started.count(2) == 1
+
+
+def test_unscheduling_a_running_job(scheduler, runner, clock):
+    job = Job(1)
+    scheduler.reschedule(job)
+    clock.advance(minutes=5)
+    assert scheduler._pop_due(clock()) == [1]
+    # như _fire_jobs: lần sau được xếp lịch trước khi job chạy
+    scheduler._push(1, START + dt.timedelta(minutes=10))
+    scheduler._enqueue(1, 'conn')
+    scheduler._enqueue(2, 'conn')
+    wait_until(lambda: runner.started == [1])
+    # job 1 đang chạy bị xóa, đồng thời lần chạy tiếp của nó đã đến hạn và chờ sau job 2
+    scheduler._enqueue(1, 'conn')
+    scheduler.unschedule(1)
+    runner.finish(1)
+    wait_until(lambda: runner.started == [1, 2])
+    runner.finish(2)
+    wait_until(lambda: scheduler.get_scheduler_status()['busy_connections'] == 0)
+    assert runner.started == [1, 2]
+    clock.advance(days=1)
+    assert scheduler._pop_due(clock()) == []
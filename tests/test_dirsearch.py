@@ -0,0 +1,131 @@
+import json
+import os
+import signal
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pocsuite3.lib.core.option import init_options
+from tests import PROJECT_ROOT
+
+# _Dirseach_ import _Pipeline_ tương đối, nạp như package Recon_Dirsearch
+sys.path.insert(0, os.path.join(PROJECT_ROOT, 'apps', 'reconna'))
+from Recon_Dirsearch._Dirseach_ import Recon_Directory  # noqa: E402
+
+FOUND = {'/admin', '/login', '/backup'}
+PATHS = ['admin', 'login', 'backup'] + [f"missing{i}" for i in range(60)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    reject_head = False
+    methods = None
+
+    def _respond(self, with_body):
+        self.methods.append(self.command)
+        found = self.path in FOUND or self.path == '/'
+        body = b'ok' if found else b'not found ' * 200
+        self.send_response(200 if found else 404)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if with_body:
+            self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond(True)
+
+    def do_HEAD(self):
+        if self.reject_head:
+            self.methods.append('HEAD')
+            self.send_response(405)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        else:
+            self._respond(False)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    handler = type('TestHandler', (Handler,), {'methods': []})
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    httpd.handler = handler
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def wordlist(tmp_path):
+    path = tmp_path / 'words.txt'
+    path.write_text('\n'.join(PATHS) + '\n\n')
+    return str(path)
+
+
+@pytest.fixture(scope='module', autouse=True)
+def pocsuite_options():
+    # requests đã được pocsuite3 patch, app gọi init_options() khi import (apps/home/routes.py)
+    init_options()
+
+
+@pytest.fixture(autouse=True)
+def keep_signal_handlers():
+    # Recon_Directory đăng ký SIGINT/SIGTERM handler
+    handlers = signal.getsignal(signal.SIGINT), signal.getsignal(signal.SIGTERM)
+    yield
+    signal.signal(signal.SIGINT, handlers[0])
+    signal.signal(signal.SIGTERM, handlers[1])
+
+
+def scan(server, wordlist, **kwargs):
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    scanner = Recon_Directory(base_url, wordlist_file=wordlist, threads=4, timeout=5, **kwargs)
+    assert scanner.start_scan()
+    assert scanner.wait_for_completion(timeout=30)
+    return scanner
+
+
+@pytest.mark.parametrize('backend', ['threads', 'pipeline'])
+def test_scan_keeps_only_found_urls(server, wordlist, backend):
+    scanner = scan(server, wordlist, backend=backend)
+    assert sorted(r['path'] for r in scanner.get_found_urls()) == ['admin', 'backup', 'login']
+    assert scanner.get_status()['status_counts'] == {'200': 3, '404': 60}
+    assert scanner.get_summary()['total_scanned'] == len(PATHS)
+    assert scanner.total_paths == len(PATHS)
+    assert set(server.handler.methods) == {'HEAD'}
+
+
+@pytest.mark.parametrize('backend', ['threads', 'pipeline'])
+def test_rejected_head_falls_back_to_get(server, wordlist, backend):
+    server.handler.reject_head = True
+    scanner = scan(server, wordlist, backend=backend)
+    assert len(scanner.get_found_urls()) == 3
+    assert scanner.get_status()['status_counts'] == {'200': 3, '404': 60}
+    assert 'GET' in server.handler.methods
+
+
+def test_misses_are_spilled_to_file(server, wordlist, tmp_path):
+    spill_file = str(tmp_path / 'misses.jsonl')
+    scanner = scan(server, wordlist, spill_file=spill_file)
+    with open(spill_file) as f:
+        misses = [json.loads(line) for line in f]
+    assert len(misses) == 60
+    assert all(miss['status_code'] == 404 for miss in misses)
+    assert len(scanner.get_results()) == len(PATHS)
+    assert len(scanner.get_results(found_only=True)) == 3
+
+
+def test_stop_ends_scan(server, wordlist):
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    scanner = Recon_Directory(base_url, wordlist_file=wordlist, threads=1, timeout=5,
+                              callback=lambda result: scanner.stop())
+    scanner.start_scan()
+    assert scanner.wait_for_completion(timeout=10)
+    assert scanner.get_summary()['was_interrupted']
+    assert scanner.scanned_count < len(PATHS)
@@ -0,0 +1,74 @@
+import threading
+
+from apps import jobs
+
+
+class SleepJob(jobs.Job):
+    def __init__(self, release, fail=False):
+        super().__init__()
+        self.release = release
+        self.fail = fail
+
+    def to_dict(self):
+        return {'job_id': self.job_id, 'status': self.state, 'done': self.state in jobs.FINISHED_STATES,
+                'error': self.error}
+
+
+class SleepManager(jobs.JobManager):
+    kind = 'Sleep job'
+
+    def submit(self, release, fail=False):
+        return self._enqueue(SleepJob(release, fail))
+
+    def _execute(self, job):
+        job.release.wait(5)
+        if job.fail:
+            raise RuntimeError('boom')
+
+
+def test_jobs_beyond_max_workers_wait():
+    manager = SleepManager(max_workers=2)
+    release = threading.Event()
+    job_ids = [manager.submit(release) for _ in range(3)]
+    assert manager.stats() == {'max_workers': 2, 'running': 2, 'queued': 1, 'jobs': 3}
+    assert manager.status(job_ids[2])['queue_position'] == 0
+    release.set()
+    for job_id in job_ids:
+        assert manager.wait(job_id, 5)['status'] == jobs.DONE
+    assert manager.stats()['running'] == 0
+
+
+def test_failure_is_reported():
+    manager = SleepManager()
+    finished = []
+    notified = threading.Event()
+    manager.on_finish = lambda job: (finished.append(job), notified.set())
+    release = threading.Event()
+    release.set()
+    job_id = manager.submit(release, fail=True)
+    assert manager.wait(job_id, 5)['status'] == jobs.FAILED
+    # on_finish được gọi sau khi job chuyển trạng thái
+    assert notified.wait(5)
+    assert finished == [manager.status(job_id)]
+    assert finished[0]['error'] == 'boom'
+
+
+def test_finished_jobs_are_purged():
+    manager = SleepManager(result_ttl=0, max_jobs=10)
+    release = threading.Event()
+    release.set()
+    job_id = manager.submit(release)
+    manager.wait(job_id, 5)
+    # result_ttl=0: job đã xong bị xóa ở lần đọc sau
+    assert manager.status(job_id) is None
+
+    manager = SleepManager(max_jobs=2)
+    done = [manager.submit(release) for _ in range(2)]
+    for job_id in done:
+        manager.wait(job_id, 5)
+    blocked = threading.Event()
+    running = manager.submit(blocked)
+    assert manager.get(done[0]) is None
+    assert manager.get(running) is not None
+    blocked.set()
+    assert manager.wait(running, 5)['status'] == jobs.DONE
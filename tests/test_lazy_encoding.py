@@ -0,0 +1,62 @@
+import codecs
+
+from requests.models import Response
+
+from pocsuite3.lib.request.patch import lazy_encoding
+from pocsuite3.lib.request.patch.lazy_encoding import defer_encoding, sniff_encoding
+
+
+def make_response(body, url="http://example.com/", content_type="text/html"):
+    resp = Response()
+    resp._content = body
+    resp.url = url
+    resp.status_code = 200
+    resp.headers["Content-Type"] = content_type
+    resp.encoding = "ISO-8859-1"
+    defer_encoding(resp)
+    return resp
+
+
+def setup_function(function):
+    lazy_encoding._encodings.clear()
+
+
+def test_sniff_bom_and_declaration():
+    assert sniff_encoding(codecs.BOM_UTF8 + b"abc") == ("utf-8-sig", True)
+    assert sniff_encoding(b'<meta charset="gbk"><p>x</p>') == ("gbk", True)
+
+
+def test_sniff_ascii_guess_is_utf8():
+    assert sniff_encoding(b"<html>not found</html>") == ("utf-8", False)
+
+
+def test_ascii_page_does_not_poison_host_cache():
+    not_found = make_response(b"<html>404 not found</html>")
+    assert not_found.text == "<html>404 not found</html>"
+
+    page = make_response("<p>登录成功</p>".encode("utf-8"))
+    assert page.text == "<p>登录成功</p>"
+    assert lazy_encoding._encodings == {}
+
+
+def test_long_ascii_prefix_then_utf8():
+    body = b"<p>" + b"a" * lazy_encoding.CHARSET_SNIFF_BYTES + "登录成功</p>".encode("utf-8")
+    assert make_response(body).text.endswith("登录成功</p>")
+
+
+def test_declared_charset_is_cached_per_host():
+    first = make_response('<meta charset="gbk"><p>登录</p>'.encode("gbk"))
+    assert first.text.endswith("登录</p>")
+    key = ("example.com", "text/html")
+    assert lazy_encoding._encodings[key] == "gbk"
+
+    second = make_response("<p>成功</p>".encode("gbk"))
+    assert second.encoding == "gbk"
+    assert second.text == "<p>成功</p>"
+
+
+def test_explicit_encoding_wins():
+    resp = make_response("<p>登录</p>".encode("utf-8"))
+    resp.encoding = "latin-1"
+    assert resp.encoding == "latin-1"
+    assert lazy_encoding._encodings == {}
@@ -0,0 +1,193 @@
+import json
+
+import pytest
+from flask import Flask
+
+from apps import db
+from apps.home import poc_campaigns
+from apps.models import Reports, Targets, VerificationResults
+from pocsuite3.lib.core.option import init_options
+
+
+@pytest.fixture
+def app(monkeypatch):
+    app = Flask(__name__)
+    # sqlite:// của flask_sqlalchemy dùng chung một connection cho mọi thread
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    monkeypatch.setattr(poc_campaigns, 'count_poc_files', lambda: 10)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+
+
+def add_targets(app, count, **fields):
+    with app.app_context():
+        targets = [Targets(hostname=f"host{i}.example", ip_address=f"10.0.0.{i}", server_type='web', **fields)
+                   for i in range(count)]
+        db.session.add_all(targets)
+        db.session.commit()
+        return [target.server_id for target in targets]
+
+
+def entry(path, result='ok'):
+    return {'poc': {'path': path, 'name': path}, 'result': {'Result': result}}
+
+
+def row(i):
+    return {'target_hostname': f"host{i}", 'poc_id': 'poc', 'poc_path': 'pocs/poc', 'target_ip': '10.0.0.1',
+            'result_data': '{}', 'status': 'completed', 'notes': 'test'}
+
+
+def count_rows(app):
+    with app.app_context():
+        return VerificationResults.query.count()
+
+
+def test_iter_targets_reads_pages_by_server_id(app, monkeypatch):
+    ids = add_targets(app, 7)
+    add_targets(app, 2, status='inactive')
+    with app.app_context():
+        db.session.add(Reports(server_id=ids[1], wappalyzer='WordPress (v5.2)'))
+        db.session.commit()
+    queries = []
+    target_query = poc_campaigns.target_query
+    monkeypatch.setattr(poc_campaigns, 'target_query', lambda f: queries.append(f) or target_query(f))
+
+    targets = poc_campaigns.iter_targets(app, {'status': 'active'}, page_size=3)
+    first = next(targets)
+    # target bị xóa trong lúc đọc không làm lệch trang sau (keyset, không offset)
+    with app.app_context():
+        Targets.query.filter_by(server_id=ids[0]).delete()
+        db.session.commit()
+    rest = list(targets)
+    assert [first[0]] + [t[0] for t in rest] == ids
+    assert first[1:3] == ('host0.example', '10.0.0.0')
+    assert len(queries) == 4
+    assert rest[0][3].known and not rest[1][3].known
+
+
+def test_rows_are_written_in_batches(app):
+    writer = poc_campaigns.ResultWriter(app, batch_size=3)
+    for i in range(7):
+        writer.add(row(i))
+    assert (writer.commits, writer.written, count_rows(app)) == (2, 6, 6)
+    assert writer.flush()
+    assert (writer.commits, writer.written, count_rows(app)) == (3, 7, 7)
+    assert writer.flush()
+    assert writer.commits == 3
+
+
+def test_target_reports_merge_per_poc(app):
+    [server_id] = add_targets(app, 1)
+    writer = poc_campaigns.ResultWriter(app, batch_size=10)
+    writer.target_done(server_id, [entry('pocs/a'), entry('pocs/b')])
+    writer.flush()
+    writer.target_done(server_id, [entry('pocs/b', 'new'), entry('pocs/c')])
+    writer.flush()
+    with app.app_context():
+        pocs = json.loads(Reports.query.filter_by(server_id=server_id).one().pocs)
+        assert [(e['poc']['path'], e['result']['Result']) for e in pocs] == [
+            ('pocs/a', 'ok'), ('pocs/b', 'new'), ('pocs/c', 'ok')]
+        assert Targets.query.get(server_id).exploitation_level == '3/10'
+
+
+def test_merge_poc_entries():
+    current = json.dumps([entry('pocs/a'), entry('pocs/b'), 'legacy'])
+    merged = poc_campaigns.merge_poc_entries(current, [entry('pocs/a', 'new')])
+    assert merged == [entry('pocs/b'), 'legacy', entry('pocs/a', 'new')]
+    assert poc_campaigns.merge_poc_entries('not json', [entry('pocs/a')]) == [entry('pocs/a')]
+    assert poc_campaigns.merge_poc_entries('{"a": 1}', [entry('pocs/a')]) == [entry('pocs/a')]
+    assert poc_campaigns.merge_poc_entries(None, []) == []
+
+
+def test_failed_flush_is_retried(app, monkeypatch):
+    [server_id] = add_targets(app, 1)
+    bulk_create = VerificationResults.bulk_create.__func__
+    failures = [RuntimeError('database is locked')]
+
+    def flaky(cls, rows, commit=True):
+        if failures:
+            raise failures.pop()
+        return bulk_create(cls, rows, commit)
+
+    monkeypatch.setattr(VerificationResults, 'bulk_create', classmethod(flaky))
+    writer = poc_campaigns.ResultWriter(app, batch_size=2, retry_delay=60)
+    writer.add(row(0))
+    writer.target_done(server_id, [entry('pocs/a', 'old')])
+    writer.add(row(1))
+    assert writer.stats()['errors'] == 2
+    assert writer.pending() == 3
+    # không flush tự động trong retry_delay sau lỗi
+    writer.add(row(2))
+    writer.target_done(server_id, [entry('pocs/a', 'new'), entry('pocs/b')])
+    assert writer.commits == 0
+
+    assert writer.flush()
+    assert count_rows(app) == 3
+    assert writer.stats() == {'written': 3, 'targets_written': 1, 'commits': 1, 'errors': 2, 'dropped': 0,
+                              'pending': 0}
+    with app.app_context():
+        pocs = json.loads(Reports.query.filter_by(server_id=server_id).one().pocs)
+        assert [(e['poc']['path'], e['result']['Result']) for e in pocs] == [('pocs/a', 'new'), ('pocs/b', 'ok')]
+
+
+def test_batch_is_dropped_after_max_retries(app, monkeypatch):
+    def broken(cls, rows, commit=True):
+        raise RuntimeError('bad row')
+
+    monkeypatch.setattr(VerificationResults, 'bulk_create', classmethod(broken))
+    writer = poc_campaigns.ResultWriter(app, batch_size=10, max_retries=2, retry_delay=0)
+    writer.add(row(0))
+    assert not writer.close(wait=0)
+    assert writer.stats()['dropped'] == 1
+    assert writer.pending() == 0
+    assert writer.errors == 3
+
+
+class FakePoc:
+    def __init__(self, path):
+        self.name = path
+        self.vulID = path
+        self.appName = 'app'
+        self.appVersion = '1'
+
+
+def test_cancel_keeps_partial_targets(app, monkeypatch):
+    # TaskScheduler của pocsuite3 đọc kb.thread_continue
+    init_options()
+    ids = add_targets(app, 2)
+    pocs = ['pocs/a', 'pocs/b', 'pocs/c']
+    campaign = poc_campaigns.Campaign(app, pocs, options={'full_matrix': True, 'threads': 1})
+    ran = []
+
+    class FakeContext:
+        def __init__(self, poc, params):
+            self.poc = poc
+            self.target = params['target-value']
+
+        def run(self, mode, scheduler=None):
+            ran.append((self.target, self.poc.name))
+            if len(ran) == 2:
+                # hủy campaign giữa target đầu tiên
+                campaign.stop.set()
+            return None, {'Result': 'ok'}
+
+        def report(self, output):
+            return {'status': 'success' if self.poc.name == 'pocs/a' else 'Fail'}
+
+    monkeypatch.setattr(poc_campaigns, 'load_poc', FakePoc)
+    monkeypatch.setattr(poc_campaigns, 'PocContext', FakeContext)
+    poc_campaigns.CampaignRun(campaign, threads=1, batch_size=50).run()
+
+    assert ran == [('host0.example', 'pocs/a'), ('host0.example', 'pocs/b')]
+    assert (campaign.completed, campaign.vulnerable, campaign.targets_done) == (2, 1, 0)
+    assert count_rows(app) == 2
+    with app.app_context():
+        report = Reports.query.filter_by(server_id=ids[0]).one()
+        assert [e['poc']['path'] for e in json.loads(report.pocs)] == ['pocs/a', 'pocs/b']
+        assert Targets.query.get(ids[0]).exploitation_level == '2/10'
+        assert Reports.query.filter_by(server_id=ids[1]).first() is None
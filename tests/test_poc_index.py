@@ -0,0 +1,140 @@
+import os
+
+import pytest
+
+from pocsuite3.lib.core.data import paths
+from pocsuite3.lib.core.interpreter import PocsuiteInterpreter
+from pocsuite3.lib.core.option import init_options
+from pocsuite3.lib.core.poc_index import PocIndex
+
+POC = '''
+from pocsuite3.api import POCBase, register_poc
+from pocsuite3.lib.core.enums import VUL_TYPE
+
+
+class DemoPoc(POCBase):
+    vulID = '1'
+    author = '{author}'
+    name = '{name}'
+    appName = 'Demo App'
+    appVersion = '<= 1.{minor}'
+    references = 'https://example.com/{name}'
+    vulType = VUL_TYPE.CODE_EXECUTION
+
+
+register_poc(DemoPoc)
+'''
+
+
+def write_poc(path, mtime, **fields):
+    values = dict(author='me', name='demo', minor=0)
+    values.update(fields)
+    path.write_text(POC.format(**values))
+    os.utime(str(path), (mtime, mtime))
+
+
+@pytest.fixture
+def poc_root(tmp_path, monkeypatch):
+    root = tmp_path / 'pocsuite3'
+    (root / 'pocs').mkdir(parents=True)
+    monkeypatch.setitem(paths, 'POCSUITE_ROOT_PATH', str(root))
+    monkeypatch.setitem(paths, 'POCSUITE_POCS_PATH', str(root / 'pocs'))
+    monkeypatch.setitem(paths, 'POCSUITE_POC_INDEX', str(tmp_path / 'data' / 'poc_index.db'))
+    return root
+
+
+@pytest.fixture
+def interpreter(poc_root):
+    write_poc(poc_root / 'pocs' / 'first.py', 1000, name='first')
+    init_options()
+    interpreter = PocsuiteInterpreter()
+    # chỉ số generation trong DB quyết định khi nào phải sync lại
+    interpreter.POC_INDEX_REFRESH_INTERVAL = 3600
+    yield interpreter
+    init_options()
+
+
+def names(modules):
+    return {module['path']: module['name'] for module in modules}
+
+
+def test_metadata_of_a_poc(interpreter):
+    [module] = interpreter.get_all_modules()
+    assert module == {'appname': 'Demo App', 'name': 'first', 'appversion': '<= 1.0', 'path': 'pocs/first',
+                      'author': 'me', 'references': 'https://example.com/first', 'vulType': 'CODE_EXECUTION'}
+
+
+def test_added_modified_and_deleted_pocs_are_detected(interpreter, poc_root):
+    pocs = poc_root / 'pocs'
+    write_poc(pocs / 'second.py', 1000, name='second')
+    interpreter.refresh_modules()
+    assert names(interpreter.get_all_modules()) == {'pocs/first': 'first', 'pocs/second': 'second'}
+
+    # cùng kích thước, mtime khác
+    write_poc(pocs / 'first.py', 2000, name='FIRST')
+    assert interpreter.poc_index.sync(str(poc_root), ['pocs/first', 'pocs/second'],
+                                      interpreter.parse_poc_metadata) == 1
+    assert names(interpreter.get_all_modules())['pocs/first'] == 'FIRST'
+
+    os.remove(str(pocs / 'second.py'))
+    interpreter.refresh_modules()
+    assert names(interpreter.get_all_modules()) == {'pocs/first': 'FIRST'}
+
+
+def test_unchanged_pocs_are_not_parsed_again(interpreter, poc_root):
+    calls = []
+
+    def parser(code):
+        calls.append(code)
+        return interpreter.parse_poc_metadata(code)
+
+    index = interpreter.poc_index
+    assert index.sync(str(poc_root), ['pocs/first'], parser) == 0
+    # chỉ touch: mtime đổi nhưng nội dung giống, không parse lại
+    os.utime(str(poc_root / 'pocs' / 'first.py'), (3000, 3000))
+    assert index.sync(str(poc_root), ['pocs/first'], parser) == 0
+    assert calls == []
+    write_poc(poc_root / 'pocs' / 'first.py', 3000, minor=12)
+    assert index.sync(str(poc_root), ['pocs/first'], parser) == 1
+    assert len(calls) == 1
+
+
+def test_other_processes_see_the_change(interpreter, poc_root):
+    # một interpreter khác dùng chung file index
+    other = PocIndex(paths.POCSUITE_POC_INDEX)
+    other.sync(str(poc_root), ['pocs/first'], interpreter.parse_poc_metadata)
+    assert not other.is_stale(3600)
+    write_poc(poc_root / 'pocs' / 'third.py', 1000, name='third')
+    interpreter.refresh_modules()
+    assert other.is_stale(3600)
+
+    write_poc(poc_root / 'pocs' / 'fourth.py', 1000, name='fourth')
+    other.sync(str(poc_root), ['pocs/first', 'pocs/third', 'pocs/fourth'], interpreter.parse_poc_metadata)
+    # get_all_modules sync lại khi generation trong DB đã đổi
+    assert set(names(interpreter.get_all_modules())) == {'pocs/first', 'pocs/third', 'pocs/fourth'}
+
+
+def test_malformed_poc_is_still_listed(interpreter, poc_root):
+    pocs = poc_root / 'pocs'
+    (pocs / 'broken.py').write_bytes(b'class Broken(POCBase:\n    name = \xff\xfe\n    vulType =\n')
+    (pocs / 'empty.py').write_text('')
+    interpreter.refresh_modules()
+    modules = {module['path']: module for module in interpreter.get_all_modules()}
+    assert set(modules) == {'pocs/first', 'pocs/broken', 'pocs/empty'}
+    assert modules['pocs/empty']['name'] is None
+    assert modules['pocs/empty']['vulType'] == ''
+
+
+def test_parser_error_does_not_stop_the_sync(poc_root):
+    pocs = poc_root / 'pocs'
+    write_poc(pocs / 'a.py', 1000, name='a')
+    write_poc(pocs / 'b.py', 1000, name='b')
+
+    def parser(code):
+        if "'a'" in code:
+            raise ValueError('bad poc')
+        return {'name': 'b'}
+
+    index = PocIndex(paths.POCSUITE_POC_INDEX)
+    assert index.sync(str(poc_root), ['pocs/a', 'pocs/b'], parser) == 2
+    assert names(index.all()) == {'pocs/a': None, 'pocs/b': 'b'}
@@ -0,0 +1,147 @@
+import threading
+import time
+
+import pytest
+
+from pocsuite3.lib.core.option import init_options
+
+from apps import jobs
+from apps.home import poc_jobs
+
+POC = '''
+import threading
+import time
+
+from pocsuite3.api import register_poc, POCBase, OptString, Output
+from pocsuite3.lib.core.data import conf
+from pocsuite3.lib.request.patch.hook_request import _request_context
+
+
+class JobTestPoc(POCBase):
+    vulID = '1'
+    name = 'job test'
+    appName = 'app'
+    appVersion = '1.0'
+    shells = []
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def _options(self):
+        return {'word': OptString('', 'word'), 'delay': OptString('0', 'delay')}
+
+    def _verify(self):
+        time.sleep(float(self.get_option('delay')))
+        context = _request_context.value
+        output = Output(self)
+        output.success({'word': self.get_option('word'), 'target': self.url,
+                        'agent': context['headers'].get('User-Agent'), 'timeout': context['timeout']})
+        return output
+
+    def _shell(self):
+        with self.lock:
+            self.running[0] += 1
+            self.running[1] = max(self.running)
+        time.sleep(0.2)
+        self.shells.append((conf.connect_back_host, conf.connect_back_port))
+        with self.lock:
+            self.running[0] -= 1
+        return Output(self)
+
+
+register_poc(JobTestPoc)
+'''
+
+
+@pytest.fixture
+def poc_path(tmp_path):
+    init_options()
+    path = tmp_path / 'job_test_poc.py'
+    path.write_text(POC)
+    yield str(path)
+    init_options()
+
+
+def test_contexts_keep_their_own_params(poc_path):
+    poc = poc_jobs.load_poc(poc_path)
+    first = poc_jobs.PocContext(poc, {'target-value': 'http://a.example', 'word-value': 'one', 'agent-value': 'A'})
+    second = poc_jobs.PocContext(poc, {'target-value': 'http://b.example', 'word-value': 'two', 'timeout-value': '7'})
+    _, first_result = first.run('verify')
+    _, second_result = second.run('verify')
+    assert first_result == {'word': 'one', 'target': 'http://a.example', 'agent': 'A', 'timeout': 30.0}
+    assert second_result['word'] == 'two'
+    assert second_result['agent'] is None
+    assert second_result['timeout'] == 7.0
+    # PoC đã load không bị ghi
+    assert poc.get_option('word') == ''
+    assert poc.getg_option('target') == 0
+    assert poc_jobs.load_poc(poc_path) is poc
+
+
+def test_request_context_is_per_thread(poc_path):
+    poc = poc_jobs.load_poc(poc_path)
+    results = {}
+
+    def run(word, agent):
+        context = poc_jobs.PocContext(poc, {'target-value': f"http://{word}.example", 'word-value': word,
+                                            'agent-value': agent, 'delay-value': '0.2'})
+        results[word] = context.run('verify')[1]
+
+    threads = [threading.Thread(target=run, args=(f"w{i}", f"agent{i}")) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for i in range(4):
+        assert results[f"w{i}"]['agent'] == f"agent{i}"
+        assert results[f"w{i}"]['target'] == f"http://w{i}.example"
+
+
+def test_shell_jobs_are_serialized(poc_path):
+    poc = poc_jobs.load_poc(poc_path)
+    manager = poc_jobs.PocJobManager(max_workers=3)
+    job_ids = [manager.submit(poc_path, 'shell', {'target-value': 'http://a.example', 'lhost-value': '10.0.0.1',
+                                                  'lport-value': str(4440 + i)}) for i in range(3)]
+    for job_id in job_ids:
+        assert manager.wait(job_id, 5)['status'] == jobs.DONE
+    assert poc.running[1] == 1
+    assert sorted(poc.shells) == [('10.0.0.1', 4440), ('10.0.0.1', 4441), ('10.0.0.1', 4442)]
+
+
+def test_job_manager_runs_and_reports(poc_path):
+    manager = poc_jobs.PocJobManager(max_workers=1)
+    finished = []
+    manager.on_finish = finished.append
+    running = manager.submit(poc_path, 'verify', {'target-value': 'http://a.example', 'delay-value': '0.3'})
+    queued = manager.submit(poc_path, 'verify', {'target-value': 'http://b.example', 'word-value': 'b'})
+    assert manager.status(queued)['queue_position'] == 0
+    assert manager.stats()['running'] == 1
+
+    # wait có timeout trả về trạng thái chưa xong thay vì chặn
+    started = time.time()
+    assert not manager.wait(queued, 0.05)['done']
+    assert time.time() - started < 0.2
+
+    status = manager.wait(queued, 5)
+    assert status['status'] == jobs.DONE
+    assert status['result']['word'] == 'b'
+    assert status['report']['status'] == 'success'
+    assert [job['job_id'] for job in finished] == [running, queued]
+
+
+def test_queued_job_can_be_cancelled(poc_path):
+    manager = poc_jobs.PocJobManager(max_workers=1)
+    running = manager.submit(poc_path, 'verify', {'target-value': 'http://a.example', 'delay-value': '0.3'})
+    queued = manager.submit(poc_path, 'verify', {'target-value': 'http://b.example'})
+    assert manager.cancel(running) == (False, 'Only queued jobs can be cancelled')
+    assert manager.cancel(queued) == (True, 'Job cancelled')
+    assert manager.status(queued)['status'] == jobs.CANCELLED
+    assert manager.wait(running, 5)['status'] == jobs.DONE
+
+
+def test_failed_job_keeps_its_error(poc_path):
+    manager = poc_jobs.PocJobManager()
+    # target bắt buộc nhưng không có
+    job_id = manager.submit(poc_path, 'verify', {})
+    status = manager.wait(job_id, 5)
+    assert status['status'] == jobs.FAILED
+    assert 'target' in status['error']
@@ -0,0 +1,81 @@
+import importlib.util
+import os
+
+import pytest
+
+from pocsuite3.lib.core import register
+from pocsuite3.lib.core.data import paths
+from pocsuite3.lib.core.register import PocLoader
+
+POC = '''
+class TestPoc(object):
+    name = 'cache test'
+    value = {0}
+'''
+
+
+@pytest.fixture(autouse=True)
+def bytecode_path(tmp_path, monkeypatch):
+    monkeypatch.setitem(paths, 'POCSUITE_BYTECODE_PATH', str(tmp_path / 'bytecode'))
+    return tmp_path / 'bytecode'
+
+
+def load(path):
+    loader = PocLoader('pocs_cache_test', str(path))
+    spec = importlib.util.spec_from_file_location('pocs_cache_test', str(path), loader=loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
+
+
+def count_compiles(monkeypatch):
+    calls = []
+
+    def counting_compile(*args, **kwargs):
+        calls.append(args[1])
+        return compile(*args, **kwargs)
+
+    monkeypatch.setattr(register, 'compile', counting_compile, raising=False)
+    return calls
+
+
+def test_second_load_uses_cached_code(tmp_path, bytecode_path, monkeypatch):
+    poc = tmp_path / 'poc.py'
+    poc.write_text(POC.format(1))
+    compiles = count_compiles(monkeypatch)
+    assert load(poc).TestPoc.value == 1
+    assert len(os.listdir(str(bytecode_path))) == 1
+    assert load(poc).TestPoc.value == 1
+    assert compiles == [str(poc)]
+
+
+def test_edited_poc_misses_the_cache(tmp_path, monkeypatch):
+    poc = tmp_path / 'poc.py'
+    poc.write_text(POC.format(1))
+    load(poc)
+    poc.write_text(POC.format(2))
+    compiles = count_compiles(monkeypatch)
+    assert load(poc).TestPoc.value == 2
+    assert compiles == [str(poc)]
+
+
+def test_cache_of_another_interpreter_is_ignored(tmp_path, bytecode_path, monkeypatch):
+    poc = tmp_path / 'poc.py'
+    poc.write_text(POC.format(1))
+    load(poc)
+    cache_file = os.path.join(str(bytecode_path), os.listdir(str(bytecode_path))[0])
+    with open(cache_file, 'r+b') as f:
+        f.write(b'\0\0\0\0')
+    compiles = count_compiles(monkeypatch)
+    assert load(poc).TestPoc.value == 1
+    assert compiles == [str(poc)]
+
+
+def test_unwritable_cache_still_loads(tmp_path, monkeypatch):
+    blocker = tmp_path / 'blocker'
+    blocker.write_text('')
+    monkeypatch.setitem(paths, 'POCSUITE_BYTECODE_PATH', str(blocker / 'bytecode'))
+    poc = tmp_path / 'poc.py'
+    poc.write_text(POC.format(3))
+    assert load(poc).TestPoc.value == 3
+    assert register.load_cached_code('missing') is None
@@ -0,0 +1,80 @@
+import pytest
+
+from pocsuite3.lib.core.poc_matcher import (
+    Fingerprint, PocMatcher, parse_version_ranges, version_in_ranges, version_tuple)
+
+
+@pytest.mark.parametrize('text, ranges', [
+    ('2.0.0-2.0.8', [((2, 0, 0), (2, 0, 8), True, True)]),
+    ('1.0 ~ 1.9', [((1, 0), (1, 9), True, True)]),
+    ('Struts 2.3.5 - Struts 2.3.31', [((2, 3, 5), (2, 3, 31), True, True)]),
+    ('4.x to 5.2', [((4,), (5, 2), True, True)]),
+    ('2.3.x - 2.5.x', [((2, 3), (2, 5), True, True)]),
+    ('<= 2.6.7', [(None, (2, 6, 7), True, True)]),
+    ('< 4.1', [(None, (4, 1), True, False)]),
+    ('>= 3.0', [((3, 0), None, True, True)]),
+    ('= 1.2', [((1, 2), (1, 2), True, True)]),
+    ('2.3.x', [((2, 3), (2, 3), True, True)]),
+    ('12.2.1.3.0, 12.2.1.4.0', [((12, 2, 1, 3, 0), (12, 2, 1, 3, 0), True, True),
+                                ((12, 2, 1, 4, 0), (12, 2, 1, 4, 0), True, True)]),
+    ('10.3.6 or 12.1.3', [((10, 3, 6), (10, 3, 6), True, True), ((12, 1, 3), (12, 1, 3), True, True)]),
+])
+def test_parse_version_ranges(text, ranges):
+    assert parse_version_ranges(text) == ranges
+
+
+@pytest.mark.parametrize('text', [None, '', 'unknown', 'all', 'all (except 2.5.1)'])
+def test_unparsable_versions_match_everything(text):
+    assert parse_version_ranges(text) is None
+    assert version_in_ranges('1.0', parse_version_ranges(text))
+
+
+def test_version_tuple():
+    assert version_tuple('v6.2.1') == (6, 2, 1)
+    assert version_tuple('') == ()
+
+
+@pytest.mark.parametrize('version, expected', [
+    ('2.0.0', True),
+    ('2.0.8', True),
+    ('2.0.9', False),
+    ('1.9', False),
+    # only a prefix of the version is known
+    ('2.0', True),
+    ('2', True),
+    # no version at all
+    ('', True),
+])
+def test_version_in_closed_range(version, expected):
+    assert version_in_ranges(version, parse_version_ranges('2.0.0-2.0.8')) is expected
+
+
+def test_version_in_open_ranges():
+    below = parse_version_ranges('< 10.3.6')
+    assert version_in_ranges('10.3.5', below)
+    assert not version_in_ranges('10.3.6', below)
+    assert not version_in_ranges('10.4', below)
+    assert version_in_ranges('10.3', below)
+    above = parse_version_ranges('> 5.0')
+    assert version_in_ranges('5.0.1', above)
+    assert not version_in_ranges('5.0', above)
+
+
+def test_matcher_prunes_by_product_and_version():
+    matcher = PocMatcher([
+        ('wp_old.py', 'WordPress', '< 5.0', ''),
+        ('wp_new.py', 'WordPress', '>= 6.0', ''),
+        ('wp_plugin.py', 'WordPress File Manager Plugin', '6.0-6.8', ''),
+        ('weblogic.py', 'WebLogic', '10.3.6', ''),
+        ('generic.py', 'Some CMS', '', ''),
+    ])
+    assert matcher.select(None) == ['wp_old.py', 'wp_new.py', 'wp_plugin.py', 'weblogic.py', 'generic.py']
+
+    fingerprint = Fingerprint()
+    fingerprint.add('WordPress', '6.2')
+    fingerprint.add_component('wordpress', 'file-manager', '6.9')
+    assert matcher.select(fingerprint) == ['wp_new.py', 'generic.py']
+
+    fingerprint = Fingerprint()
+    fingerprint.add_port(7001)
+    assert matcher.select(fingerprint) == ['weblogic.py', 'generic.py']
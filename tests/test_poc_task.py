@@ -0,0 +1,103 @@
+import pytest
+
+from pocsuite3.lib.controller import controller
+from pocsuite3.lib.core.data import cmd_line_options, conf, kb
+from pocsuite3.lib.core.enums import POC_CATEGORY
+from pocsuite3.lib.core.exception import PocsuiteValidationException
+from pocsuite3.lib.core.interpreter_option import OptString
+from pocsuite3.lib.core.option import init_options
+from pocsuite3.lib.core.poc import POCBase
+
+
+class HttpPoc(POCBase):
+    name = 'task test'
+
+    def _options(self):
+        return {'username': OptString('admin', 'user name'), 'password': OptString('', 'password')}
+
+
+class TcpPoc(POCBase):
+    name = 'tcp task test'
+    protocol = POC_CATEGORY.PROTOCOL.FTP
+
+
+@pytest.fixture(autouse=True)
+def pocsuite_options():
+    init_options()
+    yield
+    # không để PoC đăng ký trong kb cho test khác
+    init_options()
+
+
+def test_task_shares_the_definition():
+    poc = HttpPoc()
+    task = poc.new_task()
+    assert isinstance(task, HttpPoc)
+    assert task.options is poc.options
+    assert task.get_option('username') == 'admin'
+
+
+def test_set_option_copies_on_write():
+    poc = HttpPoc()
+    task, sibling = poc.new_task(), poc.new_task()
+    task.set_option('username', 'root')
+    assert task.get_option('username') == 'root'
+    assert poc.get_option('username') == 'admin'
+    assert sibling.get_option('username') == 'admin'
+    # chỉ dict bị ghi được copy, phần còn lại vẫn dùng chung
+    assert task.options is not poc.options
+    assert task.options['password'] is poc.options['password']
+    assert task.global_options is poc.global_options
+
+
+def test_second_write_keeps_the_task_copy():
+    poc = HttpPoc()
+    task = poc.new_task()
+    task.set_option('username', 'root')
+    options = task.options
+    task.set_option('password', 'secret')
+    assert task.options is options
+    assert (task.get_option('username'), task.get_option('password')) == ('root', 'secret')
+    assert poc.get_option('password') == ''
+
+
+def test_build_url_writes_only_the_task():
+    conf.console_mode = False
+    poc = TcpPoc()
+    tasks = [poc.new_task() for _ in range(2)]
+    for task, target in zip(tasks, ('10.0.0.1:21', '10.0.0.2:23')):
+        task.target = target
+        task.build_url()
+    assert [task.getg_option('rhost') for task in tasks] == ['10.0.0.1', '10.0.0.2']
+    assert [task.getg_option('rport') for task in tasks] == [21, 23]
+    assert poc.getg_option('rhost') == 0
+
+
+def test_registered_poc_writes_in_place():
+    poc = HttpPoc()
+    options = poc.options
+    poc.set_option('username', 'root')
+    assert poc.options is options
+    with pytest.raises(PocsuiteValidationException):
+        poc.new_task().set_option('missing', 1)
+
+
+def test_prepared_pocs_reset_per_run(monkeypatch):
+    poc = HttpPoc()
+    kb.registered_pocs['task test'] = poc
+    kb.cmd_line = ['username']
+    cmd_line_options.username = 'first'
+    monkeypatch.setattr(controller, 'run_threads', lambda num, func: [controller.prepare_poc(poc) for _ in range(2)])
+    applied = []
+    apply = controller.apply_cmd_line_options
+    monkeypatch.setattr(controller, 'apply_cmd_line_options', lambda module: (applied.append(module), apply(module)))
+
+    controller.start()
+    assert applied == [poc]
+    assert poc.get_option('username') == 'first'
+
+    # run sau có giá trị mới: PoC được chuẩn bị lại
+    cmd_line_options.username = 'second'
+    controller.start()
+    assert applied == [poc, poc]
+    assert poc.get_option('username') == 'second'
@@ -0,0 +1,137 @@
+import os
+import pty
+import threading
+import time
+import tty
+
+import pytest
+
+from tests import load_module
+
+pty_mux = load_module('apps', 'managershell', 'pty_mux.py')
+
+
+class Handler:
+    def __init__(self):
+        self.data = bytearray()
+        self.calls = 0
+        self.closed = threading.Event()
+        self._lock = threading.Lock()
+
+    def on_data(self, data):
+        with self._lock:
+            self.data += data
+            self.calls += 1
+
+    def on_close(self):
+        self.closed.set()
+
+    def wait_for(self, size, timeout=5):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self._lock:
+                if len(self.data) >= size:
+                    return bytes(self.data)
+            time.sleep(0.01)
+        raise AssertionError(f"got {len(self.data)} of {size} bytes")
+
+
+def fd_open(fd):
+    try:
+        os.fstat(fd)
+        return True
+    except OSError:
+        return False
+
+
+@pytest.fixture
+def mux():
+    mux = pty_mux.PtyMultiplexer()
+    yield mux
+    mux.stop()
+
+
+@pytest.fixture
+def pty_pair():
+    master, slave = pty.openpty()
+    # raw: không echo, không đổi \n thành \r\n
+    tty.setraw(slave)
+    yield master, slave
+    for fd in (master, slave):
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+
+
+def test_output_reaches_its_handler(mux, pty_pair):
+    master, slave = pty_pair
+    handler = Handler()
+    mux.register(master, handler)
+    os.write(slave, b'hello\n')
+    assert handler.wait_for(6) == b'hello\n'
+    assert mux.count() == 1
+
+
+def test_pending_output_is_one_call(pty_pair):
+    master, slave = pty_pair
+    mux = pty_mux.PtyMultiplexer(read_size=256)
+    payload = os.urandom(2000)
+    os.write(slave, payload)
+    handler = Handler()
+    try:
+        mux.register(master, handler)
+        assert handler.wait_for(len(payload)) == payload
+    finally:
+        mux.stop()
+    # fd sẵn sàng được đọc tới khi hết dữ liệu rồi mới gọi handler
+    assert handler.calls == 1
+    assert mux.reads >= len(payload) // 256
+
+
+def test_closed_shell_calls_on_close_and_closes_fd(mux, pty_pair):
+    master, slave = pty_pair
+    handler = Handler()
+    mux.register(master, handler)
+    os.write(slave, b'bye')
+    handler.wait_for(3)
+    os.close(slave)
+    assert handler.closed.wait(5)
+    deadline = time.time() + 5
+    while fd_open(master) and time.time() < deadline:
+        time.sleep(0.01)
+    assert not fd_open(master)
+    assert mux.count() == 0
+
+
+def test_unregister_without_close_keeps_fd(mux, pty_pair):
+    master, slave = pty_pair
+    handler = Handler()
+    mux.register(master, handler)
+    mux.unregister(master, close=False)
+    deadline = time.time() + 5
+    while mux.count() and time.time() < deadline:
+        time.sleep(0.01)
+    assert mux.count() == 0
+    os.write(slave, b'ignored')
+    time.sleep(0.1)
+    assert handler.calls == 0
+    assert not handler.closed.is_set()
+    assert fd_open(master)
+
+
+def test_handlers_are_isolated(mux):
+    pairs = [pty.openpty() for _ in range(3)]
+    handlers = [Handler() for _ in pairs]
+    try:
+        for (master, slave), handler in zip(pairs, handlers):
+            tty.setraw(slave)
+            mux.register(master, handler)
+        for i, (_, slave) in enumerate(pairs):
+            os.write(slave, f"shell{i}".encode())
+        for i, handler in enumerate(handlers):
+            assert handler.wait_for(6) == f"shell{i}".encode()
+    finally:
+        for master, slave in pairs:
+            mux.unregister(master)
+            os.close(slave)
@@ -0,0 +1,61 @@
+import sys
+import threading
+import time
+
+from tests import load_module
+
+job_manager = load_module('apps', 'reconna', 'job_manager.py')
+
+
+def wait_finished(manager, job_id, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        status = manager.status(job_id)
+        if status['done']:
+            return status
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} still {manager.status(job_id)['status']}")
+
+
+def test_command_output_lines_are_items():
+    manager = job_manager.ReconJobManager(max_processes=1)
+    manager.register('echo', job_manager.CommandTool(
+        lambda target, params: [sys.executable, '-c', f"print('a'); print('{target}')"]))
+    job_id = manager.submit('echo', 'b')
+    status = wait_finished(manager, job_id)
+    assert status['status'] == job_manager.DONE
+    assert manager.results(job_id)['items'] == ['a', 'b']
+    assert manager.results(job_id, since=1)['items'] == ['b']
+
+
+def test_cancel_before_handle_stops_process():
+    manager = job_manager.ReconJobManager(max_processes=1)
+    job_ids = []
+    submitted = threading.Event()
+
+    def build(target, params):
+        # cancel() tới khi job đã RUNNING nhưng process chưa được spawn
+        submitted.wait(2)
+        assert manager.cancel(job_ids[0])[0]
+        return [sys.executable, '-c', 'import time; time.sleep(30)']
+
+    manager.register('sleep', job_manager.CommandTool(build))
+    job_ids.append(manager.submit('sleep', 'target'))
+    submitted.set()
+    started = time.time()
+    status = wait_finished(manager, job_ids[0])
+    assert status['status'] == job_manager.CANCELLED
+    assert time.time() - started < 5
+
+
+def test_queued_job_is_cancelled_without_running():
+    manager = job_manager.ReconJobManager(max_processes=1)
+    manager.register('sleep', job_manager.CommandTool(
+        lambda target, params: [sys.executable, '-c', 'import time; time.sleep(30)']))
+    running = manager.submit('sleep', 'a')
+    queued = manager.submit('sleep', 'b')
+    assert manager.status(queued)['queue_position'] == 0
+    assert manager.cancel(queued) == (True, 'Scan cancelled')
+    assert manager.status(queued)['status'] == job_manager.CANCELLED
+    assert manager.cancel(running) == (True, 'Scan stopped')
+    assert wait_finished(manager, running)['status'] == job_manager.CANCELLED
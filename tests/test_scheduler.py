@@ -0,0 +1,119 @@
+import time
+from queue import Empty, Queue
+
+import pytest
+
+from pocsuite3.lib.core.data import kb
+from pocsuite3.lib.core.scheduler import TaskScheduler, target_host
+from pocsuite3.lib.core.settings import HOST_BACKOFF_BASE, HOST_BACKOFF_MAX
+
+
+def make_scheduler(tasks, **kwargs):
+    task_queue = Queue()
+    for seq, target in enumerate(tasks):
+        task_queue.put((seq, target, 'poc'))
+    return TaskScheduler(4, task_queue=task_queue, **kwargs)
+
+
+def next_target(scheduler, now):
+    item, host, wait = scheduler._next_locked(now)
+    return (item[1], wait) if item else (None, wait)
+
+
+@pytest.fixture(autouse=True)
+def scheduler_kb():
+    saved = kb.get('task_feeding'), kb.get('thread_continue')
+    kb.task_feeding = False
+    kb.thread_continue = True
+    yield
+    kb.task_feeding, kb.thread_continue = saved
+
+
+def test_target_host():
+    assert target_host('http://A.b:8080/x') == 'a.b'
+    assert target_host('a.b:8080') == 'a.b'
+    assert target_host('user:pw@a.b') == 'a.b'
+    assert target_host('http://[::1]:80/') == '::1'
+    assert target_host('::1') == '::1'
+
+
+def test_token_bucket_limits_rate_per_host():
+    scheduler = make_scheduler(['http://a/1', 'http://a/2', 'http://a/3', 'http://b/1'], rate=2, burst=2)
+    # host states are created (and their bucket stamped) inside _next_locked
+    now = time.time() + 1
+    assert next_target(scheduler, now)[0] == 'http://a/1'
+    assert next_target(scheduler, now)[0] == 'http://a/2'
+    # bucket of a is empty, its task is parked and b is served instead
+    assert next_target(scheduler, now)[0] == 'http://b/1'
+    target, wait = next_target(scheduler, now)
+    assert target is None
+    assert wait == pytest.approx(0.5)
+    assert next_target(scheduler, now + 0.5)[0] == 'http://a/3'
+
+
+def test_max_inflight_per_host():
+    scheduler = make_scheduler(['http://a/1', 'http://a/2', 'http://b/1'], max_inflight=1)
+    now = scheduler.started_at
+    assert next_target(scheduler, now)[0] == 'http://a/1'
+    assert next_target(scheduler, now)[0] == 'http://b/1'
+    assert next_target(scheduler, now)[0] is None
+    scheduler.release('a', now)
+    assert next_target(scheduler, now)[0] == 'http://a/2'
+
+
+def test_throttling_backs_off_exponentially():
+    scheduler = make_scheduler([], max_inflight=8)
+    scheduler.throttled('http://a/')
+    state = scheduler.hosts['a']
+    first = state.backoff_until - state.refilled_at
+    assert first == pytest.approx(HOST_BACKOFF_BASE, abs=0.05)
+    assert state.factor == 0.5
+    assert scheduler._host_limit(state) == 4
+
+    # answers to requests sent before the backoff do not count again
+    scheduler.throttled('http://a/')
+    assert state.strikes == 1
+
+    state.backoff_until = 0
+    scheduler.throttled('http://a/')
+    assert state.strikes == 2
+    assert state.factor == 0.25
+
+    state.backoff_until = 0
+    scheduler.throttled('http://a/', retry_after=1000)
+    assert state.backoff_until - state.refilled_at <= HOST_BACKOFF_MAX + 0.05
+
+
+def test_backoff_parks_host_tasks():
+    scheduler = make_scheduler(['http://a/1', 'http://b/1'])
+    scheduler.throttled('http://a/', retry_after=5)
+    now = scheduler.started_at
+    assert next_target(scheduler, now)[0] == 'http://b/1'
+    target, wait = next_target(scheduler, now)
+    assert target is None
+    assert next_target(scheduler, scheduler.hosts['a'].backoff_until)[0] == 'http://a/1'
+
+
+def test_clean_tasks_restore_the_factor():
+    scheduler = make_scheduler([])
+    scheduler.throttled('http://a/')
+    state = scheduler.hosts['a']
+    # a host in backoff without a configured limit runs one task at a time
+    assert scheduler._host_limit(state) == 1
+    for _ in range(4):
+        state.inflight += 1
+        scheduler.running += 1
+        scheduler.release('a', state.backoff_until + 1)
+    assert state.factor == 1.0
+    assert state.strikes == 0
+    assert scheduler._host_limit(state) is None
+
+
+def test_get_raises_empty_when_done():
+    scheduler = make_scheduler(['http://a/1'])
+    item, host = scheduler.get()
+    assert host == 'a'
+    scheduler.release(host, scheduler.started_at)
+    with pytest.raises(Empty):
+        scheduler.get()
+    assert scheduler.stats()['completed'] == 1
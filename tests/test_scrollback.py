@@ -0,0 +1,99 @@
+import os
+
+from tests import load_module
+
+scrollback = load_module('apps', 'managershell', 'scrollback.py')
+
+
+def session_output(blocks):
+    return ''.join(f'line {i} đã chạy /usr/bin/id\n' for i in range(blocks * 100))
+
+
+def test_ring_grows_lazily_and_wraps():
+    ring = scrollback.ScrollbackRing(16)
+    assert len(ring.buffer) == 0
+    ring.append(b'0123456789')
+    assert len(ring.buffer) == 10
+    assert ring.snapshot() == b'0123456789'
+    ring.append(b'abcdefghij')
+    assert len(ring.buffer) == 16
+    assert ring.snapshot() == b'456789abcdefghij'
+    ring.append(b'XYZ')
+    assert ring.snapshot() == b'789abcdefghijXYZ'
+
+
+def test_ring_does_not_start_inside_a_character():
+    ring = scrollback.ScrollbackRing(3)
+    ring.append('aaaé'.encode('utf-8') + 'đ'.encode('utf-8'))
+    assert ring.text() == 'đ'
+
+
+def test_transcript_pages_through_index(tmp_path):
+    text = session_output(20)
+    data = text.encode('utf-8')
+    transcript = scrollback.Transcript(str(tmp_path), 'shell_1', block_size=1024)
+    for start in range(0, len(data), 700):
+        transcript.append(data[start:start + 700])
+    assert transcript.size() == len(data)
+
+    pages = []
+    offset = 0
+    while offset < len(data):
+        page, start, offset, total = transcript.read(offset, 999)
+        assert total == len(data)
+        pages.append(page)
+    assert ''.join(pages) == text
+
+    page, start, next_offset, total = transcript.read(-50, 50)
+    assert next_offset == total
+    assert text.endswith(page)
+
+
+def test_transcript_file_names_are_sanitized(tmp_path):
+    transcript = scrollback.Transcript(str(tmp_path), '../shell 1', block_size=16)
+    assert os.path.dirname(transcript.data_path) == str(tmp_path)
+
+
+def test_transcript_recovers_after_partial_write(tmp_path):
+    data = session_output(5).encode('utf-8')
+    transcript = scrollback.Transcript(str(tmp_path), 'shell_1', block_size=1024)
+    transcript.append(data)
+    transcript.flush()
+    data_size = os.path.getsize(transcript.data_path)
+
+    # process chết giữa lúc ghi block tiếp theo: data ghi dở, record index ghi dở
+    with open(transcript.data_path, 'ab') as f:
+        f.write(b'\x1f\x8b\x08partial')
+    with open(transcript.index_path, 'ab') as f:
+        f.write(b'\x00' * 7)
+
+    recovered = scrollback.Transcript(str(tmp_path), 'shell_1', block_size=1024)
+    assert recovered.size() == len(data)
+    assert os.path.getsize(recovered.data_path) == data_size
+    assert os.path.getsize(recovered.index_path) % scrollback.INDEX_RECORD.size == 0
+
+    recovered.append(b'more output\n')
+    assert recovered.read(0, len(data) + 100)[0] == data.decode('utf-8') + 'more output\n'
+
+
+def test_history_reloads_ring_from_transcript(tmp_path):
+    history = scrollback.ShellHistory(str(tmp_path), ring_size=64, block_size=128)
+    history.append('shell_1', session_output(2))
+    history.close('shell_1')
+
+    restarted = scrollback.ShellHistory(str(tmp_path), ring_size=64, block_size=128)
+    replay = restarted.replay('shell_1')
+    assert replay and session_output(2).endswith(replay)
+
+
+def test_history_close_flushes_and_evicts(tmp_path):
+    history = scrollback.ShellHistory(str(tmp_path), block_size=1024 * 1024)
+    history.append('shell_1', 'whoami\nroot\n')
+    history.close('shell_1')
+    assert history.rings == {}
+    assert history.transcripts == {}
+
+    page = history.read('shell_1', 0, 100)
+    assert page[0] == 'whoami\nroot\n'
+    # đọc transcript của shell đã đóng không giữ nó lại
+    assert history.transcripts == {}
@@ -0,0 +1,89 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pocsuite3.lib.core.option import init_options
+from pocsuite3.lib.request.patch.session_pool import SessionPool
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:{0}'.format(httpd.server_address[1])
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_pool_key():
+    assert SessionPool.pool_key('http://A.example/x', {}) == ('http', 'a.example', 80, None)
+    assert SessionPool.pool_key('https://a.example:8443/', {}) == ('https', 'a.example', 8443, None)
+    proxies = {'http': 'http://127.0.0.1:8080'}
+    assert SessionPool.pool_key('http://a.example/', proxies)[3] == 'http://127.0.0.1:8080'
+    assert SessionPool.pool_key('https://a.example/', proxies)[3] is None
+
+
+def test_same_key_shares_a_session():
+    pool = SessionPool()
+    key = SessionPool.pool_key('http://a.example/', {})
+    session = pool.acquire(key)
+    pool.release(key)
+    assert pool.acquire(key) is session
+    pool.release(key)
+    assert pool.acquire(SessionPool.pool_key('http://b.example/', {})) is not session
+
+
+def test_least_recently_used_sessions_are_closed():
+    pool = SessionPool(max_hosts=2)
+    keys = [SessionPool.pool_key('http://{0}.example/'.format(host), {}) for host in 'abc']
+    for key in keys:
+        pool.acquire(key)
+        pool.release(key)
+    assert list(pool._sessions) == keys[1:]
+    assert pool.stats()['sessions'] == 2
+
+
+def test_sessions_in_use_are_kept():
+    pool = SessionPool(max_hosts=1, idle_timeout=0)
+    busy = SessionPool.pool_key('http://a.example/', {})
+    session = pool.acquire(busy)
+    other = SessionPool.pool_key('http://b.example/', {})
+    pool.acquire(other)
+    pool.release(other)
+    pool.acquire(SessionPool.pool_key('http://c.example/', {}))
+    assert busy in pool._sessions
+    assert other not in pool._sessions
+    assert pool._sessions[busy][0] is session
+
+
+def test_connections_are_reused(server):
+    # Session.request goes through the pocsuite3 hook, which reads conf
+    init_options()
+    pool = SessionPool()
+    key = SessionPool.pool_key(server, {})
+    for _ in range(5):
+        session = pool.acquire(key)
+        try:
+            assert session.get(server + '/x', proxies={}).text == 'ok'
+        finally:
+            pool.release(key)
+    stats = pool.stats()
+    assert (stats['connections'], stats['requests'], stats['reused']) == (1, 5, 4)
+    pool.clear()
+    assert pool.stats()['sessions'] == 0
+    assert pool.stats()['requests'] == 5
@@ -0,0 +1,113 @@
+import contextlib
+from types import SimpleNamespace
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, String, create_engine, select
+from sqlalchemy.orm import Session, declarative_base
+
+from tests import load_module
+
+state_writer = load_module('apps', 'managershell', 'state_writer.py')
+
+Base = declarative_base()
+
+
+class ShellConnection(Base):
+    """Các cột của apps.models.ShellConnection mà writer ghi"""
+    __tablename__ = 'shell_connections'
+    id = Column(Integer, primary_key=True)
+    connection_id = Column(String(64), unique=True)
+    status = Column(String(32))
+    hostname = Column(String(255))
+    command_count = Column(Integer, default=0)
+    data_transferred = Column(BigInteger, default=0)
+    last_active = Column(DateTime)
+    updated_at = Column(DateTime)
+
+
+class App:
+    def app_context(self):
+        return contextlib.nullcontext()
+
+
+def make_writer(tmp_path, **kwargs):
+    # file DB: the writer thread uses its own connection
+    engine = create_engine(f"sqlite:///{tmp_path / 'shells.db'}")
+    Base.metadata.create_all(engine)
+    db = SimpleNamespace(session=Session(engine))
+    db.session.add_all([ShellConnection(connection_id='s1', status='listening'),
+                        ShellConnection(connection_id='s2', status='listening')])
+    db.session.commit()
+    kwargs.setdefault('interval', 60)
+    writer = state_writer.ShellStateWriter(App(), db=db, model=ShellConnection, **kwargs)
+    return writer, db
+
+
+def row(db, connection_id):
+    return db.session.execute(
+        select(ShellConnection).where(ShellConnection.connection_id == connection_id)
+    ).scalar_one()
+
+
+def test_updates_are_merged_into_one_write(tmp_path):
+    writer, db = make_writer(tmp_path)
+    writer.update('s1', status='connected')
+    writer.update('s1', status='closed', hostname='web01', unknown_field='x')
+    for _ in range(3):
+        writer.activity('s1', commands=1, bytes_count=10)
+    writer.activity('s2', bytes_count=5)
+    assert writer.flush() == 2
+    db.session.expire_all()
+    shell = row(db, 's1')
+    assert (shell.status, shell.hostname, shell.command_count, shell.data_transferred) == ('closed', 'web01', 3, 30)
+    assert shell.last_active is not None
+    assert row(db, 's2').data_transferred == 5
+    assert row(db, 's2').command_count == 0
+    assert writer.stats() == {'updates': 6, 'flushes': 1, 'rows': 2, 'errors': 0, 'pending': 0}
+    writer.stop()
+
+
+def test_counters_add_up_across_flushes(tmp_path):
+    writer, db = make_writer(tmp_path)
+    writer.activity('s1', commands=2)
+    writer.flush()
+    writer.activity('s1', commands=3)
+    writer.flush()
+    db.session.expire_all()
+    assert row(db, 's1').command_count == 5
+    writer.stop()
+
+
+def test_failed_write_is_requeued(tmp_path):
+    writer, db = make_writer(tmp_path)
+    writer.update('s1', status='connected')
+    writer.activity('s1', commands=1)
+    real_write = writer._write
+
+    def locked(pending):
+        raise RuntimeError('db locked')
+
+    writer._write = locked
+    assert writer.flush() == 0
+    assert writer.stats()['errors'] == 1
+    # cập nhật mới hơn thắng, bộ đếm cộng dồn
+    writer.update('s1', status='closed')
+    writer.activity('s1', commands=1)
+    writer._write = real_write
+    assert writer.flush() == 1
+    db.session.expire_all()
+    assert (row(db, 's1').status, row(db, 's1').command_count) == ('closed', 2)
+    writer.stop()
+
+
+def test_max_pending_wakes_the_writer_thread(tmp_path):
+    writer, db = make_writer(tmp_path, max_pending=5)
+    for _ in range(5):
+        writer.activity('s1', bytes_count=1)
+    for _ in range(100):
+        if writer.stats()['rows']:
+            break
+        writer._thread.join(0.05)
+    assert writer.stats()['rows'] == 1
+    writer.stop()
+    writer._thread.join(1)
+    assert not writer._thread.is_alive()
@@ -0,0 +1,95 @@
+import threading
+
+from tests import load_module
+
+supervisor = load_module('apps', 'managershell', 'supervisor.py')
+
+
+class Manager:
+    """Phía PwncatManager mà ShellSupervisor gọi tới"""
+
+    def __init__(self, close_during_restart=False, fail=False):
+        self.close_during_restart = close_during_restart
+        self.fail = fail
+        self.registered = []
+        self.restarted = threading.Event()
+        self.supervisor = None
+
+    def _mark_disconnected(self, shell_id, delay):
+        pass
+
+    def _exited_shells(self):
+        return []
+
+    def _restart_shell(self, shell_id, generation):
+        try:
+            if self.fail:
+                return False
+            if self.close_during_restart:
+                # người dùng đóng shell trong lúc process mới đang khởi động
+                self.supervisor.unwatch(shell_id)
+            if not self.supervisor.watch(shell_id, generation):
+                return False
+            self.registered.append(shell_id)
+            return True
+        finally:
+            self.restarted.set()
+
+
+def make_supervisor(manager):
+    manager.supervisor = supervisor.ShellSupervisor(manager, max_workers=1, base_delay=0.01,
+                                                    max_delay=0.05, sweep_interval=60)
+    return manager.supervisor
+
+
+def test_exit_is_reconnected():
+    manager = Manager()
+    sup = make_supervisor(manager)
+    sup.watch('shell_1')
+    sup.notify_exit('shell_1')
+    assert manager.restarted.wait(2)
+    assert manager.registered == ['shell_1']
+    assert sup.status('shell_1')['state'] == supervisor.RUNNING
+    assert sup.status('shell_1')['attempts'] == 1
+
+
+def test_shell_closed_during_reconnect_is_not_registered():
+    manager = Manager(close_during_restart=True)
+    sup = make_supervisor(manager)
+    sup.watch('shell_1')
+    sup.notify_exit('shell_1')
+    assert manager.restarted.wait(2)
+    assert manager.registered == []
+    assert sup.status('shell_1') is None
+
+
+def test_watch_with_stale_generation_is_refused():
+    manager = Manager()
+    sup = make_supervisor(manager)
+    sup.watch('shell_1')
+    generation = sup.shells['shell_1'].generation
+    sup.notify_exit('shell_1')
+    assert not sup.watch('shell_1', generation)
+    assert not sup.watch('shell_2', 1)
+    assert sup.watch('shell_2')
+
+
+def test_failed_attempt_backs_off_again():
+    manager = Manager(fail=True)
+    sup = make_supervisor(manager)
+    sup.watch('shell_1')
+    sup.notify_exit('shell_1')
+    assert manager.restarted.wait(2)
+    manager.restarted.clear()
+    assert manager.restarted.wait(2)
+    status = sup.status('shell_1')
+    assert status['attempts'] >= 2
+    sup.unwatch('shell_1')
+
+
+def test_delay_is_capped_and_jittered():
+    sup = make_supervisor(Manager())
+    for attempts in range(12):
+        delay = sup._delay(attempts)
+        ceiling = min(sup.max_delay, sup.base_delay * 2 ** attempts)
+        assert ceiling / 2 <= delay <= ceiling
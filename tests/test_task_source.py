@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+from pocsuite3.lib.core.data import kb
+from pocsuite3.lib.core.datatype import AttribDict
+from pocsuite3.lib.core.task_source import (
+    TaskCursor, cidr_target_source, count_targets, file_target_source, iter_targets, iter_tasks,
+    tasks_fingerprint)
+
+
+@pytest.fixture(autouse=True)
+def task_kb():
+    saved = {key: kb.get(key) for key in ('targets', 'target_sources', 'registered_pocs')}
+    kb.targets = []
+    kb.target_sources = []
+    kb.registered_pocs = AttribDict()
+    yield kb
+    kb.update(saved)
+
+
+def test_cidr_source_is_counted_without_expanding():
+    assert cidr_target_source('10.0.0.0/8') == 2 ** 24 - 2
+    assert cidr_target_source('192.168.1.0/31') == 2
+    assert cidr_target_source('2001:db8::/64') == 2 ** 64 - 1
+    kb.targets = ['http://a']
+    assert count_targets() == 1 + (2 ** 24 - 2) + 2 + (2 ** 64 - 1)
+
+
+def test_cidr_source_yields_hosts_lazily():
+    cidr_target_source('192.168.1.0/30')
+    assert list(iter_targets()) == ['192.168.1.1', '192.168.1.2']
+
+
+def test_file_source_count_is_unknown(tmp_path):
+    url_file = tmp_path / 'urls.txt'
+    url_file.write_text('http://a\n# comment\n\nhttp://b # trailing\n')
+    kb.targets = ['http://c']
+    file_target_source(str(url_file))
+    assert count_targets() is None
+    assert list(iter_targets()) == ['http://c', 'http://a', 'http://b']
+
+
+def test_tasks_are_numbered_per_poc_and_target():
+    kb.targets = ['t1', 't2']
+    kb.registered_pocs = AttribDict({'p1': 'poc1', 'p2': 'poc2'})
+    assert list(iter_tasks()) == [(0, 't1', 'p1'), (1, 't2', 'p1'), (2, 't1', 'p2'), (3, 't2', 'p2')]
+    assert [seq for seq, _, _ in iter_tasks(start=2)] == [2, 3]
+
+
+def test_cursor_watermark_waits_for_gaps(tmp_path):
+    cursor = TaskCursor(str(tmp_path / 'resume.json'), 'fp')
+    for seq in (1, 2, 4):
+        cursor.done(seq)
+    assert cursor.position == 0
+    cursor.done(0)
+    assert cursor.position == 3
+    cursor.done(3)
+    assert cursor.position == 5
+    assert not cursor._finished
+
+
+def test_cursor_flushes_every_n_tasks(tmp_path):
+    resume_file = tmp_path / 'resume.json'
+    cursor = TaskCursor(str(resume_file), 'fp', flush_every=2)
+    cursor.done(0)
+    assert not resume_file.exists()
+    cursor.done(1)
+    assert json.loads(resume_file.read_text()) == {'fingerprint': 'fp', 'position': 2}
+
+
+def test_resume_starts_from_saved_position(tmp_path):
+    kb.targets = ['t1', 't2', 't3']
+    kb.registered_pocs = AttribDict({'p1': 'poc1'})
+    resume_file = str(tmp_path / 'resume.json')
+    cursor = TaskCursor(resume_file, tasks_fingerprint())
+    cursor.done(0)
+    cursor.done(1)
+    cursor.flush()
+
+    resumed = TaskCursor(resume_file, tasks_fingerprint())
+    start = resumed.load()
+    assert start == 2
+    assert list(iter_tasks(start)) == [(2, 't3', 'p1')]
+    resumed.clear()
+    assert not os.path.exists(resume_file)
+
+
+def test_resume_file_of_another_scan_is_ignored(tmp_path):
+    kb.targets = ['t1']
+    kb.registered_pocs = AttribDict({'p1': 'poc1'})
+    resume_file = str(tmp_path / 'resume.json')
+    cursor = TaskCursor(resume_file, tasks_fingerprint())
+    cursor.done(0)
+    cursor.flush()
+
+    kb.targets = ['t1', 't2']
+    assert TaskCursor(resume_file, tasks_fingerprint()).load() == 0
+    assert TaskCursor(str(tmp_path / 'missing.json'), 'fp').load() == 0
@@ -0,0 +1,83 @@
+import threading
+import time
+
+from tests import load_module
+
+terminal_stream = load_module('apps', 'managershell', 'terminal_stream.py')
+
+
+class Client:
+    def __init__(self):
+        self.frames = []
+        self.event = threading.Event()
+
+    def send(self, event, payload, sid, callback):
+        self.frames.append(payload['output'])
+        callback()
+        self.event.set()
+
+
+def make_streamer():
+    client = Client()
+    return terminal_stream.TerminalStreamer(client.send, window=0.01), client
+
+
+def test_split_utf8_is_joined():
+    streamer, client = make_streamer()
+    streamer.subscribe('shell_1', 'sid')
+    data = 'đăng nhập\n'.encode('utf-8')
+    streamer.feed('shell_1', data[:2])
+    streamer.feed('shell_1', data[2:])
+    assert client.event.wait(2)
+    assert ''.join(client.frames) == 'đăng nhập\n'
+
+
+def test_end_keeps_subscribers():
+    streamer, client = make_streamer()
+    streamer.subscribe('shell_1', 'sid')
+    streamer.feed('shell_1', b'first\n')
+    streamer.end('shell_1')
+    assert client.event.wait(2)
+    client.event.clear()
+    streamer.feed('shell_1', b'after reconnect\n')
+    assert client.event.wait(2)
+    assert ''.join(client.frames) == 'first\nafter reconnect\n'
+
+
+def test_close_delivers_pending_then_drops_stream():
+    streamer, client = make_streamer()
+    streamer.window = 60
+    streamer.subscribe('shell_1', 'sid')
+    streamer.feed('shell_1', b'last line\n')
+    streamer.close('shell_1')
+    assert client.event.wait(2)
+    assert client.frames == ['last line\n']
+    for _ in range(100):
+        if 'shell_1' not in streamer.streams:
+            break
+        time.sleep(0.01)
+    assert 'shell_1' not in streamer.streams
+
+
+def test_close_without_pending_output():
+    streamer, client = make_streamer()
+    streamer.subscribe('shell_1', 'sid')
+    streamer.close('shell_1')
+    assert streamer.streams == {}
+    assert streamer.metrics()['clients'] == 0
+
+
+def test_close_evicts_history():
+    scrollback = load_module('apps', 'managershell', 'scrollback.py')
+    client = Client()
+    history = scrollback.ShellHistory()
+    streamer = terminal_stream.TerminalStreamer(client.send, window=0.01, history=history)
+    streamer.subscribe('shell_1', 'sid')
+    streamer.feed('shell_1', b'id\n')
+    streamer.close('shell_1')
+    for _ in range(100):
+        if not history.rings:
+            break
+        time.sleep(0.01)
+    assert history.rings == {}
+    assert client.frames == ['id\n']
@@ -0,0 +1,36 @@
+from apps.weevely.module_executor import CronWeevelyRunner
+
+
+def test_upload_keeps_no_overwrite_by_default():
+    command = CronWeevelyRunner._build_upload_command({'source_path': '/tmp/a', 'target_path': '/var/www/a'})
+    assert command.startswith(':file_upload -chunked -chunk-size ')
+    assert '-force' not in command
+    assert command.endswith(' /tmp/a /var/www/a')
+
+
+def test_upload_force_only_when_asked():
+    params = {'source_path': '/tmp/a', 'target_path': '/var/www/a', 'force': 'true'}
+    assert ' -force ' in CronWeevelyRunner._build_upload_command(params)
+    params['force'] = 'false'
+    assert '-force' not in CronWeevelyRunner._build_upload_command(params)
+
+
+def test_upload_vector_is_honoured():
+    params = {'source_path': '/tmp/a', 'target_path': '/var/www/a', 'vector': 'fwrite'}
+    assert CronWeevelyRunner._build_upload_command(params) == ':file_upload -vector fwrite /tmp/a /var/www/a'
+
+
+def test_download_is_chunked_without_vector(tmp_path, monkeypatch):
+    monkeypatch.setattr(CronWeevelyRunner, '_download_folder', staticmethod(lambda: str(tmp_path)))
+    command, local_path, remote_path = CronWeevelyRunner._build_download_command({'remote_path': '/etc/hosts'})
+    assert command.startswith(':file_download -chunked -chunk-size ')
+    assert command.endswith(f" /etc/hosts {tmp_path / 'hosts'}")
+    assert (local_path, remote_path) == (str(tmp_path / 'hosts'), '/etc/hosts')
+
+
+def test_download_vector_is_honoured(tmp_path, monkeypatch):
+    monkeypatch.setattr(CronWeevelyRunner, '_download_folder', staticmethod(lambda: str(tmp_path)))
+    command, _, _ = CronWeevelyRunner._build_download_command({'remote_path': '/etc/hosts', 'vector': 'base64'})
+    assert command == f":file_download -vector base64 /etc/hosts {tmp_path / 'hosts'}"
+    command, _, _ = CronWeevelyRunner._build_download_command({'remote_path': '/etc/hosts', 'vector': 'chunked'})
+    assert '-chunked' in command
@@ -0,0 +1,116 @@
+import os
+import subprocess
+import threading
+import time
+
+import pytest
+
+from apps.weevely.session_pool import WeevelySessionPool, WorkerError
+
+# Giả lập `weevely.py worker <url> <password>`: cùng giao thức JSON theo dòng
+FAKE_WEEVELY = '''
+import json
+import os
+import sys
+import time
+
+if sys.argv[2].endswith('slow-start'):
+    time.sleep(5)
+print(json.dumps({'ready': True}), flush=True)
+for line in sys.stdin:
+    request = json.loads(line)
+    if request['op'] == 'exit':
+        break
+    if request['op'] == 'ping':
+        print(json.dumps({'id': request['id'], 'ok': True}), flush=True)
+        continue
+    cmd = request['cmd']
+    if cmd == 'die':
+        sys.exit(1)
+    if cmd.startswith('sleep '):
+        time.sleep(float(cmd.split()[1]))
+    stdout = '%d %s %s' % (os.getpid(), sys.argv[2], cmd)
+    print(json.dumps({'id': request['id'], 'stdout': stdout, 'stderr': '', 'returncode': 0}), flush=True)
+'''
+
+
+@pytest.fixture
+def pool(tmp_path):
+    weevely_path = tmp_path / 'weevely.py'
+    weevely_path.write_text(FAKE_WEEVELY)
+    pool = WeevelySessionPool(str(weevely_path), start_timeout=10)
+    yield pool
+    pool.close_all()
+
+
+def run(pool, cmd, url='http://a/agent.php', timeout=10):
+    pid, _url, _cmd = pool.execute(url, 'pw', cmd, timeout).stdout.split(' ', 2)
+    return int(pid)
+
+
+def test_worker_is_reused_per_key(pool):
+    first = run(pool, 'id')
+    assert run(pool, 'id') == first
+    assert run(pool, 'id', url='http://b/agent.php') != first
+    stats = pool.stats()
+    assert (stats['spawned'], stats['reused'], stats['keys']) == (2, 1, 2)
+
+
+def test_dead_worker_is_respawned(pool):
+    first = run(pool, 'id')
+    with pytest.raises(WorkerError):
+        pool.execute('http://a/agent.php', 'pw', 'die', 10)
+    assert pool.stats()['workers'] == 0
+    assert run(pool, 'id') != first
+    assert pool.stats()['spawned'] == 2
+
+
+def test_timed_out_command_kills_the_worker(pool):
+    first = run(pool, 'id')
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.execute('http://a/agent.php', 'pw', 'sleep 5', 0.5)
+    assert pool.stats()['workers'] == 0
+    assert run(pool, 'id') != first
+
+
+def test_commands_of_one_key_are_serialized(pool):
+    run(pool, 'id')
+    pids, errors = [], []
+
+    def call():
+        try:
+            pids.append(run(pool, 'sleep 0.3'))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(3)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert len(set(pids)) == 1
+    assert time.time() - started >= 0.9
+    assert pool.stats()['workers'] == 1
+
+
+def test_waiting_for_the_worker_counts_in_the_timeout(pool):
+    run(pool, 'id')
+    busy = threading.Thread(target=run, args=(pool, 'sleep 0.6'))
+    busy.start()
+    time.sleep(0.1)
+    started = time.time()
+    # chờ worker ~0.5s rồi lệnh 0.6s: tổng vượt timeout 0.8s
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.execute('http://a/agent.php', 'pw', 'sleep 0.6', 0.8)
+    assert time.time() - started < 1.5
+    busy.join()
+
+
+def test_slow_start_counts_in_the_timeout(pool):
+    started = time.time()
+    with pytest.raises(subprocess.TimeoutExpired):
+        pool.execute('http://slow-start', 'pw', 'id', 0.5)
+    assert time.time() - started < 2
+    assert pool.stats()['workers'] == 0